@@ -3,27 +3,34 @@
 This module contains the AsgStateChangeHook NestedStack class.
 """
 
+import json
+from typing import Optional
+
 from aws_cdk import (
     NestedStack,
     Duration,
     aws_lambda,
+    aws_ec2 as ec2,
     aws_iam as iam,
+    aws_sns as sns,
     aws_logs as logs,
     aws_ecs as ecs,
     aws_events as events,
     aws_events_targets as events_targets,
     aws_autoscaling as autoscaling,
+    aws_cloudwatch as cloudwatch,
 )
 from constructs import Construct
 
 from ContainerManager.leaf_stack.domain_stack import DomainStack
+from ContainerManager.utils.lambda_logging import logging_environment
 
 class AsgStateChangeHook(NestedStack):
     """
     Contains the infrastructure to keep the management logic
     in sync with the ASG/Instance state.
     """
-    def __init__(
+    def __init__( # pylint: disable=too-many-locals
         self,
         scope: Construct,
         container_id: str,
@@ -32,10 +39,61 @@ class AsgStateChangeHook(NestedStack):
         ec2_service: ecs.Ec2Service,
         auto_scaling_group: autoscaling.AutoScalingGroup,
         rule_watchdog_trigger: events.Rule,
+        scale_down_alarms: list[cloudwatch.Alarm],
+        watchdog_config: dict,
+        watchdog_metrics: dict[str, cloudwatch.Metric],
+        wake_trace: dict[str, str],
+        readiness_check_config: dict,
+        notify_up_message: str,
+        sns_topics: list[sns.Topic],
+        metric_namespace: str,
+        elastic_ip: Optional[ec2.CfnEIP],
+        logging_layer: aws_lambda.ILayerVersion,
+        logging_config: dict,
         **kwargs,
     ) -> None:
         super().__init__(scope, "AsgStateChangeHook", **kwargs)
+        shutdown_hold_seconds = watchdog_config["ShutdownHoldSeconds"]
+        shutdown_mode = "Direct" if watchdog_config["DirectShutdown"]["Enabled"] else "Alarm"
+
+        ## How long the instance sat idle before it started terminating. Published on every spin-down,
+        ##   with which way it was spun down, so you can compare turning on `Watchdog.DirectShutdown`:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.Metric.html
+        self.metric_idle_to_terminate = cloudwatch.Metric(
+            metric_name="Metric-IdleToTerminate",
+            namespace=metric_namespace,
+            dimensions_map={
+                "ContainerNameID": container_id,
+                "ShutdownMode": shutdown_mode,
+            },
+            label="Seconds from the last activity, to the instance terminating",
+            unit=cloudwatch.Unit.SECONDS,
+            # Only one data point per spin-down:
+            statistic=cloudwatch.Stats.MAXIMUM,
+        )
 
+        ## Pause the instance while it's launching, so DNS can be updated as soon as it has an IP.
+        ## (No notification target, so it only goes to EventBridge. The lambda completes it.)
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_autoscaling.LifecycleHook.html
+        self.launch_lifecycle_hook = autoscaling.LifecycleHook(
+            self,
+            "LaunchLifecycleHook",
+            auto_scaling_group=auto_scaling_group,
+            lifecycle_transition=autoscaling.LifecycleTransition.INSTANCE_LAUNCHING,
+            # If the lambda fails, keep going anyways. The "Launch Successful" event is a backup:
+            default_result=autoscaling.DefaultResult.CONTINUE,
+            heartbeat_timeout=Duration.minutes(1),
+        )
+
+        ## Some events make the lambda wait on something, give those room:
+        if readiness_check_config["Enabled"]:
+            # Waits on the container's readiness check. Games can take a while, so as long as possible:
+            lambda_timeout = Duration.minutes(15)
+        elif shutdown_hold_seconds:
+            # Holds the instance for the whole window, in case players reconnect:
+            lambda_timeout = Duration.seconds(60 + shutdown_hold_seconds)
+        else:
+            lambda_timeout = Duration.seconds(30)
 
         ## Lambda function to update the DNS record:
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html
@@ -46,9 +104,12 @@ class AsgStateChangeHook(NestedStack):
             code=aws_lambda.Code.from_asset("./ContainerManager/leaf_stack/lambda/instance-StateChange-hook/"),
             handler="main.lambda_handler",
             runtime=aws_lambda.Runtime.PYTHON_3_12,
-            timeout=Duration.seconds(30),
+            timeout=lambda_timeout,
             log_retention=logs.RetentionDays.ONE_WEEK,
+            layers=[logging_layer],
             environment={
+                **logging_environment(logging_config, "AsgStateChangeHook"),
+                "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
                 "HOSTED_ZONE_ID": domain_stack.sub_hosted_zone.hosted_zone_id,
                 "DOMAIN_NAME": domain_stack.sub_domain_name,
                 "UNAVAILABLE_IP": domain_stack.unavailable_ip,
@@ -57,8 +118,53 @@ class AsgStateChangeHook(NestedStack):
                 "WATCH_INSTANCE_RULE": rule_watchdog_trigger.rule_name,
                 "ECS_CLUSTER_NAME": ecs_cluster.cluster_name,
                 "ECS_SERVICE_NAME": ec2_service.service_name,
+                "SHUTDOWN_HOLD_SECONDS": str(shutdown_hold_seconds),
+                "WAKE_TRACE_PARAMETER": wake_trace["ParameterName"],
+                # Optional, only if DNS and the "started" notification wait on the container being ready:
+                "READINESS_CHECK": str(readiness_check_config["Enabled"]),
+                "NOTIFY_UP_MESSAGE": notify_up_message,
+                "NOTIFY_TOPIC_ARNS": json.dumps([topic.topic_arn for topic in sns_topics]),
+                "METRIC_NAMESPACE": metric_namespace,
+                "METRIC_NAME_READY_LATENCY": "Metric-ReadyLatency",
+                # (Finishes the wake's trace once the container's ready, see WakeTrace):
+                "METRIC_NAME_TIME_TO_PLAYABLE": wake_trace["MetricTimeToPlayable"],
+                "METRIC_NAME_WAKE_STAGE": wake_trace["MetricWakeStage"],
+                "METRIC_DIMENSIONS": json.dumps({"ContainerNameID": container_id}),
+                ## To find the last activity, the same way the watchdog's alarm sees it:
+                "METRIC_NAME_IDLE_TO_TERMINATE": self.metric_idle_to_terminate.metric_name,
+                "SHUTDOWN_MODE": shutdown_mode,
+                "METRIC_NAME_ACTIVITY_COUNT": watchdog_metrics["ActivityCount"].metric_name,
+                # (A Query never touches the host, so there's no SSH count):
+                "METRIC_NAME_SSH_CONNECTIONS": watchdog_metrics["SshConnections"].metric_name if watchdog_config["Type"] != "QUERY" else "",
+                "METRIC_THRESHOLD": str(watchdog_config["Threshold"]),
+                # Optional, only if the instance should always use the same IP:
+                "ELASTIC_IP": elastic_ip.attr_public_ip if elastic_ip else "",
+                "ELASTIC_IP_ALLOCATION_ID": elastic_ip.attr_allocation_id if elastic_ip else "",
             },
         )
+        if elastic_ip:
+            ## Let it move the Elastic IP to the new instance:
+            # https://docs.aws.amazon.com/service-authorization/latest/reference/list_amazonec2.html
+            self.lambda_asg_state_change_hook.add_to_role_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["ec2:AssociateAddress"],
+                    resources=[f"arn:aws:ec2:{self.region}:{self.account}:elastic-ip/{elastic_ip.attr_allocation_id}"],
+                )
+            )
+            self.lambda_asg_state_change_hook.add_to_role_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["ec2:AssociateAddress"],
+                    # No clue what the instance ID will be, so lock it to the ASG:
+                    resources=[f"arn:aws:ec2:{self.region}:{self.account}:instance/*"],
+                    conditions={
+                        "StringEquals": {
+                            "aws:ResourceTag/aws:autoscaling:groupName": auto_scaling_group.auto_scaling_group_name,
+                        }
+                    },
+                )
+            )
         self.lambda_asg_state_change_hook.add_to_role_policy(
             iam.PolicyStatement(
                 # NOTE: these are on the list of actions that CANNOT be locked down
@@ -69,21 +175,42 @@ class AsgStateChangeHook(NestedStack):
                     "ec2:DescribeInstances",
                     # To make sure no other instances are starting up:
                     "autoscaling:DescribeAutoScalingGroups",
+                    # To find the last activity, when spinning down:
+                    "cloudwatch:GetMetricData",
                 ],
                 resources=["*"],
             )
         )
-        # Give it permissions to update the service desired_task:
+        ## Let it finish the launch lifecycle action, and let go of the instance after the hold window:
         self.lambda_asg_state_change_hook.add_to_role_policy(
             iam.PolicyStatement(
                 effect=iam.Effect.ALLOW,
                 actions=[
-                    "ecs:UpdateService",
-                    "ecs:DescribeServices",
+                    "autoscaling:CompleteLifecycleAction",
+                    "autoscaling:SetInstanceProtection",
                 ],
+                resources=[auto_scaling_group.auto_scaling_group_arn],
+            )
+        )
+        # Give it permissions to update the service desired_task:
+        self.lambda_asg_state_change_hook.add_to_role_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["ecs:UpdateService"],
                 resources=[ec2_service.service_arn],
             )
         )
+        ## Let it follow the current wake's trace, finish it once the container's ready, and clear it when spinning down:
+        self.lambda_asg_state_change_hook.add_to_role_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ssm:GetParameter",
+                    "ssm:PutParameter",
+                ],
+                resources=[wake_trace["ParameterArn"]],
+            )
+        )
         ## Let it update the DNS record of this stack:
         self.lambda_asg_state_change_hook.add_to_role_policy(
             iam.PolicyStatement(
@@ -115,10 +242,15 @@ class AsgStateChangeHook(NestedStack):
             # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events.EventPattern.html
             event_pattern=events.EventPattern(
                 source=["aws.autoscaling"],
-                # "EC2 Instance Launch Successful" -> FINISHES spinning up (has an ip now)
+                # "EC2 Instance-launch Lifecycle Action" -> STARTS spinning up (already has an ip)
+                # "EC2 Instance Launch Successful" -> FINISHES spinning up (backup for the one above)
                 # "EC2 Instance-terminate Lifecycle Action" -> STARTS to spin down (shorter
                 #                          wait time than "EC2 Instance Terminate Successful").
-                detail_type=["EC2 Instance Launch Successful", "EC2 Instance-terminate Lifecycle Action"],
+                detail_type=[
+                    "EC2 Instance-launch Lifecycle Action",
+                    "EC2 Instance Launch Successful",
+                    "EC2 Instance-terminate Lifecycle Action",
+                ],
                 detail={
                     "AutoScalingGroupName": [auto_scaling_group.auto_scaling_group_name],
                 },
@@ -128,3 +260,64 @@ class AsgStateChangeHook(NestedStack):
                 events_targets.LambdaFunction(self.lambda_asg_state_change_hook),
             ],
         )
+
+        ## EventBridge Rule: When the watchdog wants to spin down, hold the instance for a bit first.
+        #    (The ASG can't terminate it while it's protected, this is what lets it go)
+        if shutdown_hold_seconds:
+            self.rule_scale_down_hold_trigger = events.Rule(
+                self,
+                "ScaleDownHoldTrigger",
+                rule_name=f"{container_id}-rule-ASG-ScaleDown-hold",
+                description="Trigger Lambda whenever the ASG is told to spin down, to give players a chance to reconnect",
+                # https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/cloudwatch-and-eventbridge.html
+                event_pattern=events.EventPattern(
+                    source=["aws.cloudwatch"],
+                    detail_type=["CloudWatch Alarm State Change"],
+                    resources=[alarm.alarm_arn for alarm in scale_down_alarms],
+                    detail={
+                        "state": {"value": ["ALARM"]},
+                    },
+                ),
+                targets=[
+                    events_targets.LambdaFunction(self.lambda_asg_state_change_hook),
+                ],
+            )
+
+        ## Wait for the container to be READY, before pointing DNS at it and letting everyone know:
+        if readiness_check_config["Enabled"]:
+            ## Let it check on the task, and find the instance it's on:
+            self.lambda_asg_state_change_hook.add_to_role_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=[
+                        "ecs:DescribeTasks",
+                        "ecs:DescribeContainerInstances",
+                    ],
+                    resources=[
+                        f"arn:aws:ecs:{self.region}:{self.account}:task/{ecs_cluster.cluster_name}/*",
+                        f"arn:aws:ecs:{self.region}:{self.account}:container-instance/{ecs_cluster.cluster_name}/*",
+                    ],
+                )
+            )
+            ## Let it send the "started" notification:
+            for topic in sns_topics:
+                topic.grant_publish(self.lambda_asg_state_change_hook)
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events.Rule.html
+            self.rule_task_running_trigger = events.Rule(
+                self,
+                "TaskRunningTrigger",
+                rule_name=f"{container_id}-rule-Task-Running-hook",
+                description="Trigger Lambda when the task starts, to wait for it to be ready",
+                event_pattern=events.EventPattern(
+                    source=["aws.ecs"],
+                    detail_type=["ECS Task State Change"],
+                    detail={
+                        "clusterArn": [ecs_cluster.cluster_arn],
+                        "lastStatus": ["RUNNING"],
+                        "desiredStatus": ["RUNNING"],
+                    },
+                ),
+                targets=[
+                    events_targets.LambdaFunction(self.lambda_asg_state_change_hook),
+                ],
+            )
@@ -6,8 +6,11 @@ This module contains the Container NestedStack class.
 
 from aws_cdk import (
     NestedStack,
+    Duration,
     RemovalPolicy,
     aws_ecs as ecs,
+    aws_ecr as ecr,
+    aws_iam as iam,
     aws_logs as logs,
 )
 from constructs import Construct
@@ -51,13 +54,74 @@ class Container(NestedStack):
         ### Give the task write logging permissions:
         self.container_log_group.grant_write(self.task_definition.task_role)
 
+        ## Where to pull the image from:
+        image_cache_config = container_config["ImageCache"]
+        if image_cache_config["Enabled"]:
+            ## Mirror the image into ECR in this region, the first pull populates it:
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecr.CfnPullThroughCacheRule.html
+            self.image_cache_prefix = image_cache_config["RepositoryPrefix"] or container_id.lower()
+            upstream = image_cache_config["Upstream"]
+            self.pull_through_cache_rule = ecr.CfnPullThroughCacheRule(
+                self,
+                "PullThroughCacheRule",
+                ecr_repository_prefix=self.image_cache_prefix,
+                upstream_registry_url=upstream["Registry"],
+                credential_arn=image_cache_config["CredentialArn"],
+            )
+            ## The repo doesn't exist until the first pull. Importing it just builds the uri/arn:
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecr.Repository.html#static-fromwbrrepositorywbrnamescope-id-repositoryname
+            self.image_cache_repository = ecr.Repository.from_repository_name(
+                self,
+                "ImageCacheRepository",
+                f"{self.image_cache_prefix}/{upstream['Repository']}",
+            )
+            # (Handles a digest too, 'repo@sha256:...'. `from_ecr_repository` would build 'repo:sha256:...'):
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecr.IRepository.html#repositorywbruriwbrforwbrtagwbrorwbrdigesttagordigest
+            self.image_uri = self.image_cache_repository.repository_uri_for_tag_or_digest(upstream["Tag"])
+            container_image = ecs.ContainerImage.from_registry(self.image_uri)
+            # Since it's not `from_ecr_repository`, let the execution role pull from the repo itself:
+            self.image_cache_repository.grant_pull(self.task_definition.obtain_execution_role())
+            ## Pulling through the cache creates the repo, and imports the image into it:
+            # https://docs.aws.amazon.com/AmazonECR/latest/userguide/pull-through-cache-iam.html
+            self.task_definition.obtain_execution_role().add_to_principal_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=[
+                        "ecr:CreateRepository",
+                        "ecr:BatchImportUpstreamImage",
+                    ],
+                    resources=[f"arn:aws:ecr:{self.region}:{self.account}:repository/{self.image_cache_prefix}/*"],
+                )
+            )
+        else:
+            self.image_cache_prefix = None
+            self.image_uri = container_config["Image"]
+            container_image = ecs.ContainerImage.from_registry(self.image_uri)
+
+        ## If the container says when it's ready to accept players, instead of just "running":
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecs.HealthCheck.html
+        readiness_check_config = container_config["ReadinessCheck"]
+        if readiness_check_config["Enabled"]:
+            health_check = ecs.HealthCheck(
+                command=["CMD-SHELL", readiness_check_config["Command"]],
+                # Failures during this don't count, give the game time to load:
+                start_period=Duration.seconds(readiness_check_config["StartPeriodSeconds"]),
+                ## Check often, so players know as soon as it's ready. But don't give up on
+                ## it quickly either, ECS replaces the task if it's ever marked unhealthy:
+                interval=Duration.seconds(10),
+                retries=10,
+                timeout=Duration.seconds(5),
+            )
+        else:
+            health_check = None
+
         ## Details for add_container:
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecs.TaskDefinition.html#addwbrcontainerid-props
         ## And what it returns:
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecs.ContainerDefinition.html
         self.container = self.task_definition.add_container(
             container_id.title(),
-            image=ecs.ContainerImage.from_registry(container_config["Image"]),
+            image=container_image,
             port_mappings=container_config["Ports"],
             ## Hard limit. Won't ever go above this
             # memory_limit_mib=999999999,
@@ -65,6 +129,7 @@ class Container(NestedStack):
             memory_reservation_mib=4*1024,
             ## Add environment variables into the container here:
             environment=container_config["Environment"],
+            health_check=health_check,
             ## Logging, straight from:
             # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecs.LogDriver.html
             logging=ecs.LogDrivers.aws_logs(
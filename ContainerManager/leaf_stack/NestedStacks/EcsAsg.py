@@ -5,6 +5,7 @@ This module contains the EcsAsg NestedStack class.
 
 from aws_cdk import (
     NestedStack,
+    CfnTag,
     aws_ec2 as ec2,
     aws_ecs as ecs,
     aws_iam as iam,
@@ -22,7 +23,7 @@ class EcsAsg(NestedStack):
     This sets up the "hardware" of the container, and the task to
     run on it.
     """
-    def __init__(
+    def __init__( # pylint: disable=too-many-locals
         self,
         scope: Construct,
         leaf_construct_id: str,
@@ -34,6 +35,10 @@ class EcsAsg(NestedStack):
         leaf_stack_sns_topic: sns.Topic,
         task_definition: ecs.Ec2TaskDefinition,
         ec2_config: dict,
+        protect_from_scale_in: bool,
+        machine_image: ec2.IMachineImage,
+        image_cache_config: dict,
+        readiness_check_config: dict,
         sg_container_traffic: ec2.SecurityGroup,
         efs_file_system: efs.FileSystem,
         host_access_point: efs.AccessPoint,
@@ -76,6 +81,34 @@ class EcsAsg(NestedStack):
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ec2.UserData.html
         self.ec2_user_data = ec2.UserData.for_linux() # (Can also set to python, etc. Default bash)
 
+        ## Boot Timeline: Each phase of the boot pushes "seconds since the kernel started" to CloudWatch,
+        ## so you can see where the boot time actually goes. (Never let it fail the boot itself):
+        # https://docs.aws.amazon.com/cli/latest/reference/cloudwatch/put-metric-data.html
+        self.metric_namespace = leaf_construct_id
+        self.metric_boot_timeline_name = "Metric-BootTimeline"
+        self.ec2_user_data.add_commands(
+            'boot_phase() {',
+            f'  aws cloudwatch put-metric-data --region "{self.region}" --namespace "{self.metric_namespace}" \\',
+            f'    --metric-name "{self.metric_boot_timeline_name}" --unit Seconds --dimensions "ContainerNameID={container_id},Phase=$1" \\',
+            '    --value "${2:-$(cut -d " " -f 1 /proc/uptime)}" || true',
+            '}',
+            ## When cloud-init itself started (It writes epoch times, so subtract when the kernel started):
+            # https://cloudinit.readthedocs.io/en/latest/reference/cli.html#status
+            'boot_phase CloudInitStarted "$(jq --argjson btime "$(awk \'/^btime/ {print $2}\' /proc/stat)" \'.v1."init-local".start - $btime\' /run/cloud-init/status.json)" &',
+        )
+        self.ec2_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["cloudwatch:PutMetricData"],
+                resources=["*"],
+                conditions={
+                    "StringEquals": {
+                        "cloudwatch:namespace": self.metric_namespace,
+                    }
+                },
+            )
+        )
+
         ## Mount the EFS volume:
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_efs-readme.html#mounting-the-file-system-using-user-data
         #  (the first few commands on that page aren't needed. Since we're a optimized ecs image, we have those packages already)
@@ -86,7 +119,9 @@ class EcsAsg(NestedStack):
             #      (You can also mount efs directly by removing the accesspoint flag)
             # https://docs.aws.amazon.com/efs/latest/ug/mounting-access-points.html
             f'echo "{efs_file_system.file_system_id}:/ {efs_mount_point} efs defaults,tls,iam,_netdev,accesspoint={host_access_point.access_point_id} 0 0" >> /etc/fstab',
-            'mount -a -t efs,nfs4 defaults',
+            ## In the background. The container mounts EFS on it's own (through the task definition), this
+            ## one is just for the host. The ECS agent doesn't start until user data finishes, so don't wait on it:
+            '( mount -a -t efs,nfs4 defaults && boot_phase EfsMounted ) > /var/log/efs-mount.log 2>&1 &',
         )
 
         ## Add ECS Agent Config Variables:
@@ -100,7 +135,48 @@ class EcsAsg(NestedStack):
             ## Isn't ever on long enough to worry about cleanup anyways:
             'echo "ECS_DISABLE_IMAGE_CLEANUP=true" >> /etc/ecs/ecs.config',
         )
+        if ec2_config["WarmPool"]["Enabled"]:
+            ## Don't register to the cluster while the instance is being prepared in the warm pool.
+            ## (Otherwise the service could try to place the task on it, right before it stops)
+            # https://docs.aws.amazon.com/AmazonECS/latest/developerguide/using-warm-pool.html
+            self.ec2_user_data.add_commands(
+                'echo "ECS_WARM_POOLS_CHECK=true" >> /etc/ecs/ecs.config',
+            )
+        if image_cache_config["Enabled"]:
+            ## Pull from the in-region cache as fast as possible:
+            self.ec2_user_data.add_commands(
+                # Use the local image if it's there (warm pool / golden AMI), otherwise pull it:
+                'echo "ECS_IMAGE_PULL_BEHAVIOR=prefer-cached" >> /etc/ecs/ecs.config',
+                ## Pull more layers at once (docker's default is 3):
+                # https://docs.docker.com/reference/cli/dockerd/#daemon-configuration-file
+                'mkdir -p /etc/docker',
+                'test -f /etc/docker/daemon.json || echo "{}" > /etc/docker/daemon.json',
+                'jq \'. + {"max-concurrent-downloads": 10}\' /etc/docker/daemon.json > /tmp/daemon.json && mv /tmp/daemon.json /etc/docker/daemon.json',
+                'systemctl restart docker',
+            )
+        ## Watch the ECS agent in the background, for the rest of the Boot Timeline:
+        # https://docs.aws.amazon.com/AmazonECS/latest/developerguide/ecs-agent-introspection.html
+        self.ec2_user_data.add_commands(
+            '(',
+            '  wait_for() { for _ in $(seq 900); do "$@" && return 0; sleep 1; done; return 1; }',
+            '  agent_registered() { curl -sf http://localhost:51678/v1/metadata | jq -e ".ContainerInstanceArn" > /dev/null; }',
+            '  task_in_state() { curl -sf http://localhost:51678/v1/tasks | jq -e --args "[.Tasks[].KnownStatus] | any(IN(\\$ARGS.positional[]))" "$@" > /dev/null; }',
+            '  wait_for agent_registered && boot_phase EcsAgentRegistered',
+            # The agent starts pulling the image as soon as it gets the task:
+            '  wait_for task_in_state NONE MANIFEST_PULLED CREATED RUNNING && boot_phase ImagePullStarted',
+            # The container gets created right after the pull finishes:
+            '  wait_for task_in_state CREATED RUNNING && boot_phase ImagePullStopped',
+            '  wait_for task_in_state RUNNING && boot_phase ContainerRunning',
+            ') > /var/log/boot-timeline.log 2>&1 &',
+        )
+        ## NOTE: User Data only runs on the FIRST boot. With a warm pool, that's when the instance is
+        ##       prepared. Resuming it later skips all of this, which is the point. (EFS re-mounts from fstab).
+
 
+        ## Hibernating needs the root volume encrypted, and large enough to hold the RAM:
+        # https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/hibernating-prerequisites.html
+        hibernate = ec2_config["WarmPool"]["Enabled"] and ec2_config["WarmPool"]["PoolState"] == "Hibernated"
+        root_volume_config = ec2_config["RootVolume"]
 
         ## Contains the configuration information to launch an instance, and stores launch parameters
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ec2.LaunchTemplate.html
@@ -109,8 +185,8 @@ class EcsAsg(NestedStack):
             "LaunchTemplate",
             instance_type=ec2.InstanceType(ec2_config["InstanceType"]),
             ## Needs to be an "EcsOptimized" image to register to the cluster
-            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecs.EcsOptimizedImage.html
-            machine_image=ecs.EcsOptimizedImage.amazon_linux2023(),
+            #  (Either the stock one, or the Golden AMI built on top of it)
+            machine_image=machine_image,
             # Lets Specific traffic to/from the instance:
             security_group=sg_container_traffic,
             user_data=self.ec2_user_data,
@@ -119,7 +195,38 @@ class EcsAsg(NestedStack):
             ## Console recommends to enable IMDSv2:
             http_tokens=ec2.LaunchTemplateHttpTokens.REQUIRED,
             require_imdsv2=True,
+            hibernation_configured=hibernate,
+            ## The root volume is where docker extracts the image, so it's on the boot path:
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ec2.BlockDevice.html
+            block_devices=[
+                ec2.BlockDevice(
+                    # The root device of the ECS Optimized AL2023 image:
+                    device_name="/dev/xvda",
+                    volume=ec2.BlockDeviceVolume.ebs(
+                        root_volume_config["SizeGb"],
+                        volume_type=getattr(ec2.EbsDeviceVolumeType, root_volume_config["Type"].upper()),
+                        iops=root_volume_config["Iops"],
+                        # Always encrypted, so turning on hibernation later doesn't change it:
+                        encrypted=True,
+                    ),
+                ),
+            ],
         )
+        ## CDK doesn't expose these on the BlockDevice yet, so set them on the template directly:
+        # https://docs.aws.amazon.com/AWSCloudFormation/latest/UserGuide/aws-properties-ec2-launchtemplate-ebs.html
+        cfn_launch_template: ec2.CfnLaunchTemplate = self.launch_template.node.default_child
+        if root_volume_config["Throughput"]:
+            cfn_launch_template.add_property_override(
+                "LaunchTemplateData.BlockDeviceMappings.0.Ebs.Throughput",
+                root_volume_config["Throughput"],
+            )
+        if root_volume_config["InitializationRate"]:
+            ## Pull the whole volume from the snapshot at this rate, instead of lazy-loading each block on first read:
+            # https://docs.aws.amazon.com/ebs/latest/userguide/initalize-volume.html
+            cfn_launch_template.add_property_override(
+                "LaunchTemplateData.BlockDeviceMappings.0.Ebs.VolumeInitializationRate",
+                root_volume_config["InitializationRate"],
+            )
 
 
         ## A Fleet represents a managed set of EC2 instances:
@@ -132,7 +239,8 @@ class EcsAsg(NestedStack):
             # desired_capacity=0,
             min_capacity=0,
             max_capacity=1,
-            new_instances_protected_from_scale_in=False,
+            # Only if something else decides when the instance can terminate (The AsgStateChangeHook's hold window):
+            new_instances_protected_from_scale_in=protect_from_scale_in,
             ## Notifications:
             # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_autoscaling.AutoScalingGroup.html#notifications
             notifications=[
@@ -147,6 +255,29 @@ class EcsAsg(NestedStack):
             )],
         )
 
+        ## A static IP the instance gets on every launch, so DNS never has to change:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ec2.CfnEIP.html
+        if ec2_config["ElasticIp"]:
+            self.elastic_ip = ec2.CfnEIP(
+                self,
+                "ElasticIp",
+                domain="vpc",
+                tags=[CfnTag(key="Name", value=f"{leaf_construct_id}/elastic-ip")],
+            )
+        else:
+            self.elastic_ip = None
+
+        ## Keep a pre-initialized instance around, so spin-up is just a "start" instead of a full launch:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_autoscaling.AutoScalingGroup.html#addwbrwarmwbrpoolprops
+        if ec2_config["WarmPool"]["Enabled"]:
+            self.warm_pool = self.auto_scaling_group.add_warm_pool(
+                pool_state=getattr(autoscaling.PoolState, ec2_config["WarmPool"]["PoolState"].upper()),
+                max_group_prepared_capacity=ec2_config["WarmPool"]["MaxPreparedCapacity"],
+                min_size=0,
+                # Put the instance BACK in the pool when the system spins down:
+                reuse_on_scale_in=ec2_config["WarmPool"]["ReuseOnScaleIn"],
+            )
+
         ## This allows an ECS cluster to target a specific EC2 Auto Scaling Group for the placement of tasks.
         # Can ensure that instances are not prematurely terminated while there are still tasks running on them.
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecs.AsgCapacityProvider.html
@@ -188,15 +319,18 @@ class EcsAsg(NestedStack):
 
         ## EventBridge Rule: Send notification to user when ECS Task spins up or down:
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events.Rule.html
-        message = events.RuleTargetInput.from_text("\n".join([
+        self.notify_up_message = "\n".join([
             f"Container for '{container_id}' has started!",
             f"Connect to it at: '{container_url}'.",
-        ]))
+        ])
+        message = events.RuleTargetInput.from_text(self.notify_up_message)
         self.rule_notify_up = events.Rule(
             self,
             "RuleNotifyUp",
             rule_name=f"{container_id}-rule-notify-up",
             description="Let user know when system finishes spinning UP",
+            # If the container has a readiness check, the AsgStateChangeHook sends this once it passes instead:
+            enabled=not readiness_check_config["Enabled"],
             # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events.EventPattern.html
             event_pattern=events.EventPattern(
                 source=["aws.ecs"],
@@ -226,6 +360,12 @@ class EcsAsg(NestedStack):
         ##    Don't want to spam the user sadly.)
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events.Rule.html
         message = events.RuleTargetInput.from_text(f"Container for '{container_id}' has stopped.")
+        notify_down_detail = {
+            "AutoScalingGroupName": [self.auto_scaling_group.auto_scaling_group_name],
+        }
+        if ec2_config["WarmPool"]["Enabled"]:
+            # Instances leaving the warm pool never ran the container, don't spam the user:
+            notify_down_detail["Origin"] = ["AutoScalingGroup"]
         self.rule_notify_down = events.Rule(
             self,
             "RuleNotifyDown",
@@ -235,9 +375,7 @@ class EcsAsg(NestedStack):
             event_pattern=events.EventPattern(
                 source=["aws.autoscaling"],
                 detail_type=["EC2 Instance-terminate Lifecycle Action"],
-                detail={
-                    "AutoScalingGroupName": [self.auto_scaling_group.auto_scaling_group_name],
-                },
+                detail=notify_down_detail,
             ),
             targets=[
                 # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events_targets.SnsTopic.html
@@ -0,0 +1,217 @@
+"""
+This module contains the GoldenAmi NestedStack class.
+"""
+
+import json
+import hashlib
+from typing import Optional
+
+from aws_cdk import (
+    NestedStack,
+    Fn,
+    Tags,
+    aws_ec2 as ec2,
+    aws_ecs as ecs,
+    aws_iam as iam,
+    aws_ssm as ssm,
+    aws_imagebuilder as imagebuilder,
+)
+from constructs import Construct
+
+
+### Nested Stack info:
+# https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.NestedStack.html
+class GoldenAmi(NestedStack):
+    """
+    This builds an AMI with the container image already pulled
+    into it, so the instance doesn't have to pull it on every start.
+    """
+    def __init__(
+        self,
+        scope: Construct,
+        leaf_construct_id: str,
+        container_id: str,
+        vpc: ec2.Vpc,
+        ec2_config: dict,
+        container_image: str,
+        image_uri: str,
+        image_cache_prefix: Optional[str],
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, "GoldenAmiNestedStack", **kwargs)
+
+        ## The same base image the ASG would use without this stack:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecs.EcsOptimizedImage.html
+        base_image_id = ecs.EcsOptimizedImage.amazon_linux2023().get_image(self).image_id
+
+        ## Image Builder names+versions are immutable. Put what we care about IN the name, so
+        ## a change creates a new recipe (and image), and nothing else does:
+        #   - The container image: Pin it with a digest (image@sha256:...) to rebuild on every update.
+        #                          (And if it's pulled through the cache, since that changes the uri)
+        #   - The base AMI: Resolved at deploy time, so use the "0abc..." part of "ami-0abc...".
+        image_hash = hashlib.sha256(f"{container_image}|{image_cache_prefix}".encode()).hexdigest()[:8]
+        base_image_suffix = Fn.select(1, Fn.split("-", base_image_id))
+
+        ## Permissions for the instance building the image:
+        # https://docs.aws.amazon.com/imagebuilder/latest/userguide/image-builder-setting-up.html#image-builder-IAM-prereq
+        self.build_role = iam.Role(
+            self,
+            "BuildInstanceRole",
+            assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"),
+            description="The permissions for the instance that builds the Golden AMI",
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name("AmazonSSMManagedInstanceCore"),
+                iam.ManagedPolicy.from_aws_managed_policy_name("EC2InstanceProfileForImageBuilder"),
+            ],
+        )
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_iam.InstanceProfile.html
+        self.build_instance_profile = iam.InstanceProfile(
+            self,
+            "BuildInstanceProfile",
+            role=self.build_role,
+        )
+
+        ## How to get the image onto the build instance:
+        #   (Has to be the SAME uri the task uses, or the agent won't know it's cached)
+        pull_commands = [f"docker pull {image_uri}"]
+        if image_cache_prefix:
+            ## Pull through the same in-region cache the task uses:
+            # https://docs.aws.amazon.com/AmazonECR/latest/userguide/pull-through-cache-iam.html
+            self.build_role.add_to_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["ecr:GetAuthorizationToken"],
+                    resources=["*"],
+                )
+            )
+            self.build_role.add_to_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=[
+                        "ecr:BatchGetImage",
+                        "ecr:GetDownloadUrlForLayer",
+                        "ecr:BatchCheckLayerAvailability",
+                        "ecr:CreateRepository",
+                        "ecr:BatchImportUpstreamImage",
+                    ],
+                    resources=[f"arn:aws:ecr:{self.region}:{self.account}:repository/{image_cache_prefix}/*"],
+                )
+            )
+            ecr_registry = f"{self.account}.dkr.ecr.{self.region}.{self.url_suffix}"
+            pull_commands.insert(0, f"aws ecr get-login-password --region {self.region} | docker login --username AWS --password-stdin {ecr_registry}")
+
+        ## The build instance only needs to get OUT, to pull the image:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ec2.SecurityGroup.html
+        self.sg_build_instance = ec2.SecurityGroup(
+            self,
+            "SgBuildInstance",
+            vpc=vpc,
+            description=f"({container_id}): Traffic for the Golden AMI build instance",
+            allow_all_outbound=True,
+        )
+        Tags.of(self.sg_build_instance).add("Name", f"{leaf_construct_id}/sg-golden-ami-build")
+
+        ## Where/How the image gets built:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_imagebuilder.CfnInfrastructureConfiguration.html
+        self.infrastructure_configuration = imagebuilder.CfnInfrastructureConfiguration(
+            self,
+            "InfrastructureConfiguration",
+            name=f"{leaf_construct_id}-golden-ami-infra",
+            instance_profile_name=self.build_instance_profile.instance_profile_name,
+            # Has to be the same architecture as the leaf instance, so just use the same type:
+            instance_types=[ec2_config["InstanceType"]],
+            subnet_id=vpc.public_subnets[0].subnet_id,
+            security_group_ids=[self.sg_build_instance.security_group_id],
+            terminate_instance_on_failure=True,
+            instance_metadata_options=imagebuilder.CfnInfrastructureConfiguration.InstanceMetadataOptionsProperty(
+                http_tokens="required",
+            ),
+        )
+
+        ## The steps to run on the build instance:
+        # https://docs.aws.amazon.com/imagebuilder/latest/userguide/toe-use-documents.html
+        #   (JSON is valid YAML, and saves us from building YAML by hand)
+        component_document = {
+            "name": f"{container_id}-golden-ami",
+            "schemaVersion": 1.0,
+            "phases": [{
+                "name": "build",
+                "steps": [
+                    {
+                        "name": "PullContainerImage",
+                        "action": "ExecuteBash",
+                        "inputs": {"commands": pull_commands},
+                    },
+                    {
+                        "name": "ConfigureEcsAgent",
+                        "action": "ExecuteBash",
+                        "inputs": {"commands": [
+                            ## Use the image we just pulled, instead of checking the registry on every start:
+                            # https://github.com/aws/amazon-ecs-agent/blob/master/README.md#environment-variables
+                            'echo "ECS_IMAGE_PULL_BEHAVIOR=prefer-cached" >> /etc/ecs/ecs.config',
+                            ## The agent might've started on the build instance. Wipe its state, or every
+                            ## instance from this AMI will think it's already registered somewhere:
+                            # https://docs.aws.amazon.com/AmazonECS/latest/developerguide/ecs-agent-install.html
+                            "systemctl stop ecs || true",
+                            "rm -rf /var/lib/ecs/data/*",
+                        ]},
+                    },
+                ],
+            }],
+        }
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_imagebuilder.CfnComponent.html
+        self.component = imagebuilder.CfnComponent(
+            self,
+            "Component",
+            name=f"{leaf_construct_id}-golden-ami-{image_hash}",
+            platform="Linux",
+            version="1.0.0",
+            description=f"Pre-pull '{container_image}' into the ECS Optimized AMI",
+            data=json.dumps(component_document, indent=2),
+        )
+
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_imagebuilder.CfnImageRecipe.html
+        self.image_recipe = imagebuilder.CfnImageRecipe(
+            self,
+            "ImageRecipe",
+            name=f"{leaf_construct_id}-golden-ami-{image_hash}-{base_image_suffix}",
+            version="1.0.0",
+            parent_image=base_image_id,
+            components=[
+                imagebuilder.CfnImageRecipe.ComponentConfigurationProperty(
+                    component_arn=self.component.attr_arn,
+                ),
+            ],
+        )
+
+        ## Actually build the image. This happens during the deploy, and only
+        ## happens again if the recipe is replaced (see the names above):
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_imagebuilder.CfnImage.html
+        self.image = imagebuilder.CfnImage(
+            self,
+            "Image",
+            image_recipe_arn=self.image_recipe.attr_arn,
+            infrastructure_configuration_arn=self.infrastructure_configuration.attr_arn,
+            # Don't need to spin up ANOTHER instance just to test the image:
+            image_tests_configuration=imagebuilder.CfnImage.ImageTestsConfigurationProperty(
+                image_tests_enabled=False,
+            ),
+        )
+
+        ## Publish the AMI ID, so the Launch Template can pick it up:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ssm.StringParameter.html
+        self.image_id_parameter = ssm.StringParameter(
+            self,
+            "ImageIdParameter",
+            parameter_name=f"/{leaf_construct_id}/golden-ami/image-id",
+            description=f"The Golden AMI for {container_id}, with '{container_image}' already pulled",
+            string_value=self.image.attr_image_id,
+            data_type=ssm.ParameterDataType.AWS_EC2_IMAGE,
+        )
+
+        ## Resolved when the instance LAUNCHES, not when the template is created:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ec2.MachineImage.html#static-resolvewbrssmwbrparameterwbratwbrlaunchparametername-options
+        self.machine_image = ec2.MachineImage.resolve_ssm_parameter_at_launch(
+            self.image_id_parameter.parameter_name,
+            os=ec2.OperatingSystemType.LINUX,
+        )
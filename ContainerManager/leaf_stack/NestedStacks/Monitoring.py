@@ -0,0 +1,259 @@
+"""
+This module contains the Monitoring NestedStack class.
+"""
+
+import json
+
+from aws_cdk import (
+    NestedStack,
+    Duration,
+    aws_lambda,
+    aws_ec2 as ec2,
+    aws_ecs as ecs,
+    aws_cloudwatch as cloudwatch,
+)
+from constructs import Construct
+
+class Monitoring(NestedStack):
+    """
+    Collects what the host and container are doing, and puts it on
+    a dashboard next to the watchdog and every lambda's duration.
+    """
+    def __init__( # pylint: disable=too-many-locals
+        self,
+        scope: Construct,
+        leaf_construct_id: str,
+        container_id: str,
+        monitoring_config: dict,
+        ecs_cluster: ecs.Cluster,
+        ec2_service: ecs.Ec2Service,
+        ec2_user_data: ec2.UserData,
+        metric_namespace: str,
+        metric_activity_count: cloudwatch.Metric,
+        metric_ssh_connections: cloudwatch.Metric,
+        metric_asg_num_instances: cloudwatch.Metric,
+        activity_threshold: int,
+        watchdog_alarms: list[cloudwatch.Alarm],
+        metric_time_to_playable: cloudwatch.Metric,
+        metric_idle_to_terminate: cloudwatch.Metric,
+        lambda_functions: dict[str, aws_lambda.IFunction],
+        start_system_function_name: str,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, "MonitoringNestedStack", **kwargs)
+
+        ## Container Insights: CPU/Memory/Network of the task itself, in the 'ECS/ContainerInsights' namespace.
+        ##   (Same as the cluster's `container_insights` option. The cluster is in EcsAsg, so set it on the L1):
+        # https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/ContainerInsights.html
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecs.CfnCluster.html
+        if monitoring_config["ContainerInsights"]:
+            cfn_cluster: ecs.CfnCluster = ecs_cluster.node.default_child
+            cfn_cluster.cluster_settings = [ecs.CfnCluster.ClusterSettingsProperty(name="containerInsights", value="enabled")]
+
+        ## Host Metrics: The CloudWatch agent pushes what the instance itself is doing, into the leaf's namespace.
+        ##   (EcsAsg already lets the instance push to it). CPU steal is the one to watch, it's when the
+        ##   hypervisor (or running out of burst credits) holds the game's ticks back.
+        # https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch-Agent-Configuration-File-Details.html
+        # https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/metrics-collected-by-CloudWatch-agent.html
+        self.host_metrics_dimension_map = {
+            "ContainerNameID": container_id,
+        }
+        cloudwatch_agent_config = {
+            "agent": {
+                "metrics_collection_interval": monitoring_config["HostMetricsIntervalSeconds"],
+                # Only ever one instance, and it's name changes every launch:
+                "omit_hostname": True,
+            },
+            "metrics": {
+                "namespace": metric_namespace,
+                # Roll every cpu/device/interface up into one metric with ONLY the ContainerNameID. (So the dashboard doesn't need their names):
+                "aggregation_dimensions": [list(self.host_metrics_dimension_map.keys())],
+                "metrics_collected": {
+                    section_name: {
+                        **section,
+                        "append_dimensions": self.host_metrics_dimension_map,
+                        # Each one is a custom metric you pay for. Only keep the rolled up ones:
+                        "drop_original_metrics": [f"{section_name}_{measurement}" for measurement in section["measurement"]],
+                    }
+                    for section_name, section in {
+                        "cpu": {"totalcpu": True, "measurement": ["usage_active", "usage_steal", "usage_iowait"]},
+                        "mem": {"measurement": ["used_percent"]},
+                        "disk": {"resources": ["/"], "measurement": ["used_percent"]},
+                        "diskio": {"measurement": ["read_bytes", "write_bytes"]},
+                        "net": {"measurement": ["bytes_recv", "bytes_sent"]},
+                    }.items()
+                },
+            },
+        }
+        cloudwatch_agent_config_path = "/opt/aws/amazon-cloudwatch-agent/etc/amazon-cloudwatch-agent.json"
+        ec2_user_data.add_commands(
+            ## In the background, the container doesn't need it to start:
+            # https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/install-CloudWatch-Agent-commandline-fleet.html
+            '(',
+            '  dnf install -y amazon-cloudwatch-agent',
+            f"  echo '{json.dumps(cloudwatch_agent_config)}' > \"{cloudwatch_agent_config_path}\"",
+            f'  /opt/aws/amazon-cloudwatch-agent/bin/amazon-cloudwatch-agent-ctl -a fetch-config -m ec2 -s -c "file:{cloudwatch_agent_config_path}"',
+            # User data only runs on the first boot. This starts it again if the instance is resumed from a warm pool:
+            '  systemctl enable amazon-cloudwatch-agent',
+            ') > /var/log/cloudwatch-agent-setup.log 2>&1 &',
+        )
+
+        ## The rolled up host metrics, to graph:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.Metric.html
+        def host_metric(metric_name: str, label: str, unit: cloudwatch.Unit, statistic: str) -> cloudwatch.Metric:
+            return cloudwatch.Metric(
+                metric_name=metric_name,
+                namespace=metric_namespace,
+                dimensions_map=self.host_metrics_dimension_map,
+                label=label,
+                unit=unit,
+                statistic=statistic,
+                period=Duration.seconds(monitoring_config["HostMetricsIntervalSeconds"]),
+            )
+        self.host_metrics = {
+            "CpuActive": host_metric("cpu_usage_active", "CPU Used (%)", cloudwatch.Unit.PERCENT, cloudwatch.Stats.MAXIMUM),
+            "CpuSteal": host_metric("cpu_usage_steal", "CPU Steal (%)", cloudwatch.Unit.PERCENT, cloudwatch.Stats.MAXIMUM),
+            "CpuIoWait": host_metric("cpu_usage_iowait", "CPU IO Wait (%)", cloudwatch.Unit.PERCENT, cloudwatch.Stats.MAXIMUM),
+            "MemoryUsed": host_metric("mem_used_percent", "Memory Used (%)", cloudwatch.Unit.PERCENT, cloudwatch.Stats.MAXIMUM),
+            "DiskUsed": host_metric("disk_used_percent", "Root Volume Used (%)", cloudwatch.Unit.PERCENT, cloudwatch.Stats.MAXIMUM),
+            # These are how much happened since the last push, so add them up:
+            "DiskRead": host_metric("diskio_read_bytes", "Disk Read", cloudwatch.Unit.BYTES, cloudwatch.Stats.SUM),
+            "DiskWrite": host_metric("diskio_write_bytes", "Disk Write", cloudwatch.Unit.BYTES, cloudwatch.Stats.SUM),
+            "NetworkIn": host_metric("net_bytes_recv", "Network In", cloudwatch.Unit.BYTES, cloudwatch.Stats.SUM),
+            "NetworkOut": host_metric("net_bytes_sent", "Network Out", cloudwatch.Unit.BYTES, cloudwatch.Stats.SUM),
+        }
+
+        ## The dashboard itself:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.Dashboard.html
+        self.dashboard = cloudwatch.Dashboard(
+            self,
+            "Dashboard",
+            dashboard_name=f"{leaf_construct_id}-Dashboard",
+            default_interval=Duration.hours(3),
+        )
+
+        ## Is anyone on, and is the watchdog about to spin it down:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.GraphWidget.html
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Container Activity",
+                left=[metric_activity_count],
+                right=[metric_ssh_connections],
+                # Where the watchdog starts counting it as idle:
+                left_annotations=[cloudwatch.HorizontalAnnotation(value=activity_threshold, label="Idle Threshold")],
+                width=12,
+            ),
+            cloudwatch.GraphWidget(
+                title="Instances In Service",
+                left=[metric_asg_num_instances],
+                width=6,
+            ),
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.AlarmStatusWidget.html
+            cloudwatch.AlarmStatusWidget(
+                title="Watchdog Alarms",
+                alarms=watchdog_alarms,
+                width=6,
+            ),
+        )
+
+        ## The instance itself, from the CloudWatch agent:
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Host CPU",
+                left=[self.host_metrics["CpuActive"], self.host_metrics["CpuSteal"], self.host_metrics["CpuIoWait"]],
+                left_y_axis=cloudwatch.YAxisProps(min=0, max=100),
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Host Memory / Root Volume",
+                left=[self.host_metrics["MemoryUsed"], self.host_metrics["DiskUsed"]],
+                left_y_axis=cloudwatch.YAxisProps(min=0, max=100),
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Host Network / Disk IO",
+                left=[self.host_metrics["NetworkIn"], self.host_metrics["NetworkOut"]],
+                right=[self.host_metrics["DiskRead"], self.host_metrics["DiskWrite"]],
+                width=8,
+            ),
+        )
+
+        ## The container, from Container Insights:
+        # https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/Container-Insights-metrics-ECS.html
+        if monitoring_config["ContainerInsights"]:
+            def container_insights_metric(metric_name: str, label: str) -> cloudwatch.Metric:
+                return cloudwatch.Metric(
+                    metric_name=metric_name,
+                    namespace="ECS/ContainerInsights",
+                    dimensions_map={
+                        "ClusterName": ecs_cluster.cluster_name,
+                        "ServiceName": ec2_service.service_name,
+                    },
+                    label=label,
+                    statistic=cloudwatch.Stats.AVERAGE,
+                    period=Duration.minutes(1),
+                )
+            self.dashboard.add_widgets(
+                cloudwatch.GraphWidget(
+                    title="Container CPU (CPU Units)",
+                    left=[
+                        container_insights_metric("CpuUtilized", "Used"),
+                        container_insights_metric("CpuReserved", "Reserved"),
+                    ],
+                    width=8,
+                ),
+                cloudwatch.GraphWidget(
+                    title="Container Memory (MB)",
+                    left=[
+                        container_insights_metric("MemoryUtilized", "Used"),
+                        container_insights_metric("MemoryReserved", "Reserved"),
+                    ],
+                    width=8,
+                ),
+                cloudwatch.GraphWidget(
+                    title="Container Network (Bytes/Second)",
+                    left=[
+                        container_insights_metric("NetworkRxBytes", "In"),
+                        container_insights_metric("NetworkTxBytes", "Out"),
+                    ],
+                    width=8,
+                ),
+            )
+
+        ## How long each lambda takes, how long players wait on a wake, and how long it sits idle before spinning down:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html#metricwbrdurationprops
+        lambda_durations = [
+            lambda_function.metric_duration(label=name, statistic=cloudwatch.Stats.MAXIMUM, period=Duration.minutes(1))
+            # (The watchdog's is optional):
+            for name, lambda_function in lambda_functions.items() if lambda_function is not None
+        ]
+        ## The trigger lambda is in the LinkTogetherStack (us-east-1). It's deployed AFTER this
+        ## stack, so it can't be referenced. Look it up by name and region instead:
+        # https://docs.aws.amazon.com/lambda/latest/dg/monitoring-metrics-types.html
+        lambda_durations.append(cloudwatch.Metric(
+            metric_name="Duration",
+            namespace="AWS/Lambda",
+            dimensions_map={"FunctionName": start_system_function_name},
+            label="StartSystem",
+            unit=cloudwatch.Unit.MILLISECONDS,
+            statistic=cloudwatch.Stats.MAXIMUM,
+            period=Duration.minutes(1),
+            region="us-east-1",
+        ))
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Lambda Duration (Maximum)",
+                left=lambda_durations,
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Time To Playable (Seconds)",
+                left=[metric_time_to_playable.with_(period=Duration.minutes(5))],
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Idle To Terminate (Seconds)",
+                left=[metric_idle_to_terminate.with_(period=Duration.minutes(5))],
+                width=8,
+            ),
+        )
@@ -0,0 +1,149 @@
+"""
+This module contains the WakeTrace NestedStack class.
+"""
+
+import json
+
+from aws_cdk import (
+    NestedStack,
+    Duration,
+    aws_lambda,
+    aws_iam as iam,
+    aws_ecs as ecs,
+    aws_ssm as ssm,
+    aws_logs as logs,
+    aws_cloudwatch as cloudwatch,
+    aws_events as events,
+    aws_events_targets as events_targets,
+)
+from constructs import Construct
+
+from ContainerManager.utils.lambda_logging import logging_environment
+
+class WakeTrace(NestedStack):
+    """
+    Follows a single wake (someone connecting while the system
+    is down), from the first DNS query until the container is
+    playable. Publishes how long each stage took.
+    """
+    def __init__(
+        self,
+        scope: Construct,
+        leaf_construct_id: str,
+        container_id: str,
+        ecs_cluster: ecs.Cluster,
+        readiness_check_config: dict,
+        metric_namespace: str,
+        logging_layer: aws_lambda.ILayerVersion,
+        logging_config: dict,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, "WakeTraceNestedStack", **kwargs)
+
+        ## The trace for the current wake. The trigger lambda fills it in on the first DNS query of
+        ## a wake, and the AsgStateChangeHook empties it again when spinning down:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ssm.StringParameter.html
+        self.trace_parameter_name = f"/{leaf_construct_id}/wake-trace"
+        self.trace_parameter = ssm.StringParameter(
+            self,
+            "WakeTraceParameter",
+            parameter_name=self.trace_parameter_name,
+            description=f"{container_id}: The trace of the current wake. Empty while no wake is in progress.",
+            # Every lambda reads an empty trace as "no wake in progress". (The lambdas update the
+            #   value, so CloudFormation only puts this back if the parameter gets replaced):
+            string_value="{}",
+        )
+        # The trigger lambda is in us-east-1, so build the ARN instead of exporting it across regions:
+        self.trace_parameter_arn = f"arn:aws:ssm:{self.region}:{self.account}:parameter{self.trace_parameter_name}"
+
+        ## The metrics this publishes:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.Metric.html
+        self.metric_dimension_map = {
+            "ContainerNameID": container_id,
+        }
+        self.metric_time_to_playable = cloudwatch.Metric(
+            metric_name="Metric-TimeToPlayable",
+            namespace=metric_namespace,
+            dimensions_map=self.metric_dimension_map,
+            label="Seconds from the first DNS query, to the container being playable",
+            unit=cloudwatch.Unit.SECONDS,
+            # Only one data point per wake:
+            statistic=cloudwatch.Stats.MAXIMUM,
+        )
+        # (Has an extra "Stage" dimension, one for each stage of the wake)
+        self.metric_wake_stage_name = "Metric-WakeStage"
+
+        ## Lambda to put the trace together, once the container is running. (With a readiness check,
+        ##   the AsgStateChangeHook finishes it once the container is ready):
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html
+        self.lambda_wake_trace = aws_lambda.Function(
+            self,
+            "WakeTrace",
+            description=f"{container_id}-WakeTrace: Publishes how long each stage of spinning up took.",
+            code=aws_lambda.Code.from_asset("./ContainerManager/leaf_stack/lambda/wake-trace/"),
+            handler="main.lambda_handler",
+            runtime=aws_lambda.Runtime.PYTHON_3_12,
+            timeout=Duration.seconds(30),
+            log_retention=logs.RetentionDays.ONE_WEEK,
+            layers=[logging_layer],
+            environment={
+                **logging_environment(logging_config, "WakeTrace"),
+                "WAKE_TRACE_PARAMETER": self.trace_parameter_name,
+                # Optional, only if the container isn't playable until it's readiness check passes:
+                "READINESS_CHECK": str(readiness_check_config["Enabled"]),
+                "METRIC_NAMESPACE": metric_namespace,
+                "METRIC_NAME_TIME_TO_PLAYABLE": self.metric_time_to_playable.metric_name,
+                "METRIC_NAME_WAKE_STAGE": self.metric_wake_stage_name,
+                "METRIC_DIMENSIONS": json.dumps(self.metric_dimension_map),
+            },
+        )
+        ## Let it read the trace, and mark it as done:
+        self.lambda_wake_trace.add_to_role_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "ssm:GetParameter",
+                    "ssm:PutParameter",
+                ],
+                resources=[self.trace_parameter_arn],
+            )
+        )
+        ## Let it find when the instance launched, and registered to the cluster:
+        self.lambda_wake_trace.add_to_role_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["ecs:DescribeContainerInstances"],
+                resources=[f"arn:aws:ecs:{self.region}:{self.account}:container-instance/{ecs_cluster.cluster_name}/*"],
+            )
+        )
+        self.lambda_wake_trace.add_to_role_policy(
+            iam.PolicyStatement(
+                # NOTE: Can't be locked down, it *has* to be '*':
+                effect=iam.Effect.ALLOW,
+                actions=["ec2:DescribeInstances"],
+                resources=["*"],
+            )
+        )
+
+        ## EventBridge Rule: Finish the trace when the task starts. (Same event as EcsAsg's "RuleNotifyUp"):
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events.Rule.html
+        self.rule_wake_trace_trigger = events.Rule(
+            self,
+            "WakeTraceTrigger",
+            rule_name=f"{container_id}-rule-wake-trace",
+            description="Trigger Lambda when the task starts, to finish the trace for this wake",
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events.EventPattern.html
+            event_pattern=events.EventPattern(
+                source=["aws.ecs"],
+                detail_type=["ECS Task State Change"],
+                detail={
+                    "clusterArn": [ecs_cluster.cluster_arn],
+                    "lastStatus": ["RUNNING"],
+                    "desiredStatus": ["RUNNING"],
+                },
+            ),
+            targets=[
+                # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events_targets.LambdaFunction.html
+                events_targets.LambdaFunction(self.lambda_wake_trace),
+            ],
+        )
@@ -9,6 +9,7 @@ from aws_cdk import (
     NestedStack,
     Duration,
     aws_lambda,
+    aws_ec2 as ec2,
     aws_iam as iam,
     aws_ecs as ecs,
     aws_sns as sns,
@@ -21,20 +22,27 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from ContainerManager.utils.lambda_logging import logging_environment
+
 class Watchdog(NestedStack):
     """
     This sets up the logic for watching the container for
     connections, and scaling down the ASG when none are found.
     """
-    def __init__(
+    def __init__( # pylint: disable=too-many-locals
         self,
         scope: Construct,
         leaf_construct_id: str,
         container_id: str,
+        container_url: str,
+        unavailable_ip: str,
         watchdog_config: dict,
         task_definition: ecs.Ec2TaskDefinition,
         auto_scaling_group: autoscaling.AutoScalingGroup,
         base_stack_sns_topic: sns.Topic,
+        ec2_user_data: ec2.UserData,
+        logging_layer: aws_lambda.ILayerVersion,
+        logging_config: dict,
         **kwargs,
     ) -> None:
         super().__init__(scope, "WatchdogNestedStack", **kwargs)
@@ -48,6 +56,8 @@ class Watchdog(NestedStack):
             adjustment_type=autoscaling.AdjustmentType.EXACT_CAPACITY,
         )
         self.scale_down_asg_action.add_adjustment(adjustment=0, lower_bound=0)
+        # Every alarm that can spin down the ASG. (The AsgStateChangeHook might need to know):
+        self.scale_down_alarms = []
 
         ################################
         ## Instance Up too-long Logic ##
@@ -89,6 +99,7 @@ class Watchdog(NestedStack):
             self.alarm_asg_instance_left_up.add_alarm_action(
                 cloudwatch_actions.AutoScalingAction(self.scale_down_asg_action)
             )
+            self.scale_down_alarms.append(self.alarm_asg_instance_left_up)
 
 
         #############################
@@ -104,6 +115,8 @@ class Watchdog(NestedStack):
         # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch/client/put_metric_data.html
         if watchdog_config["Type"] == "TCP":
             label = "Number of Connections (TCP)"
+        elif watchdog_config["Type"] == "QUERY":
+            label = f"Number of Players ({watchdog_config['Query']['Protocol']})"
         else: # watchdog_config["Type"] == "UDP":
             label = "Number of packets in since last check (UDP)"
 
@@ -137,12 +150,15 @@ class Watchdog(NestedStack):
         # Info: https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/using-metric-math.html
         ## (Save threshold, it's also used in dns stack to NOT trip alarm if someone is connecting)
         self.threshold = watchdog_config["Threshold"]
+        using_metrics = {"activity": self.metric_activity_count}
+        expression = f"activity > {self.threshold}"
+        # A Query never touches the host, so there's no SSH count to go off of:
+        if watchdog_config["Type"] != "QUERY":
+            using_metrics["ssh"] = self.metric_ssh_connections
+            expression = f"ssh > 0 OR {expression}"
         self.metric_total_activity = cloudwatch.MathExpression(
-            expression=f"ssh > 0 OR activity > {self.threshold}",
-            using_metrics={
-                "ssh": self.metric_ssh_connections,
-                "activity": self.metric_activity_count,
-            },
+            expression=expression,
+            using_metrics=using_metrics,
             label="(Bool) total container activity",
             period=Duration.minutes(1),
         )
@@ -167,114 +183,213 @@ class Watchdog(NestedStack):
         self.alarm_container_activity.add_alarm_action(
             cloudwatch_actions.AutoScalingAction(self.scale_down_asg_action)
         )
+        self.scale_down_alarms.append(self.alarm_container_activity)
 
-        ## Lambda, count the number of connections and pass to CloudWatch Alarm
-        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html
-        self.lambda_watchdog_container_activity = aws_lambda.Function(
-            self,
-            "WatchdogContainerActivity",
-            description=f"{container_id}-Watchdog: Counts the number of connections to the container, and passes it to a CloudWatch Alarm.",
-            code=aws_lambda.Code.from_asset("./ContainerManager/leaf_stack/lambda/watchdog-container-activity/"),
-            handler="main.lambda_handler",
-            runtime=aws_lambda.Runtime.PYTHON_3_12,
-            timeout=Duration.seconds(30),
-            log_retention=logs.RetentionDays.ONE_WEEK,
-            environment={
-                "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
-                "TASK_DEFINITION": task_definition.family,
-                "METRIC_NAMESPACE": self.metric_namespace,
-                "METRIC_NAME_ACTIVITY_COUNT": self.metric_activity_count.metric_name,
-                "METRIC_NAME_SSH_CONNECTIONS": self.metric_ssh_connections.metric_name,
-                # Convert from an Enum, to a string that boto3 expects. (Words must have first letter
-                #   capitalized too, which is what `.title()` does. Otherwise they'd be all caps).
-                "METRIC_UNIT": self.metric_unit.value.title(),
-                "METRIC_DIMENSIONS": json.dumps(self.metric_dimension_map),
-                # Load the config options, depending on connection type:
-                "CONNECTION_TYPE": watchdog_config["Type"],
-                "TCP_PORT": str(watchdog_config.get("TcpPort", "")),
-            },
-        )
-        # Just like the other lambda, check and find the running instance:
-        self.lambda_watchdog_container_activity.add_to_role_policy(
-            iam.PolicyStatement(
-                effect=iam.Effect.ALLOW,
-                actions=["autoscaling:DescribeAutoScalingGroups"],
-                resources=["*"],
+        ## Count the connections with the agent on the instance, or the lambda (through SSM):
+        if watchdog_config["ActivityAgent"]["Enabled"]:
+            ## No lambda to trigger:
+            self.lambda_watchdog_container_activity = None
+            ## Agent on the instance, that counts the connections from /proc and pushes them itself:
+            #   (The instance can already push to this namespace, for the boot timeline)
+            with open("./ContainerManager/leaf_stack/host/activity-agent/agent.py", encoding="utf-8") as agent_file:
+                agent_script = agent_file.read()
+            activity_agent_config = {
+                "TaskDefinitionFamily": task_definition.family,
+                "ConnectionType": watchdog_config["Type"],
+                "TcpPort": watchdog_config.get("TcpPort", 0),
+                "MetricNamespace": self.metric_namespace,
+                "MetricNameActivityCount": self.metric_activity_count.metric_name,
+                "MetricNameSshConnections": self.metric_ssh_connections.metric_name,
+                "MetricUnit": self.metric_unit.value.title(),
+                "MetricDimensions": self.metric_dimension_map,
+                # The metrics (and Threshold for UDP) are per minute:
+                "IntervalSeconds": 60,
+            }
+            ec2_user_data.add_commands(
+                'mkdir -p /opt/activity-agent /etc/activity-agent',
+                "cat > /opt/activity-agent/agent.py <<'ACTIVITY_AGENT'",
+                agent_script,
+                'ACTIVITY_AGENT',
+                f"echo '{json.dumps(activity_agent_config)}' > /etc/activity-agent/config.json",
+                ## Restarts it if it ever dies, and starts it again if the instance is resumed from a warm pool:
+                # https://www.freedesktop.org/software/systemd/man/latest/systemd.service.html
+                "cat > /etc/systemd/system/activity-agent.service <<'ACTIVITY_AGENT'",
+                '[Unit]',
+                'Description=Counts the connections to the container, for the Watchdog',
+                'After=network-online.target docker.service',
+                '[Service]',
+                f'Environment=AWS_DEFAULT_REGION={self.region}',
+                'ExecStart=/usr/bin/python3 /opt/activity-agent/agent.py',
+                'Restart=always',
+                'RestartSec=10',
+                '[Install]',
+                'WantedBy=multi-user.target',
+                'ACTIVITY_AGENT',
+                ## In the background, the container doesn't need it to start:
+                '( dnf install -y python3-boto3 && systemctl enable --now --no-block activity-agent ) > /var/log/activity-agent-setup.log 2>&1 &',
             )
-        )
-        # Give it permissions to send commands to the instance host:
-        self.lambda_watchdog_container_activity.add_to_role_policy(
-            iam.PolicyStatement(
-                effect=iam.Effect.ALLOW,
-                actions=["ssm:SendCommand"],
-                # No clue what the instance ID will be, so lock it to the ASG:
-                resources=["*"],
-                conditions={
-                    "StringEquals": {
-                        "aws:ResourceTag/aws:autoscaling:groupName": auto_scaling_group.auto_scaling_group_name,
-                    }
+
+            ## Instead of the lambda's errors alarm: Trigger if the agent stops reporting while the instance is up.
+            ##   (Otherwise the activity alarm would just see missing data, and never spin down)
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.MathExpression.html
+            metric_agent_heartbeat = cloudwatch.MathExpression(
+                expression="IF(instances > 0, FILL(samples, 0), 1)",
+                using_metrics={
+                    "instances": self.metric_asg_num_instances,
+                    "samples": self.metric_activity_count.with_(statistic=cloudwatch.Stats.SAMPLE_COUNT),
                 },
+                label="(Count) activity samples, while the instance is up",
+                period=Duration.minutes(1),
             )
-        )
-        self.lambda_watchdog_container_activity.add_to_role_policy(
-            iam.PolicyStatement(
-                effect=iam.Effect.ALLOW,
-                actions=["ssm:SendCommand"],
-                resources=[f"arn:aws:ssm:{self.region}::document/AWS-RunShellScript"],
+            self.alarm_watchdog_errors = metric_agent_heartbeat.create_alarm(
+                self,
+                "AlarmWatchdogHeartbeat",
+                alarm_name=f"{leaf_construct_id}-Alarm-Watchdog-Heartbeat",
+                alarm_description="Trigger if the activity agent stops reporting, while the instance is up",
+                # Gives the agent time to be installed on a new instance:
+                evaluation_periods=5,
+                threshold=0,
+                comparison_operator=cloudwatch.ComparisonOperator.LESS_THAN_OR_EQUAL_TO_THRESHOLD,
+                treat_missing_data=cloudwatch.TreatMissingData.MISSING,
             )
-        )
-        self.lambda_watchdog_container_activity.add_to_role_policy(
-            iam.PolicyStatement(
-                effect=iam.Effect.ALLOW,
-                actions=["ssm:GetCommandInvocation"],
-                resources=[f"arn:aws:ssm:{self.region}:{self.account}:*"],
+            self.alarm_watchdog_errors.add_alarm_action(
+                cloudwatch_actions.AutoScalingAction(self.scale_down_asg_action)
             )
-        )
-        # Give it permissions to push metric data:
-        self.lambda_watchdog_container_activity.add_to_role_policy(
-            iam.PolicyStatement(
-                effect=iam.Effect.ALLOW,
-                actions=["cloudwatch:PutMetricData"],
-                resources=["*"],
-                conditions={
-                    "StringEquals": {
-                        "cloudwatch:namespace": self.metric_namespace,
-                    }
-                }
+            self.scale_down_alarms.append(self.alarm_watchdog_errors)
+        else:
+            query_config = watchdog_config.get("Query", {})
+            ## Lambda, count the number of connections and pass to CloudWatch Alarm
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html
+            self.lambda_watchdog_container_activity = aws_lambda.Function(
+                self,
+                "WatchdogContainerActivity",
+                description=f"{container_id}-Watchdog: Counts the number of connections to the container, and passes it to a CloudWatch Alarm.",
+                code=aws_lambda.Code.from_asset("./ContainerManager/leaf_stack/lambda/watchdog-container-activity/"),
+                handler="main.lambda_handler",
+                runtime=aws_lambda.Runtime.PYTHON_3_12,
+                timeout=Duration.seconds(30),
+                log_retention=logs.RetentionDays.ONE_WEEK,
+                layers=[logging_layer],
+                environment={
+                    **logging_environment(logging_config, "Watchdog"),
+                    "ASG_NAME": auto_scaling_group.auto_scaling_group_name,
+                    "TASK_DEFINITION": task_definition.family,
+                    "METRIC_NAMESPACE": self.metric_namespace,
+                    "METRIC_NAME_ACTIVITY_COUNT": self.metric_activity_count.metric_name,
+                    "METRIC_NAME_SSH_CONNECTIONS": self.metric_ssh_connections.metric_name,
+                    # Convert from an Enum, to a string that boto3 expects. (Words must have first letter
+                    #   capitalized too, which is what `.title()` does. Otherwise they'd be all caps).
+                    "METRIC_UNIT": self.metric_unit.value.title(),
+                    "METRIC_DIMENSIONS": json.dumps(self.metric_dimension_map),
+                    # Load the config options, depending on connection type:
+                    "CONNECTION_TYPE": watchdog_config["Type"],
+                    "TCP_PORT": str(watchdog_config.get("TcpPort", "")),
+                    "QUERY_PROTOCOL": query_config.get("Protocol", ""),
+                    "QUERY_PORT": str(query_config.get("Port", "")),
+                    "QUERY_TIMEOUT_MS": str(query_config.get("TimeoutMs", "")),
+                    # Optional, only if it spins down on it's own, without waiting on the alarm:
+                    "DIRECT_SHUTDOWN_SAMPLES": str(watchdog_config["DirectShutdown"]["IdleSamples"] if watchdog_config["DirectShutdown"]["Enabled"] else 0),
+                    "METRIC_THRESHOLD": str(self.threshold),
+                    "ACTIVITY_ALARM_NAME": self.alarm_container_activity.alarm_name,
+                },
             )
-        )
+            # Just like the other lambda, check and find the running instance:
+            self.lambda_watchdog_container_activity.add_to_role_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["autoscaling:DescribeAutoScalingGroups"],
+                    resources=["*"],
+                )
+            )
+            if watchdog_config["Type"] == "QUERY":
+                # Give it permissions to look up the instance's IP, to query the game on:
+                self.lambda_watchdog_container_activity.add_to_role_policy(
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=["ec2:DescribeInstances"],
+                        resources=["*"],
+                    )
+                )
+            else:
+                # Give it permissions to send commands to the instance host:
+                self.lambda_watchdog_container_activity.add_to_role_policy(
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=["ssm:SendCommand"],
+                        # No clue what the instance ID will be, so lock it to the ASG:
+                        resources=["*"],
+                        conditions={
+                            "StringEquals": {
+                                "aws:ResourceTag/aws:autoscaling:groupName": auto_scaling_group.auto_scaling_group_name,
+                            }
+                        },
+                    )
+                )
+                self.lambda_watchdog_container_activity.add_to_role_policy(
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=["ssm:SendCommand"],
+                        resources=[f"arn:aws:ssm:{self.region}::document/AWS-RunShellScript"],
+                    )
+                )
+                self.lambda_watchdog_container_activity.add_to_role_policy(
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=["ssm:GetCommandInvocation"],
+                        resources=[f"arn:aws:ssm:{self.region}:{self.account}:*"],
+                    )
+                )
+            if watchdog_config["DirectShutdown"]["Enabled"]:
+                # Give it permissions to set off the activity alarm, so it spins down the same way:
+                self.lambda_watchdog_container_activity.add_to_role_policy(
+                    iam.PolicyStatement(
+                        effect=iam.Effect.ALLOW,
+                        actions=["cloudwatch:SetAlarmState"],
+                        resources=[self.alarm_container_activity.alarm_arn],
+                    )
+                )
+                # And to check if someone's trying to connect, before it does:
+                self.lambda_watchdog_container_activity.add_to_role_policy(
+                    iam.PolicyStatement(
+                        # NOTE: Can't be locked down, it *has* to be '*':
+                        effect=iam.Effect.ALLOW,
+                        actions=["cloudwatch:GetMetricData"],
+                        resources=["*"],
+                    )
+                )
 
-        ## Grab existing metric for Lambda fail alarm
-        # https://bobbyhadz.com/blog/cloudwatch-alarm-aws-cdk
-        ## Something like this:
-        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html#metricwbrerrorsprops
-        self.metric_watchdog_errors = self.lambda_watchdog_container_activity.metric_errors(
-            label="Number of Watchdog Errors",
-            unit=cloudwatch.Unit.COUNT,
-            # If multiple requests happen in a period, and one isn't an error,
-            # use that one.
-            statistic=cloudwatch.Stats.MINIMUM,
-            period=Duration.minutes(1),
-        )
-        self.alarm_watchdog_errors = self.metric_watchdog_errors.create_alarm(
-            self,
-            "AlarmWatchdogErrors",
-            alarm_name=f"{leaf_construct_id}-Alarm-Watchdog-Errors",
-            alarm_description="Trigger if the Lambda Watchdog fails too many times",
-            # Must be in alarm this long consecutively to trigger. 3 strikes you're out:
-            #      (Duration doesn't matter here, no need to divide by metric period. We ALWAYS want 3)
-            evaluation_periods=3,
-            # What counts as an alarm (ANY error here):
-            threshold=1,
-            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
-            treat_missing_data=cloudwatch.TreatMissingData.MISSING,
-        )
+            ## Grab existing metric for Lambda fail alarm
+            # https://bobbyhadz.com/blog/cloudwatch-alarm-aws-cdk
+            ## Something like this:
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html#metricwbrerrorsprops
+            self.metric_watchdog_errors = self.lambda_watchdog_container_activity.metric_errors(
+                label="Number of Watchdog Errors",
+                unit=cloudwatch.Unit.COUNT,
+                # If multiple requests happen in a period, and one isn't an error,
+                # use that one.
+                statistic=cloudwatch.Stats.MINIMUM,
+                period=Duration.minutes(1),
+            )
+            self.alarm_watchdog_errors = self.metric_watchdog_errors.create_alarm(
+                self,
+                "AlarmWatchdogErrors",
+                alarm_name=f"{leaf_construct_id}-Alarm-Watchdog-Errors",
+                alarm_description="Trigger if the Lambda Watchdog fails too many times",
+                # Must be in alarm this long consecutively to trigger. 3 strikes you're out:
+                #      (Duration doesn't matter here, no need to divide by metric period. We ALWAYS want 3)
+                evaluation_periods=3,
+                # What counts as an alarm (ANY error here):
+                threshold=1,
+                comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+                treat_missing_data=cloudwatch.TreatMissingData.MISSING,
+            )
 
-        ## Call this if switching to ALARM:
-        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.Alarm.html#addwbralarmwbractionactions
-        self.alarm_watchdog_errors.add_alarm_action(
-            cloudwatch_actions.AutoScalingAction(self.scale_down_asg_action)
-        )
+            ## Call this if switching to ALARM:
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.Alarm.html#addwbralarmwbractionactions
+            self.alarm_watchdog_errors.add_alarm_action(
+                cloudwatch_actions.AutoScalingAction(self.scale_down_asg_action)
+            )
+            self.scale_down_alarms.append(self.alarm_watchdog_errors)
 
         ## EventBridge Rule to trigger lambda every minute, to see how many are using the container
         # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events.Rule.html
@@ -287,7 +402,102 @@ class Watchdog(NestedStack):
             targets=[
                 # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events_targets.LambdaFunction.html
                 events_targets.LambdaFunction(self.lambda_watchdog_container_activity),
-            ],
+            ] if self.lambda_watchdog_container_activity else [],
             # Start disabled, self.lambda_watchdog_container_activity will enable it when instance starts up
             enabled=False,
         )
+
+
+        #########################
+        ## Latency Probe Logic ##
+        #########################
+        if watchdog_config["LatencyProbe"]["Enabled"]:
+            latency_probe_config = watchdog_config["LatencyProbe"]
+            ## How long it takes to connect like a player would, and how steady that is. Same namespace/dimensions as the activity:
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.Metric.html
+            self.probe_metrics = {
+                "Latency": cloudwatch.Metric(
+                    metric_name="Metric-ProbeLatency",
+                    namespace=self.metric_namespace,
+                    dimensions_map=self.metric_dimension_map,
+                    label=f"Probe Latency ({latency_probe_config['Protocol']}, ms)",
+                    unit=cloudwatch.Unit.MILLISECONDS,
+                    # The median, so one slow sample doesn't count as the server being slow:
+                    statistic=cloudwatch.Stats.p(50),
+                    period=Duration.minutes(1),
+                ),
+                "Jitter": cloudwatch.Metric(
+                    metric_name="Metric-ProbeJitter",
+                    namespace=self.metric_namespace,
+                    dimensions_map=self.metric_dimension_map,
+                    label="Probe Jitter (ms)",
+                    unit=cloudwatch.Unit.MILLISECONDS,
+                    statistic=cloudwatch.Stats.MAXIMUM,
+                    period=Duration.minutes(1),
+                ),
+                "Failures": cloudwatch.Metric(
+                    metric_name="Metric-ProbeFailures",
+                    namespace=self.metric_namespace,
+                    dimensions_map=self.metric_dimension_map,
+                    label="Probe Failures",
+                    unit=self.metric_unit,
+                    statistic=cloudwatch.Stats.MAXIMUM,
+                    period=Duration.minutes(1),
+                ),
+            }
+
+            ## Lambda, probe the container and pass the timings to CloudWatch
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html
+            self.lambda_latency_probe = aws_lambda.Function(
+                self,
+                "LatencyProbe",
+                description=f"{container_id}-LatencyProbe: Times connecting to the container, like a player would.",
+                code=aws_lambda.Code.from_asset("./ContainerManager/leaf_stack/lambda/latency-probe/"),
+                handler="main.lambda_handler",
+                runtime=aws_lambda.Runtime.PYTHON_3_12,
+                # Every sample timing out has to fit (The config makes sure they fit in 20 seconds):
+                timeout=Duration.seconds(30),
+                log_retention=logs.RetentionDays.ONE_WEEK,
+                layers=[logging_layer],
+                environment={
+                    **logging_environment(logging_config, "LatencyProbe"),
+                    "DOMAIN_NAME": container_url,
+                    "UNAVAILABLE_IP": unavailable_ip,
+                    "PROTOCOL": latency_probe_config["Protocol"],
+                    "PORT": str(latency_probe_config["Port"]),
+                    "UDP_PAYLOAD": latency_probe_config["UdpPayload"],
+                    "SAMPLES": str(latency_probe_config["Samples"]),
+                    "TIMEOUT_MS": str(latency_probe_config["TimeoutMs"]),
+                    "METRIC_NAMESPACE": self.metric_namespace,
+                    "METRIC_NAME_LATENCY": self.probe_metrics["Latency"].metric_name,
+                    "METRIC_NAME_JITTER": self.probe_metrics["Jitter"].metric_name,
+                    "METRIC_NAME_FAILURES": self.probe_metrics["Failures"].metric_name,
+                    "METRIC_DIMENSIONS": json.dumps(self.metric_dimension_map),
+                },
+            )
+            ## Run it on the same rule as the watchdog, so it only runs while the container is up:
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_events.Rule.html#addwbrtargettarget
+            self.rule_watchdog_trigger.add_target(
+                events_targets.LambdaFunction(self.lambda_latency_probe),
+            )
+
+            ## Warn if it's been slow for too long:
+            #   (Failures are graphed, but don't alarm. The watchdog turns on before the
+            #   container is listening, and it already handles a container no one can reach.)
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch.Metric.html#createwbralarmscope-id-props
+            self.alarm_probe_latency = self.probe_metrics["Latency"].create_alarm(
+                self,
+                "AlarmProbeLatency",
+                alarm_name=f"{leaf_construct_id}-Alarm-ProbeLatency",
+                alarm_description=f"Trigger if connecting to the container takes over {latency_probe_config['ThresholdMs']}ms for too long",
+                evaluation_periods=int(latency_probe_config["MinutesDegraded"] / self.probe_metrics["Latency"].period.to_minutes()),
+                threshold=latency_probe_config["ThresholdMs"],
+                comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+                # No data while the container is spun down:
+                treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+            )
+            ## Only warn the admin. Slow isn't a reason to kick everyone off:
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_cloudwatch_actions.SnsAction.html
+            self.alarm_probe_latency.add_alarm_action(
+                cloudwatch_actions.SnsAction(base_stack_sns_topic)
+            )
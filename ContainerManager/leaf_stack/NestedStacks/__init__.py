@@ -8,5 +8,8 @@ from .AsgStateChangeHook import AsgStateChangeHook
 from .Container import Container
 from .EcsAsg import EcsAsg
 from .Efs import Efs
+from .GoldenAmi import GoldenAmi
+from .Monitoring import Monitoring
 from .SecurityGroups import SecurityGroups
+from .WakeTrace import WakeTrace
 from .Watchdog import Watchdog
@@ -0,0 +1,166 @@
+"""
+Agent on the instance (HOST of the container), for counting connections.
+
+Counts the same things as the watchdog lambda's SSM script, but in-process
+from /proc. (Instead of running docker/nsenter/netstat/jq every minute).
+Then pushes them to the same CloudWatch metrics the lambda would have.
+
+Runs as a systemd service, installed by the instance's user data. Needs
+to run on the host's python, so keep it to the standard library + boto3.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import http.client
+import urllib.parse
+import urllib.request
+from typing import Optional
+
+import boto3
+
+CONFIG_PATH = "/etc/activity-agent/config.json"
+# https://docs.aws.amazon.com/AmazonECS/latest/developerguide/ecs-agent-introspection.html
+ECS_AGENT_METADATA_URL = "http://localhost:51678/v1/metadata"
+DOCKER_SOCKET = "/var/run/docker.sock"
+SSH_PORT = 22
+# The 'st' column in /proc/net/tcp:
+TCP_ESTABLISHED = "01"
+
+
+class DockerConnection(http.client.HTTPConnection):
+    """ Talks to the docker daemon over it's unix socket. (No docker CLI process) """
+    def __init__(self, timeout: int=5):
+        super().__init__("localhost", timeout=timeout)
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(DOCKER_SOCKET)
+
+
+def docker_get(path: str):
+    """ GET from the docker engine API """
+    # https://docs.docker.com/reference/api/engine/
+    connection = DockerConnection()
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"Docker API '{path}' returned {response.status}: {body[:200]}")
+        return json.loads(body)
+    finally:
+        connection.close()
+
+
+def registered_to_cluster() -> bool:
+    """ If the ECS agent is up and registered. (Not while booting, or being prepared for the warm pool) """
+    try:
+        with urllib.request.urlopen(ECS_AGENT_METADATA_URL, timeout=2) as response:
+            return bool(json.loads(response.read()).get("ContainerInstanceArn"))
+    except OSError:
+        return False
+
+
+def get_container_pid(task_family: str) -> Optional[int]:
+    """ The PID of the task's container, or None if it isn't running yet """
+    # Same label the lambda's 'docker container ls --filter' uses:
+    filters = json.dumps({
+        "label": [f"com.amazonaws.ecs.task-definition-family={task_family}"],
+        "status": ["running"],
+    })
+    containers = docker_get(f"/containers/json?filters={urllib.parse.quote(filters)}")
+    if not containers:
+        return None
+    return docker_get(f"/containers/{containers[0]['Id']}/json")["State"]["Pid"]
+
+
+def count_established(proc_net_dir: str, port: int) -> int:
+    """ Number of ESTABLISHED TCP connections on a local port, in that network namespace """
+    count = 0
+    for file_name in ["tcp", "tcp6"]:
+        try:
+            with open(os.path.join(proc_net_dir, file_name), encoding="utf-8") as proc_file:
+                # Skip the header line:
+                lines = proc_file.readlines()[1:]
+        except FileNotFoundError:
+            # No IPv6 in this namespace:
+            continue
+        for line in lines:
+            fields = line.split()
+            # local_address is "<hex ip>:<hex port>", and 'st' is the connection's state:
+            if fields[3] == TCP_ESTABLISHED and int(fields[1].rsplit(":", 1)[1], 16) == port:
+                count += 1
+    return count
+
+
+def count_udp_datagrams(proc_net_dir: str) -> int:
+    """ UDP packets in + out, since the network namespace was created. (Same counters as 'nstat') """
+    with open(os.path.join(proc_net_dir, "snmp"), encoding="utf-8") as snmp_file:
+        # A line with the names, then a line with the values:
+        names, values = [line.split()[1:] for line in snmp_file if line.startswith("Udp:")]
+    udp_stats = dict(zip(names, map(int, values)))
+    return udp_stats["InDatagrams"] + udp_stats["OutDatagrams"]
+
+
+class ActivityAgent:
+    """ Samples the connections every interval, and pushes them to CloudWatch """
+    def __init__(self, config: dict):
+        self.config = config
+        self.cloudwatch_client = boto3.client("cloudwatch")
+        # Change it to the format boto3 cloudwatch wants:
+        self.dimension_map = [{"Name": k, "Value": v} for k, v in config["MetricDimensions"].items()]
+        # UDP is how many packets since the last sample, so remember the last one: (pid, count)
+        self.last_udp_sample = None
+
+    def sample_activity(self) -> int:
+        """ Players connected (TCP), or packets since the last sample (UDP). 0 if the container isn't running """
+        pid = get_container_pid(self.config["TaskDefinitionFamily"])
+        if pid is None:
+            # Nobody can be playing on it yet:
+            return 0
+        if self.config["ConnectionType"] == "TCP":
+            return count_established(f"/proc/{pid}/net", self.config["TcpPort"])
+        # ConnectionType == "UDP":
+        udp_count = count_udp_datagrams(f"/proc/{pid}/net")
+        last_pid, last_count = self.last_udp_sample or (None, 0)
+        self.last_udp_sample = (pid, udp_count)
+        # A new container starts from 0 again. (The first sample is everything so far, just like 'nstat'):
+        return udp_count - last_count if pid == last_pid else udp_count
+
+    def push(self, activity_count: int, num_ssh_conn: int) -> None:
+        """ Pushes both metrics to cloudwatch, in one call """
+        self.cloudwatch_client.put_metric_data(
+            Namespace=self.config["MetricNamespace"],
+            MetricData=[{
+                'MetricName': metric_name,
+                'Dimensions': self.dimension_map,
+                'Unit': self.config["MetricUnit"],
+                'Value': value,
+            } for metric_name, value in [
+                (self.config["MetricNameActivityCount"], activity_count),
+                (self.config["MetricNameSshConnections"], num_ssh_conn),
+            ]],
+        )
+
+    def run(self) -> None:
+        """ Sample forever. A failed sample is logged and skipped, the next one tries again """
+        while True:
+            start_time = time.monotonic()
+            try:
+                if registered_to_cluster():
+                    # This process is in the host's network namespace, so it's own /proc/net is the host's:
+                    num_ssh_conn = count_established("/proc/net", SSH_PORT)
+                    self.push(self.sample_activity(), num_ssh_conn)
+            # If it keeps failing, the watchdog's heartbeat alarm spins everything down:
+            except Exception as e: # pylint: disable=broad-exception-caught
+                print(f"Sample failed: {e!r}", file=sys.stderr, flush=True)
+            time.sleep(max(0, self.config["IntervalSeconds"] - (time.monotonic() - start_time)))
+
+
+if __name__ == "__main__":
+    with open(CONFIG_PATH, encoding="utf-8") as config_file:
+        ActivityAgent(json.load(config_file)).run()
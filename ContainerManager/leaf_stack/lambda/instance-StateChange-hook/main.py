@@ -7,8 +7,16 @@ whenever the ASG state changes (instance starts or stops).
 import os
 import sys
 import json
+import time
+from typing import Callable
+from datetime import datetime, timezone
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import boto3
+import botocore
+# From the logging layer:
+from structured_logging import Logger
 
 required_vars = [
     "HOSTED_ZONE_ID",
@@ -19,35 +27,74 @@ required_vars = [
     "WATCH_INSTANCE_RULE",
     "ECS_CLUSTER_NAME",
     "ECS_SERVICE_NAME",
+    "ASG_NAME",
+    "WAKE_TRACE_PARAMETER",
 ]
 missing_vars = [x for x in required_vars if not os.environ.get(x)]
 if any(missing_vars):
     raise RuntimeError(f"Missing environment vars: [{', '.join(missing_vars)}]")
 
+logger = Logger()
+
+# Optional. If set, DNS and the "started" notification wait for the container to pass it's readiness check:
+READINESS_CHECK = os.environ.get("READINESS_CHECK") == "True"
+
 # Boto3 Clients:
 #    Can get cached if function is reused, keep clients that are used on spin-UP here:
 route53_client = boto3.client('route53') # Used for updating DNS record
 events_client = boto3.client('events')   # Used for enabling/disabling the watchdog lambda
 ecs_client = boto3.client('ecs')         # Used for updating the ECS service
-ec2_client = boto3.client('ec2')         # Used for getting the new instance's IP
+ec2_client = boto3.client('ec2')         # Used for getting the new instance's IP, or giving it the Elastic IP
+asg_client = boto3.client('autoscaling') # Used for finishing the launch lifecycle action, and holding the instance
+ssm_client = boto3.client('ssm')         # Used for following the wake trace
+# Only the readiness check sends the "started" notification from here:
+sns_client = boto3.client('sns') if READINESS_CHECK else None
+
+# One thread for each independent step in `update_system` (ECS, DNS, Watchdog rule, Elastic IP, Wake trace):
+MAX_WORKERS = 5
+
+# Optional. If set, the instance always gets this IP, and DNS always points to it:
+elastic_ip = os.environ.get("ELASTIC_IP")
+elastic_ip_allocation_id = os.environ.get("ELASTIC_IP_ALLOCATION_ID")
+
+# How long to keep the instance around after the watchdog spins it down, in case someone reconnects:
+SHUTDOWN_HOLD_SECONDS = int(os.environ.get("SHUTDOWN_HOLD_SECONDS", "0"))
+# How long to wait for the alarm's scaling action to land, after the alarm fires:
+ALARM_ACTION_WAIT_SECONDS = 15
 
+# How far back to look for the last activity, when spinning down. (Past the longest the watchdog would wait):
+IDLE_LOOKBACK_SECONDS = 3 * 60 * 60
+
+@logger.handler
 def lambda_handler(event: dict, context: dict) -> None:
     """
     Main function of the lambda.
 
-    `update_system` is broken out, to guarantee the event rule is always updated.
+    `update_system` runs every step, even if one fails, to guarantee the event rule is always updated.
     """
-    print(json.dumps({"Event": event, "Context": context}, default=str))
 
-    ### If the ec2 instance just FINISHED coming up:
-    if event["detail-type"] == "EC2 Instance Launch Successful":
+    ### Warm Pool instances aren't serving anything, don't touch the system for them:
+    if is_warm_pool_transition(event):
+        logger.info("Instance is moving in/out of the Warm Pool. Skipping.", Origin=event["detail"].get("Origin"), Destination=event["detail"].get("Destination"))
+        # Still have to let it finish going into the pool though:
+        if event["detail-type"] == "EC2 Instance-launch Lifecycle Action":
+            complete_lifecycle_action(event)
+        return
+
+    ### If the ec2 instance is STARTING to come up (It already has an IP):
+    if event["detail-type"] == "EC2 Instance-launch Lifecycle Action":
         try:
-            update_system(spin_up=True, event=event)
+            # Point DNS at the instance now, so it's ready by the time the container is:
+            update_system(spin_up=True, instance_id=event["detail"]["EC2InstanceId"])
         finally:
-            # We're doing this last, since it's not required for a user to connect (Get them in ASAP)
-            # BUT we want to make sure this ALWAYS happens! If something goes wrong, this'll grantee
-            # the instance will eventually spin down.
-            events_client.enable_rule(Name=os.environ["WATCH_INSTANCE_RULE"])
+            # Let the instance continue launching, no matter what:
+            complete_lifecycle_action(event)
+
+    ### If the ec2 instance just FINISHED coming up:
+    #   (The launch lifecycle action above already did all this, doing it again is
+    #    harmless and keeps everything in sync if that one failed)
+    elif event["detail-type"] == "EC2 Instance Launch Successful":
+        update_system(spin_up=True, instance_id=event["detail"]["EC2InstanceId"])
 
     ### If the ec2 instance just STARTED to go down:
     elif event["detail-type"] == "EC2 Instance-terminate Lifecycle Action":
@@ -55,40 +102,412 @@ def lambda_handler(event: dict, context: dict) -> None:
             ### Safety Check - If another instance is spinning up, just quit:
             exit_if_asg_instance_coming_up(asg_name=event["detail"]["AutoScalingGroupName"])
             # Now just update the system like normal:
-            update_system(spin_up=False, event=event)
+            update_system(spin_up=False)
+            publish_idle_to_terminate(terminating_at=datetime.fromisoformat(event["time"]).timestamp())
         finally:
+            # No matter what happened above, the watchdog gets turned off. (`update_system`
+            #   already did if it got that far, doing it again is harmless):
             events_client.disable_rule(Name=os.environ["WATCH_INSTANCE_RULE"])
 
+    ### If the watchdog wants the instance down, but it's protected to give players a chance to reconnect:
+    elif event["detail-type"] == "CloudWatch Alarm State Change":
+        hold_for_reconnect(asg_name=os.environ["ASG_NAME"], hold_seconds=SHUTDOWN_HOLD_SECONDS)
+
+    ### If the container just started, but the game might not be ready for players yet:
+    elif event["detail-type"] == "ECS Task State Change":
+        wait_for_ready(event, context)
+
     ### If the EventBridge filter somehow changed (This should never happen):
     else:
         raise RuntimeError(f"Unknown event type: '{event['detail-type']}'. Did you mess with the EventBridge Rule??")
 
 
 
-def update_system(spin_up: bool, event: dict) -> None:
-    """ Update the ECS Service and DNS. """
-    # Update the ECS service first, it'll take the longest to turn on:
-    update_ecs_service(desired_count=1 if spin_up else 0)
+def is_warm_pool_transition(event: dict) -> bool:
+    """ If the event is for an instance that isn't going to/from the ASG itself """
+    # https://docs.aws.amazon.com/autoscaling/ec2/userguide/warm-pools-eventbridge-events.html
+    #   - Launch into the pool (being prepared): Destination == "WarmPool"
+    #   - Terminated out of the pool (never served): Origin == "WarmPool"
+    # (Instances going ASG -> WarmPool on scale-in are still a spin-DOWN, so they fall through)
+    if event["detail-type"] in ["EC2 Instance Launch Successful", "EC2 Instance-launch Lifecycle Action"]:
+        return event["detail"].get("Destination") == "WarmPool"
+    if event["detail-type"] == "EC2 Instance-terminate Lifecycle Action":
+        return event["detail"].get("Origin") == "WarmPool"
+    return False
+
+
+def hold_for_reconnect(asg_name: str, hold_seconds: int) -> None:
+    """
+    Give players a chance to reconnect, before the instance is terminated.
+
+    The instance is protected from scale-in, so the ASG can't terminate it on it's own. Spin
+    down everything else like normal, and only let the ASG have the instance if nobody
+    reconnects (the trigger lambda sets the desired capacity back to 1) in time. If anything
+    fails before someone reconnects, the ASG still gets the instance.
+    """
+    instance_id = get_protected_instance(asg_name)
+    if instance_id is None:
+        logger.info("No protected instance in the ASG, nothing to hold.")
+        return
+    # The alarm's scaling action happens at the same time as this event, give it a moment to land:
+    if not wait_for_desired_capacity(asg_name, spin_up=False, timeout=ALARM_ACTION_WAIT_SECONDS):
+        logger.info("The ASG isn't spinning down, nothing to hold.")
+        return
+
+    reconnected = False
+    try:
+        update_system(spin_up=False)
+        logger.info("Holding the instance, in case someone reconnects.", InstanceId=instance_id, HoldSeconds=hold_seconds)
+        reconnected = wait_for_desired_capacity(asg_name, spin_up=True, timeout=hold_seconds)
+    finally:
+        ## Nobody came back (or the hold broke), let the ASG terminate it like normal.
+        #   (If this doesn't happen, nothing else will. The instance stays up with DesiredCapacity=0):
+        if not reconnected:
+            logger.add_summary(InstanceId=instance_id, Reconnected=False)
+            # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/autoscaling/client/set_instance_protection.html
+            asg_client.set_instance_protection(
+                InstanceIds=[instance_id],
+                AutoScalingGroupName=asg_name,
+                ProtectedFromScaleIn=False,
+            )
+
+    if reconnected:
+        ## Someone reconnected! The instance never went anywhere, so just bring everything back:
+        logger.add_summary(InstanceId=instance_id, Reconnected=True)
+        update_system(spin_up=True, instance_id=instance_id)
+
 
-    # Update the DNS to the new public IP:
+def get_protected_instance(asg_name: str) -> str | None:
+    """ Get the instance the ASG can't terminate on it's own, if there is one """
+    asg_info = asg_client.describe_auto_scaling_groups(AutoScalingGroupNames=[asg_name])['AutoScalingGroups'][0]
+    for instance in asg_info['Instances']:
+        if instance['LifecycleState'] == "InService" and instance['ProtectedFromScaleIn']:
+            return instance['InstanceId']
+    return None
+
+
+def wait_for_desired_capacity(asg_name: str, spin_up: bool, timeout: int, poll_seconds: int=5) -> bool:
+    """ Wait for the ASG to be told to spin up/down. Returns if it happened before the timeout """
+    deadline = time.monotonic() + timeout
+    while True:
+        asg_info = asg_client.describe_auto_scaling_groups(AutoScalingGroupNames=[asg_name])['AutoScalingGroups'][0]
+        if (asg_info['DesiredCapacity'] > 0) == spin_up:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_seconds)
+
+
+def update_system(spin_up: bool, instance_id: str | None = None) -> None:
+    """ Update the ECS Service, DNS, and Watchdog rule. """
+    ## None of these depend on each other, so do them all at once:
+    #   - Spin-up: Nobody waits on ECS to get the new IP.
+    #   - Spin-down: DNS resets right away, so new connections stop before the task is gone.
+    #   - Elastic IP: DNS is always the same IP, the instance just has to get it.
+    steps = {}
+    if elastic_ip:
+        # Keep DNS on the Elastic IP, even when spun down. (Clients never have to re-resolve it):
+        update_dns = partial(update_dns_zone, new_ip=elastic_ip)
+        if spin_up:
+            steps["associate_elastic_ip"] = partial(associate_elastic_ip, instance_id=instance_id)
+    elif spin_up and READINESS_CHECK:
+        # Leave it unavailable. `wait_for_ready` points it at the instance once the container's ready:
+        update_dns = None
+    elif spin_up:
+        update_dns = partial(update_dns_to_instance, instance_id=instance_id)
+    else:
+        update_dns = partial(update_dns_zone, new_ip=os.environ["UNAVAILABLE_IP"])
     if spin_up:
-        new_ip = get_instance_ip(instance_id=event["detail"]["EC2InstanceId"])
+        update_watchdog_rule = partial(events_client.enable_rule, Name=os.environ["WATCH_INSTANCE_RULE"])
+        update_wake_trace = log_wake_trace
     else:
-        new_ip = os.environ["UNAVAILABLE_IP"]
+        update_watchdog_rule = partial(events_client.disable_rule, Name=os.environ["WATCH_INSTANCE_RULE"])
+        update_wake_trace = clear_wake_trace
+    if update_dns is not None:
+        steps["update_dns_zone"] = update_dns
+    run_steps({
+        **steps,
+        # (On spin-up, the trigger lambda normally already did this. It's here
+        #  in case the ASG was scaled some other way, i.e the console)
+        "update_ecs_service": partial(update_ecs_service, desired_count=1 if spin_up else 0),
+        # This is the one that ALWAYS has to happen! If something goes wrong, this'll
+        # guarantee the instance will eventually spin down.
+        "update_watchdog_rule": update_watchdog_rule,
+        "update_wake_trace": update_wake_trace,
+    })
+
+
+def wait_for_ready(event: dict, context: dict) -> None:
+    """
+    Wait for the container to pass it's readiness check, THEN point DNS at it and let
+    everyone know. (Otherwise players connect before the game is up, and just fail)
+    """
+    task = event["detail"]
+    if not wait_for_healthy(cluster=task["clusterArn"], task_arn=task["taskArn"], context=context):
+        logger.warning("Task never became ready. Leaving DNS and notifications alone.", TaskArn=task["taskArn"])
+        return
+    ready_time = time.time()
+    ready_latency = ready_time - datetime.fromisoformat(task["startedAt"]).timestamp()
+    logger.add_summary(TaskArn=task["taskArn"], ReadyLatency=round(ready_latency, 3))
+
+    steps = {
+        "notify_up": notify_up,
+        "publish_ready_latency": partial(publish_ready_latency, ready_latency=ready_latency),
+        "finish_wake_trace": partial(finish_wake_trace, ready_time=ready_time, ready_latency=ready_latency),
+    }
+    # (The Elastic IP never changes, DNS is already pointing to it):
+    if not elastic_ip:
+        instance_id = get_task_instance_id(cluster=task["clusterArn"], container_instance_arn=task["containerInstanceArn"])
+        steps["update_dns_zone"] = partial(update_dns_to_instance, instance_id=instance_id)
+    run_steps(steps)
+
+
+def wait_for_healthy(cluster: str, task_arn: str, context: dict, poll_seconds: int=5) -> bool:
+    """ Wait for the task's health check to pass. Returns False if it never will """
+    # Leave enough time to finish everything else afterwards:
+    while context.get_remaining_time_in_millis() > 30 * 1000:
+        # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ecs/client/describe_tasks.html
+        task = ecs_client.describe_tasks(cluster=cluster, tasks=[task_arn])["tasks"][0]
+        if task["healthStatus"] == "HEALTHY":
+            return True
+        # ECS replaces an unhealthy task, the new one will trigger this again:
+        if task["healthStatus"] == "UNHEALTHY" or task["desiredStatus"] == "STOPPED":
+            return False
+        time.sleep(poll_seconds)
+    return False
+
+
+def get_task_instance_id(cluster: str, container_instance_arn: str) -> str:
+    """ Get the instance the task is running on """
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ecs/client/describe_container_instances.html
+    container_instance = ecs_client.describe_container_instances(
+        cluster=cluster,
+        containerInstances=[container_instance_arn],
+    )["containerInstances"][0]
+    return container_instance["ec2InstanceId"]
+
+
+def notify_up() -> None:
+    """ Let everyone know the container is ready """
+    for topic_arn in json.loads(os.environ["NOTIFY_TOPIC_ARNS"]):
+        sns_client.publish(TopicArn=topic_arn, Message=os.environ["NOTIFY_UP_MESSAGE"])
+
+
+def publish_ready_latency(ready_latency: float) -> None:
+    """ Publish how long the container took to be ready, after it started running """
+    # (Through the logs, see `structured_logging`):
+    logger.put_metrics(
+        namespace=os.environ["METRIC_NAMESPACE"],
+        metric_data=[{
+            "MetricName": os.environ["METRIC_NAME_READY_LATENCY"],
+            "Dimensions": [{"Name": k, "Value": v} for k, v in json.loads(os.environ["METRIC_DIMENSIONS"]).items()],
+            "Unit": "Seconds",
+            "Value": ready_latency,
+        }],
+    )
+
+
+def publish_idle_to_terminate(terminating_at: float) -> None:
+    """
+    Publish how long the instance sat idle, before it started terminating.
+
+    Idle starts after the last minute the watchdog's alarm would count as active
+    (`ssh > 0 OR activity > Threshold`), from the same metrics.
+    """
+    # - Normally initializing boto3.client is expensive, but we only
+    # care about spin-*UP* time. This only runs when system is shutting down.
+    cloudwatch_client = boto3.client('cloudwatch')
+    queries = [("activity", os.environ["METRIC_NAME_ACTIVITY_COUNT"])]
+    if os.environ.get("METRIC_NAME_SSH_CONNECTIONS"):
+        queries.append(("ssh", os.environ["METRIC_NAME_SSH_CONNECTIONS"]))
+    dimensions = [{"Name": k, "Value": v} for k, v in json.loads(os.environ["METRIC_DIMENSIONS"]).items()]
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch/client/get_metric_data.html
+    results = cloudwatch_client.get_metric_data(
+        MetricDataQueries=[{
+            "Id": query_id,
+            "MetricStat": {
+                "Metric": {"Namespace": os.environ["METRIC_NAMESPACE"], "MetricName": metric_name, "Dimensions": dimensions},
+                "Period": 60,
+                "Stat": "Maximum",
+            },
+        } for query_id, metric_name in queries],
+        StartTime=datetime.fromtimestamp(terminating_at - IDLE_LOOKBACK_SECONDS, tz=timezone.utc),
+        EndTime=datetime.fromtimestamp(terminating_at, tz=timezone.utc),
+    )["MetricDataResults"]
+    series = {result["Id"]: dict(zip(result["Timestamps"], result["Values"])) for result in results}
+    threshold = int(os.environ["METRIC_THRESHOLD"])
+    active_minutes = [
+        timestamp.timestamp() for timestamp, value in series["activity"].items() if value > threshold
+    ] + [
+        timestamp.timestamp() for timestamp, value in series.get("ssh", {}).items() if value > 0
+    ]
+    if not active_minutes:
+        logger.info("No activity to measure from. Skipping the idle to terminate metric.", LookbackSeconds=IDLE_LOOKBACK_SECONDS)
+        return
+    # The timestamp is the START of the minute it was active in:
+    idle_to_terminate = terminating_at - (max(active_minutes) + 60)
+    if idle_to_terminate < 0:
+        logger.info("It wasn't idle, something else spun it down. Skipping the idle to terminate metric.")
+        return
+    logger.add_summary(IdleToTerminate=round(idle_to_terminate, 3), ShutdownMode=os.environ["SHUTDOWN_MODE"])
+    # (Through the logs, see `structured_logging`):
+    logger.put_metrics(
+        namespace=os.environ["METRIC_NAMESPACE"],
+        metric_data=[{
+            "MetricName": os.environ["METRIC_NAME_IDLE_TO_TERMINATE"],
+            "Dimensions": [*dimensions, {"Name": "ShutdownMode", "Value": os.environ["SHUTDOWN_MODE"]}],
+            "Unit": "Seconds",
+            "Value": idle_to_terminate,
+        }],
+    )
+
+
+def run_steps(steps: dict) -> None:
+    """
+    Run each step in it's own thread, and log how long each took.
+
+    Every step gets run, even if another fails. The first error is re-raised at the end.
+    """
+    errors = []
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(time_step, name, step): name for name, step in steps.items()}
+        for future in as_completed(futures):
+            if future.exception() is not None:
+                logger.error("Step failed", Step=futures[future], Error=repr(future.exception()))
+                errors.append(future.exception())
+    logger.info("Step", Step="Total", Seconds=round(time.perf_counter() - start_time, 3))
+    if errors:
+        raise errors[0]
+
+
+def time_step(name: str, step: Callable) -> None:
+    """ Run a single step, and log how long it took """
+    start_time = time.perf_counter()
+    try:
+        step()
+    finally:
+        logger.info("Step", Step=name, Seconds=round(time.perf_counter() - start_time, 3))
+
+
+def associate_elastic_ip(instance_id: str, max_attempts: int=20) -> None:
+    """ Move the Elastic IP to the instance """
+    logger.info("Associating Elastic IP", ElasticIp=elastic_ip, InstanceId=instance_id)
+    # On the launch lifecycle action, the instance might not be in a state that can take it yet:
+    for attempt in range(max_attempts):
+        try:
+            # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ec2/client/associate_address.html
+            ec2_client.associate_address(
+                AllocationId=elastic_ip_allocation_id,
+                InstanceId=instance_id,
+                # If an old instance still has it, take it:
+                AllowReassociation=True,
+            )
+            return
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] != "IncorrectInstanceState" or attempt == max_attempts - 1:
+                raise
+            time.sleep(1)
+
+
+def get_wake_trace() -> dict:
+    """ Get the current wake's trace. (It's empty between wakes) """
+    return json.loads(ssm_client.get_parameter(Name=os.environ["WAKE_TRACE_PARAMETER"])["Parameter"]["Value"])
+
+
+def log_wake_trace() -> None:
+    """ Log which wake this is part of, to follow it across the lambdas """
+    trace = get_wake_trace()
+    if not trace:
+        logger.info("No wake trace. (Was the system started some other way?)")
+        return
+    logger.append_keys(CorrelationId=trace["CorrelationId"])
+
+
+def finish_wake_trace(ready_time: float, ready_latency: float) -> None:
+    """
+    With a readiness check, the player can't play until it passes. The WakeTrace lambda
+    already published the stages up to the container running, so publish the rest.
+    """
+    trace = get_wake_trace()
+    if not trace or trace.get("Completed"):
+        logger.info("No wake to finish tracing. (Was the system started some other way, or did the container restart?)")
+        return
+    logger.append_keys(CorrelationId=trace["CorrelationId"])
+    time_to_playable = ready_time - trace["DnsQueryTime"]
+    logger.add_summary(TimeToPlayable=round(time_to_playable, 3))
+    dimensions = [{"Name": k, "Value": v} for k, v in json.loads(os.environ["METRIC_DIMENSIONS"]).items()]
+    # (Through the logs, see `structured_logging`):
+    logger.put_metrics(
+        namespace=os.environ["METRIC_NAMESPACE"],
+        metric_data=[{
+            "MetricName": os.environ["METRIC_NAME_TIME_TO_PLAYABLE"],
+            "Dimensions": dimensions,
+            "Unit": "Seconds",
+            "Value": time_to_playable,
+        }, {
+            "MetricName": os.environ["METRIC_NAME_WAKE_STAGE"],
+            "Dimensions": [*dimensions, {"Name": "Stage", "Value": "ContainerReady"}],
+            "Unit": "Seconds",
+            "Value": ready_latency,
+        }],
+    )
+    ## Mark it done, so a restarted container doesn't count as another wake:
+    trace.update({"Completed": True, "TimeToPlayable": time_to_playable})
+    trace.setdefault("Stages", {})["ContainerReady"] = round(ready_latency, 3)
+    ssm_client.put_parameter(
+        Name=os.environ["WAKE_TRACE_PARAMETER"],
+        Value=json.dumps(trace),
+        Type="String",
+        Overwrite=True,
+    )
+
+
+def clear_wake_trace() -> None:
+    """ Empty the wake trace, so the next DNS query starts a new one """
+    # (The WakeTrace stack owns the parameter, so it's emptied instead of deleted):
+    ssm_client.put_parameter(
+        Name=os.environ["WAKE_TRACE_PARAMETER"],
+        Value="{}",
+        Type="String",
+        Overwrite=True,
+    )
+
+
+def update_dns_to_instance(instance_id: str) -> None:
+    """ Point the DNS record at the instance's public IP """
+    new_ip = get_instance_ip(instance_id=instance_id)
     update_dns_zone(new_ip)
 
 
-def get_instance_ip(instance_id: str) -> str:
+def get_instance_ip(instance_id: str, max_attempts: int=20) -> str:
     """ Get the instance IP """
-    # Since you're supplying an ID, there should always be exactly one:
-    instance_details = ec2_client.describe_instances(InstanceIds=[instance_id])["Reservations"][0]["Instances"][0]
-    # Now you have the new ip for the instance:
-    return instance_details["PublicIpAddress"]
+    # On the launch lifecycle action, the instance might not have it's public IP *quite* yet:
+    for _ in range(max_attempts):
+        # Since you're supplying an ID, there should always be exactly one:
+        instance_details = ec2_client.describe_instances(InstanceIds=[instance_id])["Reservations"][0]["Instances"][0]
+        if "PublicIpAddress" in instance_details:
+            # Now you have the new ip for the instance:
+            return instance_details["PublicIpAddress"]
+        time.sleep(1)
+    raise RuntimeError(f"Instance '{instance_id}' never got a public IP.")
+
+
+def complete_lifecycle_action(event: dict) -> None:
+    """ Let the ASG know it can continue with the lifecycle action """
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/autoscaling/client/complete_lifecycle_action.html
+    asg_client.complete_lifecycle_action(
+        LifecycleHookName=event["detail"]["LifecycleHookName"],
+        AutoScalingGroupName=event["detail"]["AutoScalingGroupName"],
+        LifecycleActionToken=event["detail"]["LifecycleActionToken"],
+        InstanceId=event["detail"]["EC2InstanceId"],
+        LifecycleActionResult="CONTINUE",
+    )
 
 
 def update_dns_zone(new_ip: str) -> None:
     """ Update the DNS record with the new IP """
-    print(f"Changing to new IP: {new_ip}")
+    logger.info("Changing to new IP", NewIp=new_ip)
     ### Update the record with the new IP:
     route53_client.change_resource_record_sets(
         HostedZoneId=os.environ['HOSTED_ZONE_ID'],
@@ -108,7 +527,7 @@ def update_dns_zone(new_ip: str) -> None:
 
 def update_ecs_service(desired_count: int) -> None:
     """ Update the ECS service to desired count """
-    print(f"Spinning {'up' if desired_count else 'down'} ecs service ({desired_count=})")
+    logger.info(f"Spinning {'up' if desired_count else 'down'} ecs service", DesiredCount=desired_count)
     ## Spin up the task on the new instance:
     ecs_client.update_service(
         cluster=os.environ["ECS_CLUSTER_NAME"],
@@ -121,14 +540,11 @@ def exit_if_asg_instance_coming_up(asg_name: str) -> None:
     """ SAFEGUARD: Exit if another instance is coming up in the ASG """
     # - There's a window where if a instance is coming up as another spins down, it could wipe the
     # ip of the new instance from route53. This is a safety check to make sure that doesn't happen.
-    # - Normally initializing boto3.client is expensive, but we only
-    # care about spin-*UP* time. This only runs when system is shutting down.
-    asg_client = boto3.client('autoscaling')
     # With using asg_name, we guarantee there's only one output:
     asg_info = asg_client.describe_auto_scaling_groups(AutoScalingGroupNames=[asg_name])['AutoScalingGroups'][0]
     for instance in asg_info['Instances']:
         # If there's a instance in ANY of the Pending states, or just finished starting, let IT update the DNS stuff.
         # We don't want to step over it with this instance going down.
         if instance['LifecycleState'].startswith("Pending") or  instance['LifecycleState'] == "InService":
-            print(f"Instance '{instance['InstanceId']}' is in '{instance['LifecycleState']}', skipping this termination event.")
+            logger.info("Another instance is coming up, skipping this termination event.", InstanceId=instance['InstanceId'], LifecycleState=instance['LifecycleState'])
             sys.exit()
@@ -0,0 +1,140 @@
+"""
+Function code for probing the container like a player would.
+Times how long a TCP connect, or a UDP query round trip takes,
+and pushes the latency and jitter to CloudWatch metrics.
+"""
+
+import os
+import json
+import time
+import socket
+import statistics
+
+# From the logging layer:
+from structured_logging import Logger
+
+## Check for required environment variables:
+required_vars = [
+    # Where players connect to:
+    "DOMAIN_NAME",
+    "UNAVAILABLE_IP",
+    # How to probe it:
+    "PROTOCOL",
+    "PORT",
+    "SAMPLES",
+    "TIMEOUT_MS",
+    # Which metrics to update in cloudwatch:
+    "METRIC_NAMESPACE",
+    "METRIC_NAME_LATENCY",
+    "METRIC_NAME_JITTER",
+    "METRIC_NAME_FAILURES",
+    "METRIC_DIMENSIONS",
+]
+missing_vars = [x for x in required_vars if not os.environ.get(x)]
+if any(missing_vars):
+    raise RuntimeError(f"Missing environment vars: [{', '.join(missing_vars)}]")
+
+# Protocol for this lambda:
+protocol = os.environ["PROTOCOL"].upper()
+if protocol == "TCP":
+    pass
+elif protocol == "UDP":
+    assert os.environ.get("UDP_PAYLOAD"), "You must declare what to send for UDP probes! (UDP_PAYLOAD)"
+else:
+    raise RuntimeError(f"Invalid protocol! Not yet supported: '{protocol}'.")
+udp_payload = bytes.fromhex(os.environ.get("UDP_PAYLOAD", ""))
+port = int(os.environ["PORT"])
+samples = int(os.environ["SAMPLES"])
+timeout_seconds = int(os.environ["TIMEOUT_MS"]) / 1000
+
+
+logger = Logger()
+
+### Dimension map for cloudwatch:
+# Load the metric dimension map:
+dimensions_input = json.loads(os.environ["METRIC_DIMENSIONS"])
+# Change it to the format boto3 cloudwatch wants:
+dimension_map = [{"Name": k, "Value": v} for k, v in dimensions_input.items()]
+
+
+@logger.handler
+def lambda_handler(_event, _context) -> None:
+    """ Main function of the lambda. """
+    ## Look it up the same way a player would:
+    try:
+        ip = socket.gethostbyname(os.environ["DOMAIN_NAME"])
+    except socket.gaierror as e:
+        logger.warning("Could not resolve the domain. Skipping.", Domain=os.environ["DOMAIN_NAME"], Error=str(e))
+        return
+    # DNS isn't pointing at the instance (yet). Nothing to probe:
+    if ip == os.environ["UNAVAILABLE_IP"]:
+        logger.info("The container isn't up. Skipping.", Domain=os.environ["DOMAIN_NAME"], Ip=ip)
+        return
+
+    probe = probe_tcp if protocol == "TCP" else probe_udp
+    latencies = []
+    for _ in range(samples):
+        latency = probe(ip)
+        if latency is not None:
+            latencies.append(latency)
+
+    failures = samples - len(latencies)
+    logger.add_summary(Ip=ip, Port=port, Protocol=protocol, LatenciesMs=[round(x, 1) for x in latencies], Failures=failures)
+    push_to_cloudwatch(latencies, failures)
+
+def probe_tcp(ip: str) -> float | None:
+    """ How long the TCP handshake takes, in milliseconds. None if it fails. """
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((ip, port), timeout=timeout_seconds):
+            return (time.perf_counter() - start) * 1000
+    except OSError as e:
+        logger.debug("TCP connect failed", Ip=ip, Port=port, Error=str(e))
+        return None
+
+def probe_udp(ip: str) -> float | None:
+    """ How long a UDP query takes to get ANY reply, in milliseconds. None if it fails. """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout_seconds)
+        start = time.perf_counter()
+        try:
+            sock.sendto(udp_payload, (ip, port))
+            sock.recvfrom(4096)
+            return (time.perf_counter() - start) * 1000
+        except OSError as e:
+            logger.debug("UDP query failed", Ip=ip, Port=port, Error=str(e))
+            return None
+
+def jitter(latencies: list) -> float:
+    """ The average change between back-to-back samples. (Like RFC 3550, without the smoothing) """
+    if len(latencies) < 2:
+        return 0.0
+    return statistics.mean(abs(b - a) for a, b in zip(latencies, latencies[1:]))
+
+def push_to_cloudwatch(latencies: list, failures: int) -> None:
+    """ Pushes the probe's results to cloudwatch, through the logs. """
+    metric_data = [{
+        'MetricName': os.environ["METRIC_NAME_FAILURES"],
+        'Dimensions': dimension_map,
+        'Unit': 'Count',
+        'Value': failures,
+    }]
+    # Nothing to time if every sample failed:
+    if latencies:
+        metric_data.append({
+            'MetricName': os.environ["METRIC_NAME_LATENCY"],
+            'Dimensions': dimension_map,
+            'Unit': 'Milliseconds',
+            # Every sample, so the alarm can use percentiles and not just the average:
+            'Values': latencies,
+        })
+        metric_data.append({
+            'MetricName': os.environ["METRIC_NAME_JITTER"],
+            'Dimensions': dimension_map,
+            'Unit': 'Milliseconds',
+            'Value': jitter(latencies),
+        })
+    logger.put_metrics(
+        namespace=os.environ["METRIC_NAMESPACE"],
+        metric_data=metric_data,
+    )
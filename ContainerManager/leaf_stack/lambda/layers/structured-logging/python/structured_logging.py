@@ -0,0 +1,150 @@
+"""
+Structured logging shared by every lambda, through a Lambda Layer.
+
+Every line is one JSON object. The verbose payloads (the event, full API
+responses) only get logged for a sample of the invocations, and every
+invocation ends with a one-line summary of what it did.
+
+Metrics are logged too, in the Embedded Metric Format. CloudWatch pulls
+them out of the log lines on it's own, so publishing one never waits on
+(or gets throttled by) a PutMetricData call.
+
+Configured per function, with environment variables:
+    - LOG_LEVEL: DEBUG, INFO, WARNING, or ERROR. (Default=INFO)
+    - LOG_VERBOSE_SAMPLE_RATE: 0-1, how many invocations log their
+        verbose payloads. DEBUG always logs them. (Default=0)
+
+Lambda only runs one invocation at a time per environment, so the
+per-invocation state here isn't split up by thread.
+"""
+
+import os
+import json
+import time
+import random
+import functools
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+
+class Logger:
+    """ Writes one JSON object per line, and summarizes each invocation """
+    def __init__(self):
+        self.level = os.environ.get("LOG_LEVEL", "INFO").upper()
+        if self.level not in LEVELS:
+            raise RuntimeError(f"Invalid LOG_LEVEL: '{self.level}'. Must be one of: {list(LEVELS)}.")
+        self.sample_rate = float(os.environ.get("LOG_VERBOSE_SAMPLE_RATE", "0"))
+        # Reset at the start of each invocation:
+        self.sampled = False
+        self.keys = {}
+        self.summary = {}
+
+    def enabled(self, level: str) -> bool:
+        """ If a line at this level would be logged """
+        return LEVELS[level] >= LEVELS[self.level]
+
+    def log(self, level: str, message: str, **fields) -> None:
+        """ Log one line, if it's at or above LOG_LEVEL """
+        # Check first, so nothing is serialized for lines that are thrown away:
+        if self.enabled(level):
+            print(json.dumps({"Level": level, "Message": message, **self.keys, **fields}, default=str))
+
+    def debug(self, message: str, **fields) -> None:
+        """ Log at DEBUG """
+        self.log("DEBUG", message, **fields)
+
+    def info(self, message: str, **fields) -> None:
+        """ Log at INFO """
+        self.log("INFO", message, **fields)
+
+    def warning(self, message: str, **fields) -> None:
+        """ Log at WARNING """
+        self.log("WARNING", message, **fields)
+
+    def error(self, message: str, **fields) -> None:
+        """ Log at ERROR """
+        self.log("ERROR", message, **fields)
+
+    def verbose(self, message: str, **fields) -> None:
+        """ Log a big payload, but only if this invocation was sampled (or at DEBUG) """
+        if self.sampled or self.enabled("DEBUG"):
+            print(json.dumps({"Level": "VERBOSE", "Message": message, **self.keys, **fields}, default=str))
+
+    def put_metrics(self, namespace: str, metric_data: list) -> None:
+        """
+        Publish metrics as Embedded Metric Format log lines. Always logged, no matter the LOG_LEVEL.
+            (Takes the same 'MetricData' list boto3's `put_metric_data` does)
+        """
+        # https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+        lines = []
+        for datum in metric_data:
+            dimensions = {d["Name"]: d["Value"] for d in datum.get("Dimensions", [])}
+            timestamp = datum["Timestamp"].timestamp() if "Timestamp" in datum else time.time()
+            # Every metric in a line shares it's dimensions and time, and each name can only be in it once:
+            line = next((
+                line for line in lines
+                if line["Dimensions"] == dimensions and line["Timestamp"] == timestamp and datum["MetricName"] not in line["Values"]
+            ), None)
+            if line is None:
+                line = {"Dimensions": dimensions, "Timestamp": timestamp, "Metrics": [], "Values": {}}
+                lines.append(line)
+            line["Metrics"].append({"Name": datum["MetricName"], "Unit": datum.get("Unit", "None")})
+            # A list of 'Values' works the same as in PutMetricData. (Each one is a sample):
+            line["Values"][datum["MetricName"]] = datum["Values"] if "Values" in datum else datum["Value"]
+        for line in lines:
+            print(json.dumps({
+                "_aws": {
+                    "Timestamp": round(line["Timestamp"] * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": namespace,
+                        "Dimensions": [list(line["Dimensions"])],
+                        "Metrics": line["Metrics"],
+                    }],
+                },
+                **self.keys,
+                **line["Dimensions"],
+                **line["Values"],
+            }, default=str))
+
+    def append_keys(self, **keys) -> None:
+        """ Add keys to every line after this, and the summary. (i.e the wake's CorrelationId) """
+        self.keys.update(keys)
+
+    def add_summary(self, **fields) -> None:
+        """ Add fields to this invocation's summary line """
+        self.summary.update(fields)
+
+    def handler(self, func):
+        """
+        Decorator for the lambda_handler. Samples the invocation, logs the event
+        if it's sampled, and logs the summary once it finishes. (Even if it fails)
+        """
+        @functools.wraps(func)
+        def wrapper(event, context):
+            self.sampled = random.random() < self.sample_rate
+            self.keys = {}
+            self.summary = {}
+            self.verbose("Event", Event=event, Context=context)
+            status = "Success"
+            start_time = time.perf_counter()
+            try:
+                return func(event, context)
+            except SystemExit as e:
+                # Exiting early on purpose, isn't an error:
+                status = "Exited" if not e.code else "Error"
+                raise
+            except Exception as e:
+                status = "Error"
+                self.add_summary(Error=repr(e))
+                raise
+            finally:
+                summary = {
+                    "Status": status,
+                    "DurationMs": round((time.perf_counter() - start_time) * 1000, 1),
+                    "Sampled": self.sampled,
+                    **self.summary,
+                }
+                if isinstance(event, dict) and "detail-type" in event:
+                    summary["DetailType"] = event["detail-type"]
+                self.log("ERROR" if status == "Error" else "INFO", "Invocation", **summary)
+        return wrapper
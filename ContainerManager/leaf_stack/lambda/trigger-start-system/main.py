@@ -1,57 +1,115 @@
-
-"""
-Lambda code for starting the system when someone tries to connect.
-"""
-
-import os
-import json
-
-import boto3
-from botocore.config import Config
-
-required_vars = [
-    "ASG_NAME",
-    "MANAGER_STACK_REGION",
-    # For not letting the system spin down if someone is trying to connect:
-    "METRIC_NAMESPACE",
-    "METRIC_NAME",
-    "METRIC_THRESHOLD",
-    "METRIC_UNIT",
-    "METRIC_DIMENSIONS",
-]
-missing_vars = [x for x in required_vars if not os.environ.get(x)]
-if any(missing_vars):
-    raise RuntimeError(f"Missing environment vars: [{', '.join(missing_vars)}]")
-
-# Boto3 Clients:
-config = Config(region_name=os.environ["MANAGER_STACK_REGION"])
-cloudwatch_client = boto3.client('cloudwatch', config=config)
-asg_client = boto3.client('autoscaling', config=config)
-
-def lambda_handler(event, context):
-    """ Main function of the lambda. """
-    print(json.dumps({"Event": event, "Context": context}, default=str))
-
-    ### Let the metric know someone is trying to connect, to stop it
-    ### from alarming and spinning down the system:
-    ###   (Also if the system is in alarm, this resets it so it can spin down again)
-    dimensions_input = json.loads(os.environ["METRIC_DIMENSIONS"])
-    # Change it to the format boto3 cloudwatch wants:
-    dimension_map = [{"Name": k, "Value": v} for k, v in dimensions_input.items()]
-    cloudwatch_client.put_metric_data(
-        Namespace=os.environ["METRIC_NAMESPACE"],
-        MetricData=[{
-            'MetricName': os.environ["METRIC_NAME"],
-            'Dimensions': dimension_map,
-            'Unit': os.environ["METRIC_UNIT"],
-            # One greater than the threshold, to make sure the alarm doesn't error:
-            'Value': 1+int(os.environ["METRIC_THRESHOLD"]),
-        }],
-    )
-
-    ## Spin up the instance. The instance-StateChange-hook will do the rest:
-    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/autoscaling.html#AutoScaling.Client.update_auto_scaling_group
-    asg_client.update_auto_scaling_group(
-        AutoScalingGroupName=os.environ["ASG_NAME"],
-        DesiredCapacity=1,
-    )
+
+"""
+Lambda code for starting the system when someone tries to connect.
+"""
+
+import os
+import json
+import gzip
+import time
+import base64
+
+import boto3
+from botocore.config import Config
+# From the logging layer:
+from structured_logging import Logger
+
+required_vars = [
+    "ASG_NAME",
+    "MANAGER_STACK_REGION",
+    # For placing the task as soon as the instance registers:
+    "ECS_CLUSTER_NAME",
+    "ECS_SERVICE_NAME",
+    # For tracing how long the player waits, starting from their DNS query:
+    "WAKE_TRACE_PARAMETER",
+    # For not letting the system spin down if someone is trying to connect:
+    "METRIC_NAMESPACE",
+    "METRIC_NAME",
+    "METRIC_THRESHOLD",
+    "METRIC_UNIT",
+    "METRIC_DIMENSIONS",
+]
+missing_vars = [x for x in required_vars if not os.environ.get(x)]
+if any(missing_vars):
+    raise RuntimeError(f"Missing environment vars: [{', '.join(missing_vars)}]")
+
+logger = Logger()
+
+# Boto3 Clients:
+config = Config(region_name=os.environ["MANAGER_STACK_REGION"])
+cloudwatch_client = boto3.client('cloudwatch', config=config)
+asg_client = boto3.client('autoscaling', config=config)
+ecs_client = boto3.client('ecs', config=config)
+ssm_client = boto3.client('ssm', config=config)
+
+@logger.handler
+def lambda_handler(event, _context):
+    """ Main function of the lambda. """
+    trigger_time = time.time()
+
+    ### Let the metric know someone is trying to connect, to stop it
+    ### from alarming and spinning down the system:
+    ###   (Also if the system is in alarm, this resets it so it can spin down again)
+    dimensions_input = json.loads(os.environ["METRIC_DIMENSIONS"])
+    # Change it to the format boto3 cloudwatch wants:
+    dimension_map = [{"Name": k, "Value": v} for k, v in dimensions_input.items()]
+    cloudwatch_client.put_metric_data(
+        Namespace=os.environ["METRIC_NAMESPACE"],
+        MetricData=[{
+            'MetricName': os.environ["METRIC_NAME"],
+            'Dimensions': dimension_map,
+            'Unit': os.environ["METRIC_UNIT"],
+            # One greater than the threshold, to make sure the alarm doesn't error:
+            'Value': 1+int(os.environ["METRIC_THRESHOLD"]),
+        }],
+    )
+
+    ## Spin up the instance. The instance-StateChange-hook will do the rest:
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/autoscaling.html#AutoScaling.Client.update_auto_scaling_group
+    asg_client.update_auto_scaling_group(
+        AutoScalingGroupName=os.environ["ASG_NAME"],
+        DesiredCapacity=1,
+    )
+
+    ## Ask for the task NOW too, instead of waiting for the instance to finish launching. ECS
+    ## will place it the moment the instance registers to the cluster:
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ecs/client/update_service.html
+    ecs_client.update_service(
+        cluster=os.environ["ECS_CLUSTER_NAME"],
+        service=os.environ["ECS_SERVICE_NAME"],
+        desiredCount=1,
+    )
+
+    ## Last, since nothing above should wait on it:
+    start_wake_trace(event, trigger_time)
+
+
+def start_wake_trace(event: dict, trigger_time: float) -> None:
+    """ Start the trace for this wake. Only the first DNS query of a wake does anything """
+    ## The DNS query logs, from the subscription filter:
+    # https://docs.aws.amazon.com/AmazonCloudWatch/latest/logs/SubscriptionFilters.html#LambdaFunctionExample
+    log_data = json.loads(gzip.decompress(base64.b64decode(event["awslogs"]["data"])))
+    first_query = min(log_data["logEvents"], key=lambda log_event: log_event["timestamp"])
+    trace = {
+        # Follow this ID in each lambda's logs:
+        "CorrelationId": first_query["id"],
+        "DnsQueryTime": first_query["timestamp"] / 1000,
+        "TriggerTime": trigger_time,
+    }
+    ## Only starts one if there isn't one already. (The WakeTrace stack owns the parameter, and the
+    ## AsgStateChangeHook empties it when spinning down, so the next wake starts a new one):
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ssm/client/get_parameter.html
+    current_trace = json.loads(ssm_client.get_parameter(Name=os.environ["WAKE_TRACE_PARAMETER"])["Parameter"]["Value"])
+    if current_trace:
+        # Already waking up, or already up:
+        logger.add_summary(StartedWake=False)
+        return
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ssm/client/put_parameter.html
+    ssm_client.put_parameter(
+        Name=os.environ["WAKE_TRACE_PARAMETER"],
+        Value=json.dumps(trace),
+        Type="String",
+        Overwrite=True,
+    )
+    logger.append_keys(CorrelationId=trace["CorrelationId"])
+    logger.add_summary(StartedWake=True, WakeTrace=trace)
@@ -0,0 +1,146 @@
+"""
+Lambda code for finishing the trace of a wake, once the
+container is running. It publishes how long each stage
+of spinning up took, and how long the player waited.
+
+With a readiness check, the player can't play until it passes. So
+this only publishes the stages, and the AsgStateChangeHook finishes
+the trace (and publishes how long the player waited) once it does.
+"""
+
+import os
+import json
+from datetime import datetime
+
+import boto3
+# From the logging layer:
+from structured_logging import Logger
+
+required_vars = [
+    "WAKE_TRACE_PARAMETER",
+    "METRIC_NAMESPACE",
+    "METRIC_NAME_TIME_TO_PLAYABLE",
+    "METRIC_NAME_WAKE_STAGE",
+    "METRIC_DIMENSIONS",
+]
+missing_vars = [x for x in required_vars if not os.environ.get(x)]
+if any(missing_vars):
+    raise RuntimeError(f"Missing environment vars: [{', '.join(missing_vars)}]")
+
+logger = Logger()
+
+# Optional. If set, the AsgStateChangeHook finishes the trace once the container passes it's readiness check:
+READINESS_CHECK = os.environ.get("READINESS_CHECK") == "True"
+
+# Boto3 Clients:
+ssm_client = boto3.client('ssm')               # Used for reading/finishing the trace
+ecs_client = boto3.client('ecs')               # Used for when the instance registered
+ec2_client = boto3.client('ec2')               # Used for when the instance launched
+
+# Load the metric dimension map, in the format boto3 cloudwatch wants:
+dimension_map = [{"Name": k, "Value": v} for k, v in json.loads(os.environ["METRIC_DIMENSIONS"]).items()]
+
+
+@logger.handler
+def lambda_handler(event: dict, _context: dict) -> None:
+    """ Main function of the lambda. """
+    trace = get_wake_trace()
+    if trace is None:
+        logger.info("No wake in progress (Was the system started some other way?). Nothing to trace.")
+        return
+    logger.append_keys(CorrelationId=trace["CorrelationId"])
+    if trace.get("Completed") or trace.get("Stages"):
+        logger.info("Wake was already traced (Did the container restart?). Skipping.")
+        return
+
+    task = event["detail"]
+    launched_at, registered_at = get_instance_times(task["clusterArn"], task["containerInstanceArn"])
+    ## When each stage of the wake ENDED, in order. The stage is named by what it was waiting on:
+    timeline = [
+        ("Trigger", trace["TriggerTime"]),
+        ("InstanceLaunch", launched_at),
+        ("InstanceRegister", registered_at),
+        ("TaskPlacement", parse_time(task.get("pullStartedAt"))),
+        ("ImagePull", parse_time(task.get("pullStoppedAt"))),
+        ("ContainerStart", parse_time(task["startedAt"])),
+    ]
+    stages = get_stage_durations(trace["DnsQueryTime"], timeline)
+    logger.add_summary(TaskArn=task["taskArn"], Stages=stages)
+    metric_data = [{
+        "MetricName": os.environ["METRIC_NAME_WAKE_STAGE"],
+        "Dimensions": dimension_map + [{"Name": "Stage", "Value": stage}],
+        "Unit": "Seconds",
+        "Value": seconds,
+    } for stage, seconds in stages.items()]
+    trace["Stages"] = stages
+
+    ## Without a readiness check, the player can play as soon as the container's running:
+    if not READINESS_CHECK:
+        time_to_playable = parse_time(task["startedAt"]) - trace["DnsQueryTime"]
+        logger.add_summary(TimeToPlayable=round(time_to_playable, 3))
+        metric_data.append({
+            "MetricName": os.environ["METRIC_NAME_TIME_TO_PLAYABLE"],
+            "Dimensions": dimension_map,
+            "Unit": "Seconds",
+            "Value": time_to_playable,
+        })
+        # Mark it done, so a restarted container doesn't count as another wake:
+        trace.update({"Completed": True, "TimeToPlayable": time_to_playable})
+
+    ## Publish everything at the time the container started:
+    timestamp = datetime.fromtimestamp(parse_time(task["startedAt"]))
+    # (Through the logs, see `structured_logging`):
+    logger.put_metrics(
+        namespace=os.environ["METRIC_NAMESPACE"],
+        metric_data=[{**metric, "Timestamp": timestamp} for metric in metric_data],
+    )
+
+    ## Save the stages, so a restarted container doesn't count as another wake:
+    ssm_client.put_parameter(
+        Name=os.environ["WAKE_TRACE_PARAMETER"],
+        Value=json.dumps(trace),
+        Type="String",
+        Overwrite=True,
+    )
+
+
+def get_wake_trace() -> dict | None:
+    """ Get the trace the trigger lambda started, if there is one """
+    parameter = ssm_client.get_parameter(Name=os.environ["WAKE_TRACE_PARAMETER"])["Parameter"]
+    # It's empty between wakes:
+    return json.loads(parameter["Value"]) or None
+
+
+def get_instance_times(cluster_arn: str, container_instance_arn: str) -> tuple[float, float]:
+    """ Get when the instance launched, and when it registered to the cluster """
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ecs/client/describe_container_instances.html
+    container_instance = ecs_client.describe_container_instances(
+        cluster=cluster_arn,
+        containerInstances=[container_instance_arn],
+    )["containerInstances"][0]
+    # Since you're supplying an ID, there should always be exactly one:
+    instance_details = ec2_client.describe_instances(
+        InstanceIds=[container_instance["ec2InstanceId"]],
+    )["Reservations"][0]["Instances"][0]
+    return instance_details["LaunchTime"].timestamp(), container_instance["registeredAt"].timestamp()
+
+
+def get_stage_durations(start_time: float, timeline: list[tuple[str, float | None]]) -> dict:
+    """ Turn when each stage ended, into how long each one took """
+    stages = {}
+    previous_time = start_time
+    for stage, ended_at in timeline:
+        # If it didn't happen as part of this wake, skip it. (i.e the instance came from a warm
+        # pool and launched long ago, or the image was already cached and never pulled):
+        if ended_at is None or ended_at < previous_time:
+            continue
+        stages[stage] = round(ended_at - previous_time, 3)
+        previous_time = ended_at
+    return stages
+
+
+def parse_time(timestamp: str | None) -> float | None:
+    """ Convert the ECS event's time (i.e '2024-01-01T00:00:00.000Z') to epoch seconds """
+    if timestamp is None:
+        return None
+    return datetime.fromisoformat(timestamp).timestamp()
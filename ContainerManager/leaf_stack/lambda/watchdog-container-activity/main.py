@@ -1,15 +1,24 @@
 
 """
 Function code for watching the container for connections.
-Needs to support BOTH TCP and UDP protocols. It pushes
-the info to CloudWatch metrics.
+Needs to support BOTH TCP and UDP protocols, or asking the
+game itself (Query). It pushes the info to CloudWatch metrics.
+With DirectShutdown, it also spins the container down itself
+once it's been idle long enough, and nobody's trying to connect.
 """
 
 import os
 import json
+import time
+from collections import deque
+from datetime import datetime, timezone
 
 import boto3
 import botocore
+# From the logging layer:
+from structured_logging import Logger
+
+from query_protocols import PROTOCOLS, QueryError
 
 ## Check for required environment variables:
 required_vars = [
@@ -36,17 +45,40 @@ if connection_type == "TCP":
     assert os.environ.get("TCP_PORT"), "You must declare which port to check on for TCP connections! (TCP_PORT)"
 elif connection_type == "UDP":
     pass
+elif connection_type == "QUERY":
+    assert os.environ.get("QUERY_PORT"), "You must declare which port to query! (QUERY_PORT)"
+    assert os.environ.get("QUERY_PROTOCOL") in PROTOCOLS, f"QUERY_PROTOCOL must be one of: {list(PROTOCOLS)}."
 else:
     raise RuntimeError(f"Invalid connection type! Not yet supported: '{connection_type}'.")
 
+# Optional. If set, spin down after this many idle samples in a row, without waiting on the alarm:
+direct_shutdown_samples = int(os.environ.get("DIRECT_SHUTDOWN_SAMPLES", "0"))
+if direct_shutdown_samples:
+    assert os.environ.get("ACTIVITY_ALARM_NAME"), "You must declare which alarm spins it down! (ACTIVITY_ALARM_NAME)"
+    assert os.environ.get("METRIC_THRESHOLD"), "You must declare what counts as idle! (METRIC_THRESHOLD)"
+# The rule runs every minute. Any longer between samples, and one was missed:
+MAX_SAMPLE_GAP_SECONDS = 90
+
 
+logger = Logger()
 
 ### Boto3 Clients/Waiters:
 #    Can get cached if function is reused, keep clients that are *always* hit here:
 asg_client = boto3.client('autoscaling')
-ssm_client = boto3.client('ssm')
-ssm_command_waiter = ssm_client.get_waiter('command_executed')
-cloudwatch_client = boto3.client('cloudwatch')
+# A Query never touches the host, everything else counts connections on it with Run Command:
+ssm_client = boto3.client('ssm') if connection_type != "QUERY" else None
+ssm_command_waiter = ssm_client.get_waiter('command_executed') if connection_type != "QUERY" else None
+# Only a Query needs the instance's IP:
+ec2_client = boto3.client('ec2') if connection_type == "QUERY" else None
+# Only direct shutdown sets the alarm itself:
+cloudwatch_client = boto3.client('cloudwatch') if direct_shutdown_samples > 0 else None
+
+## The last few samples, as (time, instance_id, idle). Only lives as long as this
+##   lambda stays warm, if it's cold the alarm still spins it down like normal:
+idle_window = deque(maxlen=max(direct_shutdown_samples, 1))
+## Instances whose game answered (or passed it's readiness check). Until then, the game is
+##   still starting up, and nothing it reports counts towards the window:
+ready_instances = set()
 
 ### Dimension map for cloudwatch:
 # Load the metric dimension map:
@@ -55,29 +87,123 @@ dimensions_input = json.loads(os.environ["METRIC_DIMENSIONS"])
 dimension_map = [{"Name": k, "Value": v} for k, v in dimensions_input.items()]
 
 
-def lambda_handler(event, context) -> None:
+@logger.handler
+def lambda_handler(_event, _context) -> None:
     """ Main function of the lambda. """
-    print(json.dumps({"Event": event, "Context": context}, default=str))
-
     instance_id = get_acg_instance_id()
+    if connection_type == "QUERY":
+        # Ask the game straight from here, no SSM round trip. (No SSH count either, that's on the host):
+        instance_ip = get_instance_ip(instance_id)
+        player_count = query_player_count(instance_ip)
+        # Still starting up, or the reply got lost. Either way, nobody can be playing on it right now.
+        #   (Same as TCP seeing 0 connections. The alarm still needs MinutesWithoutConnections in a row)
+        activity_count = player_count or 0
+        push_to_cloudwatch_metrics({os.environ["METRIC_NAME_ACTIVITY_COUNT"]: activity_count})
+        logger.add_summary(InstanceId=instance_id, InstanceIp=instance_ip, ActivityCount=activity_count)
+        if direct_shutdown_samples:
+            check_idle_window(instance_id, activity_count=activity_count, num_ssh_conn=0, ready=player_count is not None)
+        return
     ssm_commands = build_ssm_command_script()
     connections = get_instance_connections(instance_id, ssm_commands)
 
-    push_to_cloudwatch_metric(os.environ["METRIC_NAME_ACTIVITY_COUNT"], connections["activity_count"])
-    push_to_cloudwatch_metric(os.environ["METRIC_NAME_SSH_CONNECTIONS"], connections["num_ssh_conn"])
+    push_to_cloudwatch_metrics({
+        os.environ["METRIC_NAME_ACTIVITY_COUNT"]: connections["activity_count"],
+        os.environ["METRIC_NAME_SSH_CONNECTIONS"]: connections["num_ssh_conn"],
+    })
+    logger.add_summary(InstanceId=instance_id, ActivityCount=connections["activity_count"], SshConnections=connections["num_ssh_conn"], Health=connections["health"])
+    if direct_shutdown_samples:
+        # No readiness check is "none", and there's nothing to wait on:
+        ready = connections["health"] in ["healthy", "none"]
+        check_idle_window(instance_id, activity_count=connections["activity_count"], num_ssh_conn=connections["num_ssh_conn"], ready=ready)
+
+def check_idle_window(instance_id: str, activity_count: int, num_ssh_conn: int, ready: bool) -> None:
+    """
+    Add this sample to the window, and spin down if it's idle all the way through.
+
+    Same as the alarm's `ssh > 0 OR activity > Threshold`, just without waiting for
+    CloudWatch to ingest the metrics and evaluate the alarm. Samples only count once
+    the game is ready, and the trigger's DNS keepalive still holds it up like it does the alarm.
+    """
+    now = time.time()
+    if ready:
+        ready_instances.add(instance_id)
+    # A new instance, or a missed sample, and it's not N in a row anymore:
+    if idle_window and (idle_window[-1][1] != instance_id or now - idle_window[-1][0] > MAX_SAMPLE_GAP_SECONDS):
+        idle_window.clear()
+    if instance_id not in ready_instances:
+        # Still starting up. Nobody can be on it yet, so that says nothing about if it's idle:
+        logger.add_summary(IdleSamples=0, WaitingOnReady=True)
+        return
+    idle = num_ssh_conn == 0 and activity_count <= int(os.environ["METRIC_THRESHOLD"])
+    idle_window.append((now, instance_id, idle))
+    logger.add_summary(IdleSamples=sum(sample[2] for sample in idle_window))
+    if len(idle_window) < direct_shutdown_samples or not all(sample[2] for sample in idle_window):
+        return
+    ## Someone looked up the domain since the window started (The trigger lambda pushes 'Threshold + 1'
+    ##   to the same metric). They're trying to connect, so start the window over:
+    if someone_connecting(since=idle_window[0][0], until=now):
+        logger.info("Idle, but someone's trying to connect. Starting the window over.", InstanceId=instance_id)
+        idle_window.clear()
+        return
+    ## Put the alarm into ALARM ourselves. Same scaling action, hold, and events as if it went off
+    ##   on it's own. (It goes back to it's real state the next time CloudWatch evaluates it):
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch/client/set_alarm_state.html
+    logger.info("Idle for every sample in the window, spinning down.", InstanceId=instance_id, IdleSamples=len(idle_window))
+    cloudwatch_client.set_alarm_state(
+        AlarmName=os.environ["ACTIVITY_ALARM_NAME"],
+        StateValue="ALARM",
+        StateReason=f"Watchdog: {len(idle_window)} idle samples in a row, on '{instance_id}'.",
+    )
+    # Start over, it doesn't have to keep setting it:
+    idle_window.clear()
+
+def someone_connecting(since: float, until: float) -> bool:
+    """ If the activity metric went over the threshold in this time. (Only the trigger lambda does that while it's idle) """
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch/client/get_metric_data.html
+    results = cloudwatch_client.get_metric_data(
+        MetricDataQueries=[{
+            "Id": "activity",
+            "MetricStat": {
+                "Metric": {"Namespace": os.environ["METRIC_NAMESPACE"], "MetricName": os.environ["METRIC_NAME_ACTIVITY_COUNT"], "Dimensions": dimension_map},
+                "Period": 60,
+                "Stat": "Maximum",
+            },
+        }],
+        StartTime=datetime.fromtimestamp(since, tz=timezone.utc),
+        EndTime=datetime.fromtimestamp(until, tz=timezone.utc),
+    )["MetricDataResults"]
+    return any(value > int(os.environ["METRIC_THRESHOLD"]) for value in results[0]["Values"])
 
-def push_to_cloudwatch_metric(metric_name: str, value: int) -> None:
-    """ Pushes a metric to cloudwatch. """
-    cloudwatch_client.put_metric_data(
-        Namespace=os.environ["METRIC_NAMESPACE"],
-        MetricData=[{
+def push_to_cloudwatch_metrics(metrics: dict) -> None:
+    """ Pushes the metrics to cloudwatch, through the logs. (One line, no API call) """
+    logger.put_metrics(
+        namespace=os.environ["METRIC_NAMESPACE"],
+        metric_data=[{
             'MetricName': metric_name,
             'Dimensions': dimension_map,
             'Unit': os.environ["METRIC_UNIT"],
             'Value': value,
-        }],
+        } for metric_name, value in metrics.items()],
     )
 
+def get_instance_ip(instance_id: str) -> str:
+    """ The instance's public IP. (Where the players, and the query, connect to) """
+    # Since you're supplying an ID, there should always be exactly one:
+    instance_details = ec2_client.describe_instances(InstanceIds=[instance_id])["Reservations"][0]["Instances"][0]
+    if "PublicIpAddress" not in instance_details:
+        raise RuntimeError(f"Instance '{instance_id}' has no public IP.")
+    return instance_details["PublicIpAddress"]
+
+def query_player_count(ip: str) -> int | None:
+    """ Ask the game how many players are on. None if it doesn't answer """
+    query_protocol = os.environ["QUERY_PROTOCOL"]
+    port = int(os.environ["QUERY_PORT"])
+    try:
+        return PROTOCOLS[query_protocol](ip, port, int(os.environ.get("QUERY_TIMEOUT_MS", "2000")) / 1000)
+    except (OSError, QueryError) as e:
+        logger.warning("Server didn't answer the query. Counting it as 0 players.", Protocol=query_protocol, Ip=ip, Port=port, Error=repr(e))
+        return None
+
 def build_ssm_command_script() -> list:
     """ Builds the script that will be run on the instance. """
     ssm_command = []
@@ -89,6 +215,8 @@ def build_ssm_command_script() -> list:
         ## If the task hasn't started yet, the container won't exist, and container_id will be blank:
         'if test -z "$container_id"; then echo "Task has not started yet. Exiting."; exit -1; fi',
         'docker_pid=$(docker inspect -f "{{.State.Pid}}" $container_id)',
+        ## The readiness check's status. ('none' if the container doesn't have one):
+        'health=$(docker inspect -f "{{if .State.Health}}{{.State.Health.Status}}{{else}}none{{end}}" $container_id)',
     ])
     ## Get the number of Host SSH Connections, don't spin down if someone is SSH-ed in:
     #       (Count's SFTP connections too, someone might be copying stuff in/out)
@@ -113,7 +241,7 @@ def build_ssm_command_script() -> list:
         ])
     ## Finally Save the info as json:
     ssm_command.extend([
-        'jq --null-input \'$ARGS.named\' --argjson activity_count "$activity_count" --argjson num_ssh_conn "$num_ssh_conn"',
+        'jq --null-input \'$ARGS.named\' --argjson activity_count "$activity_count" --argjson num_ssh_conn "$num_ssh_conn" --arg health "$health"',
     ])
     return ssm_command
 
@@ -126,10 +254,11 @@ def get_instance_connections(instance_id: str, ssm_commands: list) -> dict:
         DocumentName="AWS-RunShellScript",
         Parameters={ 'commands': ssm_commands }
     )
+    command_id = response['Command']['CommandId']
     # You get no feedback if the command fails. You can use this to look up the error
     #    in the console, but I couldn't find a way to get output there either:
-    print(json.dumps(response, default=str))
-    command_id = response['Command']['CommandId']
+    logger.add_summary(CommandId=command_id)
+    logger.verbose("SendCommand", Response=response)
     try:
         ## Wait for it:
         # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ssm/waiter/CommandExecuted.html
@@ -154,7 +283,7 @@ def get_instance_connections(instance_id: str, ssm_commands: list) -> dict:
         CommandId=command_id,
         InstanceId=instance_id,
     )
-    print(json.dumps(output, default=str))
+    logger.verbose("GetCommandInvocation", Output=output)
 
     try:
         connections = json.loads(output['StandardOutputContent'])
@@ -167,8 +296,8 @@ def get_instance_connections(instance_id: str, ssm_commands: list) -> dict:
     # {
     #     "activity_count": int,
     #     "num_ssh_conn": int,
+    #     "health": "starting" | "healthy" | "unhealthy" | "none",
     # }
-    print(json.dumps(connections, default=str))
     return connections
 
 def get_acg_instance_id() -> str:
@@ -178,5 +307,4 @@ def get_acg_instance_id() -> str:
     # There should only be one running instance, if there's more/less, something is wrong:
     # if lambda errors too many times, the cloudwatch alarm should spin things down anyways.
     assert len(running_instances) == 1, f"Expected 1 running instance, got '{len(running_instances)}'."
-    print(f"Found one instance: {running_instances[0]['InstanceId']}")
     return running_instances[0]['InstanceId']
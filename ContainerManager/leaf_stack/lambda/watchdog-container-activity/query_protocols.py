@@ -0,0 +1,151 @@
+"""
+Asks the game server itself how many players are on, with the
+game's own query protocol. (No SSM, nothing runs on the instance).
+
+Each protocol is a function `(ip, port, timeout_seconds) -> players`,
+added to `PROTOCOLS` under the name the config uses. Network errors
+are left as `OSError`, and anything wrong with the reply is a `QueryError`.
+"""
+
+import json
+import socket
+import struct
+
+
+class QueryError(Exception):
+    """ The server answered, but not with something we understand """
+
+
+#############################
+## Minecraft Server List Ping
+#############################
+# https://minecraft.wiki/w/Java_Edition_protocol/Server_List_Ping
+
+def _pack_varint(value: int) -> bytes:
+    """ Minecraft's VarInt. (7 bits per byte, negatives as 32-bit two's complement) """
+    value &= 0xFFFFFFFF
+    packed = b""
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            packed += bytes([byte | 0x80])
+        else:
+            return packed + bytes([byte])
+
+def _read_exactly(stream, length: int) -> bytes:
+    """ Read 'length' bytes, or fail if the server hangs up first """
+    data = stream.read(length)
+    if len(data) != length:
+        raise QueryError(f"Connection closed after {len(data)} of {length} bytes.")
+    return data
+
+def _read_varint(stream) -> int:
+    """ Read one VarInt off the connection """
+    value = 0
+    # A VarInt is never more than 5 bytes:
+    for position in range(5):
+        byte = _read_exactly(stream, 1)[0]
+        value |= (byte & 0x7F) << (7 * position)
+        if not byte & 0x80:
+            return value
+    raise QueryError("VarInt is too big.")
+
+def _packet(packet_id: int, payload: bytes=b"") -> bytes:
+    """ A packet, prefixed with it's length """
+    data = _pack_varint(packet_id) + payload
+    return _pack_varint(len(data)) + data
+
+def minecraft_slp(ip: str, port: int, timeout: float) -> int:
+    """ Players online, from the Java Edition status ping """
+    handshake = b"".join([
+        # -1: "Whatever version you are". The status reply doesn't depend on it:
+        _pack_varint(-1),
+        _pack_varint(len(ip.encode())) + ip.encode(),
+        struct.pack(">H", port),
+        # Next state, 1 = Status:
+        _pack_varint(1),
+    ])
+    with socket.create_connection((ip, port), timeout=timeout) as sock:
+        # Handshake, then the status request:
+        sock.sendall(_packet(0x00, handshake) + _packet(0x00))
+        with sock.makefile("rb") as stream:
+            # Packet length, then id:
+            _read_varint(stream)
+            packet_id = _read_varint(stream)
+            if packet_id != 0x00:
+                raise QueryError(f"Expected a status response (0x00), got packet '{packet_id:#04x}'.")
+            status = _read_exactly(stream, _read_varint(stream))
+    try:
+        return int(json.loads(status)["players"]["online"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise QueryError(f"Status response has no player count: {status[:200]!r}") from e
+
+
+#####################
+## Steam Server Query
+#####################
+# https://developer.valvesoftware.com/wiki/Server_queries
+
+A2S_HEADER = b"\xFF\xFF\xFF\xFF"
+A2S_SPLIT_HEADER = b"\xFE\xFF\xFF\xFF"
+S2C_CHALLENGE = 0x41
+A2S_INFO_REQUEST = A2S_HEADER + b"TSource Engine Query\x00"
+A2S_INFO_RESPONSE = 0x49
+A2S_PLAYER_REQUEST = A2S_HEADER + b"U"
+A2S_PLAYER_RESPONSE = 0x44
+
+def _a2s_receive(sock: socket.socket) -> bytes:
+    """ One reply, without the header """
+    data, _ = sock.recvfrom(4096)
+    # Only the player *list* gets big enough to be split, and the count is before it.
+    # Not worth putting the pieces back together for:
+    if data.startswith(A2S_SPLIT_HEADER):
+        raise QueryError("Split (multi-packet) responses aren't supported.")
+    if not data.startswith(A2S_HEADER) or len(data) < 5:
+        raise QueryError(f"Not an A2S response: {data[:20]!r}")
+    return data[4:]
+
+def _a2s_request(ip: str, port: int, timeout: float, request: bytes, challenge: bytes=b"") -> bytes:
+    """ Send the request, and answer the challenge if the server sends one first """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.sendto(request + challenge, (ip, port))
+        response = _a2s_receive(sock)
+        # Ask again with the challenge it gave us. (Stops the query being used for reflection attacks):
+        if response[0] == S2C_CHALLENGE:
+            sock.sendto(request + response[1:5], (ip, port))
+            response = _a2s_receive(sock)
+    return response
+
+def a2s_info(ip: str, port: int, timeout: float) -> int:
+    """ Players online (not counting bots), from A2S_INFO """
+    response = _a2s_request(ip, port, timeout, A2S_INFO_REQUEST)
+    if response[0] != A2S_INFO_RESPONSE:
+        raise QueryError(f"Expected an A2S_INFO response ({A2S_INFO_RESPONSE:#04x}), got '{response[0]:#04x}'.")
+    try:
+        # Skip the header and protocol bytes, then the name, map, folder, and game strings:
+        offset = 2
+        for _ in range(4):
+            offset = response.index(b"\x00", offset) + 1
+        # Skip the Steam app ID (short), then: players, max players, bots:
+        players, _, bots = response[offset + 2:offset + 5]
+    except ValueError as e:
+        raise QueryError(f"A2S_INFO response is cut short: {response[:200]!r}") from e
+    return players - bots
+
+def a2s_player(ip: str, port: int, timeout: float) -> int:
+    """ Players online, from A2S_PLAYER. (Some servers leave the count in A2S_INFO at 0) """
+    # This one always needs a challenge. Sending -1 asks for one:
+    response = _a2s_request(ip, port, timeout, A2S_PLAYER_REQUEST, challenge=A2S_HEADER)
+    if response[0] != A2S_PLAYER_RESPONSE or len(response) < 2:
+        raise QueryError(f"Expected an A2S_PLAYER response ({A2S_PLAYER_RESPONSE:#04x}), got '{response[0]:#04x}'.")
+    return response[1]
+
+
+## The names here are what `Watchdog.Query.Protocol` can be:
+PROTOCOLS = {
+    "MINECRAFT_SLP": minecraft_slp,
+    "A2S_INFO": a2s_info,
+    "A2S_PLAYER": a2s_player,
+}
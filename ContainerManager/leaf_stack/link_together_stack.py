@@ -1,153 +1,178 @@
-
-"""
-This Links together the Main Stack, and Domain Stack.
-
-Needed since they're in different regions, and we need
-    to know about objects from both.
-"""
-
-import json
-
-from aws_cdk import (
-    Stack,
-    Duration,
-    RemovalPolicy,
-    aws_iam as iam,
-    aws_logs as logs,
-    aws_logs_destinations as logs_destinations,
-    aws_lambda as aws_lambda,
-)
-from constructs import Construct
-
-from cdk_nag import NagSuppressions
-
-from ContainerManager.leaf_stack.main import ContainerManagerStack
-from ContainerManager.leaf_stack.domain_stack import DomainStack
-
-
-class LinkTogetherStack(Stack):
-    """
-    This stacks sets up the lambda to turn the system on.
-    """
-    def __init__(
-        self,
-        scope: Construct,
-        construct_id: str,
-        domain_stack: DomainStack,
-        manager_stack: ContainerManagerStack,
-        container_id: str,
-        **kwargs
-    ) -> None:
-        super().__init__(scope, construct_id, **kwargs)
-
-        ## Log group for the lambda function:
-        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_logs.LogGroup.html
-        self.log_group_start_system = logs.LogGroup(
-            self,
-            "LogGroupStartSystem",
-            retention=logs.RetentionDays.ONE_WEEK,
-            removal_policy=RemovalPolicy.DESTROY,
-            log_group_name=f"/aws/lambda/{container_id}-lambda-start-system",
-        )
-
-        ## Policy/Role for lambda function:
-        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_iam.Role.html
-        self.start_system_role = iam.Role(
-            self,
-            "StartSystemRole",
-            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
-            description="Role for the StartSystem lambda function.",
-        )
-        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_iam.Policy.html
-        self.start_system_policy = iam.Policy(
-            self,
-            "StartSystemPolicy",
-            roles=[self.start_system_role],
-            statements=[
-                # Default lambda permissions
-                # TODO: Change this to the log group option, test if it works:
-                #    https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_logs.LogGroup.html#grantwbrwritegrantee
-                #    It'd probably let you drop the CreateLogGroup too since it already exists.
-                iam.PolicyStatement(
-                    actions=[
-                        "logs:CreateLogStream",
-                        "logs:PutLogEvents",
-                        "logs:CreateLogGroup",
-                    ],
-                    # But only on the LogGroup:
-                    resources=[self.log_group_start_system.log_group_arn],
-                ),
-                # Give it permissions to update the ASG desired_capacity:
-                iam.PolicyStatement(
-                    effect=iam.Effect.ALLOW,
-                    actions=[
-                        "autoscaling:UpdateAutoScalingGroup",
-                    ],
-                    resources=[manager_stack.ecs_asg_nested_stack.auto_scaling_group.auto_scaling_group_arn],
-                ),
-                # Give it permissions to push to the metric:
-                iam.PolicyStatement(
-                    effect=iam.Effect.ALLOW,
-                    actions=["cloudwatch:PutMetricData"],
-                    resources=["*"],
-                    conditions={
-                        "StringEquals": {
-                            "cloudwatch:namespace": manager_stack.watchdog_nested_stack.metric_namespace,
-                        }
-                    }
-                ),
-            ]
-        )
-        NagSuppressions.add_resource_suppressions(
-            self.start_system_policy, [
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "It's flagging on the built-in auto-scaling arn. Nothing to do. (The '*' between autoScalingGroup and autoScalingGroupName.)",
-                    "appliesTo": [{"regex": "/^Resource::arn:aws:autoscaling:(.*):(.*):autoScalingGroup:\\*:autoScalingGroupName/(.*)$/g"}],
-                },
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "CloudWatch Metrics don't have ARN's. You need '*' to push to them. We lock down permissions based on Namespace.",
-                    "appliesTo": ["Resource::*"]
-                }
-            ],
-            apply_to_children=True,
-        )
-
-        ## Lambda that turns system on
-        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html
-        self.lambda_start_system = aws_lambda.Function(
-            self,
-            "StartSystem",
-            description=f"{container_id}-lambda-start-system: Spin up ASG when someone connects.",
-            code=aws_lambda.Code.from_asset("./ContainerManager/leaf_stack/lambda/trigger-start-system/"),
-            handler="main.lambda_handler",
-            runtime=aws_lambda.Runtime.PYTHON_3_12,
-            timeout=Duration.seconds(30),
-            log_group=self.log_group_start_system,
-            role=self.start_system_role,
-            environment={
-                "ASG_NAME": manager_stack.ecs_asg_nested_stack.auto_scaling_group.auto_scaling_group_name,
-                "MANAGER_STACK_REGION": manager_stack.region,
-                ## Metric info to let the system know someone is trying to connect, and don't spin down:
-                "METRIC_NAMESPACE": manager_stack.watchdog_nested_stack.metric_namespace,
-                "METRIC_NAME": manager_stack.watchdog_nested_stack.metric_activity_count.metric_name,
-                "METRIC_THRESHOLD": str(manager_stack.watchdog_nested_stack.threshold),
-                ## Convert METRIC_UNIT from an Enum, to a string that boto3 expects. (Words must have first
-                #   letter capitalized too, which is what `.title()` does. Otherwise they'd be all caps).
-                "METRIC_UNIT": manager_stack.watchdog_nested_stack.metric_unit.value.title(),
-                "METRIC_DIMENSIONS": json.dumps(manager_stack.watchdog_nested_stack.metric_dimension_map),
-            },
-        )
-
-        ## Trigger the system when someone connects:
-        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_logs.SubscriptionFilter.html
-        # https://conermurphy.com/blog/route53-hosted-zone-lambda-dns-invocation-aws-cdk
-        self.subscription_filter = logs.SubscriptionFilter(
-            self,
-            "SubscriptionFilter",
-            log_group=domain_stack.route53_query_log_group,
-            destination=logs_destinations.LambdaDestination(self.lambda_start_system),
-            filter_pattern=logs.FilterPattern.any_term(domain_stack.sub_domain_name),
-            filter_name="TriggerLambdaOnConnect",
-        )
+
+"""
+This Links together the Main Stack, and Domain Stack.
+
+Needed since they're in different regions, and we need
+    to know about objects from both.
+"""
+
+import json
+
+from aws_cdk import (
+    Stack,
+    Duration,
+    RemovalPolicy,
+    aws_iam as iam,
+    aws_logs as logs,
+    aws_logs_destinations as logs_destinations,
+    aws_lambda as aws_lambda,
+)
+from constructs import Construct
+
+from cdk_nag import NagSuppressions
+
+from ContainerManager.leaf_stack.main import ContainerManagerStack
+from ContainerManager.leaf_stack.domain_stack import DomainStack
+from ContainerManager.utils.lambda_logging import create_logging_layer, logging_environment
+
+
+class LinkTogetherStack(Stack):
+    """
+    This stacks sets up the lambda to turn the system on.
+    """
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        domain_stack: DomainStack,
+        manager_stack: ContainerManagerStack,
+        container_id: str,
+        logging_config: dict,
+        **kwargs
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        ## Log group for the lambda function:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_logs.LogGroup.html
+        self.log_group_start_system = logs.LogGroup(
+            self,
+            "LogGroupStartSystem",
+            retention=logs.RetentionDays.ONE_WEEK,
+            removal_policy=RemovalPolicy.DESTROY,
+            log_group_name=f"/aws/lambda/{manager_stack.start_system_function_name}",
+        )
+
+        ## Policy/Role for lambda function:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_iam.Role.html
+        self.start_system_role = iam.Role(
+            self,
+            "StartSystemRole",
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            description="Role for the StartSystem lambda function.",
+        )
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_iam.Policy.html
+        self.start_system_policy = iam.Policy(
+            self,
+            "StartSystemPolicy",
+            roles=[self.start_system_role],
+            statements=[
+                # Default lambda permissions
+                # TODO: Change this to the log group option, test if it works:
+                #    https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_logs.LogGroup.html#grantwbrwritegrantee
+                #    It'd probably let you drop the CreateLogGroup too since it already exists.
+                iam.PolicyStatement(
+                    actions=[
+                        "logs:CreateLogStream",
+                        "logs:PutLogEvents",
+                        "logs:CreateLogGroup",
+                    ],
+                    # But only on the LogGroup:
+                    resources=[self.log_group_start_system.log_group_arn],
+                ),
+                # Give it permissions to update the ASG desired_capacity:
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=[
+                        "autoscaling:UpdateAutoScalingGroup",
+                    ],
+                    resources=[manager_stack.ecs_asg_nested_stack.auto_scaling_group.auto_scaling_group_arn],
+                ),
+                # Give it permissions to update the service desired_count:
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["ecs:UpdateService"],
+                    resources=[manager_stack.ecs_asg_nested_stack.ec2_service.service_arn],
+                ),
+                # Give it permissions to start the wake trace:
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=[
+                        "ssm:GetParameter",
+                        "ssm:PutParameter",
+                    ],
+                    resources=[manager_stack.wake_trace_nested_stack.trace_parameter_arn],
+                ),
+                # Give it permissions to push to the metric:
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["cloudwatch:PutMetricData"],
+                    resources=["*"],
+                    conditions={
+                        "StringEquals": {
+                            "cloudwatch:namespace": manager_stack.watchdog_nested_stack.metric_namespace,
+                        }
+                    }
+                ),
+            ]
+        )
+        NagSuppressions.add_resource_suppressions(
+            self.start_system_policy, [
+                {
+                    "id": "AwsSolutions-IAM5",
+                    "reason": "It's flagging on the built-in auto-scaling arn. Nothing to do. (The '*' between autoScalingGroup and autoScalingGroupName.)",
+                    "appliesTo": [{"regex": "/^Resource::arn:aws:autoscaling:(.*):(.*):autoScalingGroup:\\*:autoScalingGroupName/(.*)$/g"}],
+                },
+                {
+                    "id": "AwsSolutions-IAM5",
+                    "reason": "CloudWatch Metrics don't have ARN's. You need '*' to push to them. We lock down permissions based on Namespace.",
+                    "appliesTo": ["Resource::*"]
+                }
+            ],
+            apply_to_children=True,
+        )
+
+        ## Lambda that turns system on
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.Function.html
+        self.lambda_start_system = aws_lambda.Function(
+            self,
+            "StartSystem",
+            # Named, so the manager stack's dashboard can find it:
+            function_name=manager_stack.start_system_function_name,
+            description=f"{container_id}-lambda-start-system: Spin up ASG when someone connects.",
+            code=aws_lambda.Code.from_asset("./ContainerManager/leaf_stack/lambda/trigger-start-system/"),
+            handler="main.lambda_handler",
+            runtime=aws_lambda.Runtime.PYTHON_3_12,
+            timeout=Duration.seconds(30),
+            log_group=self.log_group_start_system,
+            role=self.start_system_role,
+            # (The manager stack's layer is in a different region):
+            layers=[create_logging_layer(self)],
+            environment={
+                **logging_environment(logging_config, "StartSystem"),
+                "ASG_NAME": manager_stack.ecs_asg_nested_stack.auto_scaling_group.auto_scaling_group_name,
+                "MANAGER_STACK_REGION": manager_stack.region,
+                "ECS_CLUSTER_NAME": manager_stack.ecs_asg_nested_stack.ecs_cluster.cluster_name,
+                "ECS_SERVICE_NAME": manager_stack.ecs_asg_nested_stack.ec2_service.service_name,
+                "WAKE_TRACE_PARAMETER": manager_stack.wake_trace_nested_stack.trace_parameter_name,
+                ## Metric info to let the system know someone is trying to connect, and don't spin down:
+                "METRIC_NAMESPACE": manager_stack.watchdog_nested_stack.metric_namespace,
+                "METRIC_NAME": manager_stack.watchdog_nested_stack.metric_activity_count.metric_name,
+                "METRIC_THRESHOLD": str(manager_stack.watchdog_nested_stack.threshold),
+                ## Convert METRIC_UNIT from an Enum, to a string that boto3 expects. (Words must have first
+                #   letter capitalized too, which is what `.title()` does. Otherwise they'd be all caps).
+                "METRIC_UNIT": manager_stack.watchdog_nested_stack.metric_unit.value.title(),
+                "METRIC_DIMENSIONS": json.dumps(manager_stack.watchdog_nested_stack.metric_dimension_map),
+            },
+        )
+
+        ## Trigger the system when someone connects:
+        # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_logs.SubscriptionFilter.html
+        # https://conermurphy.com/blog/route53-hosted-zone-lambda-dns-invocation-aws-cdk
+        self.subscription_filter = logs.SubscriptionFilter(
+            self,
+            "SubscriptionFilter",
+            log_group=domain_stack.route53_query_log_group,
+            destination=logs_destinations.LambdaDestination(self.lambda_start_system),
+            filter_pattern=logs.FilterPattern.any_term(domain_stack.sub_domain_name),
+            filter_name="TriggerLambdaOnConnect",
+        )
@@ -8,6 +8,7 @@ import re
 from aws_cdk import (
     Stack,
     aws_sns as sns,
+    aws_ecs as ecs,
 )
 from constructs import Construct
 
@@ -15,6 +16,7 @@ from ContainerManager.base_stack import ContainerManagerBaseStack
 from ContainerManager.leaf_stack.domain_stack import DomainStack
 # from ContainerManager.utils.get_param import get_param
 from ContainerManager.utils.sns_subscriptions import add_sns_subscriptions
+from ContainerManager.utils.lambda_logging import create_logging_layer
 
 ## Import Nested Stacks:
 from ContainerManager.leaf_stack import NestedStacks
@@ -65,6 +67,9 @@ class ContainerManagerStack(Stack):
         subscriptions = config.get("AlertSubscription", [])
         add_sns_subscriptions(self, self.sns_notify_topic, subscriptions)
 
+        ## Every lambda in this stack logs through this:
+        self.logging_layer = create_logging_layer(self)
+
         ### All the info for the Security Group Stuff
         self.sg_nested_stack = NestedStacks.SecurityGroups(
             self,
@@ -95,6 +100,28 @@ class ContainerManagerStack(Stack):
             sg_efs_traffic=self.sg_nested_stack.sg_efs_traffic,
         )
 
+        ### All the info for the Golden AMI Stuff
+        if config["Ec2"]["GoldenAmi"]["Enabled"]:
+            self.golden_ami_nested_stack = NestedStacks.GoldenAmi(
+                self,
+                description=f"Golden AMI Logic for {construct_id}",
+                leaf_construct_id=construct_id,
+                container_id=container_id,
+                vpc=base_stack.vpc,
+                ec2_config=config["Ec2"],
+                container_image=config["Container"]["Image"],
+                image_uri=self.container_nested_stack.image_uri,
+                image_cache_prefix=self.container_nested_stack.image_cache_prefix,
+            )
+            if self.container_nested_stack.image_cache_prefix:
+                # The cache rule has to exist before the build can pull through it:
+                self.golden_ami_nested_stack.add_dependency(self.container_nested_stack)
+            machine_image = self.golden_ami_nested_stack.machine_image
+        else:
+            ## Needs to be an "EcsOptimized" image to register to the cluster
+            # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_ecs.EcsOptimizedImage.html
+            machine_image = ecs.EcsOptimizedImage.amazon_linux2023()
+
         ### All the info for the ECS and ASG Stuff
         self.ecs_asg_nested_stack = NestedStacks.EcsAsg(
             self,
@@ -108,6 +135,11 @@ class ContainerManagerStack(Stack):
             leaf_stack_sns_topic=self.sns_notify_topic,
             task_definition=self.container_nested_stack.task_definition,
             ec2_config=config["Ec2"],
+            # The AsgStateChangeHook lets it go, after giving players a chance to reconnect:
+            protect_from_scale_in=config["Watchdog"]["ShutdownHoldSeconds"] > 0,
+            machine_image=machine_image,
+            image_cache_config=config["Container"]["ImageCache"],
+            readiness_check_config=config["Container"]["ReadinessCheck"],
             sg_container_traffic=self.sg_nested_stack.sg_container_traffic,
             efs_file_system=self.efs_nested_stack.efs_file_system,
             host_access_point=self.efs_nested_stack.host_access_point,
@@ -119,10 +151,28 @@ class ContainerManagerStack(Stack):
             description=f"Watchdog Logic for {construct_id}",
             leaf_construct_id=construct_id,
             container_id=container_id,
+            container_url=domain_stack.sub_domain_name,
+            unavailable_ip=domain_stack.unavailable_ip,
             watchdog_config=config["Watchdog"],
             task_definition=self.container_nested_stack.task_definition,
             auto_scaling_group=self.ecs_asg_nested_stack.auto_scaling_group,
             base_stack_sns_topic=base_stack.sns_notify_topic,
+            ec2_user_data=self.ecs_asg_nested_stack.ec2_user_data,
+            logging_layer=self.logging_layer,
+            logging_config=config["Logging"],
+        )
+
+        ### All the info for the Wake Trace Stuff
+        self.wake_trace_nested_stack = NestedStacks.WakeTrace(
+            self,
+            description=f"WakeTrace Logic for {construct_id}",
+            leaf_construct_id=construct_id,
+            container_id=container_id,
+            ecs_cluster=self.ecs_asg_nested_stack.ecs_cluster,
+            readiness_check_config=config["Container"]["ReadinessCheck"],
+            metric_namespace=self.ecs_asg_nested_stack.metric_namespace,
+            logging_layer=self.logging_layer,
+            logging_config=config["Logging"],
         )
 
         ### All the info for the Asg StateChange Hook Stuff
@@ -135,4 +185,58 @@ class ContainerManagerStack(Stack):
             ec2_service=self.ecs_asg_nested_stack.ec2_service,
             auto_scaling_group=self.ecs_asg_nested_stack.auto_scaling_group,
             rule_watchdog_trigger=self.watchdog_nested_stack.rule_watchdog_trigger,
+            scale_down_alarms=self.watchdog_nested_stack.scale_down_alarms,
+            watchdog_config=config["Watchdog"],
+            watchdog_metrics={
+                "ActivityCount": self.watchdog_nested_stack.metric_activity_count,
+                "SshConnections": self.watchdog_nested_stack.metric_ssh_connections,
+            },
+            wake_trace={
+                "ParameterName": self.wake_trace_nested_stack.trace_parameter_name,
+                "ParameterArn": self.wake_trace_nested_stack.trace_parameter_arn,
+                "MetricTimeToPlayable": self.wake_trace_nested_stack.metric_time_to_playable.metric_name,
+                "MetricWakeStage": self.wake_trace_nested_stack.metric_wake_stage_name,
+            },
+            readiness_check_config=config["Container"]["ReadinessCheck"],
+            notify_up_message=self.ecs_asg_nested_stack.notify_up_message,
+            sns_topics=[base_stack.sns_notify_topic, self.sns_notify_topic],
+            metric_namespace=self.ecs_asg_nested_stack.metric_namespace,
+            elastic_ip=self.ecs_asg_nested_stack.elastic_ip,
+            logging_layer=self.logging_layer,
+            logging_config=config["Logging"],
         )
+
+        ## The lambda that starts everything up. It's in the LinkTogetherStack, but named
+        ## here so this stack can find it's metrics without depending on that stack:
+        self.start_system_function_name = f"{container_id}-lambda-start-system"
+
+        ### All the info for the Monitoring Stuff
+        if config["Monitoring"]["Enabled"]:
+            self.monitoring_nested_stack = NestedStacks.Monitoring(
+                self,
+                description=f"Monitoring Logic for {construct_id}",
+                leaf_construct_id=construct_id,
+                container_id=container_id,
+                monitoring_config=config["Monitoring"],
+                ecs_cluster=self.ecs_asg_nested_stack.ecs_cluster,
+                ec2_service=self.ecs_asg_nested_stack.ec2_service,
+                ec2_user_data=self.ecs_asg_nested_stack.ec2_user_data,
+                metric_namespace=self.ecs_asg_nested_stack.metric_namespace,
+                metric_activity_count=self.watchdog_nested_stack.metric_activity_count,
+                metric_ssh_connections=self.watchdog_nested_stack.metric_ssh_connections,
+                metric_asg_num_instances=self.watchdog_nested_stack.metric_asg_num_instances,
+                activity_threshold=self.watchdog_nested_stack.threshold,
+                watchdog_alarms=[
+                    self.watchdog_nested_stack.alarm_container_activity,
+                    self.watchdog_nested_stack.alarm_watchdog_errors,
+                    self.watchdog_nested_stack.alarm_asg_instance_left_up,
+                ],
+                metric_time_to_playable=self.wake_trace_nested_stack.metric_time_to_playable,
+                metric_idle_to_terminate=self.asg_state_change_hook_nested_stack.metric_idle_to_terminate,
+                lambda_functions={
+                    "Watchdog": self.watchdog_nested_stack.lambda_watchdog_container_activity,
+                    "AsgStateChangeHook": self.asg_state_change_hook_nested_stack.lambda_asg_state_change_hook,
+                    "WakeTrace": self.wake_trace_nested_stack.lambda_wake_trace,
+                },
+                start_system_function_name=self.start_system_function_name,
+            )
@@ -15,6 +15,13 @@ from aws_cdk import (
 # https://github.com/mkaranasou/pyaml_env
 from pyaml_env import parse_config
 
+## What each 'Watchdog.Query.Protocol' is sent over:
+QUERY_PROTOCOLS = {
+    "MINECRAFT_SLP": ecs.Protocol.TCP,
+    "A2S_INFO": ecs.Protocol.UDP,
+    "A2S_PLAYER": ecs.Protocol.UDP,
+}
+
 ####################
 ## HELPER METHODS ##
 ####################
@@ -39,6 +46,36 @@ def _parse_sns(config: dict) -> None:
         })
     config["AlertSubscription"] = new_config
 
+def parse_image_name(image: str) -> dict:
+    """
+    Splits a docker image into it's registry, repository, and tag (or digest).
+        I.e 'itzg/minecraft-server' -> 'registry-1.docker.io', 'itzg/minecraft-server', 'latest'
+    """
+    registry = "registry-1.docker.io"
+    repository = image
+    ## If the first part looks like a host (has a '.' or ':'), it's the registry:
+    #    (Same logic docker itself uses)
+    first_part, _, rest = image.partition("/")
+    if rest and ("." in first_part or ":" in first_part or first_part == "localhost"):
+        registry, repository = first_part, rest
+    if registry in ["docker.io", "index.docker.io"]:
+        registry = "registry-1.docker.io"
+    ## Digest or Tag:
+    if "@" in repository:
+        repository, tag = repository.split("@", 1)
+    elif ":" in repository.split("/")[-1]:
+        repository, tag = repository.rsplit(":", 1)
+    else:
+        tag = "latest"
+    ## Official docker hub images live under 'library/':
+    if registry == "registry-1.docker.io" and "/" not in repository:
+        repository = f"library/{repository}"
+    return {
+        "Registry": registry,
+        "Repository": repository,
+        "Tag": tag,
+    }
+
 #######################
 ## BASE CONFIG LOGIC ##
 #######################
@@ -75,6 +112,70 @@ def load_base_config(path: str) -> dict:
 ## LEAF CONFIG LOGIC ##
 #######################
 def _parse_container(config: dict) -> None:
+
+    def _parse_container_image_cache(config: dict) -> None:
+        if "ImageCache" not in config["Container"]:
+            config["Container"]["ImageCache"] = {}
+        assert isinstance(config["Container"]["ImageCache"], dict)
+        # Enabled
+        if "Enabled" not in config["Container"]["ImageCache"]:
+            config["Container"]["ImageCache"]["Enabled"] = False
+        assert isinstance(config["Container"]["ImageCache"]["Enabled"], bool)
+        # RepositoryPrefix (Default is set in the stack, since it's based on the container_id):
+        if "RepositoryPrefix" not in config["Container"]["ImageCache"]:
+            config["Container"]["ImageCache"]["RepositoryPrefix"] = None
+        assert isinstance(config["Container"]["ImageCache"]["RepositoryPrefix"], (str, type(None)))
+        # CredentialArn
+        if "CredentialArn" not in config["Container"]["ImageCache"]:
+            config["Container"]["ImageCache"]["CredentialArn"] = None
+        assert isinstance(config["Container"]["ImageCache"]["CredentialArn"], (str, type(None)))
+
+        if not config["Container"]["ImageCache"]["Enabled"]:
+            return
+        ## Split the image into the pieces the ECR pull through cache wants:
+        upstream = parse_image_name(config["Container"]["Image"])
+        # Only these registries are supported by ECR. Most of them need credentials too:
+        # https://docs.aws.amazon.com/AmazonECR/latest/userguide/pull-through-cache.html#pull-through-cache-upstream-registries
+        credentials_required = {
+            "registry-1.docker.io": True,
+            "ghcr.io": True,
+            "registry.gitlab.com": True,
+            "public.ecr.aws": False,
+            "quay.io": False,
+            "registry.k8s.io": False,
+        }
+        if upstream["Registry"] not in credentials_required:
+            raise ValueError(f"Container.ImageCache: Registry '{upstream['Registry']}' isn't supported by ECR pull through cache. Supported: {list(credentials_required.keys())}")
+        if credentials_required[upstream["Registry"]] and not config["Container"]["ImageCache"]["CredentialArn"]:
+            raise_missing_key_error("Container.ImageCache.CredentialArn")
+        config["Container"]["ImageCache"]["Upstream"] = upstream
+
+    def _parse_container_readiness_check(config: dict) -> None:
+        if "ReadinessCheck" not in config["Container"]:
+            config["Container"]["ReadinessCheck"] = {}
+        assert isinstance(config["Container"]["ReadinessCheck"], dict)
+        # Enabled
+        if "Enabled" not in config["Container"]["ReadinessCheck"]:
+            config["Container"]["ReadinessCheck"]["Enabled"] = False
+        assert isinstance(config["Container"]["ReadinessCheck"]["Enabled"], bool)
+        # StartPeriodSeconds
+        if "StartPeriodSeconds" not in config["Container"]["ReadinessCheck"]:
+            config["Container"]["ReadinessCheck"]["StartPeriodSeconds"] = 300
+        assert isinstance(config["Container"]["ReadinessCheck"]["StartPeriodSeconds"], int)
+        # (ECS's own limits for a health check):
+        assert 0 <= config["Container"]["ReadinessCheck"]["StartPeriodSeconds"] <= 300, "Container.ReadinessCheck.StartPeriodSeconds must be between 0 and 300."
+        # Command
+        if "Command" not in config["Container"]["ReadinessCheck"]:
+            config["Container"]["ReadinessCheck"]["Command"] = None
+            if config["Container"]["ReadinessCheck"]["Enabled"]:
+                ## Default to checking if the TCP port is accepting connections. (UDP doesn't have
+                ## connections, so there's no generic way to check it. You have to give a Command):
+                tcp_ports = [port for port in config["Container"]["Ports"] if port.protocol == ecs.Protocol.TCP]
+                if len(tcp_ports) != 1:
+                    raise_missing_key_error("Container.ReadinessCheck.Command")
+                config["Container"]["ReadinessCheck"]["Command"] = f"bash -c 'echo > /dev/tcp/127.0.0.1/{tcp_ports[0].container_port}'"
+        assert isinstance(config["Container"]["ReadinessCheck"]["Command"], (str, type(None)))
+
     if "Container" not in config:
         config["Container"] = {}
     assert isinstance(config["Container"], dict)
@@ -116,6 +217,12 @@ def _parse_container(config: dict) -> None:
         str(key): str(val) for key, val in config["Container"]["Environment"].items()
     }
 
+    ### Parse Container.ImageCache:
+    _parse_container_image_cache(config)
+
+    ### Parse Container.ReadinessCheck:
+    _parse_container_readiness_check(config)
+
 
 def _parse_volume(config: dict) -> None:
     if "Volume" not in config:
@@ -145,6 +252,83 @@ def _parse_volume(config: dict) -> None:
         assert isinstance(path["ReadOnly"], bool)
 
 def _parse_ec2(config: dict) -> None:
+
+    def _parse_ec2_warm_pool(config: dict) -> None:
+        if "WarmPool" not in config["Ec2"]:
+            config["Ec2"]["WarmPool"] = {}
+        assert isinstance(config["Ec2"]["WarmPool"], dict)
+        # Enabled
+        if "Enabled" not in config["Ec2"]["WarmPool"]:
+            config["Ec2"]["WarmPool"]["Enabled"] = False
+        assert isinstance(config["Ec2"]["WarmPool"]["Enabled"], bool)
+        # PoolState
+        if "PoolState" not in config["Ec2"]["WarmPool"]:
+            config["Ec2"]["WarmPool"]["PoolState"] = "Stopped"
+        assert isinstance(config["Ec2"]["WarmPool"]["PoolState"], str)
+        # Only support the states that don't bill for the instance itself:
+        #   ("Running" would defeat the purpose of spinning down when no one is on)
+        config["Ec2"]["WarmPool"]["PoolState"] = config["Ec2"]["WarmPool"]["PoolState"].title()
+        valid_pool_states = ["Stopped", "Hibernated"]
+        assert config["Ec2"]["WarmPool"]["PoolState"] in valid_pool_states, f"Ec2.WarmPool.PoolState must be one of {valid_pool_states}."
+        # MaxPreparedCapacity
+        if "MaxPreparedCapacity" not in config["Ec2"]["WarmPool"]:
+            config["Ec2"]["WarmPool"]["MaxPreparedCapacity"] = 1
+        assert isinstance(config["Ec2"]["WarmPool"]["MaxPreparedCapacity"], int)
+        assert config["Ec2"]["WarmPool"]["MaxPreparedCapacity"] >= 1, "Ec2.WarmPool.MaxPreparedCapacity must be at least 1."
+        # ReuseOnScaleIn
+        if "ReuseOnScaleIn" not in config["Ec2"]["WarmPool"]:
+            config["Ec2"]["WarmPool"]["ReuseOnScaleIn"] = True
+        assert isinstance(config["Ec2"]["WarmPool"]["ReuseOnScaleIn"], bool)
+
+    def _parse_ec2_golden_ami(config: dict) -> None:
+        if "GoldenAmi" not in config["Ec2"]:
+            config["Ec2"]["GoldenAmi"] = {}
+        assert isinstance(config["Ec2"]["GoldenAmi"], dict)
+        # Enabled
+        if "Enabled" not in config["Ec2"]["GoldenAmi"]:
+            config["Ec2"]["GoldenAmi"]["Enabled"] = False
+        assert isinstance(config["Ec2"]["GoldenAmi"]["Enabled"], bool)
+
+    def _parse_ec2_root_volume(config: dict) -> None:
+        if "RootVolume" not in config["Ec2"]:
+            config["Ec2"]["RootVolume"] = {}
+        assert isinstance(config["Ec2"]["RootVolume"], dict)
+        # SizeGb
+        if "SizeGb" not in config["Ec2"]["RootVolume"]:
+            # The same size the ECS Optimized AMI defaults to:
+            config["Ec2"]["RootVolume"]["SizeGb"] = 30
+        assert isinstance(config["Ec2"]["RootVolume"]["SizeGb"], int)
+        assert config["Ec2"]["RootVolume"]["SizeGb"] >= 30, "Ec2.RootVolume.SizeGb must be at least 30 (The AMI's size)."
+        # Type
+        if "Type" not in config["Ec2"]["RootVolume"]:
+            config["Ec2"]["RootVolume"]["Type"] = "gp3"
+        assert isinstance(config["Ec2"]["RootVolume"]["Type"], str)
+        config["Ec2"]["RootVolume"]["Type"] = config["Ec2"]["RootVolume"]["Type"].lower()
+        valid_volume_types = ["gp2", "gp3", "io1", "io2"]
+        assert config["Ec2"]["RootVolume"]["Type"] in valid_volume_types, f"Ec2.RootVolume.Type must be one of {valid_volume_types}."
+        # Iops
+        if "Iops" not in config["Ec2"]["RootVolume"]:
+            # The io* types don't have a baseline, you have to pick one:
+            if config["Ec2"]["RootVolume"]["Type"] in ["io1", "io2"]:
+                raise_missing_key_error("Ec2.RootVolume.Iops")
+            config["Ec2"]["RootVolume"]["Iops"] = None
+        if config["Ec2"]["RootVolume"]["Iops"] is not None:
+            assert isinstance(config["Ec2"]["RootVolume"]["Iops"], int)
+            assert config["Ec2"]["RootVolume"]["Type"] != "gp2", "Ec2.RootVolume.Iops can't be set on gp2 volumes."
+        # Throughput
+        if "Throughput" not in config["Ec2"]["RootVolume"]:
+            config["Ec2"]["RootVolume"]["Throughput"] = None
+        if config["Ec2"]["RootVolume"]["Throughput"] is not None:
+            assert isinstance(config["Ec2"]["RootVolume"]["Throughput"], int)
+            assert config["Ec2"]["RootVolume"]["Type"] == "gp3", "Ec2.RootVolume.Throughput can only be set on gp3 volumes."
+            assert 125 <= config["Ec2"]["RootVolume"]["Throughput"] <= 1000, "Ec2.RootVolume.Throughput must be between 125 and 1000 (MiB/s)."
+        # InitializationRate
+        if "InitializationRate" not in config["Ec2"]["RootVolume"]:
+            config["Ec2"]["RootVolume"]["InitializationRate"] = None
+        if config["Ec2"]["RootVolume"]["InitializationRate"] is not None:
+            assert isinstance(config["Ec2"]["RootVolume"]["InitializationRate"], int)
+            assert 100 <= config["Ec2"]["RootVolume"]["InitializationRate"] <= 300, "Ec2.RootVolume.InitializationRate must be between 100 and 300 (MiB/s)."
+
     if "Ec2" not in config:
         config["Ec2"] = {}
     assert isinstance(config["Ec2"], dict)
@@ -152,7 +336,22 @@ def _parse_ec2(config: dict) -> None:
         raise_missing_key_error("Ec2.InstanceType")
     assert isinstance(config["Ec2"]["InstanceType"], str)
 
-def _parse_watchdog(config: dict) -> None:
+    ### ElasticIp
+    if "ElasticIp" not in config["Ec2"]:
+        config["Ec2"]["ElasticIp"] = False
+    assert isinstance(config["Ec2"]["ElasticIp"], bool)
+
+    ### RootVolume Block
+    _parse_ec2_root_volume(config)
+
+    ### WarmPool Block
+    _parse_ec2_warm_pool(config)
+
+    ### GoldenAmi Block
+    _parse_ec2_golden_ami(config)
+
+# (The nested helpers count towards it's statements):
+def _parse_watchdog(config: dict) -> None: # pylint: disable=too-many-statements
 
     def _parse_watchdog_type(config: dict) -> None:
         ### Type
@@ -172,7 +371,31 @@ def _parse_watchdog(config: dict) -> None:
             else:
                 raise_missing_key_error("Watchdog.Type")
         config["Watchdog"]["Type"] = config["Watchdog"]["Type"].upper()
-        assert config["Watchdog"]["Type"] in ["TCP", "UDP"]
+        assert config["Watchdog"]["Type"] in ["TCP", "UDP", "QUERY"]
+
+    def _parse_watchdog_query(config: dict) -> None:
+        if "Query" not in config["Watchdog"]:
+            raise_missing_key_error("Watchdog.Query")
+        assert isinstance(config["Watchdog"]["Query"], dict)
+        # Protocol
+        if "Protocol" not in config["Watchdog"]["Query"]:
+            raise_missing_key_error("Watchdog.Query.Protocol")
+        config["Watchdog"]["Query"]["Protocol"] = config["Watchdog"]["Query"]["Protocol"].upper()
+        assert config["Watchdog"]["Query"]["Protocol"] in QUERY_PROTOCOLS, f"Watchdog.Query.Protocol must be one of: {list(QUERY_PROTOCOLS)}."
+        # Port (Has to be one the container opens, or the lambda can't reach it):
+        ports = [port.host_port for port in config["Container"]["Ports"] if port.protocol == QUERY_PROTOCOLS[config["Watchdog"]["Query"]["Protocol"]]]
+        if "Port" not in config["Watchdog"]["Query"]:
+            if len(ports) != 1:
+                raise_missing_key_error("Watchdog.Query.Port")
+            config["Watchdog"]["Query"]["Port"] = ports[0]
+        assert isinstance(config["Watchdog"]["Query"]["Port"], int)
+        assert config["Watchdog"]["Query"]["Port"] in ports, f"Watchdog.Query.Port ({config['Watchdog']['Query']['Port']}) must be one of the container's {QUERY_PROTOCOLS[config['Watchdog']['Query']['Protocol']].value} ports: {ports}."
+        # TimeoutMs
+        if "TimeoutMs" not in config["Watchdog"]["Query"]:
+            config["Watchdog"]["Query"]["TimeoutMs"] = 2000
+        assert isinstance(config["Watchdog"]["Query"]["TimeoutMs"], int)
+        # A2S can take two round trips (the challenge), both have to fit in the lambda's timeout:
+        assert 0 < config["Watchdog"]["Query"]["TimeoutMs"] <= 10000, "Watchdog.Query.TimeoutMs must be between 1 and 10000."
 
     def _parse_watchdog_type_extras(config: dict) -> None:
         if config["Watchdog"]["Type"] == "TCP":
@@ -187,6 +410,8 @@ def _parse_watchdog(config: dict) -> None:
         elif config["Watchdog"]["Type"] == "UDP":
             # No extra config options needed for UDP yet:
             pass
+        elif config["Watchdog"]["Type"] == "QUERY":
+            _parse_watchdog_query(config)
 
     def _parse_watchdog_minutes_without_connections(config: dict) -> None:
         if "MinutesWithoutConnections" not in config["Watchdog"]:
@@ -196,10 +421,11 @@ def _parse_watchdog(config: dict) -> None:
 
     def _parse_watchdog_threshold(config: dict) -> None:
         if "Threshold" not in config["Watchdog"]:
-            if config["Watchdog"]["Type"] == "TCP":
+            if config["Watchdog"]["Type"] in ["TCP", "QUERY"]:
                 config["Watchdog"]["Threshold"] = 0
             elif config["Watchdog"]["Type"] == "UDP":
-                # TODO: Keep an eye on this and adjust as we get info from each game.
+                # Every game is different. Calibrate it from the leaf's own history with
+                #   `make calibrate-threshold` (See ./tools/README.md).
                 #           - Valheim: No players ~0-15 packets. W/ 1 player ~5k packets
                 config["Watchdog"]["Threshold"] = 32
             else:
@@ -220,6 +446,109 @@ def _parse_watchdog(config: dict) -> None:
             config["Watchdog"]["InstanceLeftUp"]["ShouldStop"] = False
         assert isinstance(config["Watchdog"]["InstanceLeftUp"]["ShouldStop"], bool)
 
+    def _parse_watchdog_shutdown_hold_seconds(config: dict) -> None:
+        if "ShutdownHoldSeconds" not in config["Watchdog"]:
+            config["Watchdog"]["ShutdownHoldSeconds"] = 0
+        assert isinstance(config["Watchdog"]["ShutdownHoldSeconds"], int)
+        # The lambda holding the instance can only run for 15 minutes total:
+        assert 0 <= config["Watchdog"]["ShutdownHoldSeconds"] <= 600, "Watchdog.ShutdownHoldSeconds must be between 0 and 600."
+
+    def _parse_watchdog_activity_agent(config: dict) -> None:
+        if "ActivityAgent" not in config["Watchdog"]:
+            config["Watchdog"]["ActivityAgent"] = {}
+        assert isinstance(config["Watchdog"]["ActivityAgent"], dict)
+        # Enabled
+        if "Enabled" not in config["Watchdog"]["ActivityAgent"]:
+            config["Watchdog"]["ActivityAgent"]["Enabled"] = False
+        assert isinstance(config["Watchdog"]["ActivityAgent"]["Enabled"], bool)
+        # The agent counts connections on the host, a Query doesn't touch it:
+        if config["Watchdog"]["ActivityAgent"]["Enabled"]:
+            assert config["Watchdog"]["Type"] != "QUERY", "Watchdog.ActivityAgent can't be used with 'Type: Query'."
+
+    def _parse_watchdog_direct_shutdown(config: dict) -> None:
+        if "DirectShutdown" not in config["Watchdog"]:
+            config["Watchdog"]["DirectShutdown"] = {}
+        assert isinstance(config["Watchdog"]["DirectShutdown"], dict)
+        # Enabled
+        if "Enabled" not in config["Watchdog"]["DirectShutdown"]:
+            config["Watchdog"]["DirectShutdown"]["Enabled"] = False
+        assert isinstance(config["Watchdog"]["DirectShutdown"]["Enabled"], bool)
+        # IdleSamples (Same as the alarm by default, it just doesn't wait on CloudWatch):
+        if "IdleSamples" not in config["Watchdog"]["DirectShutdown"]:
+            config["Watchdog"]["DirectShutdown"]["IdleSamples"] = config["Watchdog"]["MinutesWithoutConnections"]
+        assert isinstance(config["Watchdog"]["DirectShutdown"]["IdleSamples"], int)
+        # Any longer, and the alarm would always go off first:
+        assert 2 <= config["Watchdog"]["DirectShutdown"]["IdleSamples"] <= config["Watchdog"]["MinutesWithoutConnections"], "Watchdog.DirectShutdown.IdleSamples must be between 2 and MinutesWithoutConnections."
+        # The lambda is what keeps the window, the agent replaces it:
+        if config["Watchdog"]["DirectShutdown"]["Enabled"]:
+            assert not config["Watchdog"]["ActivityAgent"]["Enabled"], "Watchdog.DirectShutdown can't be used with Watchdog.ActivityAgent."
+
+    def _parse_watchdog_latency_probe_port(config: dict) -> None:
+        if "Port" not in config["Watchdog"]["LatencyProbe"]:
+            if config["Watchdog"]["LatencyProbe"]["Protocol"] == "TCP" and "TcpPort" in config["Watchdog"]:
+                config["Watchdog"]["LatencyProbe"]["Port"] = config["Watchdog"]["TcpPort"]
+            else:
+                protocol = ecs.Protocol.TCP if config["Watchdog"]["LatencyProbe"]["Protocol"] == "TCP" else ecs.Protocol.UDP
+                ports = [port for port in config["Container"]["Ports"] if port.protocol == protocol]
+                # Only required if it's enabled, and there's more than one to choose from:
+                if len(ports) == 1:
+                    config["Watchdog"]["LatencyProbe"]["Port"] = ports[0].host_port
+                elif config["Watchdog"]["LatencyProbe"]["Enabled"]:
+                    raise_missing_key_error("Watchdog.LatencyProbe.Port")
+                else:
+                    config["Watchdog"]["LatencyProbe"]["Port"] = 0
+        assert isinstance(config["Watchdog"]["LatencyProbe"]["Port"], int)
+
+    def _parse_watchdog_latency_probe(config: dict) -> None:
+        if "LatencyProbe" not in config["Watchdog"]:
+            config["Watchdog"]["LatencyProbe"] = {}
+        assert isinstance(config["Watchdog"]["LatencyProbe"], dict)
+        # Enabled
+        if "Enabled" not in config["Watchdog"]["LatencyProbe"]:
+            config["Watchdog"]["LatencyProbe"]["Enabled"] = False
+        assert isinstance(config["Watchdog"]["LatencyProbe"]["Enabled"], bool)
+        # Protocol
+        if "Protocol" not in config["Watchdog"]["LatencyProbe"]:
+            config["Watchdog"]["LatencyProbe"]["Protocol"] = config["Watchdog"]["Type"]
+        assert isinstance(config["Watchdog"]["LatencyProbe"]["Protocol"], str)
+        config["Watchdog"]["LatencyProbe"]["Protocol"] = config["Watchdog"]["LatencyProbe"]["Protocol"].upper()
+        # Probe the same protocol and port the Query uses:
+        if config["Watchdog"]["LatencyProbe"]["Protocol"] == "QUERY":
+            # (The Query block is only parsed, and only has to exist, with 'Type: QUERY'):
+            if config["Watchdog"]["Type"] != "QUERY":
+                raise ValueError(f"Watchdog.LatencyProbe.Protocol: 'QUERY' probes the port Watchdog.Query uses, so it needs 'Watchdog.Type: QUERY' (Got '{config['Watchdog']['Type']}'). Use 'TCP' or 'UDP' instead.")
+            config["Watchdog"]["LatencyProbe"]["Protocol"] = QUERY_PROTOCOLS[config["Watchdog"]["Query"]["Protocol"]].value
+            if "Port" not in config["Watchdog"]["LatencyProbe"]:
+                config["Watchdog"]["LatencyProbe"]["Port"] = config["Watchdog"]["Query"]["Port"]
+        assert config["Watchdog"]["LatencyProbe"]["Protocol"] in ["TCP", "UDP"], "Watchdog.LatencyProbe.Protocol must be one of: ['TCP', 'UDP', 'QUERY']."
+        # Port
+        _parse_watchdog_latency_probe_port(config)
+        # UdpPayload (Default is the Source Engine 'A2S_INFO' query, which a lot of games answer):
+        if "UdpPayload" not in config["Watchdog"]["LatencyProbe"]:
+            config["Watchdog"]["LatencyProbe"]["UdpPayload"] = "FFFFFFFF54536F7572636520456E67696E6520517565727900"
+        assert isinstance(config["Watchdog"]["LatencyProbe"]["UdpPayload"], str)
+        bytes.fromhex(config["Watchdog"]["LatencyProbe"]["UdpPayload"])
+        # Samples
+        if "Samples" not in config["Watchdog"]["LatencyProbe"]:
+            config["Watchdog"]["LatencyProbe"]["Samples"] = 5
+        assert isinstance(config["Watchdog"]["LatencyProbe"]["Samples"], int)
+        assert 1 <= config["Watchdog"]["LatencyProbe"]["Samples"] <= 20, "Watchdog.LatencyProbe.Samples must be between 1 and 20."
+        # TimeoutMs
+        if "TimeoutMs" not in config["Watchdog"]["LatencyProbe"]:
+            config["Watchdog"]["LatencyProbe"]["TimeoutMs"] = 1000
+        assert isinstance(config["Watchdog"]["LatencyProbe"]["TimeoutMs"], int)
+        # Every sample timing out has to fit in the lambda's timeout:
+        assert 0 < config["Watchdog"]["LatencyProbe"]["Samples"] * config["Watchdog"]["LatencyProbe"]["TimeoutMs"] <= 20000, "Watchdog.LatencyProbe: Samples * TimeoutMs must be 20000 or less."
+        # ThresholdMs
+        if "ThresholdMs" not in config["Watchdog"]["LatencyProbe"]:
+            config["Watchdog"]["LatencyProbe"]["ThresholdMs"] = 150
+        assert isinstance(config["Watchdog"]["LatencyProbe"]["ThresholdMs"], int)
+        # MinutesDegraded
+        if "MinutesDegraded" not in config["Watchdog"]["LatencyProbe"]:
+            config["Watchdog"]["LatencyProbe"]["MinutesDegraded"] = 5
+        assert isinstance(config["Watchdog"]["LatencyProbe"]["MinutesDegraded"], int)
+        assert config["Watchdog"]["LatencyProbe"]["MinutesDegraded"] >= 1, "Watchdog.LatencyProbe.MinutesDegraded must be at least 1."
+
     if "Watchdog" not in config:
         config["Watchdog"] = {}
     assert isinstance(config["Watchdog"], dict)
@@ -237,6 +566,84 @@ def _parse_watchdog(config: dict) -> None:
     ### InstanceLeftUp Block
     _parse_watchdog_instance_left_up(config)
 
+    ### ShutdownHoldSeconds
+    _parse_watchdog_shutdown_hold_seconds(config)
+
+    ### ActivityAgent Block
+    _parse_watchdog_activity_agent(config)
+
+    ### DirectShutdown Block
+    _parse_watchdog_direct_shutdown(config)
+
+    ### LatencyProbe Block
+    _parse_watchdog_latency_probe(config)
+
+
+def _parse_monitoring(config: dict) -> None:
+    if "Monitoring" not in config:
+        config["Monitoring"] = {}
+    assert isinstance(config["Monitoring"], dict)
+
+    ### Enabled
+    if "Enabled" not in config["Monitoring"]:
+        config["Monitoring"]["Enabled"] = False
+    assert isinstance(config["Monitoring"]["Enabled"], bool)
+
+    ### ContainerInsights
+    if "ContainerInsights" not in config["Monitoring"]:
+        config["Monitoring"]["ContainerInsights"] = True
+    assert isinstance(config["Monitoring"]["ContainerInsights"], bool)
+
+    ### HostMetricsIntervalSeconds
+    if "HostMetricsIntervalSeconds" not in config["Monitoring"]:
+        config["Monitoring"]["HostMetricsIntervalSeconds"] = 10
+    assert isinstance(config["Monitoring"]["HostMetricsIntervalSeconds"], int)
+    # Anything under 60 is a high-resolution metric, and CloudWatch only stores those at these periods:
+    # https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/publishingMetrics.html#high-resolution-metrics
+    valid_intervals = [1, 5, 10, 30, 60]
+    assert config["Monitoring"]["HostMetricsIntervalSeconds"] in valid_intervals, f"Monitoring.HostMetricsIntervalSeconds must be one of {valid_intervals}."
+
+
+def _parse_logging(config: dict) -> None:
+    # Every lambda in the leaf, and what they're called under 'Logging.Functions':
+    function_names = ["StartSystem", "Watchdog", "LatencyProbe", "AsgStateChangeHook", "WakeTrace"]
+    log_levels = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+    if "Logging" not in config:
+        config["Logging"] = {}
+    assert isinstance(config["Logging"], dict)
+
+    ### Level
+    if "Level" not in config["Logging"]:
+        config["Logging"]["Level"] = "INFO"
+    config["Logging"]["Level"] = config["Logging"]["Level"].upper()
+    assert config["Logging"]["Level"] in log_levels, f"Logging.Level must be one of: {log_levels}."
+
+    ### VerboseSampleRate
+    if "VerboseSampleRate" not in config["Logging"]:
+        config["Logging"]["VerboseSampleRate"] = 0.05
+    assert isinstance(config["Logging"]["VerboseSampleRate"], (int, float))
+    assert 0 <= config["Logging"]["VerboseSampleRate"] <= 1, "Logging.VerboseSampleRate must be between 0 and 1."
+
+    ### Functions (Anything not set, is the same as above)
+    if "Functions" not in config["Logging"]:
+        config["Logging"]["Functions"] = {}
+    assert isinstance(config["Logging"]["Functions"], dict)
+    for function_name in config["Logging"]["Functions"]:
+        assert function_name in function_names, f"Logging.Functions.{function_name} isn't a lambda. Must be one of: {function_names}."
+    for function_name in function_names:
+        if function_name not in config["Logging"]["Functions"]:
+            config["Logging"]["Functions"][function_name] = {}
+        function_config = config["Logging"]["Functions"][function_name]
+        assert isinstance(function_config, dict)
+        if "Level" not in function_config:
+            function_config["Level"] = config["Logging"]["Level"]
+        function_config["Level"] = function_config["Level"].upper()
+        assert function_config["Level"] in log_levels, f"Logging.Functions.{function_name}.Level must be one of: {log_levels}."
+        if "VerboseSampleRate" not in function_config:
+            function_config["VerboseSampleRate"] = config["Logging"]["VerboseSampleRate"]
+        assert isinstance(function_config["VerboseSampleRate"], (int, float))
+        assert 0 <= function_config["VerboseSampleRate"] <= 1, f"Logging.Functions.{function_name}.VerboseSampleRate must be between 0 and 1."
 
 def load_leaf_config(path: str) -> dict:
     " Parser/Loader for all leaf stacks "
@@ -245,5 +652,7 @@ def load_leaf_config(path: str) -> dict:
     _parse_volume(config)
     _parse_ec2(config)
     _parse_watchdog(config)
+    _parse_monitoring(config)
+    _parse_logging(config)
     _parse_sns(config)
     return config
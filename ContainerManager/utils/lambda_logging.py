@@ -0,0 +1,40 @@
+"""
+lambda_logging.py
+
+Broken into it's own file since the lambdas are in both the leaf stack AND the
+link together stack (different regions), and they all share the same logging.
+"""
+
+from aws_cdk import (
+    aws_lambda,
+)
+from constructs import Construct
+
+
+def create_logging_layer(context: Construct) -> aws_lambda.LayerVersion:
+    """
+    The Layer with the `structured_logging` module every lambda uses.
+        (A layer can only be used in it's own region, so each region needs one)
+    """
+    # https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_lambda.LayerVersion.html
+    return aws_lambda.LayerVersion(
+        context,
+        "StructuredLoggingLayer",
+        description="Structured, sampled logging shared by the lambdas.",
+        # Anything under 'python/' ends up on the lambda's path:
+        code=aws_lambda.Code.from_asset("./ContainerManager/leaf_stack/lambda/layers/structured-logging/"),
+        compatible_runtimes=[aws_lambda.Runtime.PYTHON_3_12],
+    )
+
+
+def logging_environment(logging_config: dict, function_name: str) -> dict:
+    """
+    The environment variables `structured_logging` reads, for one of the lambdas.
+        (Normally 'logging_config' is the 'Logging' block from the config file)
+    """
+    # All of the error checking is in the config parser/loader:
+    function_config = logging_config["Functions"][function_name]
+    return {
+        "LOG_LEVEL": function_config["Level"],
+        "LOG_VERBOSE_SAMPLE_RATE": str(function_config["VerboseSampleRate"]),
+    }
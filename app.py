@@ -103,6 +103,7 @@ if file_path:
         domain_stack=domain_stack,
         manager_stack=manager_stack,
         container_id=container_id,
+        logging_config=leaf_config["Logging"],
     )
     for key, val in stack_tags.items():
         Tags.of(link_together_stack).add(key, val)
@@ -0,0 +1,5 @@
+"""
+Tests for the deploy profiler. (`tools/deploy_profiler.py`)
+
+Runs against a recorded deploy, so they never touch AWS.
+"""
@@ -0,0 +1,138 @@
+"""
+Checks the profiler against a recorded deploy. (`fixtures/leaf-deploy.json`)
+
+The recording is a leaf update: The base stack didn't change, the manager stack
+has nested stacks on it's critical path (and an EFS file system that's slow, but
+not what anything waited on), and the link-together stack has an older CREATE
+from before that should be ignored.
+"""
+
+import os
+import json
+from datetime import datetime, timezone
+
+import boto3
+from botocore.stub import Stubber
+
+from tools.deploy_profiler import (
+    profile,
+    leaf_stacks,
+    load_recorded,
+    save_recorded,
+    stack_operations,
+    fetch_latest_operation,
+)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "leaf-deploy.json")
+MANAGER_STACK = "ContainerManager-Minecraft-example-Stack"
+
+
+def fixture_report(**kwargs) -> dict:
+    """ Profile the recorded deploy """
+    return profile(*load_recorded(FIXTURE), **kwargs)
+
+
+def test_stack_names_match_app():
+    """ Same names (and regions) app.py gives each stack """
+    assert leaf_stacks("./Examples/Minecraft-example.yaml", "us-west-2") == [
+        ("ContainerManager-BaseStack", "us-west-2"),
+        ("ContainerManager-Minecraft-example-DomainStack", "us-east-1"),
+        (MANAGER_STACK, "us-west-2"),
+        ("ContainerManager-Minecraft-example-LinkTogetherStack", "us-east-1"),
+    ]
+
+
+def test_only_the_latest_deploy_counts():
+    """ The old CREATE is dropped, and the base stack (changed days ago) isn't part of it """
+    report = fixture_report()
+    assert [stack["StackName"] for stack in report["Stacks"]] == [
+        "ContainerManager-Minecraft-example-DomainStack",
+        MANAGER_STACK,
+        "ContainerManager-Minecraft-example-LinkTogetherStack",
+    ]
+    assert report["Unchanged"] == ["ContainerManager-BaseStack"]
+    assert report["DeploySeconds"] == 640
+    link_stack = report["Stacks"][-1]
+    assert link_stack["Seconds"] == 60 and link_stack["Status"] == "UPDATE_COMPLETE"
+
+
+def test_critical_path_follows_what_was_waited_on():
+    """ Through each stack in order, into the nested stacks, and skipping what finished early """
+    path = [(step["LogicalResourceId"], step["Depth"]) for step in fixture_report()["CriticalPath"]]
+    assert path == [
+        ("RecordSetNs", 0),
+        ("(between stacks)", 0),
+        ("SecurityGroupsNestedStackResource", 0),
+        ("EfsSecurityGroupIngress", 1),
+        ("EcsAsgNestedStackResource", 0),
+        ("LaunchTemplate", 1),
+        ("AutoScalingGroup", 1),
+        ("EcsService", 1),
+        ("WatchdogNestedStackResource", 0),
+        ("WatchdogLambda", 1),
+        ("(between stacks)", 0),
+        ("SubscriptionFilter", 0),
+    ]
+
+
+def test_slowest_resources_are_ranked():
+    """ Slowest first, nested stacks themselves left out, and marked if they're on the critical path """
+    slowest = fixture_report(top=3)["SlowestResources"]
+    assert [(r["LogicalResourceId"], r["Seconds"], r["OnCriticalPath"]) for r in slowest] == [
+        ("EcsService", 214, True),
+        ("EfsFileSystem", 160, False),
+        ("WatchdogLambda", 58, True),
+    ]
+    assert all(r["ResourceType"] != "AWS::CloudFormation::Stack" for r in fixture_report()["SlowestResources"])
+
+
+def test_unfinished_resources_count_to_the_end_of_the_stack():
+    """ A resource without an end event (i.e it failed with the stack) isn't left without a time """
+    stack_id = "arn:aws:cloudformation:us-west-2:123456789012:stack/Failed/1"
+    def event(seconds: int, logical_id: str, status: str) -> dict:
+        return {
+            "StackId": stack_id,
+            "StackName": "Failed",
+            "LogicalResourceId": logical_id,
+            "PhysicalResourceId": stack_id if logical_id == "Failed" else "",
+            "ResourceType": "AWS::CloudFormation::Stack" if logical_id == "Failed" else "AWS::ECS::Service",
+            "Timestamp": f"2024-06-01T18:00:{seconds:02}+00:00",
+            "ResourceStatus": status,
+        }
+    operations = stack_operations([
+        event(0, "Failed", "CREATE_IN_PROGRESS"),
+        event(5, "Service", "CREATE_IN_PROGRESS"),
+        event(50, "Failed", "ROLLBACK_COMPLETE"),
+    ])
+    assert operations[stack_id]["Status"] == "ROLLBACK_COMPLETE"
+    assert operations[stack_id]["Resources"][0]["Seconds"] == 45
+
+
+def test_fetch_stops_at_the_latest_operation():
+    """ Reads newest first, and stops once it's back to where the stack's operation started """
+    client = boto3.client("cloudformation", region_name="us-west-2", aws_access_key_id="testing", aws_secret_access_key="testing")
+    _, events = load_recorded(FIXTURE)
+    link_events = [e for e in events if e["StackName"] == "ContainerManager-Minecraft-example-LinkTogetherStack"]
+    for e in link_events:
+        e["Timestamp"] = datetime.fromisoformat(e["Timestamp"]).astimezone(timezone.utc)
+    with Stubber(client) as stubber:
+        # Split across two pages, the operation starts on the second one:
+        stubber.add_response("describe_stack_events", {"StackEvents": link_events[:2], "NextToken": "page-2"})
+        stubber.add_response("describe_stack_events", {"StackEvents": link_events[2:]})
+        fetched = fetch_latest_operation(client, "ContainerManager-Minecraft-example-LinkTogetherStack")
+    # Just the UPDATE, none of the older CREATE:
+    assert len(fetched) == 5
+    assert fetched[-1]["ResourceStatus"] == "UPDATE_IN_PROGRESS"
+
+
+def test_recording_round_trips(tmp_path):
+    """ What `--record` saves, profiles the same as the original """
+    stack_names, events = load_recorded(FIXTURE)
+    for e in events:
+        # Like boto3 returns them:
+        e["Timestamp"] = datetime.fromisoformat(e["Timestamp"])
+    recorded_path = str(tmp_path / "recorded.json")
+    save_recorded(recorded_path, [(name, "us-west-2") for name in stack_names], events)
+    with open(recorded_path, encoding="utf-8") as recorded_file:
+        assert json.load(recorded_file)["Stacks"] == stack_names
+    assert profile(*load_recorded(recorded_path)) == fixture_report()
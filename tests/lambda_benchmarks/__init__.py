@@ -0,0 +1,6 @@
+"""
+Cold-start and import-time benchmarks for the lambdas.
+
+Each handler is loaded in a fresh interpreter (like a Lambda cold start),
+with botocore stubbed out so nothing ever touches AWS.
+"""
@@ -0,0 +1,195 @@
+"""
+What each lambda needs to run locally: It's environment, the event
+it's benchmarked with, and what the stubbed AWS calls return.
+
+The env vars match what the NestedStacks pass in. If a lambda gains a
+required var, add it here too (The benchmark will fail until you do).
+"""
+
+import json
+import gzip
+import base64
+from datetime import datetime, timezone
+
+LAMBDA_DIR = "./ContainerManager/leaf_stack/lambda"
+# The Lambda Layer every handler imports from. (Lambda puts it's 'python/' dir on the path):
+LAYER_DIR = f"{LAMBDA_DIR}/layers/structured-logging/python"
+
+## Shared by every lambda:
+CLUSTER_ARN = "arn:aws:ecs:us-west-2:123456789012:cluster/benchmark-cluster"
+TASK_ARN = "arn:aws:ecs:us-west-2:123456789012:task/benchmark-cluster/0123456789abcdef"
+CONTAINER_INSTANCE_ARN = "arn:aws:ecs:us-west-2:123456789012:container-instance/benchmark-cluster/fedcba9876543210"
+INSTANCE_ID = "i-0123456789abcdef0"
+METRIC_DIMENSIONS = json.dumps({"ContainerNameID": "Benchmark"})
+WAKE_TRACE = json.dumps({"CorrelationId": "0", "DnsQueryTime": 1704067200.0, "TriggerTime": 1704067200.5})
+
+
+def _dns_query_logs() -> dict:
+    """ The subscription filter event, the way CloudWatch Logs sends it """
+    log_data = {"logEvents": [{"id": "0", "timestamp": 1704067200000, "message": "benchmark.example.com A"}]}
+    return {"awslogs": {"data": base64.b64encode(gzip.compress(json.dumps(log_data).encode())).decode()}}
+
+
+HANDLERS = {
+    ## On the player-facing path: Every DNS query while the system is down hits this:
+    "trigger-start-system": {
+        "path": f"{LAMBDA_DIR}/trigger-start-system/main.py",
+        "env": {
+            "ASG_NAME": "benchmark-asg",
+            "MANAGER_STACK_REGION": "us-west-2",
+            "ECS_CLUSTER_NAME": "benchmark-cluster",
+            "ECS_SERVICE_NAME": "benchmark-service",
+            "WAKE_TRACE_PARAMETER": "/Benchmark/wake-trace",
+            "METRIC_NAMESPACE": "Benchmark",
+            "METRIC_NAME": "Metric-Activity",
+            "METRIC_THRESHOLD": "0",
+            "METRIC_UNIT": "Count",
+            "METRIC_DIMENSIONS": METRIC_DIMENSIONS,
+        },
+        "event": _dns_query_logs(),
+        "responses": {
+            ("cloudwatch", "PutMetricData"): {},
+            ("autoscaling", "UpdateAutoScalingGroup"): {},
+            ("ecs", "UpdateService"): {"service": {}},
+            # Every query after the first one in a wake, the trace is already started:
+            ("ssm", "GetParameter"): {"Parameter": {"Value": WAKE_TRACE}},
+        },
+    },
+    ## The launch lifecycle action, with the instance already having it's IP:
+    "instance-StateChange-hook": {
+        "path": f"{LAMBDA_DIR}/instance-StateChange-hook/main.py",
+        "env": {
+            "HOSTED_ZONE_ID": "Z0123456789",
+            "DOMAIN_NAME": "benchmark.example.com",
+            "UNAVAILABLE_IP": "0.0.0.0",
+            "DNS_TTL": "1",
+            "RECORD_TYPE": "A",
+            "WATCH_INSTANCE_RULE": "Benchmark-rule-watchdog",
+            "ECS_CLUSTER_NAME": "benchmark-cluster",
+            "ECS_SERVICE_NAME": "benchmark-service",
+            "ASG_NAME": "benchmark-asg",
+            "WAKE_TRACE_PARAMETER": "/Benchmark/wake-trace",
+        },
+        "event": {
+            "detail-type": "EC2 Instance-launch Lifecycle Action",
+            "detail": {
+                "AutoScalingGroupName": "benchmark-asg",
+                "EC2InstanceId": INSTANCE_ID,
+                "LifecycleHookName": "benchmark-hook",
+                "LifecycleActionToken": "00000000-0000-0000-0000-000000000000",
+            },
+        },
+        "responses": {
+            ("ec2", "DescribeInstances"): {"Reservations": [{"Instances": [{"PublicIpAddress": "192.0.2.1"}]}]},
+            ("route53", "ChangeResourceRecordSets"): {"ChangeInfo": {"Id": "0", "Status": "PENDING", "SubmittedAt": datetime(2024, 1, 1)}},
+            ("ecs", "UpdateService"): {"service": {}},
+            ("events", "EnableRule"): {},
+            ("ssm", "GetParameter"): {"Parameter": {"Value": WAKE_TRACE}},
+            ("autoscaling", "CompleteLifecycleAction"): {},
+        },
+    },
+    ## A normal check-in, with the container up and one player connected:
+    "watchdog-container-activity": {
+        "path": f"{LAMBDA_DIR}/watchdog-container-activity/main.py",
+        "env": {
+            "ASG_NAME": "benchmark-asg",
+            "TASK_DEFINITION": "Benchmark-task",
+            "CONNECTION_TYPE": "TCP",
+            "TCP_PORT": "25565",
+            "METRIC_NAME_ACTIVITY_COUNT": "Metric-Activity",
+            "METRIC_NAME_SSH_CONNECTIONS": "Metric-SSH",
+            "METRIC_NAMESPACE": "Benchmark",
+            "METRIC_UNIT": "Count",
+            "METRIC_DIMENSIONS": METRIC_DIMENSIONS,
+        },
+        "event": {"detail-type": "Scheduled Event", "detail": {}},
+        "responses": {
+            ("autoscaling", "DescribeAutoScalingGroups"): {"AutoScalingGroups": [{
+                "Instances": [{"InstanceId": INSTANCE_ID, "LifecycleState": "InService"}],
+            }]},
+            ("ssm", "SendCommand"): {"Command": {"CommandId": "00000000-0000-0000-0000-000000000000"}},
+            # (The waiter and the handler both read this)
+            ("ssm", "GetCommandInvocation"): {
+                "Status": "Success",
+                "StandardOutputContent": json.dumps({"activity_count": 1, "num_ssh_conn": 0, "health": "none"}),
+            },
+        },
+    },
+    ## The same check-in with 'Type: Query'. Nothing's listening, so the query fails fast and counts as 0:
+    "watchdog-container-activity-query": {
+        "path": f"{LAMBDA_DIR}/watchdog-container-activity/main.py",
+        "env": {
+            "ASG_NAME": "benchmark-asg",
+            "TASK_DEFINITION": "Benchmark-task",
+            "CONNECTION_TYPE": "QUERY",
+            "QUERY_PROTOCOL": "MINECRAFT_SLP",
+            "QUERY_PORT": "1",
+            "QUERY_TIMEOUT_MS": "1000",
+            "METRIC_NAME_ACTIVITY_COUNT": "Metric-Activity",
+            "METRIC_NAME_SSH_CONNECTIONS": "Metric-SSH",
+            "METRIC_NAMESPACE": "Benchmark",
+            "METRIC_UNIT": "Count",
+            "METRIC_DIMENSIONS": METRIC_DIMENSIONS,
+        },
+        "event": {"detail-type": "Scheduled Event", "detail": {}},
+        "responses": {
+            ("autoscaling", "DescribeAutoScalingGroups"): {"AutoScalingGroups": [{
+                "Instances": [{"InstanceId": INSTANCE_ID, "LifecycleState": "InService"}],
+            }]},
+            ("ec2", "DescribeInstances"): {"Reservations": [{"Instances": [{"PublicIpAddress": "127.0.0.1"}]}]},
+        },
+    },
+    ## A probe with nothing listening, so it never leaves the machine:
+    "latency-probe": {
+        "path": f"{LAMBDA_DIR}/latency-probe/main.py",
+        "env": {
+            "DOMAIN_NAME": "localhost",
+            "UNAVAILABLE_IP": "0.0.0.0",
+            "PROTOCOL": "TCP",
+            "PORT": "1",
+            "SAMPLES": "5",
+            "TIMEOUT_MS": "1000",
+            "METRIC_NAMESPACE": "Benchmark",
+            "METRIC_NAME_LATENCY": "Metric-ProbeLatency",
+            "METRIC_NAME_JITTER": "Metric-ProbeJitter",
+            "METRIC_NAME_FAILURES": "Metric-ProbeFailures",
+            "METRIC_DIMENSIONS": METRIC_DIMENSIONS,
+        },
+        "event": {"detail-type": "Scheduled Event", "detail": {}},
+        # (It's metrics are log lines, it never calls AWS):
+        "responses": {},
+    },
+    ## Finishing the trace, once the container is running:
+    "wake-trace": {
+        "path": f"{LAMBDA_DIR}/wake-trace/main.py",
+        "env": {
+            "WAKE_TRACE_PARAMETER": "/Benchmark/wake-trace",
+            "METRIC_NAMESPACE": "Benchmark",
+            "METRIC_NAME_TIME_TO_PLAYABLE": "Metric-TimeToPlayable",
+            "METRIC_NAME_WAKE_STAGE": "Metric-WakeStage",
+            "METRIC_DIMENSIONS": METRIC_DIMENSIONS,
+        },
+        "event": {
+            "detail-type": "ECS Task State Change",
+            "detail": {
+                "clusterArn": CLUSTER_ARN,
+                "taskArn": TASK_ARN,
+                "containerInstanceArn": CONTAINER_INSTANCE_ARN,
+                "pullStartedAt": "2024-01-01T00:01:10.000Z",
+                "pullStoppedAt": "2024-01-01T00:01:20.000Z",
+                "startedAt": "2024-01-01T00:01:25.000Z",
+            },
+        },
+        "responses": {
+            ("ssm", "GetParameter"): {"Parameter": {"Value": WAKE_TRACE}},
+            ("ssm", "PutParameter"): {"Version": 2},
+            ("ecs", "DescribeContainerInstances"): {"containerInstances": [{
+                "ec2InstanceId": INSTANCE_ID,
+                "registeredAt": datetime(2024, 1, 1, 0, 1, 0, tzinfo=timezone.utc),
+            }]},
+            ("ec2", "DescribeInstances"): {"Reservations": [{"Instances": [{
+                "LaunchTime": datetime(2024, 1, 1, 0, 0, 30, tzinfo=timezone.utc),
+            }]}]},
+        },
+    },
+}
@@ -0,0 +1,273 @@
+"""
+Runs the lambdas locally, and measures what a cold start costs.
+
+Each cold start happens in it's own interpreter, so nothing is already
+imported or cached. Inside it:
+    - ImportSeconds: Time spent in the handler's module-level imports (boto3 included).
+    - InitSeconds: Time to load the handler module. (Imports, env checks, clients, waiters).
+                   This is the part Lambda reports as "Init Duration".
+    - FirstInvokeSeconds: The first call to the handler. (Lazy loading inside boto3 lands here).
+    - WarmInvokeSeconds: The median of the calls after that.
+    - MaxMemoryMb: The process's memory high-water mark. (Same as Lambda's "Max Memory Used").
+    - Clients: How many boto3 clients were created while loading the handler.
+    - InitApiCalls: How many AWS calls were made while loading the handler. (Should always be 0).
+    - InvokeClients: How many boto3 clients the invocations created. (Ones it only makes on some paths).
+    - InvokeApiCalls: How many AWS calls one warm invocation makes.
+
+The invoke timings are only a few milliseconds, so they're too noisy to budget on a shared
+machine. The invoke counts are what's budgeted instead, and don't change from run to run.
+
+botocore is stubbed where it makes the actual request (`BaseClient._make_api_call`), so
+the clients, waiters, and parameter validation are all real. Only the network is fake.
+
+Run all of them with:
+    python -m tests.lambda_benchmarks.runner
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import builtins
+import statistics
+import subprocess
+import importlib.util
+from contextlib import redirect_stdout
+
+from tests.lambda_benchmarks.handlers import HANDLERS, LAYER_DIR
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+## Don't let anything find real credentials, or try the instance metadata service:
+FAKE_AWS_ENV = {
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_SESSION_TOKEN": "testing",
+    "AWS_DEFAULT_REGION": "us-west-2",
+    "AWS_REGION": "us-west-2",
+    "AWS_EC2_METADATA_DISABLED": "true",
+}
+
+## How each measurement is combined across cold starts. Timings use the fastest run (the
+## one with the least noise), everything else uses the worst:
+TIMING_METRICS = ["ImportSeconds", "InitSeconds", "FirstInvokeSeconds", "WarmInvokeSeconds"]
+WORST_CASE_METRICS = ["MaxMemoryMb", "Clients", "InitApiCalls", "InvokeClients", "InvokeApiCalls"]
+
+
+class LambdaContext:
+    """ Just enough of the Lambda context object, for the handlers that use it """
+    function_name = "benchmark"
+    memory_limit_in_mb = 128
+    aws_request_id = "00000000-0000-0000-0000-000000000000"
+
+    def __init__(self, timeout_seconds: int=900):
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        """ How long until the lambda would time out """
+        return int((self._deadline - time.monotonic()) * 1000)
+
+
+class StubbedAws:
+    """
+    Replaces the network side of botocore with canned responses.
+
+    Installed as soon as the handler imports botocore, so it's in place before
+    any clients are created. Counts what the handler creates and calls.
+    """
+    def __init__(self, responses: dict):
+        self.responses = responses
+        self.installed = False
+        self.clients = 0
+        self.api_calls = []
+
+    def install_if_imported(self) -> None:
+        """ Install the stub, once botocore is imported """
+        if self.installed or "botocore.client" not in sys.modules or "botocore.session" not in sys.modules:
+            return
+        self.installed = True
+        botocore_client = sys.modules["botocore.client"]
+        botocore_session = sys.modules["botocore.session"]
+        stub = self
+
+        create_client = botocore_session.Session.create_client
+        def counted_create_client(session, *args, **kwargs):
+            stub.clients += 1
+            return create_client(session, *args, **kwargs)
+        botocore_session.Session.create_client = counted_create_client
+
+        def stubbed_make_api_call(client, operation_name, api_params):
+            return stub.make_api_call(client, operation_name, api_params)
+        botocore_client.BaseClient._make_api_call = stubbed_make_api_call
+
+    def make_api_call(self, client, operation_name: str, api_params: dict) -> dict:
+        """ Validate the call like botocore would, then return the canned response """
+        # pylint: disable=import-outside-toplevel
+        from botocore.validate import validate_parameters
+        service_name = client.meta.service_model.service_name
+        self.api_calls.append((service_name, operation_name))
+        operation_model = client.meta.service_model.operation_model(operation_name)
+        validate_parameters(api_params, operation_model.input_shape)
+        if (service_name, operation_name) not in self.responses:
+            raise RuntimeError(f"No stubbed response for '{service_name}.{operation_name}'. Add it in 'tests/lambda_benchmarks/handlers.py'.")
+        response = self.responses[(service_name, operation_name)]
+        if "Error" in response:
+            raise client.exceptions.from_code(response["Error"]["Code"])(response, operation_name)
+        return response
+
+
+class ImportTimer:
+    """ Times every import statement the handler module runs at it's top level """
+    def __init__(self, stub: StubbedAws):
+        self.stub = stub
+        self.seconds = 0.0
+        self._depth = 0
+        self._original_import = builtins.__import__
+
+    def __enter__(self):
+        builtins.__import__ = self._timed_import
+        return self
+
+    def __exit__(self, *exc_info):
+        builtins.__import__ = self._original_import
+
+    def _timed_import(self, *args, **kwargs):
+        # Only the outermost import counts, the nested ones are already inside it:
+        self._depth += 1
+        start_time = time.perf_counter()
+        try:
+            return self._original_import(*args, **kwargs)
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.seconds += time.perf_counter() - start_time
+                # (Not until the outermost import finishes, botocore might only be half-imported before that)
+                self.stub.install_if_imported()
+
+
+def max_memory_mb() -> float:
+    """ The memory high-water mark of this process """
+    ## Linux: VmHWM belongs to this process's memory, which exec started fresh. (ru_maxrss
+    #    does NOT reset on exec, so it'd report whichever process started us if it was bigger):
+    try:
+        with open("/proc/self/status", encoding="utf-8") as status_file:
+            for line in status_file:
+                if line.startswith("VmHWM:"):
+                    # "VmHWM:     48212 kB":
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    # pylint: disable=import-outside-toplevel
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports it in bytes, (and resets it on exec):
+    return max_rss / (1024 * 1024)
+
+
+def run_cold_start(handler_name: str, warm_invocations: int) -> dict:
+    """ Load and invoke the handler, in THIS interpreter. (It should be a fresh one) """
+    handler = HANDLERS[handler_name]
+    os.environ.update(FAKE_AWS_ENV)
+    os.environ.update(handler["env"])
+    stub = StubbedAws(handler["responses"])
+
+    ## Load the handler, the same way Lambda does for "main.lambda_handler":
+    sys.path.insert(0, os.path.join(REPO_ROOT, LAYER_DIR))
+    # (And the function's own dir, for anything it imports next to main.py):
+    sys.path.insert(0, os.path.dirname(os.path.join(REPO_ROOT, handler["path"])))
+    spec = importlib.util.spec_from_file_location("main", os.path.join(REPO_ROOT, handler["path"]))
+    module = importlib.util.module_from_spec(spec)
+    start_time = time.perf_counter()
+    with ImportTimer(stub) as import_timer:
+        spec.loader.exec_module(module)
+    init_seconds = time.perf_counter() - start_time
+    init_clients, init_api_calls = stub.clients, len(stub.api_calls)
+
+    ## Invoke it. (Throw away what it logs, but still pay for logging it):
+    invoke_seconds = []
+    with redirect_stdout(io.StringIO()):
+        for _ in range(1 + warm_invocations):
+            api_calls_before = len(stub.api_calls)
+            start_time = time.perf_counter()
+            module.lambda_handler(handler["event"], LambdaContext())
+            invoke_seconds.append(time.perf_counter() - start_time)
+
+    return {
+        "ImportSeconds": import_timer.seconds,
+        "InitSeconds": init_seconds,
+        "FirstInvokeSeconds": invoke_seconds[0],
+        "WarmInvokeSeconds": statistics.median(invoke_seconds[1:]) if warm_invocations else None,
+        "MaxMemoryMb": max_memory_mb(),
+        "Clients": init_clients,
+        "InitApiCalls": init_api_calls,
+        "InvokeClients": stub.clients - init_clients,
+        # (The last one. It's warm, like the rest after the first):
+        "InvokeApiCalls": len(stub.api_calls) - api_calls_before,
+    }
+
+
+def benchmark(handler_name: str, cold_starts: int=3, warm_invocations: int=20) -> dict:
+    """ Cold start the handler a few times, each in a new interpreter, and combine the results """
+    env = {k: v for k, v in os.environ.items() if not k.startswith("AWS_")}
+    runs = []
+    for _ in range(cold_starts):
+        output = subprocess.run(
+            [sys.executable, "-m", "tests.lambda_benchmarks.runner", "--cold-start", handler_name, "--warm-invocations", str(warm_invocations)],
+            cwd=REPO_ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if output.returncode != 0:
+            raise RuntimeError(f"Cold start of '{handler_name}' failed:\n{output.stderr}")
+        runs.append(json.loads(output.stdout))
+    results = {metric: min(run[metric] for run in runs) for metric in TIMING_METRICS}
+    results.update({metric: max(run[metric] for run in runs) for metric in WORST_CASE_METRICS})
+    return results
+
+
+def print_table(all_results: dict) -> None:
+    """ Print the results, one row per handler """
+    columns = TIMING_METRICS + WORST_CASE_METRICS
+    name_width = max(len(name) for name in all_results)
+    print(f"{'Handler':<{name_width}}  " + "  ".join(f"{column:>18}" for column in columns))
+    for name, results in all_results.items():
+        row = []
+        for column in columns:
+            value = results[column]
+            if column in TIMING_METRICS:
+                row.append(f"{value * 1000:>16.1f}ms")
+            else:
+                row.append(f"{value:>18.1f}" if isinstance(value, float) else f"{value:>18}")
+        print(f"{name:<{name_width}}  " + "  ".join(row))
+
+
+def main() -> None:
+    """ Benchmark every handler (or just one cold start, when called by `benchmark`) """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cold-start", choices=HANDLERS.keys(), help="Run a single cold start in this interpreter, and print the results as JSON.")
+    parser.add_argument("--handler", choices=HANDLERS.keys(), action="append", help="Only benchmark this handler. (Can be passed more than once)")
+    parser.add_argument("--cold-starts", type=int, default=3, help="How many cold starts to run per handler.")
+    parser.add_argument("--warm-invocations", type=int, default=20, help="How many warm invocations to run after each cold start.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON, instead of a table.")
+    args = parser.parse_args()
+
+    if args.cold_start:
+        print(json.dumps(run_cold_start(args.cold_start, args.warm_invocations)))
+        return
+
+    all_results = {
+        name: benchmark(name, cold_starts=args.cold_starts, warm_invocations=args.warm_invocations)
+        for name in (args.handler or HANDLERS)
+    }
+    if args.json:
+        print(json.dumps(all_results, indent=4))
+    else:
+        print_table(all_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Fails if a lambda's cold start goes over it's budget in `thresholds.json`.
+
+Only the load times are budgeted as timings, with plenty of headroom since CI
+machines vary. (The invokes are only milliseconds, so their clients and AWS
+calls are budgeted instead). If yours is slower, scale ONLY the timings with:
+    LAMBDA_BENCHMARK_BUDGET_SCALE=2 pytest tests/lambda_benchmarks
+The rest (memory, number of clients, AWS calls) are never scaled.
+
+If a change makes a lambda slower on purpose, update the budget in the same PR.
+"""
+
+import os
+import json
+
+import pytest
+
+from tests.lambda_benchmarks.handlers import HANDLERS
+from tests.lambda_benchmarks.runner import benchmark, TIMING_METRICS
+
+with open(os.path.join(os.path.dirname(__file__), "thresholds.json"), encoding="utf-8") as thresholds_file:
+    THRESHOLDS = json.load(thresholds_file)
+BUDGET_SCALE = float(os.environ.get("LAMBDA_BENCHMARK_BUDGET_SCALE", "1"))
+
+
+def test_every_handler_has_a_budget():
+    """ A new lambda should get a budget too """
+    assert set(THRESHOLDS) == set(HANDLERS)
+
+
+@pytest.mark.parametrize("handler_name", HANDLERS.keys())
+def test_cold_start_within_budget(handler_name: str):
+    """ Cold start the handler, and compare every measurement to it's budget """
+    results = benchmark(handler_name)
+    print(json.dumps({handler_name: results}, indent=4))
+
+    over_budget = []
+    for metric, budget in THRESHOLDS[handler_name].items():
+        if metric in TIMING_METRICS:
+            budget *= BUDGET_SCALE
+        if results[metric] > budget:
+            over_budget.append(f"{metric}: {results[metric]:.4g} > {budget:.4g}")
+    assert not over_budget, f"'{handler_name}' is over budget: " + ", ".join(over_budget)
@@ -0,0 +1,6 @@
+"""
+Offline simulator for a whole leaf: Wake, play, idle, and shut down.
+
+The real lambdas run against in-memory stand-ins for AWS, on a virtual
+clock, so hours of a leaf's life take seconds and never touch AWS.
+"""
@@ -0,0 +1,547 @@
+"""
+In-memory stand-ins for the AWS services the lambdas talk to.
+
+Only the calls the lambdas actually make are here. Each one is named after the
+boto3 method (`update_auto_scaling_group`), and takes the same parameters. Anything
+that takes time in AWS (launching, pulling the image, terminating...) is scheduled
+on the simulation's clock, using the timings in `simulator.DEFAULT_TIMINGS`.
+"""
+
+import json
+from datetime import datetime, timezone
+
+REGION = "us-west-2"
+ACCOUNT = "123456789012"
+
+
+class AwsError(Exception):
+    """ An error response from AWS (i.e 'ParameterNotFound') """
+    def __init__(self, code: str, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+
+
+def to_datetime(timestamp: float) -> datetime:
+    """ What boto3 returns for timestamps """
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def to_iso(timestamp: float) -> str:
+    """ What EventBridge events use for timestamps (i.e '2024-01-01T00:00:00.000Z') """
+    return to_datetime(timestamp).strftime("%Y-%m-%dT%H:%M:%S.") + f"{int(timestamp * 1000) % 1000:03d}Z"
+
+
+class FakeService:
+    """ Shared by every service: Access to the simulation it's part of """
+    def __init__(self, sim):
+        self.sim = sim
+
+    @property
+    def now(self) -> float:
+        """ The simulation's current time """
+        return self.sim.clock.now
+
+
+class FakeAutoScaling(FakeService):
+    """
+    The leaf's ASG. Max size of one, a launch lifecycle hook (completed by the
+    AsgStateChangeHook), and ECS managed draining on terminate.
+    """
+    def __init__(self, sim, asg_name: str, protect_from_scale_in: bool):
+        super().__init__(sim)
+        self.asg_name = asg_name
+        self.protect_from_scale_in = protect_from_scale_in
+        self.desired_capacity = 0
+        # Every instance this ASG ever had, including terminated ones:
+        self.instances = {}
+        self._launch_pending = False
+
+    def alive_instances(self) -> list:
+        """ Instances that are launching or in service """
+        return [i for i in self.instances.values() if not i["LifecycleState"].startswith("Terminat")]
+
+    def in_service_count(self) -> int:
+        """ What the GroupInServiceInstances metric reports """
+        return len([i for i in self.instances.values() if i["LifecycleState"] == "InService"])
+
+    def set_desired_capacity(self, desired_capacity: int) -> None:
+        """ What both the API and the scaling policy do """
+        self.desired_capacity = desired_capacity
+        self.sim.schedule(0, self.reconcile)
+
+    def reconcile(self) -> None:
+        """ Launch or terminate, to match the desired capacity """
+        alive = self.alive_instances()
+        if len(alive) < self.desired_capacity and not self._launch_pending:
+            self._launch_pending = True
+            self.sim.schedule(self.sim.timings["AsgLaunchSeconds"], self._launch)
+        elif len(alive) > self.desired_capacity:
+            # Scale-in protection stops the ASG from picking it:
+            for instance in alive:
+                if instance["LifecycleState"] == "InService" and not instance["ProtectedFromScaleIn"]:
+                    self._start_terminate(instance)
+                    break
+
+    def _launch(self) -> None:
+        self._launch_pending = False
+        # Might've been told to scale back in, while waiting:
+        if len(self.alive_instances()) >= self.desired_capacity:
+            return
+        instance_id = f"i-{len(self.instances) + 1:017x}"
+        self.instances[instance_id] = {
+            "InstanceId": instance_id,
+            "LifecycleState": "Pending:Wait",
+            "ProtectedFromScaleIn": self.protect_from_scale_in,
+            "LifecycleActionToken": f"{len(self.instances) + 1:08x}-0000-0000-0000-000000000000",
+            "LaunchedAt": self.now,
+            "TerminatedAt": None,
+        }
+        self.sim.ec2.launch_instance(instance_id)
+        self.sim.ecs.schedule_register(instance_id)
+        self.sim.put_event("aws.autoscaling", "EC2 Instance-launch Lifecycle Action", {
+            **self._event_detail(instance_id),
+            "LifecycleHookName": "LaunchLifecycleHook",
+            "LifecycleTransition": "autoscaling:EC2_INSTANCE_LAUNCHING",
+            "LifecycleActionToken": self.instances[instance_id]["LifecycleActionToken"],
+            "Origin": "EC2",
+            "Destination": "AutoScalingGroup",
+        })
+        # The hook's default result is CONTINUE, if nobody completes it:
+        self.sim.schedule(self.sim.timings["LifecycleHeartbeatSeconds"], self._finish_launch, instance_id)
+
+    def _finish_launch(self, instance_id: str) -> None:
+        instance = self.instances[instance_id]
+        if instance["LifecycleState"] != "Pending:Wait":
+            return
+        instance["LifecycleState"] = "Pending:Proceed"
+        self.sim.schedule(self.sim.timings["InServiceSeconds"], self._in_service, instance_id)
+
+    def _in_service(self, instance_id: str) -> None:
+        instance = self.instances[instance_id]
+        if instance["LifecycleState"] != "Pending:Proceed":
+            return
+        instance["LifecycleState"] = "InService"
+        self.sim.put_event("aws.autoscaling", "EC2 Instance Launch Successful", {
+            **self._event_detail(instance_id),
+            "Origin": "EC2",
+            "Destination": "AutoScalingGroup",
+        })
+        self.reconcile()
+
+    def _start_terminate(self, instance: dict) -> None:
+        instance["LifecycleState"] = "Terminating:Wait"
+        self.sim.put_event("aws.autoscaling", "EC2 Instance-terminate Lifecycle Action", {
+            **self._event_detail(instance["InstanceId"]),
+            "LifecycleHookName": "ecs-managed-draining-termination-hook",
+            "LifecycleTransition": "autoscaling:EC2_INSTANCE_TERMINATING",
+            "Origin": "AutoScalingGroup",
+            "Destination": "EC2",
+        })
+        # ECS drains the task, then lets the instance go:
+        self.sim.schedule(self.sim.timings["TerminateSeconds"], self._terminated, instance["InstanceId"])
+
+    def _terminated(self, instance_id: str) -> None:
+        instance = self.instances[instance_id]
+        instance["LifecycleState"] = "Terminated"
+        instance["TerminatedAt"] = self.now
+        self.sim.ecs.deregister(instance_id)
+        self.sim.ec2.terminate_instance(instance_id)
+        self.reconcile()
+
+    def _event_detail(self, instance_id: str) -> dict:
+        return {"AutoScalingGroupName": self.asg_name, "EC2InstanceId": instance_id}
+
+    ## The API:
+    def update_auto_scaling_group(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/autoscaling/client/update_auto_scaling_group.html """
+        self.set_desired_capacity(params["DesiredCapacity"])
+        return {}
+
+    def describe_auto_scaling_groups(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/autoscaling/client/describe_auto_scaling_groups.html """
+        assert params["AutoScalingGroupNames"] == [self.asg_name], f"Unknown ASG: {params['AutoScalingGroupNames']}"
+        return {"AutoScalingGroups": [{
+            "AutoScalingGroupName": self.asg_name,
+            "MinSize": 0,
+            "MaxSize": 1,
+            "DesiredCapacity": self.desired_capacity,
+            "Instances": [{
+                "InstanceId": instance["InstanceId"],
+                "LifecycleState": instance["LifecycleState"],
+                "HealthStatus": "Healthy",
+                "ProtectedFromScaleIn": instance["ProtectedFromScaleIn"],
+            } for instance in self.alive_instances()],
+        }]}
+
+    def complete_lifecycle_action(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/autoscaling/client/complete_lifecycle_action.html """
+        instance = self.instances.get(params["InstanceId"])
+        if instance is None or instance["LifecycleActionToken"] != params.get("LifecycleActionToken"):
+            raise AwsError("ValidationError", "No active Lifecycle Action found with token")
+        if instance["LifecycleState"] == "Pending:Wait":
+            self._finish_launch(params["InstanceId"])
+        return {}
+
+    def set_instance_protection(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/autoscaling/client/set_instance_protection.html """
+        for instance_id in params["InstanceIds"]:
+            self.instances[instance_id]["ProtectedFromScaleIn"] = params["ProtectedFromScaleIn"]
+        self.sim.schedule(0, self.reconcile)
+        return {}
+
+
+class FakeEc2(FakeService):
+    """ Just the instances' IPs and launch times, and the Elastic IP if there is one """
+    def __init__(self, sim, elastic_ip: str | None):
+        super().__init__(sim)
+        self.instances = {}
+        self.elastic_ip = elastic_ip
+        self.elastic_ip_instance = None
+
+    def launch_instance(self, instance_id: str) -> None:
+        """ Every instance gets a public IP the moment it launches """
+        self.instances[instance_id] = {
+            "InstanceId": instance_id,
+            "LaunchTime": to_datetime(self.now),
+            "PublicIpAddress": f"203.0.113.{len(self.instances) + 1}",
+            "State": {"Name": "running"},
+        }
+
+    def terminate_instance(self, instance_id: str) -> None:
+        """ It loses it's IP, and the Elastic IP if it had it """
+        instance = self.instances[instance_id]
+        instance["State"] = {"Name": "terminated"}
+        instance.pop("PublicIpAddress", None)
+        if self.elastic_ip_instance == instance_id:
+            self.elastic_ip_instance = None
+
+    def instance_at_ip(self, ip: str) -> str | None:
+        """ Where a player ends up, if they connect to this IP """
+        for instance in self.instances.values():
+            if instance.get("PublicIpAddress") == ip:
+                return instance["InstanceId"]
+        return None
+
+    ## The API:
+    def describe_instances(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ec2/client/describe_instances.html """
+        for instance_id in params["InstanceIds"]:
+            if instance_id not in self.instances:
+                raise AwsError("InvalidInstanceID.NotFound", f"The instance ID '{instance_id}' does not exist")
+        return {"Reservations": [{"Instances": [dict(self.instances[i]) for i in params["InstanceIds"]]}]}
+
+    def associate_address(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ec2/client/associate_address.html """
+        instance = self.instances.get(params["InstanceId"])
+        if instance is None or instance["State"]["Name"] != "running":
+            raise AwsError("IncorrectInstanceState", "The instance is not in a valid state for this operation")
+        if self.elastic_ip_instance and self.elastic_ip_instance != params["InstanceId"]:
+            if not params.get("AllowReassociation"):
+                raise AwsError("Resource.AlreadyAssociated", "The Elastic IP is already associated")
+            # The old instance gets a new (random) public IP:
+            self.instances[self.elastic_ip_instance]["PublicIpAddress"] = f"198.51.100.{len(self.instances) + 100}"
+        instance["PublicIpAddress"] = self.elastic_ip
+        self.elastic_ip_instance = params["InstanceId"]
+        return {"AssociationId": "eipassoc-0123456789abcdef0"}
+
+
+class FakeEcs(FakeService):
+    """
+    The cluster and it's one service. Places the task as soon as there's a registered
+    instance and the service wants one, then pulls the image and starts the container.
+    """
+    def __init__(self, sim, cluster_name: str, service_name: str, readiness_check: bool):
+        super().__init__(sim)
+        self.cluster_name = cluster_name
+        self.cluster_arn = f"arn:aws:ecs:{REGION}:{ACCOUNT}:cluster/{cluster_name}"
+        self.service_name = service_name
+        self.readiness_check = readiness_check
+        self.desired_count = 0
+        self.container_instances = {}
+        # Every task the service ever ran, newest last:
+        self.tasks = []
+        # Instances that already have the image, so the next pull is fast:
+        self._cached_images = set()
+
+    def active_task(self) -> dict | None:
+        """ The task that hasn't stopped yet, if there is one """
+        for task in self.tasks:
+            if task["lastStatus"] != "STOPPED":
+                return task
+        return None
+
+    def accepting_players(self, instance_id: str) -> bool:
+        """ If the game on this instance is up, and players can join """
+        task = self.active_task()
+        return bool(
+            task and task["InstanceId"] == instance_id
+            and task["desiredStatus"] == "RUNNING" and task["lastStatus"] == "RUNNING"
+            and self.now >= task["ReadyAt"]
+        )
+
+    def schedule_register(self, instance_id: str) -> None:
+        """ The ECS agent registers once the instance boots """
+        self.sim.schedule(self.sim.timings["EcsRegisterSeconds"], self._register, instance_id)
+
+    def _register(self, instance_id: str) -> None:
+        if self.sim.ec2.instances[instance_id]["State"]["Name"] != "running":
+            return
+        arn = f"arn:aws:ecs:{REGION}:{ACCOUNT}:container-instance/{self.cluster_name}/{instance_id[2:]}"
+        self.container_instances[arn] = {"containerInstanceArn": arn, "ec2InstanceId": instance_id, "registeredAt": to_datetime(self.now)}
+        self._place()
+
+    def deregister(self, instance_id: str) -> None:
+        """ The instance is gone, and so is anything running on it """
+        for arn, container_instance in list(self.container_instances.items()):
+            if container_instance["ec2InstanceId"] == instance_id:
+                del self.container_instances[arn]
+        task = self.active_task()
+        if task and task["InstanceId"] == instance_id:
+            self._task_stopped(task)
+
+    def _place(self) -> None:
+        if self.desired_count < 1 or self.active_task() or not self.container_instances:
+            return
+        container_instance = next(iter(self.container_instances.values()))
+        instance_id = container_instance["ec2InstanceId"]
+        task = {
+            "taskArn": f"arn:aws:ecs:{REGION}:{ACCOUNT}:task/{self.cluster_name}/{len(self.tasks) + 1:032x}",
+            "clusterArn": self.cluster_arn,
+            "containerInstanceArn": container_instance["containerInstanceArn"],
+            "lastStatus": "PENDING",
+            "desiredStatus": "RUNNING",
+            "healthStatus": "UNKNOWN",
+            "pullStartedAt": self.now,
+            "InstanceId": instance_id,
+            "ReadyAt": None,
+        }
+        self.tasks.append(task)
+        pull_seconds = self.sim.timings["CachedImagePullSeconds" if instance_id in self._cached_images else "ImagePullSeconds"]
+        self.sim.schedule(pull_seconds, self._task_running, task)
+
+    def _task_running(self, task: dict) -> None:
+        if task["desiredStatus"] != "RUNNING":
+            return
+        self._cached_images.add(task["InstanceId"])
+        task.update({
+            "lastStatus": "RUNNING",
+            "pullStoppedAt": self.now,
+            "startedAt": self.now,
+            "ReadyAt": self.now + self.sim.timings["GameStartSeconds"],
+        })
+        if self.readiness_check:
+            self.sim.schedule(self.sim.timings["GameStartSeconds"], self._task_healthy, task)
+        self.sim.put_event("aws.ecs", "ECS Task State Change", {
+            "clusterArn": task["clusterArn"],
+            "taskArn": task["taskArn"],
+            "containerInstanceArn": task["containerInstanceArn"],
+            "lastStatus": "RUNNING",
+            "desiredStatus": "RUNNING",
+            "pullStartedAt": to_iso(task["pullStartedAt"]),
+            "pullStoppedAt": to_iso(task["pullStoppedAt"]),
+            "startedAt": to_iso(task["startedAt"]),
+        })
+
+    def _task_healthy(self, task: dict) -> None:
+        if task["lastStatus"] == "RUNNING":
+            task["healthStatus"] = "HEALTHY"
+
+    def _task_stopped(self, task: dict) -> None:
+        if task["lastStatus"] == "STOPPED":
+            return
+        task.update({"lastStatus": "STOPPED", "desiredStatus": "STOPPED"})
+        self.sim.drop_players(task["InstanceId"])
+        # The service might still want one (i.e someone reconnected while it was stopping):
+        self._place()
+
+    ## The API:
+    def update_service(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ecs/client/update_service.html """
+        assert params["cluster"] == self.cluster_name and params["service"] == self.service_name
+        self.desired_count = params["desiredCount"]
+        task = self.active_task()
+        if self.desired_count == 0 and task and task["desiredStatus"] == "RUNNING":
+            task["desiredStatus"] = "STOPPED"
+            self.sim.schedule(self.sim.timings["TaskStopSeconds"], self._task_stopped, task)
+        self.sim.schedule(0, self._place)
+        return {"service": {"serviceName": self.service_name, "desiredCount": self.desired_count}}
+
+    def describe_tasks(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ecs/client/describe_tasks.html """
+        fields = ["taskArn", "clusterArn", "containerInstanceArn", "lastStatus", "desiredStatus", "healthStatus"]
+        return {"tasks": [{k: task[k] for k in fields} for task in self.tasks if task["taskArn"] in params["tasks"]]}
+
+    def describe_container_instances(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ecs/client/describe_container_instances.html """
+        return {"containerInstances": [self.container_instances[arn] for arn in params["containerInstances"] if arn in self.container_instances]}
+
+
+class FakeRoute53(FakeService):
+    """ The leaf's one DNS record """
+    def __init__(self, sim, unavailable_ip: str):
+        super().__init__(sim)
+        self.record_value = unavailable_ip
+        self.changes = []
+
+    def change_resource_record_sets(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/route53/client/change_resource_record_sets.html """
+        for change in params["ChangeBatch"]["Changes"]:
+            self.record_value = change["ResourceRecordSet"]["ResourceRecords"][0]["Value"]
+            self.changes.append((self.now, self.record_value))
+        return {"ChangeInfo": {"Id": f"/change/{len(self.changes)}", "Status": "PENDING", "SubmittedAt": to_datetime(self.now)}}
+
+
+class FakeSsm(FakeService):
+    """ Parameter Store (the wake trace), and Run Command (the watchdog's connection count) """
+    def __init__(self, sim):
+        super().__init__(sim)
+        self.parameters = {}
+        self.command_invocations = {}
+
+    def put_parameter(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ssm/client/put_parameter.html """
+        if params["Name"] in self.parameters and not params.get("Overwrite"):
+            raise AwsError("ParameterAlreadyExists", "The parameter already exists.")
+        version = self.parameters.get(params["Name"], {}).get("Version", 0) + 1
+        self.parameters[params["Name"]] = {"Name": params["Name"], "Value": params["Value"], "Type": params.get("Type", "String"), "Version": version}
+        return {"Version": version}
+
+    def get_parameter(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ssm/client/get_parameter.html """
+        if params["Name"] not in self.parameters:
+            raise AwsError("ParameterNotFound", params["Name"])
+        return {"Parameter": dict(self.parameters[params["Name"]])}
+
+    def send_command(self, **params) -> dict:
+        """
+        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ssm/client/send_command.html
+
+        Doesn't run the script, just answers what it would've. (It exits with an
+        error if the container isn't running, same as the real one).
+        """
+        command_id = f"{len(self.command_invocations) + 1:08x}-0000-0000-0000-000000000000"
+        for instance_id in params["InstanceIds"]:
+            connections = self.sim.connection_counts(instance_id)
+            if connections is None:
+                invocation = {"Status": "Failed", "StandardOutputContent": "Task has not started yet. Exiting.\n"}
+            else:
+                invocation = {"Status": "Success", "StandardOutputContent": json.dumps(connections)}
+            self.command_invocations[(command_id, instance_id)] = {"CommandId": command_id, "InstanceId": instance_id, **invocation}
+        return {"Command": {"CommandId": command_id, "InstanceIds": params["InstanceIds"]}}
+
+    def get_command_invocation(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/ssm/client/get_command_invocation.html """
+        key = (params["CommandId"], params["InstanceId"])
+        if key not in self.command_invocations:
+            raise AwsError("InvocationDoesNotExist", "")
+        return dict(self.command_invocations[key])
+
+
+class FakeCloudWatch(FakeService):
+    """ Custom metrics. (The alarms are in `simulator.Alarm`) """
+    def __init__(self, sim):
+        super().__init__(sim)
+        # (namespace, metric name, dimensions) -> [(timestamp, value), ...]
+        self.datapoints = {}
+
+    def datapoints_between(self, namespace: str, metric_name: str, dimensions: dict, start: float, end: float) -> list:
+        """ The (timestamp, value) pairs in [start, end) """
+        key = (namespace, metric_name, tuple(sorted(dimensions.items())))
+        return [(timestamp, value) for timestamp, value in self.datapoints.get(key, []) if start <= timestamp < end]
+
+    def values(self, namespace: str, metric_name: str, dimensions: dict, start: float, end: float) -> list:
+        """ The values in [start, end) """
+        return [value for _, value in self.datapoints_between(namespace, metric_name, dimensions, start, end)]
+
+    def put_metric_data(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch/client/put_metric_data.html """
+        for datum in params["MetricData"]:
+            dimensions = tuple(sorted((d["Name"], d["Value"]) for d in datum.get("Dimensions", [])))
+            timestamp = datum["Timestamp"].timestamp() if "Timestamp" in datum else self.now
+            key = (params["Namespace"], datum["MetricName"], dimensions)
+            self.datapoints.setdefault(key, []).append((timestamp, datum["Value"]))
+        return {}
+
+    def get_metric_data(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch/client/get_metric_data.html """
+        start, end = params["StartTime"].timestamp(), params["EndTime"].timestamp()
+        results = []
+        for query in params["MetricDataQueries"]:
+            metric_stat = query["MetricStat"]
+            if metric_stat["Stat"] != "Maximum":
+                raise NotImplementedError(f"The simulator only has the 'Maximum' statistic, not '{metric_stat['Stat']}'.")
+            metric = metric_stat["Metric"]
+            dimensions = {d["Name"]: d["Value"] for d in metric.get("Dimensions", [])}
+            ## One value per period, lined up on the period boundaries. Newest first, like CloudWatch's default:
+            period = metric_stat["Period"]
+            periods = {}
+            for timestamp, value in self.datapoints_between(metric["Namespace"], metric["MetricName"], dimensions, start, end):
+                period_start = timestamp // period * period
+                periods[period_start] = max(value, periods.get(period_start, value))
+            timestamps = sorted(periods, reverse=True)
+            results.append({
+                "Id": query["Id"],
+                "Timestamps": [to_datetime(timestamp) for timestamp in timestamps],
+                "Values": [periods[timestamp] for timestamp in timestamps],
+                "StatusCode": "Complete",
+            })
+        return {"MetricDataResults": results}
+
+    def set_alarm_state(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch/client/set_alarm_state.html """
+        alarm = self.sim.alarms_by_name().get(params["AlarmName"])
+        if alarm is None:
+            raise AwsError("ResourceNotFound", f"Alarm '{params['AlarmName']}' does not exist.")
+        # It only stays this way until the next evaluation:
+        self.sim.set_alarm_state(alarm, params["StateValue"])
+        return {}
+
+    def extract_metrics(self, logs: str) -> None:
+        """ Pull the Embedded Metric Format lines out of a lambda's logs, like CloudWatch Logs does """
+        # https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+        for line in logs.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict) or "_aws" not in record:
+                continue
+            timestamp = record["_aws"]["Timestamp"] / 1000
+            for directive in record["_aws"]["CloudWatchMetrics"]:
+                for dimension_set in directive["Dimensions"]:
+                    dimensions = tuple(sorted((name, record[name]) for name in dimension_set))
+                    for metric in directive["Metrics"]:
+                        values = record[metric["Name"]]
+                        key = (directive["Namespace"], metric["Name"], dimensions)
+                        for value in values if isinstance(values, list) else [values]:
+                            self.datapoints.setdefault(key, []).append((timestamp, value))
+
+
+class FakeEvents(FakeService):
+    """ Which EventBridge rules are turned on. (Routing is in `simulator.Simulation.put_event`) """
+    def __init__(self, sim):
+        super().__init__(sim)
+        self.enabled_rules = set()
+
+    def enable_rule(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/events/client/enable_rule.html """
+        self.enabled_rules.add(params["Name"])
+        return {}
+
+    def disable_rule(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/events/client/disable_rule.html """
+        self.enabled_rules.discard(params["Name"])
+        return {}
+
+
+class FakeSns(FakeService):
+    """ Just remembers what was sent """
+    def __init__(self, sim):
+        super().__init__(sim)
+        self.messages = []
+
+    def publish(self, **params) -> dict:
+        """ https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/sns/client/publish.html """
+        self.messages.append({"Time": self.now, "TopicArn": params["TopicArn"], "Message": params["Message"]})
+        return {"MessageId": f"{len(self.messages):08x}-0000-0000-0000-000000000000"}
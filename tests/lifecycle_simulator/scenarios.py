@@ -0,0 +1,142 @@
+"""
+Scenarios to play through a leaf, and a runner to print what each one cost.
+
+Each scenario is a config (an example, plus overrides), and what the players do.
+Times are seconds from the start of the simulation.
+
+Usage:
+    python3 -m tests.lifecycle_simulator.scenarios [--scenario NAME] [--json]
+"""
+
+import json
+import argparse
+
+from tests.lifecycle_simulator.simulator import Simulation, load_config
+
+MINECRAFT = "./Examples/Minecraft-example.yaml"
+VALHEIM = "./Examples/Valheim-example.yaml"
+
+SCENARIOS = {
+    ## One player wakes it up, plays for half an hour, and leaves:
+    "single-session": {
+        "Config": MINECRAFT,
+        "Players": [{"ArriveAt": 60, "PlaySeconds": 30 * 60}],
+        "DurationSeconds": 2 * 60 * 60,
+    },
+    ## Someone looks up the domain (i.e a server list pinging it), and never connects:
+    "nobody-connects": {
+        "Config": MINECRAFT,
+        "DnsQueries": [60],
+        "DurationSeconds": 60 * 60,
+    },
+    ## An admin is still SSH-ed in after the last player leaves:
+    "ssh-keeps-it-up": {
+        "Config": MINECRAFT,
+        "Players": [{"ArriveAt": 60, "PlaySeconds": 10 * 60}],
+        "SshSessions": [{"Start": 5 * 60, "End": 40 * 60}],
+        "DurationSeconds": 2 * 60 * 60,
+    },
+    ## The watchdog spins it down, but someone comes back before the hold is up:
+    "reconnect-during-hold": {
+        "Config": MINECRAFT,
+        "Overrides": {"Watchdog": {"ShutdownHoldSeconds": 300}},
+        "Players": [
+            {"ArriveAt": 60, "PlaySeconds": 20 * 60},
+            # The alarm goes off ~6 minutes after the first one leaves, then the hold starts:
+            {"ArriveAt": 31 * 60, "PlaySeconds": 10 * 60},
+        ],
+        "DurationSeconds": 2 * 60 * 60,
+    },
+    ## Same as "single-session", but the watchdog spins it down itself instead of waiting on the alarm:
+    "direct-shutdown": {
+        "Config": MINECRAFT,
+        "Overrides": {"Watchdog": {"DirectShutdown": {"Enabled": True}}},
+        "Players": [{"ArriveAt": 60, "PlaySeconds": 30 * 60}],
+        "DurationSeconds": 2 * 60 * 60,
+    },
+    ## The game takes 8 minutes to start. The player keeps retrying (each retry is a DNS query) the whole
+    ##   time, and the watchdog spinning it down itself can't count that as idle:
+    "slow-game-start": {
+        "Config": MINECRAFT,
+        "Overrides": {"Watchdog": {"DirectShutdown": {"Enabled": True}}},
+        "Timings": {"GameStartSeconds": 8 * 60},
+        "Players": [{"ArriveAt": 60, "PlaySeconds": 30 * 60}],
+        "DurationSeconds": 2 * 60 * 60,
+    },
+    ## UDP counts packets, not players. Idle traffic has to stay under the Threshold:
+    "udp-valheim": {
+        "Config": VALHEIM,
+        "Players": [{"ArriveAt": 60, "PlaySeconds": 30 * 60}],
+        "DurationSeconds": 2 * 60 * 60,
+    },
+    ## DNS waits for the game to be ready, instead of just the container:
+    "readiness-check": {
+        "Config": MINECRAFT,
+        "Overrides": {"Container": {"ReadinessCheck": {"Enabled": True}}},
+        "Players": [{"ArriveAt": 60, "PlaySeconds": 30 * 60}],
+        "DurationSeconds": 2 * 60 * 60,
+    },
+    ## DNS never changes, the instance just gets the IP:
+    "elastic-ip": {
+        "Config": MINECRAFT,
+        "Overrides": {"Ec2": {"ElasticIp": True}},
+        "Players": [{"ArriveAt": 60, "PlaySeconds": 30 * 60}],
+        "DurationSeconds": 2 * 60 * 60,
+    },
+    ## Friends trickle in and out, then one more comes back after it's already spun down:
+    "busy-evening": {
+        "Config": MINECRAFT,
+        "Players": [
+            {"ArriveAt": 60, "PlaySeconds": 45 * 60},
+            {"ArriveAt": 10 * 60, "PlaySeconds": 90 * 60},
+            {"ArriveAt": 30 * 60, "PlaySeconds": 20 * 60},
+            {"ArriveAt": 80 * 60, "PlaySeconds": 60 * 60},
+            {"ArriveAt": 3 * 60 * 60, "PlaySeconds": 30 * 60},
+        ],
+        "DurationSeconds": 5 * 60 * 60,
+    },
+}
+
+
+def run_scenario(name: str) -> tuple[Simulation, dict]:
+    """ Play the scenario through a fresh leaf. Returns the simulation (for digging into), and it's report """
+    scenario = SCENARIOS[name]
+    sim = Simulation(load_config(scenario["Config"], scenario.get("Overrides")), timings=scenario.get("Timings"))
+    report = sim.run(
+        players=scenario.get("Players"),
+        ssh_sessions=scenario.get("SshSessions"),
+        dns_queries=scenario.get("DnsQueries"),
+        duration_seconds=scenario["DurationSeconds"],
+    )
+    return sim, report
+
+
+def print_table(reports: dict) -> None:
+    """ The main numbers from each scenario, one row each """
+    columns = ["Wakes", "WakeLatencySeconds", "IdleToTerminateSeconds", "InstanceMinutes", "WastedInstanceMinutes", "PlayersGaveUp"]
+    name_width = max(len(name) for name in reports)
+    print(f"{'Scenario':<{name_width}}  " + "  ".join(columns))
+    for name, report in reports.items():
+        cells = [
+            f"{', '.join(f'{v:g}' for v in report[column]) if isinstance(report[column], list) else f'{report[column]:g}':>{len(column)}}"
+            for column in columns
+        ]
+        print(f"{name:<{name_width}}  " + "  ".join(cells))
+
+
+def main():
+    """ Run the scenarios, and print what each one cost """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS.keys(), action="append", help="Only run this scenario. (Can be repeated)")
+    parser.add_argument("--json", action="store_true", help="Print the full reports as json.")
+    args = parser.parse_args()
+
+    reports = {name: run_scenario(name)[1] for name in args.scenario or SCENARIOS}
+    if args.json:
+        print(json.dumps(reports, indent=4))
+    else:
+        print_table(reports)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,715 @@
+"""
+Runs a leaf's whole lifecycle offline: The real lambdas, against the fakes in
+`fake_aws.py`, on a virtual clock.
+
+What's real:
+    - All four lambdas, loaded from ./ContainerManager/leaf_stack/lambda/.
+    - The config, loaded with the same config_loader the stacks use.
+    - botocore's clients, waiters, and parameter validation. (Only the network is faked).
+
+What's modeled here, from what the NestedStacks deploy:
+    - The EventBridge rules, and which lambda each one triggers.
+    - The Watchdog's alarms. The container activity alarm evaluates
+      `ssh > 0 OR activity > Threshold` every minute, and goes into ALARM after
+      `MinutesWithoutConnections` periods in a row of it being false. (Or sooner,
+      if `DirectShutdown` has the watchdog set it off itself)
+    - Players: They query DNS (which triggers the start-system lambda), then keep
+      retrying until the IP they resolved has a game they can join.
+
+Usage:
+    sim = Simulation(load_config("./Examples/Minecraft-example.yaml"))
+    report = sim.run(players=[{"ArriveAt": 0, "PlaySeconds": 1800}], duration_seconds=3600)
+"""
+
+import os
+import io
+import sys
+import json
+import gzip
+import base64
+import copy
+import heapq
+import tempfile
+import itertools
+import threading
+import traceback
+import importlib.util
+from contextlib import redirect_stdout, ExitStack
+from unittest import mock
+
+import yaml
+import botocore.client
+from botocore import xform_name
+from botocore.validate import validate_parameters
+from pyaml_env import parse_config
+
+from ContainerManager.utils.config_loader import load_leaf_config
+from tests.lifecycle_simulator.fake_aws import (
+    REGION,
+    ACCOUNT,
+    AwsError,
+    to_iso,
+    FakeAutoScaling,
+    FakeEc2,
+    FakeEcs,
+    FakeRoute53,
+    FakeSsm,
+    FakeCloudWatch,
+    FakeEvents,
+    FakeSns,
+)
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+LAMBDA_DIR = os.path.join(REPO_ROOT, "ContainerManager", "leaf_stack", "lambda")
+# The Lambda Layer every handler imports from. (Lambda puts it's 'python/' dir on the path):
+LAYER_DIR = os.path.join(LAMBDA_DIR, "layers", "structured-logging", "python")
+
+## The virtual clock starts here: (2024-01-01T00:00:00Z, on a minute boundary)
+SIM_EPOCH = 1704067200.0
+
+## How long things take in AWS. Rough numbers from a Minecraft leaf, override per scenario:
+DEFAULT_TIMINGS = {
+    # Desired capacity changes -> the instance launches:
+    "AsgLaunchSeconds": 10,
+    # If nothing completes the launch lifecycle action, it continues after this:
+    "LifecycleHeartbeatSeconds": 60,
+    # Lifecycle action completed -> InService:
+    "InServiceSeconds": 20,
+    # Launch -> the ECS agent registers to the cluster:
+    "EcsRegisterSeconds": 45,
+    # Task placed -> container running:
+    "ImagePullSeconds": 30,
+    # Same, but the image is already on the instance:
+    "CachedImagePullSeconds": 2,
+    # Container running -> players can join:
+    "GameStartSeconds": 60,
+    # Service set to 0 -> the task stops:
+    "TaskStopSeconds": 10,
+    # Terminate starts -> the instance is gone (ECS drains it first):
+    "TerminateSeconds": 60,
+    # DNS query -> the start-system lambda runs (Route53 logs -> subscription filter):
+    "QueryLogDelaySeconds": 2,
+    # Event happens -> EventBridge invokes the target:
+    "EventDelaySeconds": 1,
+    # When the game isn't up, how long until the player tries again:
+    "PlayerRetrySeconds": 10,
+    # And how long until they give up entirely:
+    "PlayerGiveUpSeconds": 900,
+    # UDP only: Packets per minute per player, and from nobody (what the UDP watchdog counts):
+    "UdpPacketsPerPlayer": 5000,
+    "UdpIdlePackets": 10,
+}
+
+## Names the fakes use for the stack's resources:
+LEAF_ID = "Sim"
+ASG_NAME = f"{LEAF_ID}-asg"
+CLUSTER_NAME = f"{LEAF_ID}-cluster"
+SERVICE_NAME = f"{LEAF_ID}-service"
+WATCHDOG_RULE = f"{LEAF_ID}-rule-watchdog-trigger"
+WAKE_TRACE_PARAMETER = f"/{LEAF_ID}/wake-trace"
+UNAVAILABLE_IP = "0.0.0.0"
+ELASTIC_IP = "198.51.100.1"
+NOTIFY_TOPIC_ARNS = [f"arn:aws:sns:{REGION}:{ACCOUNT}:{LEAF_ID}-admin", f"arn:aws:sns:{REGION}:{ACCOUNT}:{LEAF_ID}-notify"]
+METRIC_DIMENSIONS = {"ContainerNameID": LEAF_ID}
+
+
+def load_config(path: str, overrides: dict | None = None) -> dict:
+    """
+    Load a leaf config like the stacks do. Overrides are merged into the raw
+    yaml BEFORE it's parsed, so they get checked like any other config.
+    """
+    # config_loader only takes a path:
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False, encoding="utf-8") as config_file:
+        yaml.safe_dump(raw_config(path, overrides), config_file)
+    try:
+        return load_leaf_config(config_file.name)
+    finally:
+        os.remove(config_file.name)
+
+
+def raw_config(path: str, overrides: dict | None = None) -> dict:
+    """ The config's yaml (with it's !ENV tags filled in), and the overrides merged into it """
+    config = parse_config(path)
+    _deep_update(config, overrides or {})
+    return config
+
+
+def _deep_update(base: dict, overrides: dict) -> None:
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _deep_update(base[key], value)
+        else:
+            base[key] = copy.deepcopy(value)
+
+
+def container_activity(ssh: float | None, activity: float | None, threshold: int) -> int | None:
+    """
+    One period of the Watchdog's `ssh > 0 OR activity > Threshold`. Each is
+    the MAXIMUM of that metric in the period, or None if it has no data.
+
+    (CloudWatch only drops the period if BOTH are missing. The start-system
+    lambda only publishes `activity`, and that still has to count)
+    """
+    if ssh is None and activity is None:
+        return None
+    return int((ssh or 0) > 0 or (activity is not None and activity > threshold))
+
+
+class Clock:
+    """ Replaces the `time` module inside the lambdas. Sleeping moves the simulation forward """
+    def __init__(self, sim: "Simulation"):
+        self._sim = sim
+        self.now = SIM_EPOCH
+
+    def time(self) -> float:
+        """ time.time() """
+        return self.now
+
+    def monotonic(self) -> float:
+        """ time.monotonic() """
+        return self.now
+
+    def perf_counter(self) -> float:
+        """ time.perf_counter() """
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """ time.sleep(), everything else keeps happening while the lambda waits """
+        if threading.current_thread() is not threading.main_thread():
+            raise RuntimeError("The simulator can't sleep in a thread. (Is a step in `run_steps` waiting on something?)")
+        self._sim.run_until(self.now + seconds)
+
+
+class LambdaContext:
+    """ Just enough of the Lambda context object, on the virtual clock """
+    memory_limit_in_mb = 128
+    aws_request_id = "00000000-0000-0000-0000-000000000000"
+
+    def __init__(self, clock: Clock, function_name: str, timeout_seconds: int):
+        self._clock = clock
+        self.function_name = function_name
+        self._deadline = clock.now + timeout_seconds
+
+    def get_remaining_time_in_millis(self) -> int:
+        """ How long until the lambda would time out """
+        return int((self._deadline - self._clock.now) * 1000)
+
+
+class Alarm:
+    """
+    A CloudWatch alarm, with TreatMissingData.MISSING:
+        - Every period in the evaluation range breaching -> ALARM.
+        - Any period in it that doesn't breach -> OK.
+        - Otherwise (some periods are missing) it keeps it's current state.
+    """
+    def __init__(self, name: str, period_value, breaching, evaluation_periods: int, scales_down: bool):
+        self.name = name
+        self.arn = f"arn:aws:cloudwatch:{REGION}:{ACCOUNT}:alarm:{name}"
+        # (start, end) -> value or None:
+        self.period_value = period_value
+        # value -> bool:
+        self.breaching = breaching
+        self.evaluation_periods = evaluation_periods
+        self.scales_down = scales_down
+        self.state = "INSUFFICIENT_DATA"
+
+    def evaluate(self, now: float) -> str:
+        """ The alarm's state, using every full minute up to now """
+        last_period_end = (now - SIM_EPOCH) // 60 * 60 + SIM_EPOCH
+        values = [
+            self.period_value(last_period_end - 60 * (i + 1), last_period_end - 60 * i)
+            for i in range(self.evaluation_periods)
+        ]
+        present = [value for value in values if value is not None]
+        if not present:
+            return "INSUFFICIENT_DATA"
+        if not all(self.breaching(value) for value in present):
+            return "OK"
+        if len(present) == self.evaluation_periods:
+            return "ALARM"
+        return self.state
+
+
+class Simulation:
+    """ One leaf, from the config. Call `run` to play a scenario through it """
+    def __init__(self, config: dict, timings: dict | None = None):
+        self.config = config
+        self.timings = {**DEFAULT_TIMINGS, **(timings or {})}
+        self.clock = Clock(self)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._aws_lock = threading.RLock()
+
+        watchdog_config = config["Watchdog"]
+        self.readiness_check = config["Container"]["ReadinessCheck"]["Enabled"]
+        self.hold_seconds = watchdog_config["ShutdownHoldSeconds"]
+        self.shutdown_mode = "Direct" if watchdog_config["DirectShutdown"]["Enabled"] else "Alarm"
+        self.activity_metric_name = f"Metric-ContainerActivity-{watchdog_config['Type']}"
+        self.elastic_ip = ELASTIC_IP if config["Ec2"]["ElasticIp"] else None
+
+        ## The fakes:
+        self.asg = FakeAutoScaling(self, ASG_NAME, protect_from_scale_in=self.hold_seconds > 0)
+        self.ec2 = FakeEc2(self, self.elastic_ip)
+        self.ecs = FakeEcs(self, CLUSTER_NAME, SERVICE_NAME, readiness_check=self.readiness_check)
+        self.route53 = FakeRoute53(self, UNAVAILABLE_IP)
+        self.ssm = FakeSsm(self)
+        self.cloudwatch = FakeCloudWatch(self)
+        self.events = FakeEvents(self)
+        self.sns = FakeSns(self)
+        self.services = {
+            "autoscaling": self.asg,
+            "ec2": self.ec2,
+            "ecs": self.ecs,
+            "route53": self.route53,
+            "ssm": self.ssm,
+            "cloudwatch": self.cloudwatch,
+            "events": self.events,
+            "sns": self.sns,
+        }
+        ## WakeTrace's "WakeTraceParameter", empty until the first wake:
+        self.ssm.put_parameter(Name=WAKE_TRACE_PARAMETER, Value="{}", Type="String")
+
+        ## The Watchdog's alarms, same as the Watchdog NestedStack:
+        self.alarm_container_activity = Alarm(
+            f"{LEAF_ID}-Alarm-ContainerActivity",
+            period_value=self._container_activity,
+            breaching=lambda value: value <= 0,
+            evaluation_periods=watchdog_config["MinutesWithoutConnections"],
+            scales_down=True,
+        )
+        self.alarm_instance_left_up = Alarm(
+            f"{LEAF_ID}-Alarm-Instance-left-up",
+            period_value=self._in_service_instances,
+            breaching=lambda value: value >= 1,
+            evaluation_periods=watchdog_config["InstanceLeftUp"]["DurationHours"] * 60,
+            scales_down=watchdog_config["InstanceLeftUp"]["ShouldStop"],
+        )
+        self.alarm_watchdog_errors = Alarm(
+            f"{LEAF_ID}-Alarm-Watchdog-Errors",
+            period_value=self._watchdog_errors,
+            breaching=lambda value: value >= 1,
+            evaluation_periods=3,
+            scales_down=True,
+        )
+        self.alarms = [self.alarm_container_activity, self.alarm_instance_left_up, self.alarm_watchdog_errors]
+
+        ## What happened, for the report:
+        self.players = []
+        self.ssh_sessions = []
+        self.invocations = []
+        self.alarm_history = []
+        self.notifications = []
+        self.in_service_history = {}
+        self.logs = io.StringIO()
+        # How much of the logs CloudWatch already pulled metrics out of:
+        self.logs_extracted = 0
+        self.handlers = {}
+        self.end_time = SIM_EPOCH
+
+    ######################
+    ## The event loop:
+    def schedule(self, delay: float, callback, *args) -> None:
+        """ Run `callback(*args)` this many seconds from now """
+        with self._aws_lock:
+            heapq.heappush(self._queue, (self.clock.now + delay, next(self._sequence), callback, args))
+
+    def run_until(self, end_time: float) -> None:
+        """ Process everything scheduled up to `end_time`. (Lambdas sleeping end up back in here) """
+        while self._queue and self._queue[0][0] <= end_time:
+            with self._aws_lock:
+                event_time, _, callback, args = heapq.heappop(self._queue)
+            self.clock.now = max(self.clock.now, event_time)
+            callback(*args)
+        self.clock.now = max(self.clock.now, end_time)
+
+    def _every_minute(self) -> None:
+        ## The watchdog's schedule rule (only while the AsgStateChangeHook has it enabled):
+        if WATCHDOG_RULE in self.events.enabled_rules:
+            self.schedule(self.timings["EventDelaySeconds"], self.invoke, "watchdog-container-activity", {
+                "source": "aws.events",
+                "detail-type": "Scheduled Event",
+                "detail": {},
+            })
+        ## AWS/AutoScaling GroupInServiceInstances:
+        self.in_service_history[self.clock.now] = self.asg.in_service_count()
+        ## CloudWatch evaluates the alarms a bit after the minute ends:
+        self.schedule(30, self._evaluate_alarms)
+        self.schedule(60, self._every_minute)
+
+    def _evaluate_alarms(self) -> None:
+        for alarm in self.alarms:
+            self.set_alarm_state(alarm, alarm.evaluate(self.clock.now))
+            # Auto Scaling actions keep getting invoked every period the alarm stays in ALARM:
+            if alarm.state == "ALARM" and alarm.scales_down:
+                self.asg.set_desired_capacity(0)
+
+    def set_alarm_state(self, alarm: Alarm, new_state: str) -> None:
+        """ Move the alarm to the new state. (From being evaluated, or SetAlarmState) """
+        if new_state == alarm.state:
+            return
+        self.alarm_history.append({"Time": self.clock.now, "Alarm": alarm.name, "From": alarm.state, "To": new_state})
+        alarm.state = new_state
+        if new_state == "ALARM":
+            self.put_event("aws.cloudwatch", "CloudWatch Alarm State Change", {
+                "alarmName": alarm.name,
+                "state": {"value": "ALARM"},
+            }, resources=[alarm.arn])
+            # The actions run on the change itself, not just when it's evaluated:
+            if alarm.scales_down:
+                self.asg.set_desired_capacity(0)
+
+    def alarms_by_name(self) -> dict:
+        """ Alarm name -> Alarm """
+        return {alarm.name: alarm for alarm in self.alarms}
+
+    ######################
+    ## The alarm's metrics:
+    def _container_activity(self, start: float, end: float) -> int | None:
+        ssh = self.cloudwatch.values(LEAF_ID, "Metric-SSH-Connections", METRIC_DIMENSIONS, start, end)
+        activity = self.cloudwatch.values(LEAF_ID, self.activity_metric_name, METRIC_DIMENSIONS, start, end)
+        return container_activity(max(ssh, default=None), max(activity, default=None), self.config["Watchdog"]["Threshold"])
+
+    def _in_service_instances(self, start: float, end: float) -> int | None:
+        samples = [count for timestamp, count in self.in_service_history.items() if start <= timestamp < end]
+        return max(samples, default=None)
+
+    def _watchdog_errors(self, start: float, end: float) -> int | None:
+        errors = [
+            int(invocation["Error"] is not None) for invocation in self.invocations
+            if invocation["Handler"] == "watchdog-container-activity" and start <= invocation["Time"] < end
+        ]
+        # Statistic is MINIMUM, so one success in the period is enough:
+        return min(errors, default=None)
+
+    ######################
+    ## EventBridge + Lambda:
+    def put_event(self, source: str, detail_type: str, detail: dict, resources: list | None = None) -> None:
+        """ Send the event to every lambda with a rule that matches it """
+        event = {
+            "version": "0",
+            "id": f"{next(self._sequence):08x}-0000-0000-0000-000000000000",
+            "source": source,
+            "detail-type": detail_type,
+            "account": ACCOUNT,
+            "time": to_iso(self.clock.now),
+            "region": REGION,
+            "resources": resources or [],
+            "detail": detail,
+        }
+        for handler_name in self._rule_targets(event):
+            self.schedule(self.timings["EventDelaySeconds"], self.invoke, handler_name, event)
+
+    def _rule_targets(self, event: dict) -> list:
+        """ The rules from the NestedStacks, and what each one triggers """
+        targets = []
+        ## AsgStateChangeHook's "AsgStateChangeTrigger":
+        if event["source"] == "aws.autoscaling":
+            targets.append("instance-StateChange-hook")
+            if event["detail-type"] == "EC2 Instance-terminate Lifecycle Action":
+                ## EcsAsg's "RuleNotifyDown" (Straight to SNS, no lambda):
+                self.notifications.append({"Time": self.clock.now, "From": "RuleNotifyDown"})
+        elif event["source"] == "aws.ecs" and event["detail"]["lastStatus"] == "RUNNING" and event["detail"]["desiredStatus"] == "RUNNING":
+            ## WakeTrace's "WakeTraceTrigger":
+            targets.append("wake-trace")
+            if self.readiness_check:
+                ## AsgStateChangeHook's "TaskRunningTrigger":
+                targets.append("instance-StateChange-hook")
+            else:
+                ## EcsAsg's "RuleNotifyUp" (Straight to SNS, no lambda):
+                self.notifications.append({"Time": self.clock.now, "From": "RuleNotifyUp"})
+        ## AsgStateChangeHook's "ScaleDownHoldTrigger":
+        elif event["source"] == "aws.cloudwatch" and self.hold_seconds:
+            scale_down_alarms = [alarm.arn for alarm in self.alarms if alarm.scales_down]
+            if set(event["resources"]) & set(scale_down_alarms):
+                targets.append("instance-StateChange-hook")
+        return targets
+
+    def invoke(self, handler_name: str, event: dict) -> None:
+        """ Run the real lambda. Errors are recorded (like Lambda would), not raised """
+        invocation = {"Handler": handler_name, "Time": self.clock.now, "Event": event.get("detail-type", "DNS Query"), "Error": None}
+        self.invocations.append(invocation)
+        context = LambdaContext(self.clock, handler_name, self._lambda_timeout(handler_name))
+        # The metrics it logs are stamped with the virtual time too:
+        sys.modules["structured_logging"].time = self.clock
+        try:
+            self.handlers[handler_name].lambda_handler(event, context)
+        except SystemExit:
+            # The AsgStateChangeHook exits early on purpose, that's not an error:
+            pass
+        except Exception: # pylint: disable=broad-exception-caught
+            invocation["Error"] = traceback.format_exc()
+        self._extract_metrics()
+
+    def _extract_metrics(self) -> None:
+        """ CloudWatch Logs pulls the Embedded Metric Format lines out of everything logged since the last time """
+        logs = self.logs.getvalue()
+        self.cloudwatch.extract_metrics(logs[self.logs_extracted:])
+        self.logs_extracted = len(logs)
+
+    def _lambda_timeout(self, handler_name: str) -> int:
+        """ Same as the NestedStacks """
+        if handler_name != "instance-StateChange-hook":
+            return 30
+        if self.readiness_check:
+            return 15 * 60
+        if self.hold_seconds:
+            return 60 + self.hold_seconds
+        return 30
+
+    def _load_handlers(self) -> None:
+        if LAYER_DIR not in sys.path:
+            sys.path.insert(0, LAYER_DIR)
+        for handler_name in ["trigger-start-system", "instance-StateChange-hook", "watchdog-container-activity", "wake-trace"]:
+            # Lambda puts the function's own dir on the path too, for anything it imports next to main.py:
+            if os.path.join(LAMBDA_DIR, handler_name) not in sys.path:
+                sys.path.insert(0, os.path.join(LAMBDA_DIR, handler_name))
+            spec = importlib.util.spec_from_file_location(f"simulated_{handler_name.replace('-', '_')}", os.path.join(LAMBDA_DIR, handler_name, "main.py"))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            # Everything the lambda waits on, happens on the virtual clock:
+            module.time = self.clock
+            self.handlers[handler_name] = module
+
+    def lambda_env(self) -> dict:
+        """ Every lambda's environment, the same as the NestedStacks give them """
+        watchdog_config = self.config["Watchdog"]
+        return {
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_SESSION_TOKEN": "testing",
+            "AWS_DEFAULT_REGION": REGION,
+            "AWS_EC2_METADATA_DISABLED": "true",
+            ## Shared:
+            "ASG_NAME": ASG_NAME,
+            "ECS_CLUSTER_NAME": CLUSTER_NAME,
+            "ECS_SERVICE_NAME": SERVICE_NAME,
+            "WAKE_TRACE_PARAMETER": WAKE_TRACE_PARAMETER,
+            "METRIC_NAMESPACE": LEAF_ID,
+            "METRIC_DIMENSIONS": str(METRIC_DIMENSIONS).replace("'", '"'),
+            "METRIC_UNIT": "Count",
+            ## trigger-start-system:
+            "MANAGER_STACK_REGION": REGION,
+            "METRIC_NAME": self.activity_metric_name,
+            "METRIC_THRESHOLD": str(watchdog_config["Threshold"]),
+            ## instance-StateChange-hook:
+            "HOSTED_ZONE_ID": "Z0SIMULATOR",
+            "DOMAIN_NAME": "sim.example.com",
+            "UNAVAILABLE_IP": UNAVAILABLE_IP,
+            "DNS_TTL": "1",
+            "RECORD_TYPE": "A",
+            "WATCH_INSTANCE_RULE": WATCHDOG_RULE,
+            "SHUTDOWN_HOLD_SECONDS": str(self.hold_seconds),
+            "READINESS_CHECK": str(self.readiness_check),
+            "NOTIFY_UP_MESSAGE": "Container is ready",
+            "NOTIFY_TOPIC_ARNS": str(NOTIFY_TOPIC_ARNS).replace("'", '"'),
+            "METRIC_NAME_READY_LATENCY": "Metric-ReadyLatency",
+            "METRIC_NAME_IDLE_TO_TERMINATE": "Metric-IdleToTerminate",
+            "SHUTDOWN_MODE": self.shutdown_mode,
+            "ELASTIC_IP": self.elastic_ip or "",
+            "ELASTIC_IP_ALLOCATION_ID": "eipalloc-0123456789abcdef0" if self.elastic_ip else "",
+            ## watchdog-container-activity:
+            "TASK_DEFINITION": f"{LEAF_ID}-task",
+            "CONNECTION_TYPE": watchdog_config["Type"],
+            "TCP_PORT": str(watchdog_config.get("TcpPort", "")),
+            "QUERY_PROTOCOL": watchdog_config.get("Query", {}).get("Protocol", ""),
+            "QUERY_PORT": str(watchdog_config.get("Query", {}).get("Port", "")),
+            "QUERY_TIMEOUT_MS": str(watchdog_config.get("Query", {}).get("TimeoutMs", "")),
+            "METRIC_NAME_ACTIVITY_COUNT": self.activity_metric_name,
+            "METRIC_NAME_SSH_CONNECTIONS": "Metric-SSH-Connections",
+            "DIRECT_SHUTDOWN_SAMPLES": str(watchdog_config["DirectShutdown"]["IdleSamples"] if self.shutdown_mode == "Direct" else 0),
+            "ACTIVITY_ALARM_NAME": self.alarm_container_activity.name,
+            ## wake-trace:
+            "METRIC_NAME_TIME_TO_PLAYABLE": "Metric-TimeToPlayable",
+            "METRIC_NAME_WAKE_STAGE": "Metric-WakeStage",
+        }
+
+    def _make_api_call(self, client, operation_name: str, api_params: dict) -> dict:
+        """ Replaces botocore's `BaseClient._make_api_call`, and sends it to the fakes instead """
+        service_name = client.meta.service_model.service_name
+        validate_parameters(api_params, client.meta.service_model.operation_model(operation_name).input_shape)
+        method = getattr(self.services.get(service_name), xform_name(operation_name), None)
+        if method is None:
+            raise NotImplementedError(f"The simulator doesn't have '{service_name}.{operation_name}' yet. Add it in 'tests/lifecycle_simulator/fake_aws.py'.")
+        try:
+            with self._aws_lock:
+                return method(**api_params)
+        except AwsError as e:
+            error_response = {"Error": {"Code": e.code, "Message": e.message}}
+            raise client.exceptions.from_code(e.code)(error_response, operation_name) from e
+
+    ######################
+    ## Players:
+    def _player_arrives(self, player: dict) -> None:
+        # If nothing is running, this player is the one waking it up:
+        player["WokeSystem"] = not self.asg.alive_instances()
+        self._player_connect(player)
+
+    def _player_connect(self, player: dict) -> None:
+        ## Every attempt looks up DNS again (TTL is 1s), and Route53 logs every query:
+        self._dns_query()
+        instance_id = self.ec2.instance_at_ip(self.route53.record_value)
+        if instance_id and self.ecs.accepting_players(instance_id):
+            player.update({"ConnectedAt": self.clock.now, "InstanceId": instance_id})
+            self.schedule(player["PlaySeconds"], self._player_leaves, player)
+        elif self.clock.now - player["ArrivedAt"] >= self.timings["PlayerGiveUpSeconds"]:
+            player["GaveUp"] = True
+        else:
+            self.schedule(self.timings["PlayerRetrySeconds"], self._player_connect, player)
+
+    def _player_leaves(self, player: dict) -> None:
+        if player["DisconnectedAt"] is None:
+            player["DisconnectedAt"] = self.clock.now
+
+    def drop_players(self, instance_id: str) -> None:
+        """ The game on this instance stopped, kick everyone on it """
+        for player in self.connected_players(instance_id):
+            player.update({"DisconnectedAt": self.clock.now, "Dropped": True})
+
+    def connected_players(self, instance_id: str) -> list:
+        """ Players currently in the game on this instance """
+        return [p for p in self.players if p["InstanceId"] == instance_id and p["ConnectedAt"] is not None and p["DisconnectedAt"] is None]
+
+    def connection_counts(self, instance_id: str) -> dict | None:
+        """ What the watchdog's script would find on the instance. None if the container isn't running """
+        task = self.ecs.active_task()
+        if not task or task["InstanceId"] != instance_id or task["lastStatus"] != "RUNNING":
+            return None
+        num_players = len(self.connected_players(instance_id))
+        if self.config["Watchdog"]["Type"] == "TCP":
+            activity_count = num_players
+        else:
+            activity_count = num_players * self.timings["UdpPacketsPerPlayer"] + self.timings["UdpIdlePackets"]
+        offset = self.clock.now - SIM_EPOCH
+        num_ssh_conn = len([s for s in self.ssh_sessions if s["Start"] <= offset < s["End"]])
+        # What docker says about the readiness check (The container's health check):
+        if not self.readiness_check:
+            health = "none"
+        else:
+            health = "healthy" if task["healthStatus"] == "HEALTHY" else "starting"
+        return {"activity_count": activity_count, "num_ssh_conn": num_ssh_conn, "health": health}
+
+    def _dns_query(self) -> None:
+        """ Someone looked up the domain. Route53 logs it, and the subscription filter triggers the lambda """
+        log_data = {"logEvents": [{
+            "id": f"{next(self._sequence):056d}",
+            "timestamp": int(self.clock.now * 1000),
+            "message": f"1.0 {to_iso(self.clock.now)} Z0SIMULATOR sim.example.com A NOERROR UDP IAD89-C1 192.0.2.1 -",
+        }]}
+        event = {"awslogs": {"data": base64.b64encode(gzip.compress(json.dumps(log_data).encode())).decode()}}
+        self.schedule(self.timings["QueryLogDelaySeconds"], self.invoke, "trigger-start-system", event)
+
+    ######################
+    ## Running it:
+    def run(self, players: list | None = None, ssh_sessions: list | None = None, dns_queries: list | None = None, duration_seconds: int=3600) -> dict:
+        """
+        Play a scenario through the leaf, and report what happened. Times are seconds from the start:
+            - players: [{"ArriveAt": 0, "PlaySeconds": 1800}, ...]
+            - ssh_sessions: [{"Start": 600, "End": 1200}, ...] (Only counted while an instance is up)
+            - dns_queries: [0, 300, ...] (Someone looks up the domain, but never connects)
+        """
+        self.players = [{
+            "ArrivedAt": SIM_EPOCH + player["ArriveAt"],
+            "PlaySeconds": player["PlaySeconds"],
+            "ConnectedAt": None,
+            "DisconnectedAt": None,
+            "InstanceId": None,
+            "WokeSystem": False,
+            "GaveUp": False,
+            "Dropped": False,
+        } for player in players or []]
+        self.ssh_sessions = ssh_sessions or []
+        self.end_time = SIM_EPOCH + duration_seconds
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch.dict(os.environ, self.lambda_env()))
+            stack.enter_context(mock.patch.object(
+                botocore.client.BaseClient,
+                "_make_api_call",
+                new=lambda client, operation_name, api_params: self._make_api_call(client, operation_name, api_params),
+            ))
+            stack.enter_context(redirect_stdout(self.logs))
+            self._load_handlers()
+            for player in self.players:
+                self.schedule(player["ArrivedAt"] - SIM_EPOCH, self._player_arrives, player)
+            for query_at in dns_queries or []:
+                self.schedule(query_at, self._dns_query)
+            self.schedule(0, self._every_minute)
+            self.run_until(self.end_time)
+        return self.report()
+
+    def report(self) -> dict:
+        """
+        What the scenario cost, and what the players saw:
+            - WakeLatencySeconds: For each player that woke the system, arriving -> in the game.
+            - IdleToTerminateSeconds: For each instance that went down, last activity -> terminated.
+            - InstanceMinutes: How long instances were up, in total.
+            - WastedInstanceMinutes: How long the game was up with nobody on it. (All of it if the game never came up)
+        """
+        instances = list(self.asg.instances.values())
+        return {
+            "Wakes": len(instances),
+            "WakeLatencySeconds": [
+                round(p["ConnectedAt"] - p["ArrivedAt"], 3) for p in self.players if p["WokeSystem"] and p["ConnectedAt"] is not None
+            ],
+            "IdleToTerminateSeconds": [
+                round(i["TerminatedAt"] - self._idle_since(i), 3) for i in instances if i["TerminatedAt"] is not None
+            ],
+            "InstanceMinutes": round(sum(self._uptime(i) for i in instances) / 60, 3),
+            "WastedInstanceMinutes": round(sum(self._wasted_seconds(i) for i in instances) / 60, 3),
+            "InstancesUpAtEnd": len(self.asg.alive_instances()),
+            "PlayersConnected": len([p for p in self.players if p["ConnectedAt"] is not None]),
+            "PlayersGaveUp": len([p for p in self.players if p["GaveUp"]]),
+            "PlayersDropped": len([p for p in self.players if p["Dropped"]]),
+            "TimeToPlayableSeconds": [
+                round(value, 3) for value in self.cloudwatch.values(LEAF_ID, "Metric-TimeToPlayable", METRIC_DIMENSIONS, SIM_EPOCH, self.end_time)
+            ],
+            "Notifications": len(self.notifications) + len(self.sns.messages),
+            "LambdaErrors": {
+                name: len([i for i in self.invocations if i["Handler"] == name and i["Error"]])
+                for name in sorted({i["Handler"] for i in self.invocations})
+            },
+            "AlarmTransitions": [f"{a['Alarm']}: {a['From']} -> {a['To']}" for a in self.alarm_history],
+        }
+
+    def errors(self) -> list:
+        """ Every lambda error, with it's traceback """
+        return [i for i in self.invocations if i["Error"]]
+
+    def _uptime(self, instance: dict) -> float:
+        return (instance["TerminatedAt"] or self.end_time) - instance["LaunchedAt"]
+
+    def _busy_intervals(self, instance: dict) -> list:
+        """ When someone was on this instance (playing, or SSH-ed in) """
+        down_at = instance["TerminatedAt"] or self.end_time
+        intervals = [
+            (p["ConnectedAt"], p["DisconnectedAt"] or down_at)
+            for p in self.players if p["InstanceId"] == instance["InstanceId"]
+        ] + [
+            (max(SIM_EPOCH + s["Start"], instance["LaunchedAt"]), min(SIM_EPOCH + s["End"], down_at))
+            for s in self.ssh_sessions
+        ]
+        return [(start, end) for start, end in intervals if start < end]
+
+    def _ready_at(self, instance: dict) -> float | None:
+        """ When the game on this instance first came up """
+        ready = [t["ReadyAt"] for t in self.ecs.tasks if t["InstanceId"] == instance["InstanceId"] and t["ReadyAt"] is not None]
+        return min(ready, default=None)
+
+    def _idle_since(self, instance: dict) -> float:
+        """ The last time anyone was on this instance. (Or when the game came up, if nobody ever was) """
+        candidates = [end for _, end in self._busy_intervals(instance)]
+        candidates.append(self._ready_at(instance) or instance["LaunchedAt"])
+        return min(max(candidates), instance["TerminatedAt"] or self.end_time)
+
+    def _wasted_seconds(self, instance: dict) -> float:
+        ready_at = self._ready_at(instance)
+        down_at = instance["TerminatedAt"] or self.end_time
+        if ready_at is None or ready_at >= down_at:
+            return self._uptime(instance)
+        ## Time the game was up, minus the time anyone was on it:
+        busy_seconds, covered_until = 0, ready_at
+        for start, end in sorted(self._busy_intervals(instance)):
+            start, end = max(start, covered_until), min(end, down_at)
+            if end > start:
+                busy_seconds += end - start
+                covered_until = end
+        return (down_at - ready_at) - busy_seconds
@@ -0,0 +1,285 @@
+"""
+Plays each scenario through the real lambdas, and checks the leaf wakes up,
+lets everyone play, and spins back down when it should.
+
+Also checks the Watchdog's alarm math on it's own, since every scenario depends on it.
+"""
+
+import functools
+
+import pytest
+
+from tests.lifecycle_simulator.fake_aws import AwsError
+from tests.lifecycle_simulator.scenarios import SCENARIOS, MINECRAFT, run_scenario
+from tests.lifecycle_simulator.simulator import (
+    SIM_EPOCH,
+    DEFAULT_TIMINGS,
+    ELASTIC_IP,
+    UNAVAILABLE_IP,
+    LEAF_ID,
+    METRIC_DIMENSIONS,
+    WATCHDOG_RULE,
+    Alarm,
+    Simulation,
+    load_config,
+    container_activity,
+)
+
+# The Minecraft example's Watchdog.MinutesWithoutConnections (the default):
+MINUTES_WITHOUT_CONNECTIONS = 5
+# From the last activity, until the instance is gone. (The alarm needs that many full
+# minutes, a little longer to land in a period + evaluate, then the ASG terminates it):
+MAX_IDLE_TO_TERMINATE = (MINUTES_WITHOUT_CONNECTIONS + 2) * 60 + DEFAULT_TIMINGS["TerminateSeconds"] + 30
+
+
+@functools.cache
+def scenario(name: str):
+    """ Each scenario only needs to run once, no matter how many tests look at it """
+    return run_scenario(name)
+
+
+def assert_no_unexpected_errors(sim) -> None:
+    """
+    The watchdog can error while the container is still starting (There's nothing to count
+    yet, and the errors alarm needs 3 in a row). Any other error is a bug.
+    """
+    errors = [e for e in sim.errors() if e["Handler"] != "watchdog-container-activity"]
+    assert not errors, errors[0]["Error"]
+    ready_times = [task["ReadyAt"] for task in sim.ecs.tasks if task["ReadyAt"]]
+    for error in sim.errors():
+        assert any(error["Time"] <= ready_at for ready_at in ready_times), f"Watchdog errored with the game up: {error['Error']}"
+
+
+def test_every_scenario_runs_clean():
+    """ No lambda errors (besides the expected ones), and nothing left running """
+    for name in SCENARIOS:
+        sim, report = scenario(name)
+        assert_no_unexpected_errors(sim)
+        assert report["InstancesUpAtEnd"] == 0, f"'{name}' left an instance running."
+        assert report["PlayersGaveUp"] == 0, f"Someone in '{name}' gave up waiting."
+
+
+def test_single_session():
+    """ One wake, the player gets in, and it spins down after they leave """
+    sim, report = scenario("single-session")
+    assert report["Wakes"] == 1
+    assert report["PlayersConnected"] == 1
+    # Launch + register + pull + game start, plus however long until the player retries:
+    assert report["WakeLatencySeconds"][0] <= 4 * 60
+    assert len(report["TimeToPlayableSeconds"]) == 1
+    assert MINUTES_WITHOUT_CONNECTIONS * 60 <= report["IdleToTerminateSeconds"][0] <= MAX_IDLE_TO_TERMINATE
+    # DNS goes back to unavailable:
+    assert sim.route53.record_value == UNAVAILABLE_IP
+
+
+def published_idle_to_terminate(sim, shutdown_mode: str) -> list:
+    """ What the AsgStateChangeHook published for each spin-down """
+    dimensions = {**METRIC_DIMENSIONS, "ShutdownMode": shutdown_mode}
+    return sim.cloudwatch.values(LEAF_ID, "Metric-IdleToTerminate", dimensions, SIM_EPOCH, sim.end_time)
+
+
+def test_direct_shutdown_beats_the_alarm():
+    """ The watchdog spinning it down itself skips waiting on the alarm, and both publish how long that took """
+    direct_sim, direct_report = scenario("direct-shutdown")
+    alarm_sim, alarm_report = scenario("single-session")
+    assert direct_report["PlayersConnected"] == 1
+    assert direct_report["IdleToTerminateSeconds"][0] < alarm_report["IdleToTerminateSeconds"][0]
+    # It still waits for every sample in the window to be idle:
+    assert direct_report["IdleToTerminateSeconds"][0] >= (MINUTES_WITHOUT_CONNECTIONS - 1) * 60
+    # One each, under it's own mode:
+    direct_published, alarm_published = published_idle_to_terminate(direct_sim, "Direct"), published_idle_to_terminate(alarm_sim, "Alarm")
+    assert len(direct_published) == len(alarm_published) == 1
+    assert not published_idle_to_terminate(direct_sim, "Alarm")
+    assert direct_published[0] < alarm_published[0]
+
+
+def test_direct_shutdown_waits_out_a_slow_start():
+    """ Someone trying to connect while the game starts keeps it up, same as it does the alarm """
+    sim, report = scenario("slow-game-start")
+    game_start = SCENARIOS["slow-game-start"]["Timings"]["GameStartSeconds"]
+    assert report["Wakes"] == 1
+    assert report["PlayersConnected"] == 1
+    assert game_start <= report["WakeLatencySeconds"][0] <= game_start + 4 * 60
+    # Nothing spun it down until after they left:
+    player = sim.players[0]
+    alarms = [a["Time"] for a in sim.alarm_history if a["To"] == "ALARM" and a["Alarm"] == sim.alarm_container_activity.name]
+    assert alarms and min(alarms) >= player["DisconnectedAt"]
+
+
+def test_direct_shutdown_waits_for_ready():
+    """ With a readiness check, samples from before the game is up don't count. (Even with nobody retrying) """
+    # Long enough for two idle samples before it's ready, but not long enough for the alarm to go off:
+    sim = Simulation(
+        load_config(MINECRAFT, {"Watchdog": {"DirectShutdown": {"Enabled": True, "IdleSamples": 2}}, "Container": {"ReadinessCheck": {"Enabled": True}}}),
+        timings={"GameStartSeconds": 4 * 60},
+    )
+    report = sim.run(dns_queries=[60], duration_seconds=60 * 60)
+    instance = next(iter(sim.asg.instances.values()))
+    assert report["Wakes"] == 1
+    assert instance["TerminatedAt"] > sim.ecs.tasks[0]["ReadyAt"]
+
+
+def test_nobody_connects():
+    """ A DNS query on it's own wakes it, then the watchdog spins it back down """
+    _, report = scenario("nobody-connects")
+    assert report["Wakes"] == 1
+    assert report["PlayersConnected"] == 0
+    assert report["IdleToTerminateSeconds"][0] <= MAX_IDLE_TO_TERMINATE
+    # Everything after the game was up, was wasted:
+    assert report["WastedInstanceMinutes"] * 60 == pytest.approx(report["IdleToTerminateSeconds"][0])
+
+
+def test_ssh_keeps_it_up():
+    """ Being SSH-ed in counts as activity, even with no players """
+    sim, report = scenario("ssh-keeps-it-up")
+    ssh_end = SIM_EPOCH + SCENARIOS["ssh-keeps-it-up"]["SshSessions"][0]["End"]
+    instance = next(iter(sim.asg.instances.values()))
+    assert report["Wakes"] == 1
+    assert instance["TerminatedAt"] >= ssh_end + MINUTES_WITHOUT_CONNECTIONS * 60
+    assert report["IdleToTerminateSeconds"][0] <= MAX_IDLE_TO_TERMINATE
+
+
+def test_reconnect_during_hold():
+    """ Someone coming back during the hold gets the SAME instance, with the image already on it """
+    sim, report = scenario("reconnect-during-hold")
+    assert report["Wakes"] == 1
+    assert report["PlayersConnected"] == 2
+    assert report["PlayersDropped"] == 0
+    # The task was stopped for the hold, and started again:
+    assert len(sim.ecs.tasks) == 2
+    hold_seconds = SCENARIOS["reconnect-during-hold"]["Overrides"]["Watchdog"]["ShutdownHoldSeconds"]
+    assert report["IdleToTerminateSeconds"][0] <= MAX_IDLE_TO_TERMINATE + hold_seconds
+    # Coming back is way faster than a cold wake:
+    assert report["TimeToPlayableSeconds"][1] < report["TimeToPlayableSeconds"][0] / 2
+
+
+def test_failed_hold_still_releases_the_instance():
+    """ If spinning down fails during the hold, the instance isn't left protected (and running) with nothing to stop it """
+    sim = Simulation(load_config(MINECRAFT, {"Watchdog": {"ShutdownHoldSeconds": 300}}))
+    change_resource_record_sets = sim.route53.change_resource_record_sets
+    failed = []
+    def throttled_once(**params):
+        # Fail the first time DNS is reset, which is the hold's spin-down:
+        if not failed and params["ChangeBatch"]["Changes"][0]["ResourceRecordSet"]["ResourceRecords"][0]["Value"] == UNAVAILABLE_IP:
+            failed.append(sim.clock.now)
+            raise AwsError("Throttling", "Rate exceeded")
+        return change_resource_record_sets(**params)
+    sim.route53.change_resource_record_sets = throttled_once
+
+    report = sim.run(players=[{"ArriveAt": 60, "PlaySeconds": 20 * 60}], duration_seconds=2 * 60 * 60)
+    assert failed, "The hold never reset DNS."
+    assert [e["Event"] for e in sim.errors() if e["Handler"] == "instance-StateChange-hook"] == ["CloudWatch Alarm State Change"]
+    assert report["InstancesUpAtEnd"] == 0
+    # It went down right away, not waiting out the hold:
+    assert report["IdleToTerminateSeconds"][0] <= MAX_IDLE_TO_TERMINATE
+
+def test_failed_terminate_still_disables_the_watchdog():
+    """ If the terminate hook fails before it resets anything, the watchdog rule still gets turned off """
+    sim = Simulation(load_config(MINECRAFT))
+    describe_auto_scaling_groups = sim.asg.describe_auto_scaling_groups
+    failed = []
+    def throttled_once(**params):
+        # Fail the hook's safety check, while the instance is terminating:
+        terminating = any(i["LifecycleState"] == "Terminating:Wait" for i in sim.asg.instances.values())
+        if not failed and terminating and sim.invocations[-1]["Handler"] == "instance-StateChange-hook":
+            failed.append(sim.clock.now)
+            raise AwsError("Throttling", "Rate exceeded")
+        return describe_auto_scaling_groups(**params)
+    sim.asg.describe_auto_scaling_groups = throttled_once
+
+    report = sim.run(players=[{"ArriveAt": 60, "PlaySeconds": 20 * 60}], duration_seconds=2 * 60 * 60)
+    assert failed, "The terminate hook never checked the ASG."
+    assert [e["Event"] for e in sim.errors() if e["Handler"] == "instance-StateChange-hook"] == ["EC2 Instance-terminate Lifecycle Action"]
+    assert report["InstancesUpAtEnd"] == 0
+    assert WATCHDOG_RULE not in sim.events.enabled_rules
+
+
+def test_udp_idle_traffic_under_threshold():
+    """ UDP with nobody on still has some packets, but it's under the Threshold so it still spins down """
+    sim, report = scenario("udp-valheim")
+    assert sim.config["Watchdog"]["Type"] == "UDP"
+    assert DEFAULT_TIMINGS["UdpIdlePackets"] <= sim.config["Watchdog"]["Threshold"]
+    assert report["PlayersConnected"] == 1
+    assert report["IdleToTerminateSeconds"][0] <= MAX_IDLE_TO_TERMINATE
+
+
+def test_readiness_check_holds_dns():
+    """ DNS only points at the instance after the game is ready, and that's when everyone's notified """
+    sim, report = scenario("readiness-check")
+    task = sim.ecs.tasks[0]
+    to_instance = [change_time for change_time, ip in sim.route53.changes if ip != UNAVAILABLE_IP]
+    assert to_instance, "DNS never pointed at the instance."
+    assert min(to_instance) >= task["ReadyAt"]
+    assert sim.sns.messages and min(m["Time"] for m in sim.sns.messages) >= task["ReadyAt"]
+    # RuleNotifyUp is off, the hook sends it instead:
+    assert not [n for n in sim.notifications if n["From"] == "RuleNotifyUp"]
+    assert report["PlayersConnected"] == 1
+    # The player waited until the game was ready, not just until the container was running:
+    assert len(report["TimeToPlayableSeconds"]) == 1
+    assert report["TimeToPlayableSeconds"][0] >= task["ReadyAt"] - sim.players[0]["ArrivedAt"]
+    ready_stage = sim.cloudwatch.values(LEAF_ID, "Metric-WakeStage", {**METRIC_DIMENSIONS, "Stage": "ContainerReady"}, SIM_EPOCH, sim.end_time)
+    assert ready_stage == [pytest.approx(task["ReadyAt"] - task["startedAt"], abs=10)]
+
+
+def test_elastic_ip_never_changes_dns():
+    """ DNS is the Elastic IP the whole time, even spun down """
+    sim, report = scenario("elastic-ip")
+    assert {ip for _, ip in sim.route53.changes} == {ELASTIC_IP}
+    assert report["PlayersConnected"] == 1
+
+
+def test_busy_evening():
+    """ Stays up while anyone's on, then wakes again for the late player """
+    _, report = scenario("busy-evening")
+    assert report["Wakes"] == 2
+    assert report["PlayersConnected"] == len(SCENARIOS["busy-evening"]["Players"])
+    assert report["PlayersDropped"] == 0
+    assert all(seconds <= MAX_IDLE_TO_TERMINATE for seconds in report["IdleToTerminateSeconds"])
+
+
+### The Watchdog's alarm math:
+@pytest.mark.parametrize("ssh, activity, threshold, expected", [
+    # No data at all, the period is missing:
+    (None, None, 0, None),
+    # Someone SSH-ed in, no matter the activity:
+    (1, 0, 0, 1),
+    (1, None, 32, 1),
+    # Activity has to be OVER the threshold:
+    (0, 0, 0, 0),
+    (0, 1, 0, 1),
+    (0, 32, 32, 0),
+    (0, 33, 32, 1),
+    # The trigger lambda only publishes activity (threshold + 1), with no ssh:
+    (None, 33, 32, 1),
+])
+def test_container_activity(ssh, activity, threshold, expected):
+    """ `ssh > 0 OR activity > Threshold` for one period """
+    assert container_activity(ssh, activity, threshold) == expected
+
+
+def make_alarm(values: list) -> Alarm:
+    """ An alarm over 3 periods, reading from `values` (oldest first, one per minute from SIM_EPOCH) """
+    def period_value(start: float, _end: float):
+        index = int((start - SIM_EPOCH) // 60)
+        return values[index] if 0 <= index < len(values) else None
+    return Alarm("Test", period_value=period_value, breaching=lambda value: value <= 0, evaluation_periods=3, scales_down=True)
+
+
+@pytest.mark.parametrize("values, current_state, expected", [
+    # Every period breaching:
+    ([0, 0, 0], "OK", "ALARM"),
+    # Any period not breaching:
+    ([0, 1, 0], "ALARM", "OK"),
+    # Some missing, the rest breaching, keeps the state it was in:
+    ([0, 0, None], "ALARM", "ALARM"),
+    ([None, 0, 0], "OK", "OK"),
+    ([None, 0, 0], "ALARM", "ALARM"),
+    # Nothing at all:
+    ([None, None, None], "OK", "INSUFFICIENT_DATA"),
+])
+def test_alarm_treats_missing_data_as_missing(values, current_state, expected):
+    """ TreatMissingData.MISSING, evaluated with only full periods """
+    alarm = make_alarm(values)
+    alarm.state = current_state
+    # 30s into the next minute, so all 3 periods are complete:
+    assert alarm.evaluate(SIM_EPOCH + len(values) * 60 + 30) == expected
@@ -0,0 +1,224 @@
+"""
+Checks what the simulator copies from the NestedStacks still matches what they synthesize:
+Each lambda's environment and timeout, the EventBridge rules (and what each one triggers),
+and the Watchdog's alarms.
+
+Each config is synthesized once (exactly what `cdk synth` runs), then compared to a
+Simulation of the same config. If one of these fails, a stack changed and the
+simulator didn't. Change it in `simulator.py` too.
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import functools
+import tempfile
+import subprocess
+
+import yaml
+import pytest
+
+from ContainerManager.utils.lambda_logging import logging_environment
+from tests.synth_benchmarks.runner import REPO_ROOT, SYNTH_ENV
+from tests.lifecycle_simulator.scenarios import MINECRAFT, VALHEIM
+from tests.lifecycle_simulator.simulator import LEAF_ID, Simulation, load_config, raw_config
+
+## Each example as-is, plus one with every optional piece the simulator models turned on:
+CONFIGS = {
+    "Minecraft-example": (MINECRAFT, {}),
+    "Valheim-example": (VALHEIM, {}),
+    "Every-option": (MINECRAFT, {
+        "Watchdog": {"ShutdownHoldSeconds": 300, "DirectShutdown": {"Enabled": True}},
+        "Container": {"ReadinessCheck": {"Enabled": True}},
+        "Ec2": {"ElasticIp": True},
+    }),
+}
+
+## The simulated lambdas, and their construct ID in the stacks:
+FUNCTION_IDS = {
+    "trigger-start-system": "StartSystem",
+    "instance-StateChange-hook": "AsgStateChangeHook",
+    "watchdog-container-activity": "WatchdogContainerActivity",
+    "wake-trace": "WakeTrace",
+}
+## Rules that go straight to SNS, no lambda. (The simulator records them as notifications):
+NOTIFY_RULE_IDS = ["RuleNotifyUp", "RuleNotifyDown"]
+
+## Names of resources the simulator fakes with it's own. Only checked that they're both set, or both empty:
+RESOURCE_NAME_VARS = [
+    "ASG_NAME",
+    "MANAGER_STACK_REGION",
+    "ECS_CLUSTER_NAME",
+    "ECS_SERVICE_NAME",
+    "HOSTED_ZONE_ID",
+    "DOMAIN_NAME",
+    "WATCH_INSTANCE_RULE",
+    "TASK_DEFINITION",
+    "NOTIFY_UP_MESSAGE",
+    "NOTIFY_TOPIC_ARNS",
+    "ACTIVITY_ALARM_NAME",
+    "ELASTIC_IP",
+    "ELASTIC_IP_ALLOCATION_ID",
+]
+
+# A pattern value that references one of the leaf's own resources (i.e it's cluster or ASG). The
+#   simulator only has one of each, so it matches any value:
+ANY_VALUE = object()
+
+
+def construct_id(logical_id: str) -> str:
+    """ The construct's ID, from it's logical ID in the template (The ID plus an 8 character hash) """
+    return re.fullmatch(r"(?P<id>.+)[0-9A-F]{8}", logical_id).group("id")
+
+
+def to_simulator_names(value: str, leaf_name: str) -> str:
+    """ Swap the leaf's names for the simulator's, i.e 'ContainerManager-{Leaf}-Stack' -> 'Sim' """
+    return value.replace(f"ContainerManager-{leaf_name}-Stack", LEAF_ID).replace(leaf_name, LEAF_ID)
+
+
+@functools.cache
+def synthesize(name: str) -> dict:
+    """ Synth the config, and pull out the resources of every template (nested ones included) """
+    config_path, overrides = CONFIGS[name]
+    with tempfile.TemporaryDirectory(prefix="simulator-stacks-") as tmp_dir:
+        ## app.py names the leaf after the config's file name:
+        config_file = os.path.join(tmp_dir, f"{name}.yaml")
+        with open(config_file, "w", encoding="utf-8") as config_out:
+            yaml.safe_dump(raw_config(config_path, overrides), config_out)
+        outdir = os.path.join(tmp_dir, "cdk.out")
+        env = {
+            **SYNTH_ENV,
+            **os.environ,
+            "CDK_OUTDIR": outdir,
+            "CDK_CONTEXT_JSON": json.dumps({"config-file": config_file}),
+        }
+        output = subprocess.run([sys.executable, "app.py"], cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=False)
+        if output.returncode != 0:
+            raise RuntimeError(f"Synth of '{name}' failed:\n{output.stderr}")
+        resources = {}
+        for template_path in glob.glob(os.path.join(outdir, "*.template.json")):
+            with open(template_path, encoding="utf-8") as template:
+                resources.update(json.load(template).get("Resources", {}))
+    return resources
+
+
+def resources_of_type(resources: dict, resource_type: str) -> dict:
+    """ Construct ID -> properties, for every resource of that type """
+    return {
+        construct_id(logical_id): resource["Properties"]
+        for logical_id, resource in resources.items() if resource["Type"] == resource_type
+    }
+
+
+@pytest.fixture(name="leaf", params=CONFIGS, scope="module")
+def fixture_leaf(request) -> tuple:
+    """ The synthesized resources, and a Simulation of the same config """
+    config_path, overrides = CONFIGS[request.param]
+    return request.param, synthesize(request.param), Simulation(load_config(config_path, overrides))
+
+
+def test_lambda_environments_match(leaf):
+    """ Every variable the stacks give the lambdas, the simulator does too (and nothing they don't) """
+    leaf_name, resources, sim = leaf
+    functions = resources_of_type(resources, "AWS::Lambda::Function")
+    sim_env = {key: value for key, value in sim.lambda_env().items() if not key.startswith("AWS_")}
+    # The simulator leaves logging at it's defaults. (Every lambda gets the same variables):
+    logging_vars = logging_environment(sim.config["Logging"], "StartSystem")
+    mismatched = []
+    stack_vars = set()
+    for handler_name, function_id in FUNCTION_IDS.items():
+        env = functions[function_id]["Environment"]["Variables"]
+        for key, value in env.items():
+            if key in logging_vars:
+                continue
+            stack_vars.add(key)
+            if key not in sim_env:
+                mismatched.append(f"{handler_name}: '{key}' is missing")
+            elif key in RESOURCE_NAME_VARS:
+                if (value == "") != (sim_env[key] == ""):
+                    mismatched.append(f"{handler_name}: '{key}' is {value!r}, simulator has {sim_env[key]!r}")
+            elif not isinstance(value, str) or to_simulator_names(value, leaf_name) != sim_env[key]:
+                mismatched.append(f"{handler_name}: '{key}' is {value!r}, simulator has {sim_env[key]!r}")
+    mismatched += [f"'{key}' isn't in any stack anymore" for key in set(sim_env) - stack_vars]
+    assert not mismatched, f"'{leaf_name}': " + ", ".join(sorted(mismatched))
+
+
+def test_lambda_timeouts_match(leaf):
+    """ The simulator times each lambda out at the same point the stacks do """
+    leaf_name, resources, sim = leaf
+    functions = resources_of_type(resources, "AWS::Lambda::Function")
+    for handler_name, function_id in FUNCTION_IDS.items():
+        assert sim._lambda_timeout(handler_name) == functions[function_id]["Timeout"], f"'{leaf_name}': {handler_name}"
+
+
+def test_alarms_match(leaf):
+    """ Same alarms, with the same number of periods before they go off """
+    leaf_name, resources, sim = leaf
+    stack_alarms = {
+        to_simulator_names(alarm["AlarmName"], leaf_name): alarm["EvaluationPeriods"]
+        for alarm in resources_of_type(resources, "AWS::CloudWatch::Alarm").values()
+    }
+    assert stack_alarms == {alarm.name: alarm.evaluation_periods for alarm in sim.alarms}
+
+
+def test_watchdog_schedule_matches(leaf):
+    """ The simulator runs the watchdog every minute, same as it's rule """
+    _, resources, _ = leaf
+    rules = resources_of_type(resources, "AWS::Events::Rule")
+    assert rules["RuleWatchdogTrigger"]["ScheduleExpression"] == "rate(1 minute)"
+
+
+def test_rules_match(leaf):
+    """ Every event the simulator sends through a session goes where the stacks' rules would send it """
+    leaf_name, resources, sim = leaf
+    ## The alarms the rules reference, to what the simulator calls them:
+    alarm_arns = {}
+    for alarm_id, alarm in resources_of_type(resources, "AWS::CloudWatch::Alarm").items():
+        alarm_arns[alarm_id] = next(a.arn for a in sim.alarms if a.name == to_simulator_names(alarm["AlarmName"], leaf_name))
+
+    def resolve(value):
+        if isinstance(value, str):
+            return value
+        reference = json.dumps(value)
+        return next((arn for alarm_id, arn in alarm_arns.items() if alarm_id in reference), ANY_VALUE)
+
+    def matches(pattern: dict, event: dict) -> bool:
+        for key, expected in pattern.items():
+            if isinstance(expected, dict):
+                if not isinstance(event.get(key), dict) or not matches(expected, event[key]):
+                    return False
+                continue
+            values = event.get(key) if isinstance(event.get(key), list) else [event.get(key)]
+            if not any(allowed is ANY_VALUE or allowed in values for allowed in map(resolve, expected)):
+                return False
+        return True
+
+    ## What each enabled rule triggers, from the stacks:
+    function_ids = {function_id: handler_name for handler_name, function_id in FUNCTION_IDS.items()}
+    rules = []
+    for rule_id, rule in resources_of_type(resources, "AWS::Events::Rule").items():
+        if "EventPattern" not in rule or rule.get("State") == "DISABLED":
+            continue
+        if rule_id in NOTIFY_RULE_IDS:
+            rules.append((rule["EventPattern"], {rule_id}))
+            continue
+        targets = {construct_id(target["Arn"]["Fn::GetAtt"][0]) for target in rule["Targets"] if "Fn::GetAtt" in target["Arn"]}
+        rules.append((rule["EventPattern"], {function_ids[target] for target in targets if target in function_ids}))
+
+    ## Play a session through, and record where the simulator sends each event:
+    routed = []
+    rule_targets = sim._rule_targets
+    def recording_rule_targets(event: dict) -> list:
+        notified_before = len(sim.notifications)
+        targets = rule_targets(event)
+        routed.append((event, set(targets) | {n["From"] for n in sim.notifications[notified_before:]}))
+        return targets
+    sim._rule_targets = recording_rule_targets
+    sim.run(players=[{"ArriveAt": 60, "PlaySeconds": 30 * 60}], duration_seconds=2 * 60 * 60)
+    assert routed, "The session didn't send any events."
+
+    for event, sim_targets in routed:
+        stack_targets = set().union(*(targets for pattern, targets in rules if matches(pattern, event)))
+        assert sim_targets == stack_targets, f"'{leaf_name}': '{event['detail-type']}' goes to {sorted(stack_targets)}, simulator sends it to {sorted(sim_targets)}"
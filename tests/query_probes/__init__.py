@@ -0,0 +1,4 @@
+"""
+Tests for the watchdog's `Type: Query` probes, against fake game servers
+on localhost. (Nothing here talks to a real server, or AWS).
+"""
@@ -0,0 +1,139 @@
+"""
+Fake game servers that answer the watchdog's queries, on localhost.
+
+Each one runs in a background thread, on a free port, for as long as
+it's `with` block. They answer just enough of the protocol to report
+a player count, and remember what they were sent.
+"""
+
+import json
+import struct
+import socketserver
+import threading
+
+A2S_HEADER = b"\xFF\xFF\xFF\xFF"
+A2S_INFO_REQUEST = A2S_HEADER + b"TSource Engine Query\x00"
+A2S_PLAYER_REQUEST = A2S_HEADER + b"U"
+CHALLENGE = b"\x0A\x0B\x0C\x0D"
+
+
+class _FakeServer:
+    """ Starts the server on enter, and shuts it down on exit """
+    server_class = None
+
+    def __init__(self):
+        self.requests = []
+        fake = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            """ Hands each request back to the fake """
+            def handle(self):
+                fake.handle(self)
+
+        self.server = self.server_class(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, handler: socketserver.BaseRequestHandler) -> None:
+        """ Answer one request """
+        raise NotImplementedError
+
+
+class FakeMinecraftServer(_FakeServer):
+    """ Answers the Server List Ping with 'players_online' """
+    server_class = socketserver.ThreadingTCPServer
+
+    def __init__(self, players_online: int, packet_id: int=0x00):
+        self.players_online = players_online
+        self.packet_id = packet_id
+        super().__init__()
+
+    def handle(self, handler: socketserver.BaseRequestHandler) -> None:
+        stream = handler.request.makefile("rb")
+        # Handshake, then the (empty) status request:
+        handshake = stream.read(read_varint(stream))
+        status_request = stream.read(read_varint(stream))
+        self.requests.append((handshake, status_request))
+        status = json.dumps({
+            "version": {"name": "1.21", "protocol": 767},
+            "players": {"max": 20, "online": self.players_online},
+            "description": {"text": "A Fake Server"},
+        }).encode()
+        data = pack_varint(self.packet_id) + pack_varint(len(status)) + status
+        handler.request.sendall(pack_varint(len(data)) + data)
+
+
+class FakeA2sServer(_FakeServer):
+    """ Answers A2S_INFO and A2S_PLAYER, asking for a challenge first if 'challenge' """
+    server_class = socketserver.ThreadingUDPServer
+
+    def __init__(self, players: int, bots: int=0, challenge: bool=True, split: bool=False):
+        self.players = players
+        self.bots = bots
+        self.challenge = challenge
+        self.split = split
+        super().__init__()
+
+    def handle(self, handler: socketserver.BaseRequestHandler) -> None:
+        data, sock = handler.request
+        self.requests.append(data)
+        if data.startswith(A2S_INFO_REQUEST):
+            given_challenge = data[len(A2S_INFO_REQUEST):]
+            response = self.info_response()
+        elif data.startswith(A2S_PLAYER_REQUEST):
+            given_challenge = data[len(A2S_PLAYER_REQUEST):]
+            response = self.player_response()
+        else:
+            # Real servers just ignore anything they don't understand:
+            return
+        if self.challenge and given_challenge != CHALLENGE:
+            response = A2S_HEADER + b"\x41" + CHALLENGE
+        elif self.split:
+            # One piece of a multi-packet response: ID, total, number, size, then the payload:
+            response = b"\xFE\xFF\xFF\xFF" + struct.pack("<lBBH", 1, 2, 0, 1248) + response
+        sock.sendto(response, handler.client_address)
+
+    def info_response(self) -> bytes:
+        """ A2S_INFO, with the Source engine layout """
+        # Header, protocol, then the name, map, folder, and game strings:
+        return A2S_HEADER + b"I" + b"\x11" + b"\x00".join([
+            b"Fake Server", b"map", b"fake", b"Fake Game", b"",
+        # Steam app ID, then: players, max players, bots, then the rest nobody here reads:
+        ]) + struct.pack("<H", 0) + bytes([self.players, 64, self.bots]) + b"dl\x00\x01" + b"1.0.0\x00"
+
+    def player_response(self) -> bytes:
+        """ A2S_PLAYER, with a name/score/duration for each player """
+        players = b"".join(
+            bytes([index]) + f"Player{index}".encode() + b"\x00" + struct.pack("<lf", 0, 60.0)
+            for index in range(self.players)
+        )
+        return A2S_HEADER + b"D" + bytes([self.players]) + players
+
+
+def pack_varint(value: int) -> bytes:
+    """ Minecraft's VarInt, written separately from the lambda's on purpose """
+    value &= 0xFFFFFFFF
+    packed = bytearray()
+    while value >= 0x80:
+        packed.append((value & 0x7F) | 0x80)
+        value >>= 7
+    packed.append(value)
+    return bytes(packed)
+
+def read_varint(stream) -> int:
+    """ Read one VarInt """
+    value, position = 0, 0
+    while True:
+        byte = stream.read(1)[0]
+        value |= (byte & 0x7F) << (7 * position)
+        if not byte & 0x80:
+            return value
+        position += 1
@@ -0,0 +1,106 @@
+"""
+Checks each `Watchdog.Query.Protocol` reads the right player count off a fake
+server, and that the watchdog counts a server that doesn't answer as 0 players.
+"""
+
+import os
+import socket
+import importlib.util
+
+import pytest
+
+from tests.query_probes.fake_servers import FakeMinecraftServer, FakeA2sServer, CHALLENGE
+
+WATCHDOG_DIR = "./ContainerManager/leaf_stack/lambda/watchdog-container-activity"
+TIMEOUT = 2
+
+# Loaded from the lambda's dir, the same way Lambda would import it next to main.py:
+_spec = importlib.util.spec_from_file_location("query_protocols", os.path.join(WATCHDOG_DIR, "query_protocols.py"))
+query_protocols = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(query_protocols)
+
+
+def closed_port(sock_type: int) -> int:
+    """ A port nothing is listening on """
+    with socket.socket(socket.AF_INET, sock_type) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize("players_online", [0, 3, 300])
+def test_minecraft_slp(players_online):
+    """ The count comes from the status JSON, after a status handshake """
+    with FakeMinecraftServer(players_online) as server:
+        assert query_protocols.minecraft_slp("127.0.0.1", server.port, TIMEOUT) == players_online
+    handshake, status_request = server.requests[0]
+    # Packet 0x00, asking for the status (next state 1), to the port it connected on:
+    assert handshake[0] == 0x00
+    assert handshake[-3:] == server.port.to_bytes(2, "big") + b"\x01"
+    assert status_request == b"\x00"
+
+
+def test_minecraft_slp_wrong_packet():
+    """ Anything other than a status response isn't trusted """
+    with FakeMinecraftServer(3, packet_id=0x01) as server:
+        with pytest.raises(query_protocols.QueryError):
+            query_protocols.minecraft_slp("127.0.0.1", server.port, TIMEOUT)
+
+
+@pytest.mark.parametrize("challenge", [True, False])
+def test_a2s_info(challenge):
+    """ Players minus bots, with or without the server asking for a challenge first """
+    with FakeA2sServer(players=5, bots=2, challenge=challenge) as server:
+        assert query_protocols.a2s_info("127.0.0.1", server.port, TIMEOUT) == 3
+    # Answering the challenge is one more round trip:
+    assert len(server.requests) == (2 if challenge else 1)
+    if challenge:
+        assert server.requests[1].endswith(CHALLENGE)
+
+
+@pytest.mark.parametrize("players", [0, 4])
+def test_a2s_player(players):
+    """ Always asks for a challenge first, then counts the players """
+    with FakeA2sServer(players=players) as server:
+        assert query_protocols.a2s_player("127.0.0.1", server.port, TIMEOUT) == players
+    assert server.requests[0].endswith(b"\xFF\xFF\xFF\xFF")
+    assert server.requests[1].endswith(CHALLENGE)
+
+
+def test_a2s_split_response():
+    """ Multi-packet responses aren't put back together, so they fail loudly """
+    with FakeA2sServer(players=4, challenge=False, split=True) as server:
+        with pytest.raises(query_protocols.QueryError):
+            query_protocols.a2s_info("127.0.0.1", server.port, TIMEOUT)
+
+
+def test_nothing_listening():
+    """ A closed port is an OSError (refused, or the UDP query timing out) """
+    with pytest.raises(OSError):
+        query_protocols.minecraft_slp("127.0.0.1", closed_port(socket.SOCK_STREAM), TIMEOUT)
+    with pytest.raises(OSError):
+        query_protocols.a2s_info("127.0.0.1", closed_port(socket.SOCK_DGRAM), 0.2)
+
+
+def test_watchdog_handles_no_answer(monkeypatch):
+    """ The server not answering isn't an error. (The lambda pushes it as 0 players, but it's not ready yet for DirectShutdown) """
+    for key, value in {
+        "AWS_DEFAULT_REGION": "us-west-2",
+        "ASG_NAME": "test-asg",
+        "TASK_DEFINITION": "test-task",
+        "CONNECTION_TYPE": "QUERY",
+        "QUERY_PROTOCOL": "A2S_INFO",
+        "QUERY_PORT": str(closed_port(socket.SOCK_DGRAM)),
+        "QUERY_TIMEOUT_MS": "200",
+        "METRIC_NAME_ACTIVITY_COUNT": "Metric-Activity",
+        "METRIC_NAME_SSH_CONNECTIONS": "Metric-SSH",
+        "METRIC_NAMESPACE": "Test",
+        "METRIC_UNIT": "Count",
+        "METRIC_DIMENSIONS": '{"ContainerNameID": "Test"}',
+    }.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.syspath_prepend(os.path.abspath(WATCHDOG_DIR))
+    monkeypatch.syspath_prepend(os.path.abspath("./ContainerManager/leaf_stack/lambda/layers/structured-logging/python"))
+    spec = importlib.util.spec_from_file_location("watchdog_main", os.path.join(WATCHDOG_DIR, "main.py"))
+    watchdog = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(watchdog)
+    assert watchdog.query_player_count("127.0.0.1") is None
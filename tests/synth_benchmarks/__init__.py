@@ -0,0 +1,3 @@
+"""
+Benchmarks for `cdk synth`: How long it takes, and how big the templates come out.
+"""
@@ -0,0 +1,209 @@
+"""
+Synthesizes each example config, and measures what it costs.
+
+Each synth is `python3 app.py` (exactly what `cdk synth` runs), in it's own
+process, into a throw-away output directory. For each config:
+    - SynthSeconds: Wall time of the whole synth. (Python, and the node process jsii runs it in).
+    - PeakMemoryMb: The memory high-water mark of the biggest process in the synth.
+    - Constructs: How many constructs are in the tree, across every stack.
+    - Resources: How many CloudFormation resources are in every template, nested ones included.
+    - CrossRegionExports: How many values get passed between regions. (Each one is an SSM
+                          parameter, plus the custom resources that read/write it).
+    - ResourcesByType: The resource types most likely to quietly multiply.
+    - TemplateBytes: Size of each stack's template. Nested stacks are under their parent,
+                     i.e 'ContainerManager-{Leaf}-Stack/WatchdogNestedStack'.
+
+Stack names have the config's name in them, it's swapped for '{Leaf}' so
+every config's budget reads the same.
+
+Run all of them with:
+    python -m tests.synth_benchmarks.runner
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+EXAMPLE_CONFIGS = sorted(glob.glob(os.path.join(REPO_ROOT, "Examples", "*.yaml")))
+
+## What `cdk synth` would fill in from your credentials, plus what the configs read with !ENV:
+SYNTH_ENV = {
+    "CDK_DEFAULT_ACCOUNT": "123456789012",
+    "CDK_DEFAULT_REGION": "us-west-2",
+    "HOSTED_ZONE_ID": "Z0123456789",
+    "EMAIL": "benchmark@example.com",
+    "RCRON_PASSWORD": "benchmark",
+    "VALHEIM_PASS": "benchmark",
+    "JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION": "1",
+}
+
+## How each measurement is combined across runs. Timings use the fastest run (the
+## one with the least noise), everything else uses the worst:
+TIMING_METRICS = ["SynthSeconds"]
+WORST_CASE_METRICS = ["PeakMemoryMb", "Constructs", "Resources", "CrossRegionExports"]
+# Counted separately in ResourcesByType:
+WATCHED_RESOURCE_TYPES = [
+    "AWS::IAM::Role",
+    "AWS::IAM::Policy",
+    "AWS::Lambda::Function",
+    "AWS::Logs::LogGroup",
+    "Custom::CrossRegionExportReader",
+    "Custom::CrossRegionExportWriter",
+    "Custom::LogRetention",
+]
+
+
+def config_name(config_path: str) -> str:
+    """ What app.py uses as the container_id """
+    return os.path.basename(os.path.splitext(config_path)[0])
+
+
+def count_constructs(node: dict) -> int:
+    """ This construct, and everything under it """
+    return 1 + sum(count_constructs(child) for child in node.get("children", {}).values())
+
+
+def template_key(template_file: str, stack_names: list, leaf_name: str) -> str:
+    """ The budget key for a template file """
+    if template_file.endswith(".nested.template.json"):
+        ## Nested templates are named '<parent, only letters/numbers><construct id><hash>':
+        for stack_name in stack_names:
+            prefix = re.sub(r"[^A-Za-z0-9]", "", stack_name)
+            match = re.fullmatch(rf"{prefix}(?P<nested>.+)[0-9A-F]{{8}}\.nested\.template\.json", template_file)
+            if match:
+                return f"{stack_name}/{match.group('nested')}".replace(leaf_name, "{Leaf}")
+    return template_file.removesuffix(".template.json").replace(leaf_name, "{Leaf}")
+
+
+def measure_cloud_assembly(outdir: str, leaf_name: str) -> dict:
+    """ Everything that can be counted in the synth's output """
+    with open(os.path.join(outdir, "manifest.json"), encoding="utf-8") as manifest_file:
+        manifest = json.load(manifest_file)
+    stack_names = [name for name, artifact in manifest["artifacts"].items() if artifact["type"] == "aws:cloudformation:stack"]
+    with open(os.path.join(outdir, "tree.json"), encoding="utf-8") as tree_file:
+        # (Minus the tree node itself):
+        constructs = count_constructs(json.load(tree_file)["tree"]) - 1
+
+    template_bytes = {}
+    resource_types = Counter()
+    cross_region_exports = 0
+    # Longest first, so a stack's name can't match the start of another's nested templates:
+    stack_names.sort(key=len, reverse=True)
+    for template_path in sorted(glob.glob(os.path.join(outdir, "*.template.json"))):
+        template_file = os.path.basename(template_path)
+        template_bytes[template_key(template_file, stack_names, leaf_name)] = os.path.getsize(template_path)
+        with open(template_path, encoding="utf-8") as template:
+            resources = json.load(template).get("Resources", {})
+        for resource in resources.values():
+            resource_types[resource["Type"]] += 1
+            if resource["Type"] == "Custom::CrossRegionExportWriter":
+                cross_region_exports += len(resource["Properties"]["WriterProps"]["exports"])
+
+    return {
+        "Constructs": constructs,
+        "Resources": sum(resource_types.values()),
+        "CrossRegionExports": cross_region_exports,
+        "ResourcesByType": {resource_type: resource_types[resource_type] for resource_type in WATCHED_RESOURCE_TYPES},
+        "TemplateBytes": dict(sorted(template_bytes.items())),
+    }
+
+
+def run_synth(config_path: str) -> dict:
+    """ Synth the config, in a child of THIS process. (It should be a fresh one, or the memory's off) """
+    # pylint: disable=import-outside-toplevel
+    import resource
+    outdir = tempfile.mkdtemp(prefix="synth-benchmark-")
+    try:
+        env = {
+            **SYNTH_ENV,
+            **os.environ,
+            "CDK_OUTDIR": outdir,
+            "CDK_CONTEXT_JSON": json.dumps({"config-file": os.path.relpath(config_path, REPO_ROOT)}),
+        }
+        start_time = time.perf_counter()
+        output = subprocess.run([sys.executable, "app.py"], cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=False)
+        synth_seconds = time.perf_counter() - start_time
+        if output.returncode != 0:
+            raise RuntimeError(f"Synth of '{config_path}' failed:\n{output.stderr}")
+        # Covers app.py AND the node process under it:
+        max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        # Linux reports it in KB, macOS in bytes:
+        peak_memory_mb = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+        return {
+            "SynthSeconds": synth_seconds,
+            "PeakMemoryMb": peak_memory_mb,
+            **measure_cloud_assembly(outdir, config_name(config_path)),
+        }
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+
+
+def benchmark(config_path: str, runs: int=1) -> dict:
+    """ Synth the config a few times, each from a new process, and combine the results """
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-m", "tests.synth_benchmarks.runner", "--synth", config_path],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        if output.returncode != 0:
+            raise RuntimeError(f"Benchmark of '{config_path}' failed:\n{output.stderr}")
+        results.append(json.loads(output.stdout))
+    combined = {metric: min(result[metric] for result in results) for metric in TIMING_METRICS}
+    combined.update({metric: max(result[metric] for result in results) for metric in WORST_CASE_METRICS})
+    for metric in ["ResourcesByType", "TemplateBytes"]:
+        combined[metric] = {key: max(result[metric][key] for result in results) for key in results[0][metric]}
+    return combined
+
+
+def print_table(all_results: dict) -> None:
+    """ The totals for each config, then each template's size """
+    columns = TIMING_METRICS + WORST_CASE_METRICS
+    name_width = max(len(name) for name in all_results)
+    print(f"{'Config':<{name_width}}  " + "  ".join(f"{column:>18}" for column in columns))
+    for name, results in all_results.items():
+        row = [f"{results[column]:>18.1f}" if isinstance(results[column], float) else f"{results[column]:>18}" for column in columns]
+        print(f"{name:<{name_width}}  " + "  ".join(row))
+    for name, results in all_results.items():
+        print(f"\n{name}:")
+        for key, value in {**results["ResourcesByType"], **results["TemplateBytes"]}.items():
+            print(f"    {key:<60} {value:>8}")
+
+
+def main() -> None:
+    """ Benchmark every example config (or just one synth, when called by `benchmark`) """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synth", help="Run a single synth of this config from this process, and print the results as JSON.")
+    parser.add_argument("--config", action="append", help="Only benchmark this config. (Can be passed more than once)")
+    parser.add_argument("--runs", type=int, default=1, help="How many times to synth each config.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON, instead of a table.")
+    args = parser.parse_args()
+
+    if args.synth:
+        print(json.dumps(run_synth(args.synth)))
+        return
+
+    all_results = {
+        config_name(config_path): benchmark(config_path, runs=args.runs)
+        for config_path in (args.config or EXAMPLE_CONFIGS)
+    }
+    if args.json:
+        print(json.dumps(all_results, indent=4))
+    else:
+        print_table(all_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Fails if synthesizing an example config goes over it's budget in `thresholds.json`.
+
+Cross-region exports and each watched resource type are budgeted exactly, so they catch
+a change that quietly multiplies something. (I.e a policy duplicated per leaf, or a new
+reference between regions). Total constructs, resources, and template sizes get a little
+headroom, so small changes don't need a budget bump every time.
+
+The timing budget has plenty of headroom, since CI machines vary. If yours is slower,
+scale ONLY the timing with:
+    SYNTH_BENCHMARK_BUDGET_SCALE=2 pytest tests/synth_benchmarks
+
+If a change makes the templates bigger on purpose, update the budget in the same PR.
+"""
+
+import os
+import json
+
+import pytest
+
+from tests.synth_benchmarks.runner import benchmark, config_name, EXAMPLE_CONFIGS, TIMING_METRICS
+
+with open(os.path.join(os.path.dirname(__file__), "thresholds.json"), encoding="utf-8") as thresholds_file:
+    THRESHOLDS = json.load(thresholds_file)
+BUDGET_SCALE = float(os.environ.get("SYNTH_BENCHMARK_BUDGET_SCALE", "1"))
+
+
+def test_every_example_has_a_budget():
+    """ A new example config should get a budget too """
+    assert set(THRESHOLDS) == {config_name(config_path) for config_path in EXAMPLE_CONFIGS}
+
+
+@pytest.mark.parametrize("config_path", EXAMPLE_CONFIGS, ids=config_name)
+def test_synth_within_budget(config_path: str):
+    """ Synth the config, and compare every measurement to it's budget """
+    results = benchmark(config_path)
+    print(json.dumps({config_name(config_path): results}, indent=4))
+    budgets = THRESHOLDS[config_name(config_path)]
+
+    over_budget = []
+    for metric, budget in budgets.items():
+        if isinstance(budget, dict):
+            ## Per template / per resource type. (A new template needs a budget too):
+            for key, value in results[metric].items():
+                if key not in budget:
+                    over_budget.append(f"{metric}['{key}']: No budget")
+                elif value > budget[key]:
+                    over_budget.append(f"{metric}['{key}']: {value} > {budget[key]}")
+            continue
+        if metric in TIMING_METRICS:
+            budget *= BUDGET_SCALE
+        if results[metric] > budget:
+            over_budget.append(f"{metric}: {results[metric]:.4g} > {budget:.4g}")
+    assert not over_budget, f"'{config_name(config_path)}' is over budget: " + ", ".join(over_budget)
@@ -0,0 +1,5 @@
+"""
+Tests for the threshold calibrator. (`tools/threshold_calibrator.py`)
+
+Runs against made-up activity histories, so they never touch AWS.
+"""
@@ -0,0 +1,163 @@
+"""
+Checks the calibrator against made-up activity histories.
+
+Each history is a leaf's minutes, like the watchdog pushes them: Mostly an empty
+server ticking over, with a few sessions of someone playing. The random numbers
+are seeded, so every run gets the same minutes.
+"""
+
+import random
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import pytest
+from botocore.stub import Stubber, ANY
+
+from ContainerManager.utils.config_loader import load_leaf_config
+from tools.threshold_calibrator import (
+    METRIC_NAME,
+    calibrate,
+    leaf_metric,
+    fetch_activity,
+    load_recorded,
+    save_recorded,
+    apply_threshold,
+)
+
+VALHEIM_CONFIG = "./Examples/Valheim-example.yaml"
+
+
+def history(idle: tuple, active: tuple, idle_minutes: int=2000, active_minutes: int=600, seed: int=0) -> list:
+    """ Idle minutes uniform in (low, high) packets, then active ones around (mean, stdev) """
+    rng = random.Random(seed)
+    values = [rng.randint(*idle) for _ in range(idle_minutes)]
+    values += [max(0, round(rng.gauss(*active))) for _ in range(active_minutes)]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [{"Timestamp": start + timedelta(minutes=i), "Value": float(v)} for i, v in enumerate(values)]
+
+
+def test_valheim_splits_cleanly():
+    """ ~0-15 packets empty, ~5k with a player: Confident, and well clear of both """
+    report = calibrate(history(idle=(0, 15), active=(5000, 800)), current_threshold=32)
+    assert report["Confidence"] == "High"
+    assert report["Idle"]["Minutes"] == 2000 and report["Active"]["Minutes"] == 600
+    assert report["Idle"]["Max"] < report["RecommendedThreshold"] < report["Active"]["Min"]
+    # The default already worked here, and so does the new one:
+    assert report["Misclassified"]["Current"] == {"IdleCountedActive": 0, "ActiveCountedIdle": 0}
+    assert report["Misclassified"]["Recommended"] == {"IdleCountedActive": 0, "ActiveCountedIdle": 0}
+
+
+def test_chatty_idle_server_raises_the_threshold():
+    """ An empty server that's never under 32 packets would never spin down on the default """
+    report = calibrate(history(idle=(40, 90), active=(2000, 300)), current_threshold=32)
+    assert report["Confidence"] == "High"
+    assert report["Misclassified"]["Current"]["IdleCountedActive"] == 2000
+    assert report["RecommendedThreshold"] >= 90
+    assert report["Misclassified"]["Recommended"] == {"IdleCountedActive": 0, "ActiveCountedIdle": 0}
+
+
+def test_trigger_minutes_are_dropped():
+    """ 'Threshold + 1' is what trigger-start-system pushes on DNS queries, not traffic """
+    datapoints = history(idle=(0, 15), active=(5000, 800))
+    datapoints += [{"Timestamp": d["Timestamp"], "Value": 33.0} for d in datapoints[:50]]
+    report = calibrate(datapoints, current_threshold=32)
+    assert report["DroppedTriggerMinutes"] == 50
+    assert report["Minutes"] == 2600
+    assert report["Idle"]["Max"] <= 15
+
+
+def test_nobody_ever_played():
+    """ Only idle minutes: Nothing to split, so nothing to recommend """
+    report = calibrate(history(idle=(3, 3), active=(0, 0), active_minutes=0), current_threshold=32)
+    assert report["Confidence"] == "Low"
+    assert report["RecommendedThreshold"] is None
+    assert report["Reasons"]
+
+
+@pytest.mark.parametrize("kwargs", [
+    # Too few played minutes to tell apart from the idle ones:
+    {"idle": (0, 15), "active": (5000, 800), "active_minutes": 10},
+    # Idle and active overlap:
+    {"idle": (0, 400), "active": (300, 100)},
+])
+def test_low_confidence(kwargs):
+    """ Still recommends something, but --apply won't use it by default """
+    report = calibrate(history(**kwargs), current_threshold=32)
+    assert report["Confidence"] == "Low"
+    assert report["RecommendedThreshold"] is not None
+    assert report["Reasons"]
+
+
+def test_fetch_reads_every_page():
+    """ Same namespace/dimension the watchdog pushes to, and follows NextToken """
+    namespace, container_id = leaf_metric(VALHEIM_CONFIG)
+    assert (namespace, container_id) == ("ContainerManager-Valheim-example-Stack", "Valheim-example")
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    pages = [
+        {"MetricDataResults": [{"Id": "activity", "Timestamps": [start], "Values": [4.0]}], "NextToken": "page-2"},
+        {"MetricDataResults": [{"Id": "activity", "Timestamps": [start + timedelta(minutes=1)], "Values": [5000.0]}]},
+    ]
+    query = {
+        "MetricDataQueries": [{
+            "Id": "activity",
+            "MetricStat": {
+                "Metric": {
+                    "Namespace": namespace,
+                    "MetricName": METRIC_NAME,
+                    "Dimensions": [{"Name": "ContainerNameID", "Value": container_id}],
+                },
+                "Period": 60,
+                "Stat": "Maximum",
+            },
+        }],
+        "StartTime": ANY,
+        "EndTime": ANY,
+        "ScanBy": "TimestampAscending",
+    }
+    client = boto3.client("cloudwatch", region_name="us-west-2")
+    with Stubber(client) as stubber, pytest.MonkeyPatch.context() as monkeypatch:
+        stubber.add_response("get_metric_data", pages[0], query)
+        stubber.add_response("get_metric_data", pages[1], {**query, "NextToken": "page-2"})
+        monkeypatch.setattr(boto3, "client", lambda *args, **kwargs: client)
+        datapoints = fetch_activity(namespace, container_id, "us-west-2", days=1)
+        stubber.assert_no_pending_responses()
+    assert [d["Value"] for d in datapoints] == [4.0, 5000.0]
+
+
+def test_record_round_trip(tmp_path):
+    """ What --record saves, --recorded calibrates the same """
+    datapoints = history(idle=(0, 15), active=(5000, 800))
+    path = str(tmp_path / "udp-activity.json")
+    save_recorded(path, *leaf_metric(VALHEIM_CONFIG), datapoints)
+    assert calibrate(load_recorded(path), 32) == calibrate(datapoints, 32)
+
+
+def test_apply_adds_a_watchdog_block(tmp_path):
+    """ The example only has it commented out. Adds it, and leaves the comments alone """
+    config_file = str(tmp_path / "Valheim-example.yaml")
+    shutil.copy(VALHEIM_CONFIG, config_file)
+    apply_threshold(config_file, 250)
+    assert load_leaf_config(config_file)["Watchdog"]["Threshold"] == 250
+    with open(config_file, encoding="utf-8") as config:
+        assert "#   Threshold: 32" in config.read()
+    ## Running it again changes the one it added:
+    apply_threshold(config_file, 300)
+    with open(config_file, encoding="utf-8") as config:
+        text = config.read()
+    assert text.count("\n  Threshold:") == 1
+    assert load_leaf_config(config_file)["Watchdog"]["Threshold"] == 300
+
+
+def test_apply_keeps_the_rest_of_the_block(tmp_path):
+    """ Replaces just the value (and keeps it's comment), without touching the other keys """
+    config_file = str(tmp_path / "Chatty-game.yaml")
+    with open(VALHEIM_CONFIG, encoding="utf-8") as config:
+        text = config.read()
+    with open(config_file, "w", encoding="utf-8") as config:
+        config.write(text + "\nWatchdog:\n    Type: UDP\n    Threshold: 32 # Default\n    MinutesWithoutConnections: 7\n")
+    apply_threshold(config_file, 120)
+    watchdog = load_leaf_config(config_file)["Watchdog"]
+    assert (watchdog["Threshold"], watchdog["MinutesWithoutConnections"]) == (120, 7)
+    with open(config_file, encoding="utf-8") as config:
+        assert "    Threshold: 120 # Default\n" in config.read()
@@ -0,0 +1,4 @@
+"""
+Load harness for `trigger-start-system`, under the flood of DNS query logs
+a wake (and every retry during it) produces.
+"""
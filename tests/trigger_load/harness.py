@@ -0,0 +1,180 @@
+"""
+Replays DNS query payloads against `trigger-start-system`, at the rate they'd arrive,
+and reports what it cost.
+
+AWS is stubbed with the same responses as the lambda benchmarks, plus a delay on each
+call (The lambda's calls go to the manager stack's region, usually not the one the
+query logs are in). Payloads are delivered on schedule whether or not the last ones
+finished, and run on at most `concurrency` handlers at once. Anything past that waits,
+the same as Lambda throttling and retrying an async invoke.
+
+Reports:
+    - AwsCalls / CallsPerQuery: Every AWS call made, and how many each DNS query cost.
+    - ThroughputQueriesPerSecond: DNS queries handled per second, vs the Offered rate.
+    - LatencyMs: Delivered -> handled, for each payload. (Includes time waiting for a free handler).
+    - QueueDelayMs: Just the time waiting for a free handler.
+    - PeakConcurrency: The most handlers running at once. (How many Lambda environments it'd need).
+
+The handler is loaded once up front, this is only the warm path. (Cold starts
+are in ./tests/lambda_benchmarks/).
+
+Usage:
+    python3 -m tests.trigger_load.harness --queries-per-second 200 --duration 10
+    python3 -m tests.trigger_load.harness --recorded ./captured-events.json --speed 5
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import threading
+import importlib.util
+from collections import Counter
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import botocore.client
+
+from tests.lambda_benchmarks.handlers import HANDLERS, LAYER_DIR
+from tests.lambda_benchmarks.runner import REPO_ROOT, FAKE_AWS_ENV, LambdaContext, StubbedAws
+from tests.trigger_load.payloads import synthetic_payloads, recorded_payloads
+
+HANDLER_NAME = "trigger-start-system"
+
+
+class SlowStubbedAws(StubbedAws):
+    """ The benchmark's stub, but every call takes as long as a round trip to AWS would """
+    def __init__(self, responses: dict, api_latency_seconds: float):
+        super().__init__(responses)
+        self.api_latency_seconds = api_latency_seconds
+
+    def make_api_call(self, client, operation_name: str, api_params: dict) -> dict:
+        """ Wait the round trip, then answer like the normal stub """
+        time.sleep(self.api_latency_seconds)
+        return super().make_api_call(client, operation_name, api_params)
+
+
+def load_handler():
+    """ Load the handler like Lambda does. (Call inside the stubbed AWS and environment) """
+    if os.path.join(REPO_ROOT, LAYER_DIR) not in sys.path:
+        sys.path.insert(0, os.path.join(REPO_ROOT, LAYER_DIR))
+    spec = importlib.util.spec_from_file_location("trigger_load_main", os.path.join(REPO_ROOT, HANDLERS[HANDLER_NAME]["path"]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentiles(values: list) -> dict:
+    """ p50/p95/p99/max, in milliseconds (nearest-rank) """
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+    def rank(percent: int) -> float:
+        return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+    return {f"p{p}": round(rank(p) * 1000, 1) for p in (50, 95, 99)} | {"max": round(ordered[-1] * 1000, 1)}
+
+
+def run_load(payloads: list, concurrency: int=10, api_latency_seconds: float=0.05) -> dict:
+    """ Deliver each `(deliver_at, event, num_queries)` on schedule, and report how the handler kept up """
+    stub = SlowStubbedAws(HANDLERS[HANDLER_NAME]["responses"], api_latency_seconds)
+    results = []
+    in_flight = {"Now": 0, "Peak": 0}
+    lock = threading.Lock()
+
+    def invoke(module, event: dict, num_queries: int, delivered_at: float) -> None:
+        started_at = time.perf_counter()
+        with lock:
+            in_flight["Now"] += 1
+            in_flight["Peak"] = max(in_flight["Peak"], in_flight["Now"])
+        error = None
+        try:
+            module.lambda_handler(event, LambdaContext(timeout_seconds=30))
+        except Exception as e: # pylint: disable=broad-exception-caught
+            error = repr(e)
+        finished_at = time.perf_counter()
+        with lock:
+            in_flight["Now"] -= 1
+            results.append({
+                "Queries": num_queries,
+                "DeliveredAt": delivered_at,
+                "QueueDelay": started_at - delivered_at,
+                "Latency": finished_at - delivered_at,
+                "FinishedAt": finished_at,
+                "Error": error,
+            })
+
+    with mock.patch.dict(os.environ, {**FAKE_AWS_ENV, **HANDLERS[HANDLER_NAME]["env"]}), \
+         mock.patch.object(botocore.client.BaseClient, "_make_api_call", new=lambda client, operation_name, api_params: stub.make_api_call(client, operation_name, api_params)), \
+         redirect_stdout(io.StringIO()):
+        module = load_handler()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start_time = time.perf_counter()
+            for deliver_at, event, num_queries in sorted(payloads, key=lambda payload: payload[0]):
+                time.sleep(max(0, start_time + deliver_at - time.perf_counter()))
+                executor.submit(invoke, module, event, num_queries, time.perf_counter())
+
+    num_queries = sum(result["Queries"] for result in results)
+    offered_seconds = max(payload[0] for payload in payloads) or 1
+    handled_seconds = max(r["FinishedAt"] for r in results) - min(r["DeliveredAt"] for r in results)
+    return {
+        "DnsQueries": num_queries,
+        "Payloads": len(results),
+        "AwsCalls": len(stub.api_calls),
+        "CallsPerQuery": round(len(stub.api_calls) / num_queries, 3),
+        "CallsPerPayload": round(len(stub.api_calls) / len(results), 3),
+        "CallsByOperation": dict(Counter(f"{service}.{operation}" for service, operation in stub.api_calls)),
+        "OfferedQueriesPerSecond": round(num_queries / offered_seconds, 1),
+        "ThroughputQueriesPerSecond": round(num_queries / handled_seconds, 1),
+        "LatencyMs": percentiles([r["Latency"] for r in results]),
+        "QueueDelayMs": percentiles([r["QueueDelay"] for r in results]),
+        "PeakConcurrency": in_flight["Peak"],
+        "Errors": len([r for r in results if r["Error"]]),
+    }
+
+
+def print_report(report: dict) -> None:
+    """ One line per measurement """
+    for key, value in report.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{k}={v}" for k, v in value.items())
+        print(f"{key:>28}: {value}")
+
+
+def main() -> None:
+    """ Run one load test, from the command line """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_argument_group("Synthetic storm (the default)")
+    source.add_argument("--queries-per-second", type=float, default=50, help="How many DNS queries hit the log group per second.")
+    source.add_argument("--duration", type=float, default=5, help="How long the storm lasts, in seconds.")
+    source.add_argument("--batch-window", type=float, default=1.0, help="Seconds of queries CloudWatch Logs delivers at once. (0 for one query per payload)")
+    source.add_argument("--max-batch-size", type=int, default=100, help="Most queries in a single payload.")
+    source.add_argument("--seed", type=int, default=0, help="Seed for the query arrival times.")
+    parser.add_argument("--recorded", help="Replay payloads from this file instead. (See `recorded_payloads` in payloads.py for the format)")
+    parser.add_argument("--speed", type=float, default=1.0, help="With --recorded, replay this many times faster than it happened.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Most handlers running at once. (The lambda's concurrency limit)")
+    parser.add_argument("--api-latency-ms", type=float, default=50, help="How long each AWS call takes.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    if args.recorded:
+        payloads = recorded_payloads(args.recorded, speed=args.speed)
+    else:
+        payloads = synthetic_payloads(
+            queries_per_second=args.queries_per_second,
+            duration_seconds=args.duration,
+            batch_window_seconds=args.batch_window,
+            max_batch_size=args.max_batch_size,
+            seed=args.seed,
+        )
+    report = run_load(payloads, concurrency=args.concurrency, api_latency_seconds=args.api_latency_ms / 1000)
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
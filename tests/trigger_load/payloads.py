@@ -0,0 +1,117 @@
+"""
+DNS query log payloads, the way the subscription filter delivers them to `trigger-start-system`.
+
+Route53 writes one log line per query, from every resolver between the player and
+Route53. With a TTL of 1s, nothing caches it for long, so one player retrying can
+be a few queries a second. CloudWatch Logs then batches whatever lines match the
+filter into one payload per delivery.
+
+Each payload here is `(deliver_at, event, num_queries)`. `deliver_at` is seconds from
+the start of the run, `event` is exactly what the lambda gets.
+"""
+
+import json
+import gzip
+import base64
+import random
+from datetime import datetime, timezone
+
+DOMAIN_NAME = "load.example.com"
+HOSTED_ZONE_ID = "Z0LOADTEST"
+# Some of the Route53 edge locations a query can land in:
+EDGE_LOCATIONS = ["IAD89-C1", "SEA19-C2", "FRA56-P7", "NRT57-C3"]
+
+
+def encode_event(log_events: list) -> dict:
+    """ Wrap the log lines up like CloudWatch Logs does (json -> gzip -> base64) """
+    # https://docs.aws.amazon.com/AmazonCloudWatch/latest/logs/SubscriptionFilters.html#LambdaFunctionExample
+    log_data = {
+        "messageType": "DATA_MESSAGE",
+        "owner": "123456789012",
+        "logGroup": f"/aws/route53/{DOMAIN_NAME}",
+        "logStream": f"{HOSTED_ZONE_ID}/{EDGE_LOCATIONS[0]}",
+        "subscriptionFilters": ["TriggerLambdaOnConnect"],
+        "logEvents": log_events,
+    }
+    return {"awslogs": {"data": base64.b64encode(gzip.compress(json.dumps(log_data).encode())).decode()}}
+
+
+def decode_event(event: dict) -> list:
+    """ The log lines in a payload """
+    return json.loads(gzip.decompress(base64.b64decode(event["awslogs"]["data"])))["logEvents"]
+
+
+def query_log_event(query_id: int, timestamp: float, rng: random.Random) -> dict:
+    """ One Route53 query log line """
+    # https://docs.aws.amazon.com/Route53/latest/DeveloperGuide/query-logs.html#query-logs-format
+    record_type = rng.choice(["A", "A", "AAAA"])
+    resolver_ip = f"198.51.100.{rng.randint(1, 254)}"
+    # i.e '2024-01-01T00:00:00.000Z':
+    query_time = datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    return {
+        "id": f"{query_id:056d}",
+        "timestamp": int(timestamp * 1000),
+        "message": f"1.0 {query_time} {HOSTED_ZONE_ID} {DOMAIN_NAME} {record_type} NOERROR UDP {rng.choice(EDGE_LOCATIONS)} {resolver_ip} -",
+    }
+
+
+def synthetic_payloads(
+        queries_per_second: float,
+        duration_seconds: float,
+        batch_window_seconds: float=1.0,
+        max_batch_size: int=100,
+        seed: int=0,
+    ) -> list:
+    """
+    A storm of queries arriving at random (Poisson), batched into deliveries.
+
+    Every `batch_window_seconds`, whatever queries arrived get delivered together (up
+    to `max_batch_size` per payload). A window of 0 delivers each query on it's own.
+    """
+    rng = random.Random(seed)
+    query_times = []
+    now = rng.expovariate(queries_per_second)
+    while now < duration_seconds:
+        query_times.append(now)
+        now += rng.expovariate(queries_per_second)
+
+    ## Group them by which window they landed in:
+    batches = {}
+    for query_id, query_time in enumerate(query_times):
+        window = int(query_time // batch_window_seconds) if batch_window_seconds else query_id
+        batches.setdefault(window, []).append(query_log_event(query_id, 1704067200 + query_time, rng))
+
+    payloads = []
+    for window, log_events in sorted(batches.items()):
+        # Delivered at the end of the window (Or right away, if there's no window):
+        deliver_at = (window + 1) * batch_window_seconds if batch_window_seconds else query_times[window]
+        for start in range(0, len(log_events), max_batch_size):
+            batch = log_events[start:start + max_batch_size]
+            payloads.append((deliver_at, encode_event(batch), len(batch)))
+    return payloads
+
+
+def recorded_payloads(path: str, speed: float=1.0) -> list:
+    """
+    Replay payloads captured from a real leaf. The file is a JSON list (or one per line) of either:
+        - The lambda's event, `{"awslogs": {"data": "..."}}`. (It logs every event it gets, copy them from there).
+        - The decoded log data, `{"logEvents": [...]}`.
+
+    Each is delivered at it's first query's time, relative to the first one, sped up by `speed`.
+    """
+    with open(path, encoding="utf-8") as recorded_file:
+        text = recorded_file.read().strip()
+    records = json.loads(text) if text.startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    events = []
+    for record in records:
+        # The lambda logs it as {"Event": {...}, "Context": ...}:
+        record = record.get("Event", record)
+        events.append(record if "awslogs" in record else encode_event(record["logEvents"]))
+
+    first_query_times = [min(log_event["timestamp"] for log_event in decode_event(event)) / 1000 for event in events]
+    start_time = min(first_query_times)
+    return sorted(
+        (((query_time - start_time) / speed, event, len(decode_event(event))) for query_time, event in zip(first_query_times, events)),
+        key=lambda payload: payload[0],
+    )
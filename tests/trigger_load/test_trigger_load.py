@@ -0,0 +1,65 @@
+"""
+Checks the load harness measures what it says, and holds `trigger-start-system`
+to it's current cost per payload. (If dedup work lowers it, lower the budget too).
+
+Kept short, so it runs on every push. Run bigger storms with `make load-test-trigger`.
+"""
+
+import json
+
+from tests.trigger_load.harness import run_load
+from tests.trigger_load.payloads import synthetic_payloads, recorded_payloads, decode_event, encode_event
+
+# AWS calls per invocation: put_metric_data, update_auto_scaling_group, update_service, put_parameter.
+MAX_CALLS_PER_PAYLOAD = 4
+
+
+def test_synthetic_payloads_batch_by_window():
+    """ Every query is in exactly one payload, delivered at the end of it's window """
+    payloads = synthetic_payloads(queries_per_second=100, duration_seconds=2, batch_window_seconds=0.5, max_batch_size=20)
+    query_ids = [log_event["id"] for _, event, _ in payloads for log_event in decode_event(event)]
+    assert len(query_ids) == len(set(query_ids)) == sum(num_queries for _, _, num_queries in payloads)
+    assert all(num_queries <= 20 for _, _, num_queries in payloads)
+    assert {deliver_at for deliver_at, _, _ in payloads} <= {0.5, 1.0, 1.5, 2.0}
+
+
+def test_recorded_payloads_keep_their_spacing(tmp_path):
+    """ Both formats load, and replay spaced out like they happened (sped up) """
+    def log_events(start_ms: int) -> list:
+        return [{"id": str(start_ms), "timestamp": start_ms, "message": "load.example.com A"}]
+    recorded_file = tmp_path / "events.json"
+    recorded_file.write_text("\n".join([
+        # As the lambda logs it:
+        json.dumps({"Event": encode_event(log_events(1704067204000)), "Context": "..."}),
+        # Already decoded:
+        json.dumps({"logEvents": log_events(1704067200000)}),
+    ]), encoding="utf-8")
+    payloads = recorded_payloads(str(recorded_file), speed=2)
+    assert [deliver_at for deliver_at, _, _ in payloads] == [0, 2]
+
+
+def test_calls_per_payload_within_budget():
+    """ Every payload costs the same, no matter how many queries are in it """
+    payloads = synthetic_payloads(queries_per_second=200, duration_seconds=1, batch_window_seconds=0.25)
+    report = run_load(payloads, concurrency=4, api_latency_seconds=0)
+    assert report["Errors"] == 0
+    assert report["Payloads"] == len(payloads)
+    assert report["CallsPerPayload"] <= MAX_CALLS_PER_PAYLOAD
+    assert report["CallsPerQuery"] == round(report["AwsCalls"] / report["DnsQueries"], 3)
+    # Batching is what keeps this under 1:
+    assert report["CallsPerQuery"] < 1
+
+
+def test_saturation_shows_up_as_queue_delay():
+    """ Past the concurrency limit, payloads wait. With enough, they don't """
+    # One query per payload, faster than one handler can keep up with:
+    payloads = synthetic_payloads(queries_per_second=100, duration_seconds=0.3, batch_window_seconds=0, seed=1)
+    saturated = run_load(payloads, concurrency=1, api_latency_seconds=0.01)
+    assert saturated["PeakConcurrency"] == 1
+    # Each one takes 4 round trips (40ms), so they pile up:
+    assert saturated["QueueDelayMs"]["max"] > 100
+    assert saturated["LatencyMs"]["p50"] >= 40
+
+    sized = run_load(payloads, concurrency=len(payloads), api_latency_seconds=0.01)
+    assert sized["PeakConcurrency"] > 1
+    assert sized["QueueDelayMs"]["max"] < saturated["QueueDelayMs"]["max"]
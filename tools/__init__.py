@@ -0,0 +1,6 @@
+"""
+Tools to run against a deployed leaf. (Need AWS credentials)
+
+They aren't part of the stacks, and aren't tests. Their tests are
+under `tests/`, and run offline.
+"""
@@ -0,0 +1,327 @@
+"""
+Profiles a leaf deploy from it's CloudFormation stack events: What's on the
+critical path, and which resources took the longest.
+
+Reads the events for the base, domain, manager (and every nested stack under it),
+and link-together stacks, then keeps just the latest deploy:
+    - Each stack's latest operation (The last CREATE/UPDATE/DELETE_IN_PROGRESS on the stack itself).
+    - Only the operations that ran back-to-back with the newest one. (`cdk deploy` runs the
+      stacks one after another, a stack with no changes just keeps it's older operation).
+
+The critical path is worked backwards from the end of each stack: The resource that finished
+last, then whatever finished last before THAT one started, and so on. (CloudFormation starts a
+resource the moment it's dependencies finish, so this is the chain it was waiting on). Nested
+stacks on the path are expanded into their own critical path.
+
+Live (Needs AWS credentials, and the same region you deploy to):
+    python3 -m tools.deploy_profiler --config-file ./Examples/Minecraft-example.yaml --record ./deploy-events.json
+Offline, from what `--record` saved:
+    python3 -m tools.deploy_profiler --recorded ./deploy-events.json
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime, timezone
+
+### NOTE: IF THESE ARE CHANGED: Also change them in app.py:
+APPLICATION_ID = "ContainerManager"
+BASE_STACK_NAME = f"{APPLICATION_ID}-BaseStack"
+# The domain and link-together stacks are always here:
+US_EAST_1 = "us-east-1"
+
+# Statuses a resource (or stack) starts an operation with:
+START_STATUSES = ["CREATE_IN_PROGRESS", "UPDATE_IN_PROGRESS", "DELETE_IN_PROGRESS", "IMPORT_IN_PROGRESS"]
+# Statuses a resource's part of an operation ends with:
+END_SUFFIXES = ("_COMPLETE", "_FAILED", "_SKIPPED")
+# How far apart two stacks can finish/start, and still be part of the same `cdk deploy`.
+#   (Publishing assets, and creating the next change set, happen in between):
+MAX_SECONDS_BETWEEN_STACKS = 15 * 60
+# How close a resource has to finish to when the next one started, to count as what it waited on:
+CRITICAL_PATH_SLACK_SECONDS = 2
+
+
+def leaf_stacks(config_file: str, region: str) -> list:
+    """ Every stack a leaf deploy touches, in the order `cdk deploy` runs them: [(stack_name, region), ...] """
+    container_id = os.path.basename(os.path.splitext(config_file)[0])
+    return [
+        (BASE_STACK_NAME, region),
+        (f"{APPLICATION_ID}-{container_id}-DomainStack", US_EAST_1),
+        (f"{APPLICATION_ID}-{container_id}-Stack", region),
+        (f"{APPLICATION_ID}-{container_id}-LinkTogetherStack", US_EAST_1),
+    ]
+
+
+def parse_time(timestamp) -> float:
+    """ Epoch seconds, from boto3's datetime or the string `--record` saved it as """
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def is_stack_event(event: dict) -> bool:
+    """ If the event is about the stack itself, not one of it's resources """
+    return event["ResourceType"] == "AWS::CloudFormation::Stack" and event["PhysicalResourceId"] == event["StackId"]
+
+
+def is_nested_stack(event: dict) -> bool:
+    """ If the event is about a nested stack resource, inside this stack """
+    return event["ResourceType"] == "AWS::CloudFormation::Stack" and event["PhysicalResourceId"] != event["StackId"]
+
+
+#######################
+## Reading the events:
+def fetch_events(stack_names: list) -> list:
+    """
+    Every event for the latest operation of each stack, and the nested stacks
+    under them. `stack_names` is [(stack_name, region), ...].
+    """
+    # pylint: disable=import-outside-toplevel
+    import boto3
+    import botocore
+    events = []
+    pending = list(stack_names)
+    while pending:
+        stack_name, region = pending.pop(0)
+        client = boto3.client("cloudformation", region_name=region)
+        try:
+            stack_events = fetch_latest_operation(client, stack_name)
+        except botocore.exceptions.ClientError as e:
+            if "does not exist" not in str(e):
+                raise
+            print(f"Stack '{stack_name}' doesn't exist in '{region}', skipping it.")
+            continue
+        events.extend(stack_events)
+        ## Nested stacks are in the same region, with their own events:
+        pending.extend({(e["PhysicalResourceId"], region) for e in stack_events if is_nested_stack(e) and e["PhysicalResourceId"]})
+    return events
+
+
+def fetch_latest_operation(client, stack_name: str) -> list:
+    """ A stack's events, newest first, back to the start of it's latest operation """
+    events = []
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudformation/paginator/DescribeStackEvents.html
+    for page in client.get_paginator("describe_stack_events").paginate(StackName=stack_name):
+        for event in page["StackEvents"]:
+            events.append(event)
+            if is_stack_event(event) and event["ResourceStatus"] in START_STATUSES:
+                return events
+    return events
+
+
+def load_recorded(path: str) -> tuple[list, list]:
+    """ The stacks (in deploy order) and events, from a file `--record` saved """
+    with open(path, encoding="utf-8") as recorded_file:
+        recorded = json.load(recorded_file)
+    return recorded["Stacks"], recorded["Events"]
+
+
+def save_recorded(path: str, stack_names: list, events: list) -> None:
+    """ Save the events, to profile offline later """
+    with open(path, "w", encoding="utf-8") as recorded_file:
+        json.dump({"Stacks": [name for name, _ in stack_names], "Events": events}, recorded_file, indent=4, default=str)
+
+
+#######################
+## Turning them into timings:
+def stack_operations(events: list) -> dict:
+    """
+    Each stack's latest operation: {stack_id: {"StackName", "Start", "End", "Status", "Resources"}}.
+
+    A resource's time is from it's first *_IN_PROGRESS, to the last event that ends it.
+    (Resources that got replaced have a create AND a delete, this covers both).
+    """
+    by_stack = {}
+    for event in events:
+        by_stack.setdefault(event["StackId"], []).append(event)
+
+    operations = {}
+    for stack_id, stack_events in by_stack.items():
+        stack_events.sort(key=lambda e: parse_time(e["Timestamp"]))
+        starts = [i for i, e in enumerate(stack_events) if is_stack_event(e) and e["ResourceStatus"] in START_STATUSES]
+        if not starts:
+            continue
+        stack_events = stack_events[starts[-1]:]
+        stack_level = [e for e in stack_events if is_stack_event(e)]
+        resources = {}
+        for event in stack_events:
+            if is_stack_event(event):
+                continue
+            resource = resources.setdefault(event["LogicalResourceId"], {
+                "Stack": event["StackName"],
+                "LogicalResourceId": event["LogicalResourceId"],
+                "ResourceType": event["ResourceType"],
+                "PhysicalResourceId": event.get("PhysicalResourceId"),
+                "Start": parse_time(event["Timestamp"]),
+                "End": None,
+                "Status": event["ResourceStatus"],
+            })
+            if event.get("PhysicalResourceId"):
+                resource["PhysicalResourceId"] = event["PhysicalResourceId"]
+            if event["ResourceStatus"].endswith(END_SUFFIXES):
+                resource["End"] = parse_time(event["Timestamp"])
+                resource["Status"] = event["ResourceStatus"]
+        for resource in resources.values():
+            # Still going (or the events got cut off), count it up to the end of the stack:
+            if resource["End"] is None:
+                resource["End"] = parse_time(stack_level[-1]["Timestamp"])
+            resource["Seconds"] = round(resource["End"] - resource["Start"], 3)
+        operations[stack_id] = {
+            "StackName": stack_level[0]["StackName"],
+            "Start": parse_time(stack_level[0]["Timestamp"]),
+            "End": parse_time(stack_level[-1]["Timestamp"]),
+            "Status": stack_level[-1]["ResourceStatus"],
+            "Resources": sorted(resources.values(), key=lambda r: r["Start"]),
+        }
+    return operations
+
+
+def last_deploy(operations: dict, stack_names: list) -> list:
+    """
+    The top-level stack operations that were part of the newest `cdk deploy`, in order.
+    (A stack whose latest operation is older than that didn't change, so it's left out)
+    """
+    top_level = [op for op in operations.values() if op["StackName"] in stack_names]
+    top_level.sort(key=lambda op: op["Start"])
+    deploy = top_level[-1:]
+    for op in reversed(top_level[:-1]):
+        if deploy[0]["Start"] - op["End"] > MAX_SECONDS_BETWEEN_STACKS:
+            break
+        deploy.insert(0, op)
+    return deploy
+
+
+def critical_path(operation: dict, operations: dict, depth: int=0) -> list:
+    """ The chain of resources this stack was waiting on, first to last. Nested stacks are expanded """
+    path = []
+    cursor = operation["End"]
+    remaining = list(operation["Resources"])
+    while remaining:
+        # Whatever finished last, before the cursor:
+        finished = [r for r in remaining if r["End"] <= cursor + CRITICAL_PATH_SLACK_SECONDS]
+        if not finished:
+            break
+        resource = max(finished, key=lambda r: (r["End"], r["Seconds"]))
+        path.insert(0, resource)
+        remaining = [r for r in remaining if r["Start"] < resource["Start"] and r is not resource]
+        cursor = resource["Start"]
+
+    expanded = []
+    for resource in path:
+        expanded.append({**resource, "Depth": depth})
+        nested = operations.get(resource["PhysicalResourceId"]) if resource["ResourceType"] == "AWS::CloudFormation::Stack" else None
+        if nested:
+            expanded.extend(critical_path(nested, operations, depth + 1))
+    return expanded
+
+
+def profile(stack_names: list, events: list, top: int=15) -> dict:
+    """ The whole report: Each stack, the critical path through all of them, and the slowest resources """
+    operations = stack_operations(events)
+    deploy = last_deploy(operations, stack_names)
+    if not deploy:
+        raise RuntimeError(f"No operations found for any of: {stack_names}")
+    deploy_start = deploy[0]["Start"]
+
+    path = []
+    stacks = []
+    previous_end = None
+    for op in deploy:
+        if previous_end is not None:
+            # The CLI publishing assets, and making the change set:
+            path.append({"Stack": None, "LogicalResourceId": "(between stacks)", "ResourceType": "cdk", "Start": previous_end, "End": op["Start"], "Seconds": round(op["Start"] - previous_end, 3), "Status": "", "Depth": 0})
+        path.extend(critical_path(op, operations))
+        stacks.append({"StackName": op["StackName"], "Seconds": round(op["End"] - op["Start"], 3), "Status": op["Status"]})
+        previous_end = op["End"]
+
+    ## Every real resource in the deploy (nested stacks are just their children added up):
+    deploy_stack_ids = set()
+    pending = [stack_id for stack_id, op in operations.items() if op in deploy]
+    while pending:
+        stack_id = pending.pop()
+        deploy_stack_ids.add(stack_id)
+        pending.extend(r["PhysicalResourceId"] for r in operations[stack_id]["Resources"] if r["PhysicalResourceId"] in operations)
+    on_path = {(r["Stack"], r["LogicalResourceId"]) for r in path}
+    slowest = sorted(
+        (r for stack_id in deploy_stack_ids for r in operations[stack_id]["Resources"] if r["ResourceType"] != "AWS::CloudFormation::Stack"),
+        key=lambda r: r["Seconds"],
+        reverse=True,
+    )[:top]
+
+    def summary(resource: dict) -> dict:
+        return {
+            "Stack": resource["Stack"],
+            "LogicalResourceId": resource["LogicalResourceId"],
+            "ResourceType": resource["ResourceType"],
+            "StartOffsetSeconds": round(resource["Start"] - deploy_start, 3),
+            "Seconds": resource["Seconds"],
+            "Status": resource["Status"],
+        }
+    return {
+        "DeploySeconds": round(deploy[-1]["End"] - deploy_start, 3),
+        "Stacks": stacks,
+        "Unchanged": [name for name in stack_names if name not in {op["StackName"] for op in deploy}],
+        "CriticalPath": [{**summary(r), "Depth": r["Depth"]} for r in path],
+        "SlowestResources": [{**summary(r), "OnCriticalPath": (r["Stack"], r["LogicalResourceId"]) in on_path} for r in slowest],
+    }
+
+
+#######################
+## Printing it:
+def print_report(report: dict, width: int=40) -> None:
+    """ The stacks, the critical path as a timeline, and the slowest resources """
+    total = report["DeploySeconds"] or 1
+    print(f"Deploy took {report['DeploySeconds']:.0f}s")
+    for stack in report["Stacks"]:
+        print(f"    {stack['StackName']:<60} {stack['Seconds']:>7.0f}s  {stack['Status']}")
+    for name in report["Unchanged"]:
+        print(f"    {name:<60} {'-':>8}  (not part of this deploy)")
+
+    print("\nCritical path:")
+    for step in report["CriticalPath"]:
+        start = int(step["StartOffsetSeconds"] / total * width)
+        length = max(1, int(step["Seconds"] / total * width))
+        timeline = " " * start + "#" * length
+        name = "  " * step["Depth"] + step["LogicalResourceId"]
+        print(f"    {timeline:<{width + 1}} {step['StartOffsetSeconds']:>6.0f}s +{step['Seconds']:>5.0f}s  {name} ({step['ResourceType']})")
+
+    print("\nSlowest resources: (* = on the critical path)")
+    for resource in report["SlowestResources"]:
+        marker = "*" if resource["OnCriticalPath"] else " "
+        print(f"  {marker} {resource['Seconds']:>6.0f}s  {resource['LogicalResourceId']} ({resource['ResourceType']}) in {resource['Stack']}")
+
+
+def main() -> None:
+    """ Profile a deploy, live or from a recording """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--config-file", help="The leaf's config. Reads the events from CloudFormation.")
+    source.add_argument("--recorded", help="Read the events from a file `--record` saved instead.")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION", os.environ.get("AWS_DEFAULT_REGION")), help="Region the base and leaf stacks are in. (Default: $AWS_REGION)")
+    parser.add_argument("--record", help="With --config-file, also save the events here.")
+    parser.add_argument("--top", type=int, default=15, help="How many of the slowest resources to list.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    if args.recorded:
+        stack_names, events = load_recorded(args.recorded)
+    else:
+        if not args.region:
+            parser.error("Set --region, or AWS_REGION.")
+        stacks = leaf_stacks(args.config_file, args.region)
+        stack_names = [name for name, _ in stacks]
+        events = fetch_events(stacks)
+        if args.record:
+            save_recorded(args.record, stacks, events)
+
+    report = profile(stack_names, events, top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
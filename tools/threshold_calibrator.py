@@ -0,0 +1,333 @@
+"""
+Recommends a UDP watchdog's `Threshold`, from the leaf's own activity history.
+
+The UDP watchdog counts packets in/out every minute, and anything at `Threshold` or
+less counts as nobody playing. The default (32) only fits some games: An empty server
+that keeps chatting with it's master server never spins down, and one that's too low
+to see a quiet player kicks them.
+
+Reads the leaf's `Metric-ContainerActivity-UDP` (the max of each minute), and splits it
+into the idle and active minutes:
+    - Works on log10(1 + packets). An empty server and a played one are orders of
+      magnitude apart, not a fixed number of packets apart.
+    - Otsu's split: The cut through the sorted minutes where the two groups are the
+      furthest apart, for how spread out each one is. (Every cut is scored in one pass).
+    - The threshold goes halfway (on the log scale) between the idle minutes' 99th
+      percentile, and the active minutes' 1st.
+The minutes `trigger-start-system` pushed (`Threshold + 1`, on every DNS query) aren't
+traffic, and are dropped first.
+
+How confident it is:
+    - High: Both groups have enough minutes, the split explains at least 90% of the
+      variance, and there's at least 10x between the idle 99th and active 1st percentile.
+    - Medium: The groups still don't overlap, and the split explains at least 75%.
+    - Low: Anything else. (Not enough history, barely anyone played, or they overlap).
+
+Live (Needs AWS credentials, and the region the leaf is in):
+    python3 -m tools.threshold_calibrator --config-file ./Examples/Valheim-example.yaml --record ./udp-activity.json
+Offline, from what `--record` saved:
+    python3 -m tools.threshold_calibrator --config-file ./Examples/Valheim-example.yaml --recorded ./udp-activity.json
+Add `--apply` to write the recommendation into the config. (Only if it's confident enough, see `--min-confidence`).
+"""
+
+import os
+import re
+import json
+import math
+import argparse
+import statistics
+from datetime import datetime, timedelta, timezone
+
+from ContainerManager.utils.config_loader import load_leaf_config
+
+### NOTE: IF THESE ARE CHANGED: Also change them in app.py / Watchdog.py:
+APPLICATION_ID = "ContainerManager"
+METRIC_NAME = "Metric-ContainerActivity-UDP"
+DIMENSION_NAME = "ContainerNameID"
+
+# CloudWatch only keeps 1-minute datapoints for 15 days:
+MAX_DAYS = 15
+DEFAULT_DAYS = 14
+PERIOD_SECONDS = 60
+# Fewer minutes than this in either group, and it's just a guess:
+MIN_MINUTES_PER_GROUP = 30
+# Percentiles each group's edge is taken at. (So one odd minute doesn't move it):
+IDLE_PERCENTILE = 99
+ACTIVE_PERCENTILE = 1
+CONFIDENCE_LEVELS = ["Low", "Medium", "High"]
+
+
+def leaf_metric(config_file: str) -> tuple[str, str]:
+    """ The namespace and ContainerNameID the leaf's watchdog pushes to """
+    container_id = os.path.basename(os.path.splitext(config_file)[0])
+    return f"{APPLICATION_ID}-{container_id}-Stack", container_id
+
+
+#######################
+## Reading the history:
+def fetch_activity(namespace: str, container_id: str, region: str, days: int=DEFAULT_DAYS) -> list:
+    """ Every minute the watchdog pushed, oldest first: [{"Timestamp": ..., "Value": ...}, ...] """
+    # pylint: disable=import-outside-toplevel
+    import boto3
+    client = boto3.client("cloudwatch", region_name=region)
+    end_time = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    datapoints = []
+    # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch/paginator/GetMetricData.html
+    for page in client.get_paginator("get_metric_data").paginate(
+        MetricDataQueries=[{
+            "Id": "activity",
+            "MetricStat": {
+                "Metric": {
+                    "Namespace": namespace,
+                    "MetricName": METRIC_NAME,
+                    "Dimensions": [{"Name": DIMENSION_NAME, "Value": container_id}],
+                },
+                "Period": PERIOD_SECONDS,
+                "Stat": "Maximum",
+            },
+        }],
+        StartTime=end_time - timedelta(days=days),
+        EndTime=end_time,
+        ScanBy="TimestampAscending",
+    ):
+        for result in page["MetricDataResults"]:
+            datapoints.extend({"Timestamp": t, "Value": v} for t, v in zip(result["Timestamps"], result["Values"]))
+    return datapoints
+
+
+def load_recorded(path: str) -> list:
+    """ The datapoints, from a file `--record` saved """
+    with open(path, encoding="utf-8") as recorded_file:
+        return json.load(recorded_file)["Datapoints"]
+
+
+def save_recorded(path: str, namespace: str, container_id: str, datapoints: list) -> None:
+    """ Save the datapoints, to calibrate offline later """
+    with open(path, "w", encoding="utf-8") as recorded_file:
+        json.dump({
+            "Namespace": namespace,
+            "ContainerNameID": container_id,
+            "MetricName": METRIC_NAME,
+            "Datapoints": datapoints,
+        }, recorded_file, indent=4, default=str)
+
+
+#######################
+## Splitting it in two:
+def percentile(sorted_values: list, percent: float) -> float:
+    """ Nearest-rank percentile, of values that are already sorted """
+    index = math.ceil(percent / 100 * len(sorted_values)) - 1
+    return sorted_values[min(len(sorted_values) - 1, max(0, index))]
+
+
+def otsu_split(sorted_values: list) -> tuple[int, float]:
+    """
+    Where to cut the sorted values in two (the index of the first 'high' one, 0 if
+    there's no cut), and how much of the variance that cut explains. (0-1)
+    """
+    count = len(sorted_values)
+    total = sum(sorted_values)
+    best_index, best_between = 0, 0.0
+    low_sum = 0.0
+    for index in range(1, count):
+        low_sum += sorted_values[index - 1]
+        # Can't cut between two of the same value:
+        if sorted_values[index] == sorted_values[index - 1]:
+            continue
+        low_mean = low_sum / index
+        high_mean = (total - low_sum) / (count - index)
+        # The between-group variance. (Maximizing it minimizes the variance within each group):
+        between = (index / count) * (1 - index / count) * (high_mean - low_mean) ** 2
+        if between > best_between:
+            best_index, best_between = index, between
+    variance = statistics.pvariance(sorted_values) if count > 1 else 0.0
+    return best_index, (best_between / variance if variance else 0.0)
+
+
+def summarize(values: list) -> dict:
+    """ How many minutes are in a group, and how much traffic they had """
+    if not values:
+        return {"Minutes": 0}
+    return {
+        "Minutes": len(values),
+        "Min": values[0],
+        "P50": percentile(values, 50),
+        "P99": percentile(values, 99),
+        "Max": values[-1],
+    }
+
+
+def misclassified(idle: list, active: list, threshold: int) -> dict:
+    """ Minutes a threshold would get wrong. (The watchdog counts anything above it as active) """
+    return {
+        # Keeps an empty server up:
+        "IdleCountedActive": sum(1 for value in idle if value > threshold),
+        # Spins a played one down:
+        "ActiveCountedIdle": sum(1 for value in active if value <= threshold),
+    }
+
+
+def calibrate(datapoints: list, current_threshold: int, min_minutes: int=MIN_MINUTES_PER_GROUP) -> dict:
+    """ Split the minutes into idle and active, and recommend a threshold between them """
+    # trigger-start-system pushes 'Threshold + 1' on every DNS query. That's not traffic:
+    values = sorted(d["Value"] for d in datapoints if d["Value"] != current_threshold + 1)
+    report = {
+        "Minutes": len(values),
+        "DroppedTriggerMinutes": len(datapoints) - len(values),
+        "CurrentThreshold": current_threshold,
+        "RecommendedThreshold": None,
+        "Confidence": "Low",
+        "Reasons": [],
+    }
+    split_index, separability = otsu_split([math.log10(1 + value) for value in values])
+    idle, active = values[:split_index], values[split_index:]
+    if not split_index:
+        # Every minute looks the same. Can't tell if that's idle or active:
+        idle, active = [], []
+    report["Separability"] = round(separability, 3)
+    report["Idle"] = summarize(idle)
+    report["Active"] = summarize(active)
+    if not idle or not active:
+        report["Reasons"].append("The history doesn't have both idle and active minutes to split. (Has anyone played on it yet?)")
+        return report
+
+    ## Halfway between the two edges, on the log scale:
+    idle_edge = percentile(idle, IDLE_PERCENTILE)
+    active_edge = percentile(active, ACTIVE_PERCENTILE)
+    margin = math.log10(1 + active_edge) - math.log10(1 + idle_edge)
+    recommended = max(math.ceil(idle_edge), int(math.sqrt((1 + idle_edge) * (1 + active_edge)) - 1))
+    report["MarginDecades"] = round(margin, 2)
+    report["RecommendedThreshold"] = recommended
+    report["Misclassified"] = {
+        "Current": misclassified(idle, active, current_threshold),
+        "Recommended": misclassified(idle, active, recommended),
+    }
+
+    ## How much to trust it:
+    for name, group in [("idle", idle), ("active", active)]:
+        if len(group) < min_minutes:
+            report["Reasons"].append(f"Only {len(group)} {name} minutes. (Wants at least {min_minutes})")
+    if margin <= 0:
+        report["Reasons"].append(f"The groups overlap: Idle P{IDLE_PERCENTILE} is {idle_edge}, active P{ACTIVE_PERCENTILE} is {active_edge}.")
+    elif separability < 0.75:
+        report["Reasons"].append(f"The split only explains {separability:.0%} of the variance.")
+    if report["Reasons"]:
+        return report
+    if separability >= 0.9 and margin >= 1:
+        report["Confidence"] = "High"
+    else:
+        report["Confidence"] = "Medium"
+        report["Reasons"].append(f"The groups are only {10 ** margin:.1f}x apart, with {separability:.0%} of the variance explained.")
+    return report
+
+
+#######################
+## Writing it back:
+def apply_threshold(config_file: str, threshold: int) -> None:
+    """ Sets `Watchdog.Threshold` in the config, and leaves the rest of the file (comments too) alone """
+    with open(config_file, encoding="utf-8") as config:
+        original = config.read()
+    lines = original.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    watchdog = next((i for i, line in enumerate(lines) if re.match(r"^Watchdog:\s*(#.*)?$", line)), None)
+    if watchdog is None:
+        lines += ["\n", "Watchdog:\n", f"  Threshold: {threshold}\n"]
+    else:
+        # The block is everything indented under it:
+        end = watchdog + 1
+        while end < len(lines) and (not lines[end].strip() or lines[end][0] in " \t"):
+            end += 1
+        children = [line for line in lines[watchdog + 1:end] if line.strip() and not line.lstrip().startswith("#")]
+        indent = re.match(r"^\s*", children[0]).group() if children else "  "
+        for index in range(watchdog + 1, end):
+            match = re.match(rf"^{indent}Threshold:[^#\n]*(#.*)?$", lines[index].rstrip("\r\n"))
+            if match:
+                comment = f" {match.group(1)}" if match.group(1) else ""
+                lines[index] = f"{indent}Threshold: {threshold}{comment}\n"
+                break
+        else:
+            lines.insert(watchdog + 1, f"{indent}Threshold: {threshold}\n")
+    with open(config_file, "w", encoding="utf-8") as config:
+        config.write("".join(lines))
+
+    ## Make sure the config still loads, and says what we meant it to. Otherwise put it back:
+    try:
+        loaded_threshold = load_leaf_config(config_file)["Watchdog"]["Threshold"]
+    # Whatever's wrong with it, the file gets put back the same way:
+    except Exception: # pylint: disable=broad-exception-caught
+        loaded_threshold = None
+    if loaded_threshold != threshold:
+        with open(config_file, "w", encoding="utf-8") as config:
+            config.write(original)
+        raise RuntimeError(f"Couldn't set Watchdog.Threshold in '{config_file}'. Left it unchanged, set it by hand.")
+
+
+#######################
+## Printing it:
+def print_report(report: dict) -> None:
+    """ Both groups, the recommendation, and how confident it is """
+    print(f"{report['Minutes']} minutes of history. (Dropped {report['DroppedTriggerMinutes']} pushed by DNS queries)")
+    for name in ["Idle", "Active"]:
+        group = report[name]
+        if group["Minutes"]:
+            print(f"    {name:<7} {group['Minutes']:>6} minutes, packets: min {group['Min']:.0f}, p50 {group['P50']:.0f}, p99 {group['P99']:.0f}, max {group['Max']:.0f}")
+        else:
+            print(f"    {name:<7} {0:>6} minutes")
+
+    print(f"\nCurrent threshold:     {report['CurrentThreshold']}")
+    print(f"Recommended threshold: {report['RecommendedThreshold']}  (Confidence: {report['Confidence']})")
+    for reason in report["Reasons"]:
+        print(f"    - {reason}")
+    if "Misclassified" in report:
+        print("\nMinutes each would get wrong:")
+        for name, wrong in report["Misclassified"].items():
+            print(f"    {name:<12} {wrong['IdleCountedActive']:>6} idle counted active, {wrong['ActiveCountedIdle']:>6} active counted idle")
+
+
+def main() -> None:
+    """ Calibrate a leaf's threshold, live or from a recording """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config-file", required=True, help="The leaf's config. Where the current threshold comes from (and --apply writes to).")
+    parser.add_argument("--recorded", help="Read the history from a file `--record` saved, instead of CloudWatch.")
+    parser.add_argument("--region", default=os.environ.get("AWS_REGION", os.environ.get("AWS_DEFAULT_REGION")), help="Region the leaf is in. (Default: $AWS_REGION)")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help=f"How much history to read. (Default: {DEFAULT_DAYS}, max {MAX_DAYS})")
+    parser.add_argument("--record", help="Without --recorded, also save the history here.")
+    parser.add_argument("--apply", action="store_true", help="Write the recommended threshold into the config.")
+    parser.add_argument("--min-confidence", choices=CONFIDENCE_LEVELS, default="High", help="How confident it has to be, to --apply. (Default: High)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    config = load_leaf_config(args.config_file)
+    if config["Watchdog"]["Type"] != "UDP":
+        parser.error(f"Only UDP watchdogs have a threshold to calibrate. This one is '{config['Watchdog']['Type']}'.")
+    if args.recorded:
+        datapoints = load_recorded(args.recorded)
+    else:
+        if not args.region:
+            parser.error("Set --region, or AWS_REGION.")
+        if not 1 <= args.days <= MAX_DAYS:
+            parser.error(f"--days has to be between 1 and {MAX_DAYS}. (CloudWatch only keeps 1-minute datapoints that long)")
+        namespace, container_id = leaf_metric(args.config_file)
+        datapoints = fetch_activity(namespace, container_id, args.region, days=args.days)
+        if args.record:
+            save_recorded(args.record, namespace, container_id, datapoints)
+
+    report = calibrate(datapoints, config["Watchdog"]["Threshold"])
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_report(report)
+
+    if args.apply:
+        if CONFIDENCE_LEVELS.index(report["Confidence"]) < CONFIDENCE_LEVELS.index(args.min_confidence):
+            parser.exit(1, f"\nNot applying it: Confidence is {report['Confidence']}, --min-confidence is {args.min_confidence}.\n")
+        if report["RecommendedThreshold"] == report["CurrentThreshold"]:
+            print(f"\nThreshold is already {report['CurrentThreshold']}, nothing to apply.")
+            return
+        apply_threshold(args.config_file, report["RecommendedThreshold"])
+        print(f"\nSet Watchdog.Threshold to {report['RecommendedThreshold']} in '{args.config_file}'. Deploy the leaf to use it.")
+
+
+if __name__ == "__main__":
+    main()